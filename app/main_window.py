@@ -1,34 +1,81 @@
 import locale
 import os
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
 from tkinter import messagebox
 from tkinter import ttk
 
 from app import __version__
 from service.diary_file_service import build_diary_path, launch_obsidian, save_diary
-from service.programming_diary_generator import ProgrammingDiaryGenerator
-from utils.config_manager import load_config, save_config
+from service.diary_job_queue import JOB_CANCELLED, JOB_DONE, JOB_FAILED, DiaryJob, DiaryJobQueue
+from service.diary_search_index import DiarySearchIndex, SearchHit
+from utils.cancellation import CancellationToken
+from utils.config_manager import flush_config, load_config, subscribe_config, update_config
 from utils.constants import MESSAGES
+from utils.exceptions import CancelledError
 from widgets import (
     ControlButtonsWidget,
     DateSelectionWidget,
-    ProgressWidget
+    JobListWidget,
+    ProgressWidget,
+    SearchWidget
 )
 
+if TYPE_CHECKING:
+    from service.diary_rollup import DiaryRollupGenerator, RollupResult
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
 
 class CodeDiaryMainWindow:
     """CodeDiaryアプリケーションのメインウィンドウ
 
     UI構成管理、ユーザーイベント処理、ビジネスロジック連携を担当"""
 
+    CONFIG_CHECK_INTERVAL_MS = 2000
+    PROGRESS_POLL_MS = 200
+    # 検索欄と検索結果の一覧が収まる高さ。設定ファイルの高さがこれより低い場合もこの高さで開く
+    MIN_WINDOW_HEIGHT = 400
+
     def __init__(self, root):
         """メインウィンドウを初期化し、UI構成を設定"""
         self.root = root
         self.config = load_config()
-        self.diary_generator = ProgrammingDiaryGenerator()
+        # google.genai・requestsの読み込みとAIクライアントの作成は重いため、ウィンドウ表示後にバックグラウンドで行う
+        self.diary_generator: Optional['ProgrammingDiaryGenerator'] = None
+        self.rollup_generator: Optional['DiaryRollupGenerator'] = None
+        self.services_ready: Future = Future()
+        self.rollup_token: Optional[CancellationToken] = None
+        # 選択期間のコミットの先読み。期間が変わると前の先読みは中止する
+        self.prefetch_token: Optional[CancellationToken] = None
+        self.prefetch_range: Optional[Tuple[str, str]] = None
+        # 複数期間の日誌生成は少数のワーカーで並行して実行し、重なる期間のコミット取得を共有する
+        # ジョブの状態は一定間隔で一覧に表示し、全ジョブが終わったら件数とトークン数をまとめて表示する
+        self.job_queue = DiaryJobQueue(
+            self._wait_for_services,
+            max_workers=self.config.getint('GITHUB', 'max_concurrent_jobs',
+                                           fallback=DiaryJobQueue.DEFAULT_MAX_WORKERS),
+            on_finished=self._on_job_finished
+        )
+        self.batch_jobs: List[DiaryJob] = []
+        # 保存中のジョブ（保存が終わるまでは全ジョブの終了として扱わない）と、保存済みのジョブの保存先
+        self.saving_job_ids: Set[int] = set()
+        self.saved_paths: Dict[int, Path] = {}
+        self.job_poll_id: Optional[str] = None
+        self.search_index = DiarySearchIndex()
+        self.search_hits: List[SearchHit] = []
+        # 同期フォルダへの保存やObsidianの起動でイベントループを止めないよう、ファイル操作は1本のワーカーで順に実行する
+        self.io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='diary-io')
 
         self._setup_locale()
         self._setup_ui()
+        self.root.after_idle(self._start_service_construction)
+        self.root.after_idle(self._prefetch_selected_range)
+        self._start_search_index_refresh()
+
+        subscribe_config(lambda config: self.root.after(0, self._on_config_changed))
+        self.root.after(self.CONFIG_CHECK_INTERVAL_MS, self._check_config)
 
     def _setup_locale(self):
         """日本語ロケールを初期化"""
@@ -44,7 +91,8 @@ class CodeDiaryMainWindow:
     def _setup_ui(self):
         """ウィンドウレイアウトと各ウィジェットを初期化"""
         window_width = self.config.get('WindowSettings', 'window_width', fallback='400')
-        window_height = self.config.get('WindowSettings', 'window_height', fallback='330')
+        window_height = max(self.config.getint('WindowSettings', 'window_height', fallback=self.MIN_WINDOW_HEIGHT),
+                            self.MIN_WINDOW_HEIGHT)
         window_x = self.config.get('WindowSettings', 'window_x', fallback='')
         window_y = self.config.get('WindowSettings', 'window_y', fallback='')
 
@@ -57,6 +105,7 @@ class CodeDiaryMainWindow:
 
         self.root.resizable(True, True)
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
+        self.root.bind('<Configure>', self._on_configure)
 
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.grid(row=0, column=0, sticky="wens")
@@ -72,22 +121,139 @@ class CodeDiaryMainWindow:
         self.date_selection_widget.grid(
             row=0, column=0, sticky="we", pady=(0, 10)
         )
+        self.date_selection_widget.set_callbacks(selection_changed=self._on_date_range_changed)
 
         self.progress_widget = ProgressWidget(main_frame)
         self.progress_widget.grid(
             row=1, column=0, sticky="we", pady=(0, 5)
         )
 
+        self.job_list_widget = JobListWidget(main_frame)
+        self.job_list_widget.grid(
+            row=2, column=0, sticky="we", pady=(0, 5)
+        )
+
         self.control_buttons_widget = ControlButtonsWidget(main_frame)
         self.control_buttons_widget.grid(
-            row=2, column=0, sticky="we"
+            row=3, column=0, sticky="we"
         )
 
         self.control_buttons_widget.set_callbacks(
             create_github_diary=self._create_github_diary,
-            close=self.root.quit
+            create_rollup=self._create_rollup,
+            cancel=self._cancel_generation,
+            close=self._on_closing
+        )
+
+        self.search_widget = SearchWidget(main_frame)
+        self.search_widget.grid(
+            row=4, column=0, sticky="wens", pady=(10, 0)
+        )
+        main_frame.rowconfigure(4, weight=1)
+
+        self.search_widget.set_callbacks(
+            search=self._search_diaries,
+            open_result=self._open_search_result
         )
 
+    def _start_service_construction(self):
+        """日誌生成サービスの作成と接続準備をバックグラウンドで開始"""
+        threading.Thread(target=self._build_services, daemon=True).start()
+
+    def _build_services(self):
+        """日誌生成・まとめ生成のサービスを作成し、Gemini・GitHubへの接続準備を済ませる"""
+        try:
+            from service.diary_rollup import DiaryRollupGenerator
+            from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+            self.diary_generator = ProgrammingDiaryGenerator()
+            self.rollup_generator = DiaryRollupGenerator(self.diary_generator.ai_client)
+            self.diary_generator.prepare()
+            self.services_ready.set_result(True)
+        except Exception as e:
+            print(f"日誌生成サービスの初期化に失敗しました: {e}")
+            self.services_ready.set_exception(e)
+
+    def _wait_for_services(self) -> 'ProgrammingDiaryGenerator':
+        """サービスの作成完了を待つ。作成に失敗していた場合はその例外を送出する"""
+        self.services_ready.result()
+        return self.diary_generator
+
+    def _is_prefetch_enabled(self) -> bool:
+        """GitHub連携と認証情報が設定され、先読みが無効化されていないか"""
+        return (self.config.getboolean('GITHUB', 'enable_cross_repo_tracking', fallback=False)
+                and self.config.getboolean('GITHUB', 'prefetch_enabled', fallback=True)
+                and bool(os.getenv('GITHUB_TOKEN')) and bool(os.getenv('GITHUB_USERNAME')))
+
+    def _prefetch_selected_range(self):
+        """起動時に選択されている期間のコミットを先読み"""
+        self._on_date_range_changed(*self.date_selection_widget.get_selected_dates())
+
+    def _on_date_range_changed(self, since_date_obj, until_date_obj):
+        """選択期間が変わったら前の先読みを中止し、新しい期間のコミットをバックグラウンドで先読みする"""
+        if since_date_obj > until_date_obj or not self._is_prefetch_enabled():
+            return
+
+        date_range = (since_date_obj.strftime('%Y-%m-%d'), until_date_obj.strftime('%Y-%m-%d'))
+        if date_range != self.prefetch_range:
+            self._cancel_prefetch()
+            self.prefetch_token = CancellationToken()
+            self.prefetch_range = date_range
+
+        threading.Thread(
+            target=self._prefetch_thread,
+            args=(*date_range, self.prefetch_token),
+            daemon=True
+        ).start()
+
+    def _prefetch_thread(self, since_date, until_date, cancel_token: CancellationToken):
+        """コミットの先読みをスレッド内で実行。失敗しても生成時に取得し直すため表示はしない"""
+        try:
+            diary_generator = self._wait_for_services()
+            diary_generator.prefetch_commits(since_date, until_date, cancel_token)
+        except CancelledError:
+            pass
+        except Exception as e:
+            print(f"コミットの先読みに失敗しました: {e}")
+
+    def _cancel_prefetch(self):
+        """実行中の先読みを中止"""
+        if self.prefetch_token is not None:
+            self.prefetch_token.cancel()
+        self.prefetch_range = None
+
+    def _start_search_index_refresh(self):
+        """日誌フォルダの変更を検索インデックスへバックグラウンドで反映"""
+        def run():
+            try:
+                changed = self.search_index.refresh()
+                print(f"検索インデックスを更新しました: {changed}件")
+            except Exception as e:
+                print(f"検索インデックスの更新に失敗しました: {e}")
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _search_diaries(self, query: str):
+        """保存済みの日誌を全文検索して結果一覧に表示"""
+        try:
+            self.search_hits = self.search_index.search(query)
+        except Exception as e:
+            self.progress_widget.set_error_message(f"日誌の検索に失敗しました: {e}")
+            return
+        self.search_widget.show_results([f"{hit.date} {hit.snippet}" for hit in self.search_hits])
+
+    def _open_search_result(self, index: int):
+        """選択した検索結果の日誌をObsidianで開く"""
+        if index < len(self.search_hits):
+            self.io_executor.submit(self._open_diary_in_background, self.search_hits[index].path)
+
+    def _open_diary_in_background(self, file_path: Path):
+        """ワーカースレッドでObsidianにノートを開かせる"""
+        try:
+            launch_obsidian(file_path)
+        except Exception as e:
+            self.root.after(0, messagebox.showerror, "エラー", MESSAGES["OBSIDIAN_LAUNCH_ERROR"].format(str(e)))
+
     def _validate_dates(self, since_date, until_date):
         """日付範囲の妥当性を検証"""
         if since_date > until_date:
@@ -126,85 +292,240 @@ class CodeDiaryMainWindow:
             if not self._validate_dates(since_date_obj, until_date_obj):
                 return
 
-            self._set_buttons_state(False)
-            self.progress_widget.start_progress("GitHub連携で日記を生成中...")
+            # 別の期間の先読みはAPIの残り回数を使わないよう中止し、同じ期間の先読みは完了を待って使う
+            if self.prefetch_range != (since_date, until_date):
+                self._cancel_prefetch()
 
-            thread = threading.Thread(
-                target=self._generate_github_diary_thread,
-                args=(since_date, until_date),
-                daemon=True
-            )
-            thread.start()
+            if self.job_poll_id is None:
+                self.batch_jobs = []
+                self.saved_paths = {}
+                self.progress_widget.start_progress("GitHub連携で日記を生成中...")
+                self.job_poll_id = self.root.after(self.PROGRESS_POLL_MS, self._poll_jobs)
+
+            job = self.job_queue.submit(since_date, until_date)
+            if job not in self.batch_jobs:
+                self.batch_jobs.append(job)
+            self._refresh_jobs()
+            self._update_cancel_state()
 
         except Exception as e:
             messagebox.showerror("エラー", f"GitHub連携日記の作成でエラーが発生しました:\n{str(e)}")
-            self._set_buttons_state(True)
-            self.progress_widget.stop_progress()
 
-    def _generate_github_diary_thread(self, since_date, until_date):
-        """GitHub APIからのコミット取得と日誌生成をスレッド内で実行"""
+    def _on_job_finished(self, job: DiaryJob):
+        """ジョブの終了時にワーカースレッドから呼び出される。完了したジョブは保存先を確認してメインスレッドに渡す"""
+        if job.status != JOB_DONE:
+            return
+
+        self.saving_job_ids.add(job.job_id)
         try:
-            diary_content, input_tokens, output_tokens, model_name = self.diary_generator.generate_diary(
-                since_date=since_date,
-                until_date=until_date
-            )
-            self.root.after(0, self._save_diary_result, diary_content, input_tokens, output_tokens,
-                            model_name, until_date)
+            file_path = build_diary_path(job.until_date)
+            file_exists = file_path.exists()
         except Exception as e:
-            self.root.after(0, self._schedule_error_display, str(e))
+            self.root.after(0, self._show_save_error, job, MESSAGES["DIARY_SAVE_ERROR"].format(str(e)))
+            return
+
+        self.root.after(0, self._save_diary_result, job, file_path, file_exists)
+
+    def _poll_jobs(self):
+        """ジョブの状態を一覧に表示する。待機中・実行中のジョブがなくなるまで一定間隔で繰り返す"""
+        self._refresh_jobs()
+        # 終了の通知（保存の受付）が済むまではjob.doneがセットされない
+        if (self.job_queue.has_active_jobs() or self.saving_job_ids
+                or any(not job.done.is_set() for job in self.batch_jobs)):
+            self.job_poll_id = self.root.after(self.PROGRESS_POLL_MS, self._poll_jobs)
+            return
+
+        self.job_poll_id = None
+        self._update_cancel_state()
+        if len(self.batch_jobs) == 1 and self.batch_jobs[0].job_id in self.saved_paths:
+            # 1件のみの場合は_show_diary_savedで保存先・トークン数・モデルを表示済み
+            return
+        finished = [job for job in self.batch_jobs if job.status == JOB_DONE]
+        self.progress_widget.set_jobs_summary(
+            len(finished),
+            sum(1 for job in self.batch_jobs if job.status == JOB_CANCELLED),
+            sum(1 for job in self.batch_jobs if job.status == JOB_FAILED),
+            sum(job.result[1] for job in finished),
+            sum(job.result[2] for job in finished)
+        )
+
+    def _refresh_jobs(self):
+        """ジョブ一覧と、今回まとめて実行しているジョブの残り件数を表示"""
+        self.job_queue.apply_progress()
+        self.job_list_widget.show_jobs(self.job_queue.jobs())
+        remaining = sum(1 for job in self.batch_jobs if not job.finished)
+        self.progress_widget.set_detail(f"実行中・待機中のジョブ: {remaining}/{len(self.batch_jobs)}件")
+
+    def _create_rollup(self):
+        """保存済みの日誌から選択期間を含む週・月のまとめを作成"""
+        since_date_obj, until_date_obj = self.date_selection_widget.get_selected_dates()
+        if not self._validate_dates(since_date_obj, until_date_obj):
+            return
+
+        self.rollup_token = CancellationToken()
+        self._set_buttons_state(False)
+        self.progress_widget.start_progress("週・月のまとめを作成中...")
+
+        thread = threading.Thread(
+            target=self._generate_rollup_thread,
+            args=(since_date_obj, until_date_obj, self.rollup_token),
+            daemon=True
+        )
+        thread.start()
 
-    def _save_diary_result(self, diary_content, input_tokens, output_tokens, model_name, until_date):
-        """生成した日誌をMarkdownファイルに保存しObsidianを起動"""
+    def _generate_rollup_thread(self, since_date, until_date, cancel_token: CancellationToken):
+        """保存済みの日誌からのまとめ生成をスレッド内で実行"""
         try:
-            file_path = build_diary_path(until_date)
+            self._wait_for_services()
+            results = self.rollup_generator.generate_rollups(since_date, until_date, cancel_token)
+            self.root.after(0, self._show_rollup_result, results)
+        except CancelledError:
+            self.root.after(0, self._show_cancelled)
+        except Exception as e:
+            self.root.after(0, self._schedule_error_display, f"まとめの作成に失敗しました: {e}")
+
+    def _cancel_generation(self):
+        """作成中のまとめ、または選択中のジョブ（未選択時は全ジョブ）を中止する。通信中の接続はすぐに切断される"""
+        if self.rollup_token is not None:
+            self.control_buttons_widget.set_cancel_state(False)
+            self.progress_widget.set_message(MESSAGES["CANCELLING"])
+            self.rollup_token.cancel()
+            return
+
+        job_id = self.job_list_widget.selected_job_id()
+        if job_id is not None:
+            self.job_queue.cancel(job_id)
+        else:
+            self.job_queue.cancel_all()
+        self._refresh_jobs()
 
-            if file_path.exists() and not messagebox.askyesno(
-                    MESSAGES["APPEND_TITLE"],
-                    MESSAGES["APPEND_CONFIRM"].format(file_path.name)):
-                self.progress_widget.clear_message()
-                self._set_buttons_state(True)
-                return
+    def _finish_rollup(self):
+        """まとめ作成の終了後にボタンを復帰させる"""
+        self.rollup_token = None
+        self._set_buttons_state(True)
 
-            save_diary(file_path, diary_content)
+    def _show_cancelled(self):
+        """中止したことを表示しボタンを復帰させる"""
+        self.progress_widget.stop_progress()
+        self.progress_widget.set_message(MESSAGES["CANCELLED"])
+        self._finish_rollup()
+
+    def _show_rollup_result(self, results: List['RollupResult']):
+        """作成したまとめの件数とトークン数を表示"""
+        self.progress_widget.stop_progress()
+        if results:
+            input_tokens = sum(result.input_tokens for result in results)
+            output_tokens = sum(result.output_tokens for result in results)
+            self.progress_widget.set_message(
+                f"まとめ作成完了: {len(results)}件\n"
+                f"トークン数: 入力={input_tokens} 出力={output_tokens}\n"
+                f"保存先: {results[0].path.parent}"
+            )
+        else:
+            self.progress_widget.set_message("対象期間に保存済みの日誌がありません")
+        self._finish_rollup()
 
-            self.progress_widget.set_completion_message(input_tokens, output_tokens, model_name)
+    def _save_diary_result(self, job: DiaryJob, file_path: Path, file_exists: bool):
+        """追記の確認のみメインスレッドで行い、保存とObsidianの起動はファイル操作用のワーカーに任せる"""
+        if file_exists and not messagebox.askyesno(
+                MESSAGES["APPEND_TITLE"],
+                MESSAGES["APPEND_CONFIRM"].format(file_path.name)):
+            self.saving_job_ids.discard(job.job_id)
+            return
 
-            self._set_buttons_state(True)
+        self.io_executor.submit(self._save_diary_in_background, job, file_path)
 
-            launch_obsidian()
+    def _save_diary_in_background(self, job: DiaryJob, file_path: Path):
+        """日誌の保存とObsidianの起動をワーカースレッドで実行し、結果の表示はメインスレッドに戻す"""
+        try:
+            save_diary(file_path, job.result[0])
+        except Exception as e:
+            self.root.after(0, self._show_save_error, job, MESSAGES["DIARY_SAVE_ERROR"].format(str(e)))
+            return
 
+        try:
+            launch_obsidian(file_path)
         except Exception as e:
-            self._display_error(MESSAGES["DIARY_SAVE_ERROR"].format(str(e)))
+            self.root.after(0, messagebox.showerror, "エラー", MESSAGES["OBSIDIAN_LAUNCH_ERROR"].format(str(e)))
+        self.root.after(0, self._show_diary_saved, job, file_path)
+
+    def _show_diary_saved(self, job: DiaryJob, file_path: Path):
+        """保存の完了を記録し、1件のみの生成では保存先・トークン数・モデルを表示する"""
+        self.saving_job_ids.discard(job.job_id)
+        self.saved_paths[job.job_id] = file_path
+        if self.batch_jobs == [job]:
+            _, input_tokens, output_tokens, model_name = job.result
+            self.progress_widget.set_completion_message(input_tokens, output_tokens, model_name, file_path)
+
+    def _show_save_error(self, job: DiaryJob, error_message: str):
+        """保存の失敗を表示し、保存中のジョブから外す"""
+        self.saving_job_ids.discard(job.job_id)
+        self._display_error(error_message)
 
     def _schedule_error_display(self, error_message: str):
         """メインスレッドでエラーメッセージを表示しボタンを復帰させる"""
         self.progress_widget.set_error_message(error_message)
-        self._set_buttons_state(True)
+        self._finish_rollup()
 
     def _display_error(self, error_message):
-        """エラーダイアログを表示しUIを回復状態に戻す"""
+        """エラーダイアログを表示"""
         messagebox.showerror("エラー", error_message)
-        self._set_buttons_state(True)
-        self.progress_widget.clear_message()
 
     def _set_buttons_state(self, enabled):
         """操作ボタンの有効/無効を切り替え"""
         self.control_buttons_widget.set_buttons_state(enabled)
+        self._update_cancel_state()
 
-    def _on_closing(self):
-        """ウィンドウを閉じる前にウィンドウ位置を保存"""
-        try:
-            window_x = self.root.winfo_x()
-            window_y = self.root.winfo_y()
-
-            if not self.config.has_section('WindowSettings'):
-                self.config.add_section('WindowSettings')
+    def _update_cancel_state(self):
+        """まとめの作成中、または待機中・実行中のジョブがある間のみ中止ボタンを有効にする"""
+        self.control_buttons_widget.set_cancel_state(
+            self.rollup_token is not None or self.job_queue.has_active_jobs()
+        )
 
-            self.config.set('WindowSettings', 'window_x', str(window_x))
-            self.config.set('WindowSettings', 'window_y', str(window_y))
+    def _check_config(self):
+        """設定ファイルの更新日時を定期的に確認する。変更がなければ解析は行わない"""
+        try:
+            load_config()
+        except Exception as e:
+            print(f"設定ファイルの確認中にエラーが発生しました: {e}")
+        self.root.after(self.CONFIG_CHECK_INTERVAL_MS, self._check_config)
+
+    def _on_config_changed(self):
+        """設定ファイルの変更を保存先・プロンプト設定に反映する"""
+        print("設定ファイルの変更を反映しました")
+        if self.services_ready.done() and self.services_ready.exception() is None:
+            from service.diary_rollup import DiaryRollupGenerator
+            from service.prompt_compactor import CommitPromptCompactor
+
+            self.diary_generator.prompt_compactor = CommitPromptCompactor()
+            self.rollup_generator = DiaryRollupGenerator(self.diary_generator.ai_client)
+        self.search_index = DiarySearchIndex()
+        self._start_search_index_refresh()
+
+    def _on_configure(self, event):
+        """ウィンドウの移動をまとめて設定ファイルへ保存する（一定時間移動がなければ1回だけ書き込む）"""
+        if event.widget is not self.root:
+            return
+        update_config({'WindowSettings': {
+            'window_x': str(self.root.winfo_x()),
+            'window_y': str(self.root.winfo_y())
+        }})
 
-            save_config(self.config)
+    def _on_closing(self):
+        """ウィンドウを閉じる前にウィンドウ位置を保存し、実行中の生成を中止する"""
+        if self.rollup_token is not None:
+            self.rollup_token.cancel()
+        self.job_queue.shutdown()
+        self._cancel_prefetch()
+        try:
+            update_config({'WindowSettings': {
+                'window_x': str(self.root.winfo_x()),
+                'window_y': str(self.root.winfo_y())
+            }})
+            flush_config()
         except Exception as e:
             print(f"ウィンドウ位置の保存中にエラーが発生しました: {e}")
         finally:
+            # 保存中の日誌が途中で失われないよう、ワーカーの処理が終わるのを待ってから終了する
+            self.io_executor.shutdown(wait=True)
             self.root.quit()
@@ -0,0 +1 @@
+"""CodeDiaryをウィンドウなしで実行するコマンドラインパッケージ。python -m codediary で実行する"""
@@ -0,0 +1,264 @@
+"""CodeDiaryをウィンドウなしで実行するコマンドライン
+
+cronなどのスケジューラーから日誌を生成・保存するために使う。tkinterは読み込まない。
+結果（段階ごとの所要時間・トークン数・保存先）は標準出力にJSONで出力し、途中経過は標準エラー出力に出す。
+使い方: python -m codediary generate --since 2024-01-15 --until 2024-01-21 --no-obsidian
+        python -m codediary generate --since 2024-01-15 --until 2024-01-21 --no-obsidian --profile
+        python -m codediary backfill --months 6 --workers 4 --rate 30
+        python -m codediary daemon
+        python -m codediary serve --port 8765
+        python -m codediary metrics --last 50 --prometheus codediary.prom
+        python -m codediary --trace trace.json generate --no-obsidian
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+JST = timezone(timedelta(hours=9))
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_INTERRUPTED = 130
+
+
+def _parse_date(value: str) -> str:
+    """YYYY-MM-DD形式の日付を検証して返す"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日付はYYYY-MM-DD形式で指定してください: {value}")
+    return value
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """サブコマンドごとの引数を定義したパーサーを作る"""
+    parser = argparse.ArgumentParser(prog='codediary', description=__doc__.splitlines()[0])
+    parser.add_argument('--trace', type=Path,
+                        help='処理段階ごとの所要時間をChromeのトレースビューアー形式で書き出すファイル')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help='GitHubのコミットから日誌を生成して保存する')
+    generate.add_argument('--since', type=_parse_date, help='開始日 YYYY-MM-DD（省略時は今日）')
+    generate.add_argument('--until', type=_parse_date, help='終了日 YYYY-MM-DD（省略時は開始日と同じ）')
+    generate.add_argument('--output', type=Path, help='保存先のファイル（省略時はconfig.iniのdaily_path配下）')
+    generate.add_argument('--no-obsidian', action='store_true', help='保存後にObsidianでノートを開かない')
+    generate.add_argument('--profile', action='store_true',
+                          help='段階ごとのCPUプロファイル(.prof)とメモリ確保の報告を日誌と同じフォルダに書き出す')
+    generate.set_defaults(handler=run_generate)
+
+    backfill = subparsers.add_parser('backfill', help='過去の期間の日誌を1日1ノートでまとめて作成する')
+    backfill.add_argument('--since', type=_parse_date, help='開始日 YYYY-MM-DD')
+    backfill.add_argument('--until', type=_parse_date, help='終了日 YYYY-MM-DD（省略時は今日）')
+    backfill.add_argument('--days', type=int, help='終了日からさかのぼる日数（--sinceの代わり）')
+    backfill.add_argument('--months', type=int, help='終了日からさかのぼる月数（30日単位、--sinceの代わり）')
+    backfill.add_argument('--workers', type=int, default=4, help='同時に生成する日数（既定: 4）')
+    backfill.add_argument('--rate', type=float, default=30,
+                          help='1分あたりのAI呼び出し回数の上限（既定: 30、0で無制限）')
+    backfill.add_argument('--restart', action='store_true', help='前回の進捗を破棄して最初から作成する')
+    backfill.set_defaults(handler=run_backfill)
+
+    daemon = subparsers.add_parser('daemon', help='毎日決まった時刻に新しいコミットから日誌を作成し続ける')
+    daemon.add_argument('--once', action='store_true', help='前回の同期以降の分をすぐに1回だけ作成して終了する')
+    daemon.set_defaults(handler=run_daemon)
+
+    serve = subparsers.add_parser('serve', help='日誌の生成・状態確認・取得をHTTP APIで提供する')
+    serve.add_argument('--host', default='127.0.0.1', help='待ち受けるアドレス（既定: 127.0.0.1）')
+    serve.add_argument('--port', type=int, default=8765, help='待ち受けるポート（既定: 8765）')
+    serve.add_argument('--workers', type=int, help='並行して実行する生成ジョブの数（省略時は[GITHUB] max_concurrent_jobs）')
+    serve.add_argument('--coalesce-ms', type=float, default=50,
+                       help='重なる期間の要求をまとめる受付時間（ミリ秒、既定: 50、0でまとめない）')
+    serve.set_defaults(handler=run_serve)
+
+    metrics = subparsers.add_parser('metrics', help='直近の実行の計測結果（所要時間のパーセンタイル・キャッシュ・料金）を集計する')
+    metrics.add_argument('--last', type=int, default=50, help='集計する直近の実行回数（既定: 50、0で全件）')
+    metrics.add_argument('--prometheus', type=Path,
+                         help='全件の集計をPrometheusのテキスト形式で書き出すファイル（textfile collector向け）')
+    metrics.set_defaults(handler=run_metrics)
+
+    return parser
+
+
+def run_generate(args: argparse.Namespace) -> Dict[str, Any]:
+    """日誌を生成して保存し、段階ごとの所要時間とトークン数を返す"""
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+
+    # .envの値をGemini・GitHubの設定に反映させるため、サービスの読み込みより先に環境変数を読み込む
+    from utils.env_loader import load_environment_variables
+    load_environment_variables()
+    from service.diary_file_service import build_diary_path, launch_obsidian, save_diary
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+    from utils.profiling import is_profiling_enabled, profile_dir_for
+    timings['import_ms'] = _elapsed_ms(start)
+
+    since_date = args.since or datetime.now(JST).strftime('%Y-%m-%d')
+    until_date = args.until or since_date
+    if since_date > until_date:
+        raise ValueError(f"開始日が終了日より後になっています: {since_date} > {until_date}")
+
+    stage_start = time.perf_counter()
+    generator = ProgrammingDiaryGenerator()
+    timings['init_ms'] = _elapsed_ms(stage_start)
+
+    file_path = args.output or build_diary_path(until_date)
+    profile_dir = profile_dir_for(file_path) if args.profile or is_profiling_enabled() else None
+
+    stage_start = time.perf_counter()
+    content, input_tokens, output_tokens, model_name = generator.generate_diary(
+        since_date=since_date, until_date=until_date, profile_dir=profile_dir
+    )
+    timings['generate_ms'] = _elapsed_ms(stage_start)
+
+    stage_start = time.perf_counter()
+    written = save_diary(file_path, content)
+    timings['save_ms'] = _elapsed_ms(stage_start)
+
+    if not args.no_obsidian:
+        stage_start = time.perf_counter()
+        launch_obsidian(file_path)
+        timings['obsidian_ms'] = _elapsed_ms(stage_start)
+
+    timings['total_ms'] = _elapsed_ms(start)
+    result = {
+        'since': since_date,
+        'until': until_date,
+        'output': str(file_path),
+        'written': written,
+        'model': model_name,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'timings': timings,
+    }
+    if profile_dir is not None:
+        result['profile'] = str(profile_dir)
+    return result
+
+
+def run_backfill(args: argparse.Namespace) -> Dict[str, Any]:
+    """期間内の日誌を日ごとに並行して作成・保存し、集計結果を返す。中断しても再実行で続きから再開する"""
+    from utils.env_loader import load_environment_variables
+    load_environment_variables()
+    from service.diary_backfill import BackfillCheckpoint, DiaryBackfill
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+    until_date = args.until or datetime.now(JST).strftime('%Y-%m-%d')
+    if args.since:
+        since_date = args.since
+    elif args.days or args.months:
+        days = args.days or args.months * 30
+        since_date = (datetime.strptime(until_date, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    else:
+        raise ValueError("--since・--days・--monthsのいずれかで開始日を指定してください")
+    if since_date > until_date:
+        raise ValueError(f"開始日が終了日より後になっています: {since_date} > {until_date}")
+
+    checkpoint = BackfillCheckpoint.for_range(since_date, until_date)
+    if args.restart:
+        checkpoint.clear()
+
+    backfill = DiaryBackfill(ProgrammingDiaryGenerator(), max_workers=args.workers,
+                             requests_per_minute=args.rate or None)
+    result = backfill.run(since_date, until_date, checkpoint=checkpoint)
+    if result.failed:
+        print(f"作成に失敗した日があります。同じコマンドを再実行すると失敗した日だけを作成します: {sorted(result.failed)}")
+    return {'since': since_date, 'until': until_date, 'checkpoint': str(checkpoint.path), **result.to_dict()}
+
+
+def run_daemon(args: argparse.Namespace) -> Dict[str, Any]:
+    """config.iniの[Scheduler] run_atの時刻ごとに日誌を作成する。SIGTERM・Ctrl+Cで停止し、最後の状態を返す"""
+    from utils.env_loader import load_environment_variables
+    load_environment_variables()
+    from service.diary_scheduler import DiaryScheduler
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+    scheduler = DiaryScheduler(ProgrammingDiaryGenerator())
+    if args.once:
+        return scheduler.run_once()
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    print(f"常駐を開始しました。次回の実行: {scheduler.next_run_at(datetime.now(JST)):%Y-%m-%d %H:%M}")
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return {'runs': scheduler.runs, **scheduler.state.to_dict()}
+
+
+def run_serve(args: argparse.Namespace) -> Dict[str, Any]:
+    """HTTP APIを起動し、SIGTERM・Ctrl+Cで停止するまで要求を受け付ける"""
+    from utils.env_loader import load_environment_variables
+    load_environment_variables()
+    from service.diary_api_server import DiaryAPI, DiaryAPIServer
+    from service.diary_job_queue import DiaryJobQueue
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+    generator = ProgrammingDiaryGenerator()
+    generator.prepare()
+    workers = args.workers or generator.config.getint('GITHUB', 'max_concurrent_jobs',
+                                                      fallback=DiaryJobQueue.DEFAULT_MAX_WORKERS)
+    api = DiaryAPI(generator, max_workers=workers, coalesce_window=args.coalesce_ms / 1000)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+
+    with DiaryAPIServer(api, args.host, args.port) as server:
+        print(f"HTTP APIを起動しました: {server.url}")
+        try:
+            while not stopped.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        return {'url': server.url, 'jobs': len(api.queue.jobs())}
+
+
+def run_metrics(args: argparse.Namespace) -> Dict[str, Any]:
+    """計測結果の台帳から直近の実行を集計して返す。指定があればPrometheus形式でも書き出す"""
+    from service.run_metrics import RunMetricsLedger, summarize, to_prometheus
+    from utils.file_utils import atomic_write_text
+
+    ledger = RunMetricsLedger()
+    result = {'ledger': str(ledger.path), **summarize(ledger.read(args.last or None))}
+    if args.prometheus is not None:
+        args.prometheus.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(args.prometheus, to_prometheus(ledger.read()))
+        result['prometheus'] = str(args.prometheus)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """コマンドを実行して結果をJSONで出力し、終了コードを返す"""
+    args = build_parser().parse_args(argv)
+    if args.trace is not None:
+        from utils.tracing import enable_tracing
+        enable_tracing(args.trace)
+
+    try:
+        # 生成処理の診断メッセージでJSON出力が崩れないよう、実行中の標準出力は標準エラー出力へ回す
+        with redirect_stdout(sys.stderr):
+            result = args.handler(args)
+    except KeyboardInterrupt:
+        print(json.dumps({'status': 'interrupted'}, ensure_ascii=False))
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        print(json.dumps({'status': 'error', 'error': str(e)}, ensure_ascii=False))
+        return EXIT_ERROR
+    finally:
+        if args.trace is not None:
+            from utils.tracing import disable_tracing
+            disable_tracing()
+
+    if args.trace is not None:
+        result['trace'] = str(args.trace)
+
+    print(json.dumps({'status': 'ok', **result}, ensure_ascii=False, indent=2))
+    return EXIT_OK
@@ -1,49 +1,316 @@
-from typing import Optional, Tuple
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from google import genai
+from google.genai import types
 
-from utils.config_manager import GEMINI_API_KEY, GEMINI_MODEL
+from external_service.model_policy import ModelDecision, ModelSelectionPolicy, thinking_level_from_budget
+from utils.cancellation import CancellationToken, child_token, raise_if_cancelled
+from utils.config_manager import (
+    GEMINI_API_KEY,
+    GEMINI_BASE_URL,
+    GEMINI_FAST_MODEL,
+    GEMINI_HEDGE_PERCENTILE,
+    GEMINI_LATENCY_TARGET,
+    GEMINI_MAX_RETRIES,
+    GEMINI_MODEL,
+    GEMINI_THINKING_BUDGET,
+    GEMINI_TIMEOUT
+)
 from utils.constants import MESSAGES
 from utils.exceptions import APIError
+from utils.token_estimator import estimate_tokens
+from utils.tracing import bind, span
+
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# SDK側の再試行はステータスコードの分類なしで行われるため最小限に抑え、再試行はこのクラスで管理する
+SDK_RETRY_OPTIONS = types.HttpRetryOptions(attempts=1, http_status_codes=[599])
+
+
+def _parse_seconds(value: Optional[str]) -> Optional[float]:
+    """秒数の環境変数を数値に変換。未設定・不正な値はNone"""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _parse_count(value: Optional[str]) -> Optional[int]:
+    """回数の環境変数を整数に変換。未設定・不正な値（負の値を含む）はNone"""
+    try:
+        count = int(value) if value else None
+    except ValueError:
+        return None
+    return count if count is None or count >= 0 else None
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """429・5xx・タイムアウト・接続エラーなど、再試行で回復し得るエラーかを判定"""
+    status = getattr(error, 'status_code', None) or getattr(error, 'code', None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    name = type(error).__name__
+    return isinstance(error, (TimeoutError, ConnectionError)) or 'Timeout' in name or 'Connection' in name
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """エラー応答のRetry-Afterヘッダーを秒数で返す"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    try:
+        return float(headers.get('retry-after')) if headers and headers.get('retry-after') else None
+    except (TypeError, ValueError):
+        return None
 
 
 class GeminiAPIClient:
+    DEFAULT_MAX_RETRIES = 3
+    RETRY_BASE_DELAY = 1.0
+    RETRY_MAX_DELAY = 30.0
+
     def __init__(self):
         self.api_key: Optional[str] = GEMINI_API_KEY
         self.default_model: Optional[str] = GEMINI_MODEL
+        self.base_url: Optional[str] = GEMINI_BASE_URL
         self.client: Optional[genai.Client] = None
+        self.warm_up_seconds: Optional[float] = None
+        max_retries = _parse_count(GEMINI_MAX_RETRIES)
+        self.max_retries = self.DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        self.request_timeout = _parse_seconds(GEMINI_TIMEOUT) or 180.0
+        self.policy = ModelSelectionPolicy(
+            fast_model=GEMINI_FAST_MODEL,
+            thinking_level=thinking_level_from_budget(GEMINI_THINKING_BUDGET),
+            latency_target=_parse_seconds(GEMINI_LATENCY_TARGET),
+            hedge_percentile=_parse_seconds(GEMINI_HEDGE_PERCENTILE)
+        )
+        self._lock = threading.RLock()
+        # 通信中の要求ごとの中止トークン。複数の生成で共有するクライアントは、全ての要求が中止された場合のみ閉じる
+        self._in_flight: List[Optional[CancellationToken]] = []
+        # ヘッジ要求で負けた側の中止トークン。待機をやめるだけで、ウォームアップ済みのクライアントは閉じない
+        self._abandoned: Set[CancellationToken] = set()
 
     def initialize(self) -> bool:
-        try:
-            if self.api_key:
-                self.client = genai.Client(api_key=self.api_key)
+        """クライアントを初回のみ作成し、以降は同じクライアント（接続プール）を再利用する"""
+        with self._lock:
+            if self.client is not None:
                 return True
-            else:
-                raise APIError(MESSAGES["GEMINI_API_CREDENTIALS_MISSING"])
-        except Exception as e:
-            raise APIError(f"Gemini API初期化エラー: {str(e)}")
+            try:
+                if self.api_key:
+                    http_options = types.HttpOptions(base_url=self.base_url, retry_options=SDK_RETRY_OPTIONS)
+                    self.client = genai.Client(api_key=self.api_key, http_options=http_options)
+                    return True
+                else:
+                    raise APIError(MESSAGES["GEMINI_API_CREDENTIALS_MISSING"])
+            except Exception as e:
+                raise APIError(f"Gemini API初期化エラー: {str(e)}")
 
-    def generate_content(self, prompt: str, model_name: str) -> Tuple[str, int, int]:
-        try:
-            if self.client is None:
-                raise APIError(MESSAGES["GEMINI_API_CREDENTIALS_MISSING"])
+    def warm_up(self) -> float:
+        """クライアントを作成しモデル情報を取得して、DNS解決・TLS接続・認証を済ませておく"""
+        start = time.perf_counter()
+        self.initialize()
+        if self.client is not None and self.default_model:
+            self.client.models.get(model=self.default_model)
+        self.warm_up_seconds = time.perf_counter() - start
+        return self.warm_up_seconds
+
+    def start_warm_up(self) -> threading.Thread:
+        """バックグラウンドスレッドでウォームアップを開始。失敗しても本番の呼び出し時に再試行される"""
+        def run():
+            try:
+                elapsed = self.warm_up()
+                print(f"Gemini APIのウォームアップ完了: {elapsed:.2f}秒")
+            except Exception as e:
+                print(f"Gemini APIのウォームアップに失敗しました: {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """クライアントを閉じて通信中の要求を打ち切る。次回のinitializeで作り直す"""
+        with self._lock:
+            client, self.client = self.client, None
+        if client is not None:
+            client.close()
+
+    def generate(self, prompt: str,
+                 cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int, str]:
+        """ポリシーで選んだモデルと思考レベルで生成し、判断内容と実測レイテンシを記録する"""
+        if self.default_model is None:
+            raise APIError(MESSAGES["GEMINI_API_CREDENTIALS_MISSING"])
+
+        decision = self.policy.select(self.default_model, estimate_tokens(prompt))
+        start = time.perf_counter()
+        with span('gemini.generate', model=decision.model, thinking_level=decision.thinking_level,
+                  reason=decision.reason) as current:
+            text, input_tokens, output_tokens, used_model, hedged = self._generate_with_deadline(
+                prompt, decision, cancel_token
+            )
+            current.set(used_model=used_model, hedged=hedged, input_tokens=input_tokens, output_tokens=output_tokens)
+        latency = time.perf_counter() - start
+
+        self.policy.record(decision, used_model, latency, hedged, input_tokens, output_tokens)
+        print(f"   モデル選択: {decision.model} (思考={decision.thinking_level or '既定'} 理由={decision.reason} "
+              f"予測={decision.predicted_seconds:.1f}秒) 使用={used_model} 実測={latency:.1f}秒")
+        return text, input_tokens, output_tokens, used_model
 
-            interaction = self.client.interactions.create(
-                model=model_name,
-                input=prompt,
+    def _generate_with_deadline(self, prompt: str, decision: ModelDecision,
+                                cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int, str, bool]:
+        """選んだモデルで生成し、期限内に応答がなければヘッジ要求を並行して送り先に返った結果を使う
+
+        要求ごとに子の中止トークンを使い、結果が決まった時点で残りの要求を中止して通信を打ち切る"""
+        deadline = self.policy.deadline(decision)
+        if deadline is None:
+            text, input_tokens, output_tokens = self.generate_content(
+                prompt, decision.model, decision.thinking_level, cancel_token
             )
+            return text, input_tokens, output_tokens, decision.model, False
+
+        hedge_model = self.policy.hedge_model(decision)
+        hedge_thinking_level = decision.thinking_level if hedge_model == decision.model else 'minimal'
+        executor = ThreadPoolExecutor(max_workers=2)
+        futures: Dict[Future, str] = {}
+        tokens: List[Tuple[CancellationToken, Callable[[], None]]] = []
+
+        def submit(model_name: str, thinking_level: Optional[str]):
+            token, unlink = child_token(cancel_token)
+            tokens.append((token, unlink))
+            futures[executor.submit(bind(self.generate_content), prompt, model_name, thinking_level,
+                                    token)] = model_name
+
+        try:
+            submit(decision.model, decision.thinking_level)
+            done, _ = wait(futures, timeout=deadline)
+            if not done:
+                print(f"   {deadline:.1f}秒以内に応答がないため {hedge_model} にも要求を送信します")
+                submit(hedge_model, hedge_thinking_level)
+
+            pending = set(futures)
+            error: Optional[Exception] = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        text, input_tokens, output_tokens = future.result()
+                        return text, input_tokens, output_tokens, futures[future], len(futures) > 1
+                    except APIError as e:
+                        error = e
+            raise error or APIError("Gemini API呼び出しエラー: 応答がありません")
+        finally:
+            # 負けた側の要求は待たずに戻る（終了済みの要求の中止は何もしない）。利用者による中止ではないため、
+            # 他の要求と共有するクライアントは閉じない
+            for token, unlink in tokens:
+                unlink()
+                self._abandon(token)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        """指数バックオフ（ジッター付き）の待ち時間。Retry-Afterがあればそちらを優先する"""
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.RETRY_MAX_DELAY)
+        return min(self.RETRY_BASE_DELAY * 2 ** attempt, self.RETRY_MAX_DELAY) * random.uniform(0.5, 1.0)
+
+    def generate_content(self, prompt: str, model_name: str, thinking_level: Optional[str] = None,
+                         cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int]:
+        """1つのモデルで生成する。一時的なエラーは同じプロンプトで指数バックオフしながら再試行する
+
+        中止された場合は通信中の要求を打ち切り、CancelledErrorを送出する。
+        他の生成で閉じられたクライアントは作り直して使う"""
+        raise_if_cancelled(cancel_token)
+        self.initialize()
+
+        attempt = 0
+        while True:
+            try:
+                return self._call_interaction(prompt, model_name, thinking_level, cancel_token)
+            except Exception as e:
+                raise_if_cancelled(cancel_token)
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise APIError(f"Gemini API呼び出しエラー: {str(e)}")
+                delay = self._retry_delay(attempt, e)
+                attempt += 1
+                print(f"   Gemini APIの一時的なエラーのため{delay:.1f}秒後に再試行します "
+                      f"({attempt}/{self.max_retries}): {e}")
+                if cancel_token is not None:
+                    cancel_token.wait(delay)
+                else:
+                    time.sleep(delay)
+
+    def _call_interaction(self, prompt: str, model_name: str, thinking_level: Optional[str],
+                          cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int]:
+        """要求を通信中として登録して1回呼び出す。トークンがあれば別スレッドで呼び出し、中止されたらすぐに戻る"""
+        with self._lock:
+            self.initialize()
+            client = self.client
+            self._in_flight.append(cancel_token)
+        try:
+            if cancel_token is None:
+                return self._create_interaction(client, prompt, model_name, thinking_level)
+
+            outcome: Future = Future()
+            finished = threading.Event()
+            outcome.add_done_callback(lambda _: finished.set())
+
+            def run():
+                try:
+                    outcome.set_result(self._create_interaction(client, prompt, model_name, thinking_level))
+                except BaseException as e:
+                    outcome.set_exception(e)
+
+            unregister = cancel_token.register(lambda: (self._close_if_all_cancelled(), finished.set()))
+            try:
+                threading.Thread(target=bind(run), daemon=True).start()
+                finished.wait()
+            finally:
+                unregister()
+            cancel_token.raise_if_cancelled()
+            return outcome.result()
+        finally:
+            with self._lock:
+                self._in_flight.remove(cancel_token)
+
+    def _abandon(self, token: CancellationToken):
+        """要求の待機だけを打ち切る。中止時の_close_if_all_cancelledではこのトークンを利用者の中止として扱わない"""
+        with self._lock:
+            self._abandoned.add(token)
+        try:
+            token.cancel()
+        finally:
+            with self._lock:
+                self._abandoned.discard(token)
+
+    def _close_if_all_cancelled(self):
+        """通信中の要求が全て利用者によって中止済みであればクライアントを閉じて接続を切断する
+
+        中止されていない要求や、ヘッジ要求で負けて待機を打ち切っただけの要求が残っている場合は閉じず、
+        中止した要求の応答は待たずに捨てる"""
+        with self._lock:
+            if all(token is not None and token.cancelled and token not in self._abandoned
+                   for token in self._in_flight):
+                self.close()
+
+    def _create_interaction(self, client: genai.Client, prompt: str, model_name: str,
+                            thinking_level: Optional[str]) -> Tuple[str, int, int]:
+        """interactions.createを1回呼び出し、生成テキストとトークン数を取り出す"""
+        request = {'model': model_name, 'input': prompt}
+        if thinking_level:
+            request['generation_config'] = {'thinking_level': thinking_level}
 
-            summary_text = getattr(interaction, 'output_text', None) or str(interaction)
+        with span('gemini.request', model=model_name, prompt_chars=len(prompt)):
+            interaction = client.interactions.create(**request, timeout=self.request_timeout)
 
-            input_tokens = 0
-            output_tokens = 0
+        summary_text = getattr(interaction, 'output_text', None) or str(interaction)
 
-            usage = getattr(interaction, 'usage', None)
-            if usage is not None:
-                input_tokens = getattr(usage, 'total_input_tokens', 0) or 0
-                output_tokens = getattr(usage, 'total_output_tokens', 0) or 0
+        input_tokens = 0
+        output_tokens = 0
 
-            return summary_text, input_tokens, output_tokens
+        usage = getattr(interaction, 'usage', None)
+        if usage is not None:
+            input_tokens = getattr(usage, 'total_input_tokens', 0) or 0
+            output_tokens = getattr(usage, 'total_output_tokens', 0) or 0
 
-        except Exception as e:
-            raise APIError(f"Gemini API呼び出しエラー: {str(e)}")
+        return summary_text, input_tokens, output_tokens
@@ -0,0 +1,160 @@
+import json
+import statistics
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.config_manager import get_data_dir
+
+THINKING_LEVELS = ('minimal', 'low', 'medium', 'high')
+DEFAULT_SECONDS_PER_1K_TOKENS = 2.0
+DEFAULT_BASE_SECONDS = 3.0
+HISTORY_SIZE = 50
+MIN_HEDGE_SAMPLES = 5
+
+
+def thinking_level_from_budget(budget: Optional[str]) -> Optional[str]:
+    """GEMINI_THINKING_BUDGETの値を思考レベルに変換。数値はトークン数として段階に割り当てる"""
+    if not budget:
+        return None
+    value = budget.strip().lower()
+    if value in THINKING_LEVELS:
+        return value
+    try:
+        tokens = int(value)
+    except ValueError:
+        return None
+    if tokens <= 0:
+        return 'minimal'
+    if tokens <= 1024:
+        return 'low'
+    if tokens <= 8192:
+        return 'medium'
+    return 'high'
+
+
+class ModelDecision:
+    """1回の生成で選んだモデル・思考レベルと、その根拠になった予測値"""
+
+    def __init__(self, model: str, thinking_level: Optional[str], estimated_tokens: int,
+                 predicted_seconds: float, reason: str):
+        self.model = model
+        self.thinking_level = thinking_level
+        self.estimated_tokens = estimated_tokens
+        self.predicted_seconds = predicted_seconds
+        self.reason = reason
+
+
+class ModelSelectionPolicy:
+    """入力トークン数の概算とレイテンシ目標からモデルと思考レベルを選ぶ
+
+    過去の実測レイテンシを記録し、モデルごとの1000トークンあたりの秒数を予測に使う"""
+
+    def __init__(self, fast_model: Optional[str] = None, thinking_level: Optional[str] = None,
+                 latency_target: Optional[float] = None, hedge_percentile: Optional[float] = None,
+                 log_path: Optional[Path] = None):
+        self.fast_model = fast_model
+        self.thinking_level = thinking_level
+        self.latency_target = latency_target
+        self.hedge_percentile = hedge_percentile
+        self._log_path = log_path
+        self._history: Optional[List[Dict]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def log_path(self) -> Path:
+        """判断結果と実測レイテンシの記録先"""
+        if self._log_path is None:
+            self._log_path = get_data_dir() / 'gemini_latency.jsonl'
+        return self._log_path
+
+    def _load_history(self) -> List[Dict]:
+        if self._history is None:
+            try:
+                lines = self.log_path.read_text(encoding='utf-8').splitlines()[-HISTORY_SIZE:]
+                self._history = [json.loads(line) for line in lines if line.strip()]
+            except (OSError, ValueError):
+                self._history = []
+        return self._history
+
+    def latencies(self, model: str) -> List[float]:
+        """指定モデルの記録済み実測レイテンシ(秒)を返す"""
+        with self._lock:
+            return [entry['latency_seconds'] for entry in self._load_history()
+                    if entry.get('used_model') == model and 'latency_seconds' in entry]
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """実測レイテンシのパーセンタイル値。記録が少ない場合やパーセンタイル未設定時はNone"""
+        if self.hedge_percentile is None:
+            return None
+        latencies = self.latencies(model)
+        if len(latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        index = min(max(int(self.hedge_percentile), 1), 99) - 1
+        return statistics.quantiles(latencies, n=100)[index]
+
+    def deadline(self, decision: ModelDecision) -> Optional[float]:
+        """ヘッジ要求を送るまでの待ち時間。レイテンシ目標とパーセンタイル値の短い方"""
+        candidates = [value for value in (self.latency_target, self.hedge_delay(decision.model))
+                      if value is not None]
+        return min(candidates) if candidates else None
+
+    def predict_seconds(self, model: str, estimated_tokens: int) -> float:
+        """過去の実測値から応答までの秒数を予測。実績がない場合は既定値を使う"""
+        with self._lock:
+            rates = [entry['latency_seconds'] / max(entry['estimated_tokens'], 1) * 1000
+                     for entry in self._load_history()
+                     if entry.get('used_model') == model and not entry.get('hedged')
+                     and 'latency_seconds' in entry and entry.get('estimated_tokens')]
+        if rates:
+            return statistics.median(rates) * estimated_tokens / 1000
+        return DEFAULT_BASE_SECONDS + DEFAULT_SECONDS_PER_1K_TOKENS * estimated_tokens / 1000
+
+    def select(self, primary_model: str, estimated_tokens: int) -> ModelDecision:
+        """レイテンシ目標に収まる最も高品質な組み合わせを選ぶ"""
+        predicted = self.predict_seconds(primary_model, estimated_tokens)
+        if self.latency_target is None or predicted <= self.latency_target:
+            return ModelDecision(primary_model, self.thinking_level, estimated_tokens, predicted, 'primary')
+
+        if self.thinking_level not in (None, 'minimal', 'low'):
+            return ModelDecision(primary_model, 'low', estimated_tokens, predicted, 'reduced_thinking')
+
+        if self.fast_model and self.fast_model != primary_model:
+            fast_predicted = self.predict_seconds(self.fast_model, estimated_tokens)
+            return ModelDecision(self.fast_model, 'minimal', estimated_tokens, fast_predicted, 'fast_model')
+
+        return ModelDecision(primary_model, self.thinking_level, estimated_tokens, predicted, 'primary')
+
+    def hedge_model(self, decision: ModelDecision) -> str:
+        """期限を超えたときにヘッジ要求を送るモデル。高速モデルがなければ同じモデルへ重複して送る"""
+        if self.fast_model and self.fast_model != decision.model:
+            return self.fast_model
+        return decision.model
+
+    def record(self, decision: ModelDecision, used_model: str, latency_seconds: float,
+               hedged: bool, input_tokens: int, output_tokens: int) -> None:
+        """判断内容と実測レイテンシを記録する。記録に失敗しても生成結果には影響させない"""
+        entry = {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'estimated_tokens': decision.estimated_tokens,
+            'latency_target': self.latency_target,
+            'selected_model': decision.model,
+            'thinking_level': decision.thinking_level,
+            'reason': decision.reason,
+            'predicted_seconds': round(decision.predicted_seconds, 3),
+            'used_model': used_model,
+            'latency_seconds': round(latency_seconds, 3),
+            'hedged': hedged,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+        }
+        with self._lock:
+            history = self._load_history()
+            history.append(entry)
+            del history[:-HISTORY_SIZE]
+            try:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            except OSError as e:
+                print(f"レイテンシ記録の保存に失敗しました: {e}")
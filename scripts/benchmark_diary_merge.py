@@ -0,0 +1,92 @@
+"""数MBの日誌に対する見出しごとの追記保存の時間を計測するベンチマーク
+
+見出しを数百個持つ既存日誌を一時フォルダに作り、セクションを組み立て直す従来方式と
+見出し位置の索引から差し込む方式のマージ時間、保存時間、同じ内容の再保存時間を比較する。
+使い方: python -m scripts.benchmark_diary_merge --sections 500 --size-mb 4
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from service.diary_file_service import _merge_content, _split_sections, save_diary
+
+
+def legacy_merge_content(existing_content: str, new_content: str) -> str:
+    """比較用の従来方式。既存の全セクションを分割して文字列を組み立て直す"""
+    merged = [[heading, body] for heading, body in _split_sections(existing_content)]
+    indexes = {heading: index for index, (heading, _) in enumerate(merged)}
+
+    for heading, body in _split_sections(new_content):
+        if not body:
+            continue
+        if heading in indexes:
+            section = merged[indexes[heading]]
+            section[1] = f"{body}\n\n{section[1]}".strip()
+        else:
+            indexes[heading] = len(merged)
+            merged.append([heading, body])
+
+    return "\n\n".join(f"{heading}\n\n{body}".strip() for heading, body in merged) + "\n"
+
+
+def build_existing_diary(sections: int, size_mb: float) -> str:
+    """指定した見出し数と容量の既存日誌を作る"""
+    line = "- 既存の作業メモ: リファクタリングとテスト追加を行った\n"
+    lines_per_section = max(1, int(size_mb * 1024 * 1024 / len(line.encode('utf-8')) / sections))
+    return "".join(f"## セクション{index:04d}\n\n" + line * lines_per_section + "\n"
+                   for index in range(sections))
+
+
+def build_new_diary(sections: int) -> str:
+    """既存の見出しの一部と新しい見出しを含む生成結果を作る"""
+    targets = [0, sections // 2, sections - 1]
+    return "\n".join(f"## セクション{index:04d}\n\n- 新しい作業内容\n" for index in targets) + \
+        "\n## 学びと気づき\n\n事実：ベンチマーク\n"
+
+
+def _median_ms(function: Callable[[], object], iterations: int) -> float:
+    samples: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return round(statistics.median(samples) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sections', type=int, default=500, help='既存日誌の見出し数')
+    parser.add_argument('--size-mb', type=float, default=4.0, help='既存日誌の容量(MB)')
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    existing_content = build_existing_diary(args.sections, args.size_mb)
+    new_content = build_new_diary(args.sections)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = Path(temp_dir) / 'benchmark_プログラミング学習日誌.md'
+
+        def save_fresh():
+            file_path.write_text(existing_content, encoding='utf-8')
+            save_diary(file_path, new_content)
+
+        save_ms = _median_ms(save_fresh, args.iterations)
+        resave_ms = _median_ms(lambda: save_diary(file_path, new_content), args.iterations)
+
+    result = {
+        'sections': args.sections,
+        'size_bytes': len(existing_content.encode('utf-8')),
+        'legacy_merge_ms': _median_ms(lambda: legacy_merge_content(existing_content, new_content), args.iterations),
+        'indexed_merge_ms': _median_ms(lambda: _merge_content(existing_content, new_content), args.iterations),
+        'save_with_fsync_ms': save_ms,
+        'unchanged_resave_ms': resave_ms,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""数千件の日誌に対する全文検索インデックスの構築・再走査・検索時間を計測するベンチマーク
+
+使い方: python -m scripts.benchmark_diary_search --notes 3000
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from service.diary_search_index import DiarySearchIndex
+
+WORDS = ['リファクタリング', 'テスト追加', '検索インデックス', '設計', 'バグ修正', 'GitHub API', 'Gemini',
+         'キャッシュ', '非同期処理', 'UI調整', 'ドキュメント更新', 'パフォーマンス改善']
+
+
+def build_archive(daily_dir: Path, notes: int) -> None:
+    """ランダムな作業内容の日誌を指定件数作る"""
+    random.seed(0)
+    start = date(2015, 1, 1)
+    for index in range(notes):
+        lines = "\n".join(f"- {random.choice(WORDS)}を行った（{index}-{line}）" for line in range(40))
+        content = f"## 作業内容\n\n{lines}\n\n## 学びと気づき\n\n事実：{random.choice(WORDS)}\n"
+        day = (start + timedelta(days=index)).strftime('%Y-%m-%d')
+        (daily_dir / f"{day}_プログラミング学習日誌.md").write_text(content, encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, default=3000, help='日誌の件数')
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        daily_dir = Path(temp_dir) / '01_Daily'
+        daily_dir.mkdir()
+        build_archive(daily_dir, args.notes)
+        index = DiarySearchIndex(daily_dir, Path(temp_dir) / 'index.sqlite3')
+
+        start = time.perf_counter()
+        index.refresh()
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        index.refresh()
+        rescan_ms = (time.perf_counter() - start) * 1000
+
+        result = {'notes': args.notes, 'build_ms': round(build_ms, 1), 'unchanged_rescan_ms': round(rescan_ms, 1)}
+        for query in ['検索インデックス', '設計', 'バグ修正 キャッシュ']:
+            samples = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                index.search(query)
+                samples.append(time.perf_counter() - start)
+            result[f"search_ms[{query}]"] = round(statistics.median(samples) * 1000, 2)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
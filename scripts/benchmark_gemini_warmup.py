@@ -0,0 +1,56 @@
+"""Gemini APIの初回リクエスト遅延をウォームアップあり・なしで比較するベンチマーク
+
+ローカルのスタブサーバーに対して、新規接続ごとの遅延をTLSハンドシェイクや認証の代わりとして与える。
+使い方: python -m scripts.benchmark_gemini_warmup --connection-delay 0.3 --response-delay 0.2
+"""
+import argparse
+import json
+import statistics
+import time
+
+from external_service.gemini_api import GeminiAPIClient
+from scripts.fake_gemini_server import FakeGeminiServer
+
+
+def _new_client(server: FakeGeminiServer) -> GeminiAPIClient:
+    client = GeminiAPIClient()
+    client.api_key = 'benchmark'
+    client.default_model = 'benchmark-model'
+    client.base_url = server.url
+    return client
+
+
+def measure_first_request(server: FakeGeminiServer, warm: bool) -> float:
+    """新しいクライアントで最初の日誌生成リクエストにかかる時間を計測"""
+    client = _new_client(server)
+    if warm:
+        client.warm_up()
+
+    start = time.perf_counter()
+    client.initialize()
+    client.generate_content("ベンチマーク", 'benchmark-model')
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connection-delay', type=float, default=0.3, help='新規接続ごとの遅延(秒)')
+    parser.add_argument('--response-delay', type=float, default=0.2, help='生成リクエストの応答遅延(秒)')
+    parser.add_argument('--iterations', type=int, default=5)
+    args = parser.parse_args()
+
+    with FakeGeminiServer(connection_delay=args.connection_delay, response_delay=args.response_delay) as server:
+        cold = [measure_first_request(server, warm=False) for _ in range(args.iterations)]
+        warm = [measure_first_request(server, warm=True) for _ in range(args.iterations)]
+
+    result = {
+        'connection_delay': args.connection_delay,
+        'response_delay': args.response_delay,
+        'cold_first_request_ms': round(statistics.median(cold) * 1000, 1),
+        'warm_first_request_ms': round(statistics.median(warm) * 1000, 1),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""GitHubからのコミット取得（get_commits_for_diary_generation_range）を端から端まで計測するベンチマーク
+
+ローカルのGitHub APIスタブにリポジトリ数・コミット数・応答遅延・障害の割合を指定して合成データを用意し、
+所要時間・要求数・受信量・ピークメモリを計測する。結果はJSONで保存でき、前回の結果と比較できる。
+使い方: python -m scripts.benchmark_github_fetch --repos 30 --commits-per-repo 300 --output bench.json
+        python -m scripts.benchmark_github_fetch --baseline bench.json --max-regression 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+from scripts.fake_github_server import FakeGitHubServer, build_repositories
+
+SINCE_DATE = '2024-01-01'
+# 前回の結果と比較する指標（値が大きいほど悪い）
+COMPARED_METRICS = ('wall_ms', 'requests', 'bytes', 'peak_memory_kb')
+
+
+def measure_fetch(server: FakeGitHubServer, since_date: str, until_date: str) -> Dict:
+    """新しいトラッカー（新しい接続）で期間のコミットを1回取得して計測する"""
+    from service.github_commit_tracker import GitHubCommitTracker
+    from utils.exceptions import APIError
+
+    requests_before = server.request_count
+    bytes_before = server.bytes_sent
+    tracker = GitHubCommitTracker(token='benchmark', username='benchmark')
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        commits = tracker.get_commits_for_diary_generation_range(since_date, until_date)
+        failed = 0
+    except APIError as e:
+        # 障害の応答で全件を取得できなかった回は、取得失敗として数える
+        print(f"コミットの取得に失敗しました: {e}")
+        commits, failed = [], 1
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tracker.session.close()
+
+    return {
+        'wall_ms': round(wall * 1000, 1),
+        'requests': server.request_count - requests_before,
+        'bytes': server.bytes_sent - bytes_before,
+        'peak_memory_kb': round(peak / 1024, 1),
+        'commits': len(commits),
+        'failed': failed,
+    }
+
+
+def compare(result: Dict, baseline: Dict) -> Dict[str, Dict]:
+    """指標ごとに前回の値と今回の値、増加率を並べる"""
+    comparison = {}
+    for metric in COMPARED_METRICS:
+        before, after = baseline['median'].get(metric), result['median'][metric]
+        if before:
+            comparison[metric] = {'baseline': before, 'current': after, 'change': round(after / before - 1, 3)}
+    return comparison
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repos', type=int, default=20, help='リポジトリ数')
+    parser.add_argument('--commits-per-repo', type=int, default=200, help='リポジトリごとのコミット数')
+    parser.add_argument('--days', type=int, default=30, help='コミットを散らばらせる日数（取得する期間）')
+    parser.add_argument('--body-lines', type=int, default=2, help='コミットメッセージの本文行数')
+    parser.add_argument('--latency', type=float, default=0.02, help='要求ごとの応答遅延(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='500を返す要求の割合')
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--output', type=Path, help='結果を保存するJSONファイル')
+    parser.add_argument('--baseline', type=Path, help='比較する前回の結果のJSONファイル')
+    parser.add_argument('--max-regression', type=float,
+                        help='--baselineより所要時間がこの割合を超えて増えた場合は終了コード1（例: 0.2）')
+    args = parser.parse_args()
+
+    os.environ.setdefault('GITHUB_TOKEN', 'benchmark')
+    os.environ.setdefault('GITHUB_USERNAME', 'benchmark')
+    until_date = (datetime.strptime(SINCE_DATE, '%Y-%m-%d') + timedelta(days=args.days - 1)).strftime('%Y-%m-%d')
+    commits_by_repo = build_repositories(args.repos, args.commits_per_repo, SINCE_DATE, args.days, args.body_lines)
+
+    runs: List[Dict] = []
+    # 取得処理の診断メッセージでJSON出力が崩れないよう、計測中の標準出力は標準エラー出力へ回す
+    with redirect_stdout(sys.stderr), \
+            FakeGitHubServer(commits_by_repo, response_delay=args.latency, error_rate=args.error_rate) as server:
+        os.environ['GITHUB_API_URL'] = server.url
+        for _ in range(args.iterations):
+            runs.append(measure_fetch(server, SINCE_DATE, until_date))
+        status_counts = dict(sorted(server.status_counts.items()))
+
+    result = {
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'params': {
+            'repos': args.repos,
+            'commits_per_repo': args.commits_per_repo,
+            'days': args.days,
+            'body_lines': args.body_lines,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'iterations': args.iterations,
+        },
+        'median': {metric: statistics.median(run[metric] for run in runs) for metric in runs[0]},
+        'runs': runs,
+        'status_counts': {str(status): count for status, count in status_counts.items()},
+    }
+
+    exit_code = 0
+    if args.baseline is not None:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))
+        if baseline.get('params') != result['params']:
+            print("警告: 前回の結果と計測条件が異なります", file=sys.stderr)
+        result['comparison'] = compare(result, baseline)
+        wall_change = result['comparison'].get('wall_ms', {}).get('change', 0)
+        if args.max_regression is not None and wall_change > args.max_regression:
+            print(f"所要時間が前回より{wall_change:.0%}増えています", file=sys.stderr)
+            exit_code = 1
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output is not None:
+        args.output.write_text(output + '\n', encoding='utf-8')
+    print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
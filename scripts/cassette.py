@@ -0,0 +1,355 @@
+"""GitHub APIとGemini APIの通信をカセットに記録し、あとから同じ応答を再生する
+
+記録では実際のAPIとの間に中継サーバーを挟み、要求・応答（ヘッダー・本文）と所要時間をgzip圧縮のJSONに保存する。
+再生では記録した応答を、記録時の所要時間（または倍率をかけた時間）だけ待ってから返す。
+接続先はGITHUB_API_URL・GEMINI_BASE_URLで差し替えるため、子プロセスとして実行するコマンドには手を加えない。
+使い方: python -m scripts.cassette record --output run.json.gz -- python -m codediary generate --since 2024-01-15
+        python -m scripts.cassette replay run.json.gz --latency-scale 0.5 -- python -m codediary generate --since 2024-01-15 --output ./replay.md --no-obsidian
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+DEFAULT_UPSTREAMS = {
+    'github': os.environ.get('GITHUB_API_URL', 'https://api.github.com'),
+    'gemini': os.environ.get('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com'),
+}
+# 子プロセスで接続先を差し替える環境変数
+URL_ENV_VARS = {'github': 'GITHUB_API_URL', 'gemini': 'GEMINI_BASE_URL'}
+# 中継・記録しないヘッダー（接続ごとのヘッダーと、本文を展開して保存するため無効になるヘッダー）
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-length', 'content-encoding', 'host',
+                      'proxy-connection', 'te', 'trailer', 'upgrade'}
+# カセットに保存しない認証情報
+SECRET_HEADERS = {'authorization', 'x-goog-api-key', 'cookie', 'set-cookie'}
+SECRET_QUERY_KEYS = {'key', 'access_token'}
+
+
+def _strip_secrets(path: str) -> str:
+    """パスのクエリから認証情報を取り除く"""
+    parts = urlsplit(path)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if key not in SECRET_QUERY_KEYS]
+    return parts.path + (f"?{urlencode(query)}" if query else '')
+
+
+def _encode_body(body: bytes) -> Dict[str, str]:
+    """本文をJSONに保存できる形にする。UTF-8として読めない場合はBase64で保存する"""
+    try:
+        return {'body': body.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body_base64': base64.b64encode(body).decode('ascii')}
+
+
+def _decode_body(entry: Dict[str, Any], prefix: str) -> bytes:
+    if f'{prefix}body_base64' in entry:
+        return base64.b64decode(entry[f'{prefix}body_base64'])
+    return entry.get(f'{prefix}body', '').encode('utf-8')
+
+
+def _body_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def save_cassette(path: Path, interactions: List[Dict[str, Any]], upstreams: Dict[str, str]) -> None:
+    """記録した通信をgzip圧縮のJSONとして保存する"""
+    cassette = {'version': 1, 'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'upstreams': upstreams,
+                'interactions': sorted(interactions, key=lambda entry: entry['started_at'])}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(cassette, f, ensure_ascii=False)
+
+
+def load_cassette(path: Path) -> Dict[str, Any]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class _ServiceServers(ABC):
+    """サービス（github・gemini）ごとにローカルのHTTPサーバーを1つずつ起動する抽象基底クラス
+
+    各サービスの要求を処理するハンドラーはサブクラスの_build_handlerで作る"""
+
+    def __init__(self, services: List[str]):
+        self.services = services
+        self._servers: Dict[str, ThreadingHTTPServer] = {}
+        self.start_time = time.perf_counter()
+
+    @abstractmethod
+    def _build_handler(self, service: str) -> type:
+        """serviceの要求を処理するHTTPハンドラーのクラスを返す"""
+
+    @property
+    def urls(self) -> Dict[str, str]:
+        return {service: f"http://{server.server_address[0]}:{server.server_address[1]}"
+                for service, server in self._servers.items()}
+
+    def env(self) -> Dict[str, str]:
+        """子プロセスの接続先をこのサーバーへ向ける環境変数"""
+        return {URL_ENV_VARS[service]: url for service, url in self.urls.items()}
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        for service in self.services:
+            server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_handler(service))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+            self._servers[service] = server
+        return self
+
+    def stop(self) -> None:
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers = {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler, ABC):
+    """メソッドによらず要求をhandle_requestで処理するハンドラーの抽象基底クラス"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status: int, headers: List[Tuple[str, str]], body: bytes) -> None:
+        try:
+            self.send_response(status)
+            for name, value in headers:
+                if name.lower() not in HOP_BY_HOP_HEADERS:
+                    self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    @abstractmethod
+    def handle_request(self, method: str) -> None:
+        """要求を中継・再生して応答を返す"""
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CassetteRecorder(_ServiceServers):
+    """実際のAPIへの要求を中継しながら、要求・応答・所要時間を記録する"""
+
+    def __init__(self, upstreams: Optional[Dict[str, str]] = None):
+        self.upstreams = {service: url.rstrip('/') for service, url in (upstreams or DEFAULT_UPSTREAMS).items()}
+        super().__init__(list(self.upstreams))
+        self.interactions: List[Dict[str, Any]] = []
+        self._session = requests.Session()
+        self._lock = threading.Lock()
+
+    def _build_handler(self, service: str):
+        recorder = self
+        upstream = self.upstreams[service]
+
+        class Handler(_Handler):
+            def handle_request(self, method: str) -> None:
+                body = self._read_body()
+                headers = {name: value for name, value in self.headers.items()
+                           if name.lower() not in HOP_BY_HOP_HEADERS}
+                started_at = time.perf_counter()
+                try:
+                    response = recorder._session.request(method, upstream + self.path, headers=headers, data=body,
+                                                         timeout=300, allow_redirects=False)
+                except requests.exceptions.RequestException as e:
+                    self._send(502, [('Content-Type', 'application/json')],
+                               json.dumps({'message': f'記録中の中継に失敗しました: {e}'}).encode('utf-8'))
+                    return
+                duration = time.perf_counter() - started_at
+                response_headers = [(name, value) for name, value in response.headers.items()
+                                    if name.lower() not in HOP_BY_HOP_HEADERS]
+                recorder.record({
+                    'service': service,
+                    'method': method,
+                    'path': _strip_secrets(self.path),
+                    'request_headers': {name: value for name, value in headers.items()
+                                        if name.lower() not in SECRET_HEADERS},
+                    'request_body_sha256': _body_hash(body),
+                    **{f'request_{key}': value for key, value in _encode_body(body).items()},
+                    'status': response.status_code,
+                    'response_headers': [[name, value] for name, value in response_headers
+                                         if name.lower() not in SECRET_HEADERS],
+                    **_encode_body(response.content),
+                    'started_at': round(started_at - recorder.start_time, 4),
+                    'duration': round(duration, 4),
+                })
+                self._send(response.status_code, response_headers, response.content)
+
+        return Handler
+
+    def record(self, interaction: Dict[str, Any]) -> None:
+        with self._lock:
+            self.interactions.append(interaction)
+
+    def save(self, path: Path) -> None:
+        with self._lock:
+            interactions = list(self.interactions)
+        save_cassette(path, interactions, self.upstreams)
+
+    def stop(self) -> None:
+        super().stop()
+        self._session.close()
+
+
+class CassettePlayer(_ServiceServers):
+    """カセットの応答を記録時の所要時間×latency_scaleだけ待ってから返す
+
+    要求はサービス・メソッド・パス・本文が一致する記録を記録順に使う。本文が変わった要求（プロンプトの変更など）は
+    同じパスの未使用の記録を順に使う。一致する記録がない要求には404を返し、misses に数える"""
+
+    def __init__(self, cassette: Dict[str, Any], latency_scale: float = 1.0):
+        interactions = cassette['interactions']
+        super().__init__(sorted({entry['service'] for entry in interactions}))
+        self.latency_scale = latency_scale
+        self.served = 0
+        self.misses: List[str] = []
+        self._exact: Dict[Tuple[str, str, str, str], List[int]] = {}
+        self._by_path: Dict[Tuple[str, str, str], List[int]] = {}
+        self._interactions = interactions
+        self._used: set = set()
+        self._lock = threading.Lock()
+        for index, entry in enumerate(interactions):
+            path_key = (entry['service'], entry['method'], entry['path'])
+            self._exact.setdefault((*path_key, entry['request_body_sha256']), []).append(index)
+            self._by_path.setdefault(path_key, []).append(index)
+
+    def _take(self, candidates: List[int]) -> Optional[int]:
+        """未使用の記録のうち最初のものを使う。すべて使用済みの場合は最後の記録を繰り返す"""
+        for index in candidates:
+            if index not in self._used:
+                self._used.add(index)
+                return index
+        return candidates[-1] if candidates else None
+
+    def find(self, service: str, method: str, path: str, body: bytes) -> Optional[Dict[str, Any]]:
+        """要求に対応する記録を返す。見つからない場合はNone"""
+        path_key = (service, method, _strip_secrets(path))
+        with self._lock:
+            index = self._take([index for index in self._exact.get((*path_key, _body_hash(body)), [])
+                                if index not in self._used])
+            if index is None:
+                index = self._take(self._by_path.get(path_key, []))
+            if index is None:
+                self.misses.append(f"{service} {method} {path_key[2]}")
+                return None
+            self.served += 1
+            return self._interactions[index]
+
+    def _build_handler(self, service: str):
+        player = self
+
+        class Handler(_Handler):
+            def handle_request(self, method: str) -> None:
+                entry = player.find(service, method, self.path, self._read_body())
+                if entry is None:
+                    self._send(404, [('Content-Type', 'application/json')],
+                               json.dumps({'message': 'カセットに記録がありません'}).encode('utf-8'))
+                    return
+                if player.latency_scale > 0:
+                    time.sleep(entry['duration'] * player.latency_scale)
+                self._send(entry['status'], [(name, value) for name, value in entry['response_headers']],
+                           _decode_body(entry, ''))
+
+        return Handler
+
+
+def _run_command(command: List[str], env: Dict[str, str]) -> Tuple[int, float]:
+    """接続先を差し替えた環境変数でコマンドを実行し、終了コードと所要時間を返す"""
+    start = time.perf_counter()
+    completed = subprocess.run(command, env={**os.environ, **env})
+    return completed.returncode, round(time.perf_counter() - start, 2)
+
+
+def record(args: argparse.Namespace) -> Dict[str, Any]:
+    with CassetteRecorder() as recorder:
+        exit_code, elapsed = _run_command(args.command, recorder.env())
+    recorder.save(args.output)
+    counts: Dict[str, int] = {}
+    for entry in recorder.interactions:
+        counts[entry['service']] = counts.get(entry['service'], 0) + 1
+    return {'cassette': str(args.output), 'interactions': counts, 'exit_code': exit_code, 'elapsed_seconds': elapsed}
+
+
+def replay(args: argparse.Namespace) -> Dict[str, Any]:
+    env = {'GITHUB_TOKEN': os.environ.get('GITHUB_TOKEN') or 'replay',
+           'GEMINI_API_KEY': os.environ.get('GEMINI_API_KEY') or 'replay'}
+    with tempfile.TemporaryDirectory() as data_dir, \
+            CassettePlayer(load_cassette(args.cassette), args.latency_scale) as player:
+        if not args.keep_data_dir:
+            # 前回の生成結果・コミットのキャッシュを使うと記録時と同じ要求にならないため、空のデータディレクトリで実行する
+            env['CODEDIARY_DATA_DIR'] = data_dir
+        exit_code, elapsed = _run_command(args.command, {**env, **player.env()})
+    return {'cassette': str(args.cassette), 'served': player.served, 'misses': player.misses,
+            'exit_code': exit_code, 'elapsed_seconds': elapsed}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='mode', required=True)
+
+    record_parser = subparsers.add_parser('record', help='コマンドの通信を中継して記録する')
+    record_parser.add_argument('--output', type=Path, required=True, help='カセットの保存先（.json.gz）')
+    record_parser.add_argument('command', nargs=argparse.REMAINDER, help='-- の後に実行するコマンド')
+    record_parser.set_defaults(handler=record)
+
+    replay_parser = subparsers.add_parser('replay', help='記録した応答でコマンドを実行する')
+    replay_parser.add_argument('cassette', type=Path, help='記録したカセット')
+    replay_parser.add_argument('--latency-scale', type=float, default=1.0,
+                               help='記録時の所要時間にかける倍率（1で記録どおり、0で待たない）')
+    replay_parser.add_argument('--keep-data-dir', action='store_true',
+                               help='一時ディレクトリではなく通常のデータディレクトリ（キャッシュあり）で実行する')
+    replay_parser.add_argument('command', nargs=argparse.REMAINDER, help='-- の後に実行するコマンド')
+    replay_parser.set_defaults(handler=replay)
+
+    args = parser.parse_args()
+    args.command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not args.command:
+        parser.error("実行するコマンドを -- の後に指定してください")
+
+    result = args.handler(args)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return result['exit_code']
+
+
+if __name__ == '__main__':
+    sys.exit(main())
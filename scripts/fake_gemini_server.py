@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+
+class FakeGeminiServer:
+    """Gemini APIの代わりにローカルで応答するスタブサーバー
+
+    新規接続ごとの遅延（DNS/TLS/認証の代わり）と応答遅延を設定できる。応答遅延はモデルごとにも指定できる。
+    fail_statusesとrequest_delaysには先頭から順に1リクエストずつ消費される障害・遅延を積んでおける"""
+
+    def __init__(self, response_text: str = "## 作業内容\n\nスタブ応答\n",
+                 connection_delay: float = 0.0, response_delay: float = 0.0,
+                 model_delays: Optional[Dict[str, float]] = None):
+        self.response_text = response_text
+        self.connection_delay = connection_delay
+        self.response_delay = response_delay
+        self.model_delays = model_delays or {}
+        self.fail_statuses: List[int] = []
+        self.request_delays: List[float] = []
+        self.connection_count = 0
+        self.request_count = 0
+        self.requests: List[dict] = []
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("サーバーが起動していません")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _build_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connection_count += 1
+                time.sleep(fake.connection_delay)
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # タイムアウトやヘッジで切断済みの要求は応答を捨てる
+                    self.close_connection = True
+
+            def do_GET(self):
+                model = self.path.split('?')[0].rsplit('/', 1)[-1]
+                self._reply(200, {'name': f'models/{model}', 'displayName': model})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                with fake._lock:
+                    fake.request_count += 1
+                    fake.requests.append(request)
+                    fail_status = fake.fail_statuses.pop(0) if fake.fail_statuses else None
+                    delay = (fake.request_delays.pop(0) if fake.request_delays
+                             else fake.model_delays.get(request.get('model'), fake.response_delay))
+                time.sleep(delay)
+                if fail_status is not None:
+                    self._reply(fail_status, {'error': {'code': fail_status, 'message': 'injected failure'}})
+                    return
+                self._reply(200, fake.build_interaction(request))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def build_interaction(self, request: dict) -> dict:
+        """interactions.createの応答を組み立てる"""
+        prompt = request.get('input', '')
+        return {
+            'id': f'interaction-{self.request_count}',
+            'status': 'completed',
+            'model': request.get('model'),
+            'steps': [{'type': 'model_output', 'content': [{'type': 'text', 'text': self.response_text}]}],
+            'usage': {
+                'total_input_tokens': len(prompt) if isinstance(prompt, str) else 0,
+                'total_output_tokens': len(self.response_text),
+            },
+        }
+
+    def start(self) -> 'FakeGeminiServer':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'FakeGeminiServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+def build_commit(sha: str, message: str, date: str, author: str = 'Test User') -> Dict[str, Any]:
+    """GitHub APIのコミット一覧と同じ形のコミットを作る"""
+    return {
+        'sha': sha,
+        'commit': {
+            'author': {'name': author, 'email': 'test@example.com', 'date': date},
+            'message': message,
+        },
+    }
+
+
+def build_repositories(repo_count: int, commits_per_repo: int, since_date: str, days: int,
+                       body_lines: int = 0) -> Dict[str, List[Dict[str, Any]]]:
+    """ベンチマーク用に、期間内に均等に散らばったコミットを持つリポジトリを作る
+
+    コミットの日時は開始日(JST)からdays日間に等間隔で割り当てる。body_linesを指定するとメッセージに本文行を足す"""
+    start = datetime.strptime(since_date, '%Y-%m-%d').replace(tzinfo=timezone(timedelta(hours=9)))
+    step = timedelta(days=days) / max(1, commits_per_repo)
+    body = ''.join(f"\n- 変更内容の詳細 {line}" for line in range(body_lines))
+    return {
+        f'repo-{repo:03d}': [
+            build_commit(f'{repo:08x}{index:032x}', f'repo-{repo:03d}の変更 {index}{body}',
+                         (start + step * index).astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))
+            for index in range(commits_per_repo)
+        ]
+        for repo in range(repo_count)
+    }
+
+
+class FakeGitHubServer:
+    """GitHub REST APIの代わりにローカルで応答するスタブサーバー
+
+    /user/repos と /repos/{owner}/{repo}/commits（since・untilで絞り込み）にページ分割して応答する。
+    応答遅延を設定でき、中止やタイムアウトの確認に使える。commits_delayを指定するとコミット一覧のみ遅延させる。
+    rate_limit_remainingを指定するとX-RateLimit-*ヘッダーを返し、要求ごとに1ずつ減らす。
+    enforce_rate_limitを有効にすると残り回数が0の間は403を返す。
+    fail_statusesには先頭から順に1要求ずつ消費される障害（Noneは通常の応答）を積んでおけ、error_rateの割合で500を返すこともできる"""
+
+    def __init__(self, commits_by_repo: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+                 response_delay: float = 0.0, commits_delay: Optional[float] = None,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.commits_by_repo = commits_by_repo or {}
+        self.response_delay = response_delay
+        self.commits_delay = commits_delay
+        self.error_rate = error_rate
+        self.fail_statuses: List[Optional[int]] = []
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset_at = time.time() + 3600
+        self.enforce_rate_limit = False
+        self.request_count = 0
+        self.bytes_sent = 0
+        self.status_counts: Dict[int, int] = {}
+        self.paths: List[str] = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("サーバーが起動していません")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _build_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status: int, payload: Any):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                with fake._lock:
+                    fake.bytes_sent += len(body)
+                    fake.status_counts[status] = fake.status_counts.get(status, 0) + 1
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    if fake.rate_limit_remaining is not None:
+                        self.send_header('X-RateLimit-Remaining', str(fake.rate_limit_remaining))
+                        self.send_header('X-RateLimit-Reset', str(int(fake.rate_limit_reset_at)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 中止やタイムアウトで切断済みの要求は応答を捨てる
+                    self.close_connection = True
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                with fake._lock:
+                    fake.request_count += 1
+                    fake.paths.append(url.path)
+                    rate_limited = fake.enforce_rate_limit and fake.rate_limit_remaining == 0
+                    if fake.rate_limit_remaining is not None:
+                        fake.rate_limit_remaining = max(0, fake.rate_limit_remaining - 1)
+                    fail_status = fake.fail_statuses.pop(0) if fake.fail_statuses else None
+                    if fail_status is None and fake.error_rate and fake._random.random() < fake.error_rate:
+                        fail_status = 500
+                parts = url.path.strip('/').split('/')
+                is_commits = len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'commits'
+                time.sleep(fake.commits_delay if is_commits and fake.commits_delay is not None
+                           else fake.response_delay)
+
+                if rate_limited:
+                    self._reply(403, {'message': 'API rate limit exceeded'})
+                elif fail_status is not None:
+                    self._reply(fail_status, {'message': 'Injected error'})
+                elif parts == ['user', 'repos']:
+                    self._reply(200, fake.list_repositories(int(query.get('page', 1)),
+                                                            int(query.get('per_page', 30))))
+                elif is_commits:
+                    commits = fake.list_commits(parts[2], query.get('since'), query.get('until'))
+                    if commits is None:
+                        self._reply(404, {'message': 'Not Found'})
+                    else:
+                        page, per_page = int(query.get('page', 1)), int(query.get('per_page', 30))
+                        self._reply(200, commits[(page - 1) * per_page:page * per_page])
+                else:
+                    self._reply(404, {'message': 'Not Found'})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def list_repositories(self, page: int, per_page: int) -> List[Dict[str, Any]]:
+        """リポジトリ一覧の1ページ分。pushed_atは最新のコミット日時とする"""
+        repos = []
+        for name, commits in self.commits_by_repo.items():
+            dates = [commit['commit']['author']['date'] for commit in commits]
+            repos.append({'name': name, 'pushed_at': max(dates) if dates else None})
+        return repos[(page - 1) * per_page:page * per_page]
+
+    def list_commits(self, repo: str, since: Optional[str], until: Optional[str]) -> Optional[List[Dict[str, Any]]]:
+        """期間内のコミット一覧。存在しないリポジトリはNone"""
+        if repo not in self.commits_by_repo:
+            return None
+        return [
+            commit for commit in self.commits_by_repo[repo]
+            if (since is None or commit['commit']['author']['date'] >= since)
+            and (until is None or commit['commit']['author']['date'] < until)
+        ]
+
+    def start(self) -> 'FakeGitHubServer':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> 'FakeGitHubServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
@@ -0,0 +1,139 @@
+"""日誌生成HTTP APIの同時接続数ごとの応答時間を計測する負荷試験
+
+GitHub APIとGemini APIのスタブサーバーに接続したAPIサーバーを起動し、重なる期間の生成要求を同時に送る。
+同時接続数ごとに応答時間のp50/p99と、GitHub・Geminiへの要求数（要求のまとめによる削減の確認）をJSONで出力する。
+使い方: python -m scripts.load_test_api --concurrency 1 2 4 8 16 --rounds 3
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+from urllib.request import Request, urlopen
+
+from scripts.fake_gemini_server import FakeGeminiServer
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+
+START_DATE = date(2024, 1, 1)
+# 1ラウンドで使う日数。ラウンドごとに期間をずらし、前のラウンドの生成結果のキャッシュを使わないようにする
+ROUND_DAYS = 14
+
+
+def build_commits(repos: int, days: int) -> Dict[str, List[Dict]]:
+    """リポジトリごとに1日1件のコミットを作る"""
+    return {
+        f'repo-{repo}': [
+            build_commit(f'{repo:04d}{day:06d}'.ljust(40, '0'), f'変更 {day}日目',
+                         f'{START_DATE + timedelta(days=day)}T01:00:00Z')
+            for day in range(days)
+        ]
+        for repo in range(repos)
+    }
+
+
+def build_ranges(round_index: int, concurrency: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """1ラウンド分の要求期間。1〜7日の期間をラウンドの14日間の中からランダムに選ぶ（重なりあり）"""
+    ranges = []
+    for _ in range(concurrency):
+        length = rng.randint(1, 7)
+        offset = round_index * ROUND_DAYS + rng.randint(0, ROUND_DAYS - length)
+        since = START_DATE + timedelta(days=offset)
+        ranges.append((since.isoformat(), (since + timedelta(days=length - 1)).isoformat()))
+    return ranges
+
+
+def _post_generate(url: str, since: str, until: str) -> float:
+    """生成要求を送って完了を待ち、応答までの秒数を返す"""
+    body = json.dumps({'since': since, 'until': until, 'wait': True}).encode('utf-8')
+    request = Request(f'{url}/generate', data=body, method='POST', headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urlopen(request, timeout=120) as response:
+        job = json.loads(response.read())
+    if job['status'] != 'done':
+        raise RuntimeError(f"生成に失敗しました: {job}")
+    return time.perf_counter() - start
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近傍順位法のパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_level(concurrency: int, rounds: int, args: argparse.Namespace) -> Dict:
+    """同時接続数1段階分の計測。毎回新しいデータディレクトリとAPIサーバーで始める"""
+    from external_service import gemini_api
+    from service.diary_api_server import DiaryAPI, DiaryAPIServer
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+    rng = random.Random(concurrency)
+    with tempfile.TemporaryDirectory() as data_dir, \
+            FakeGitHubServer(build_commits(args.repos, rounds * ROUND_DAYS),
+                             response_delay=args.github_delay) as github, \
+            FakeGeminiServer(response_delay=args.gemini_delay) as gemini:
+        os.environ['CODEDIARY_DATA_DIR'] = data_dir
+        os.environ['GITHUB_API_URL'] = github.url
+        gemini_api.GEMINI_BASE_URL = gemini.url
+        api = DiaryAPI(ProgrammingDiaryGenerator(), max_workers=args.workers,
+                       coalesce_window=args.coalesce_ms / 1000)
+        latencies: List[float] = []
+        start = time.perf_counter()
+        with DiaryAPIServer(api) as server, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for round_index in range(rounds):
+                ranges = build_ranges(round_index, concurrency, rng)
+                latencies.extend(executor.map(lambda r: _post_generate(server.url, *r), ranges))
+        elapsed = time.perf_counter() - start
+
+        return {
+            'concurrency': concurrency,
+            'requests': len(latencies),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+            'max_ms': round(max(latencies) * 1000, 1),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'github_requests': github.request_count,
+            'gemini_requests': gemini.request_count,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16], help='同時接続数（複数指定可）')
+    parser.add_argument('--rounds', type=int, default=3, help='同時接続数ごとに繰り返す回数')
+    parser.add_argument('--repos', type=int, default=5, help='スタブのリポジトリ数')
+    parser.add_argument('--workers', type=int, default=3, help='APIサーバーの生成ジョブのワーカー数')
+    parser.add_argument('--coalesce-ms', type=float, default=50, help='要求をまとめる受付時間（ミリ秒、0でまとめない）')
+    parser.add_argument('--github-delay', type=float, default=0.05, help='GitHub APIの応答遅延(秒)')
+    parser.add_argument('--gemini-delay', type=float, default=0.3, help='Gemini APIの応答遅延(秒)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('GITHUB_TOKEN', 'load-test')
+    os.environ.setdefault('GITHUB_USERNAME', 'load-test')
+
+    # 生成処理の診断メッセージでJSON出力が崩れないよう、計測中の標準出力は標準エラー出力へ回す
+    with redirect_stdout(sys.stderr):
+        from external_service import gemini_api
+        gemini_api.GEMINI_API_KEY = 'load-test'
+        gemini_api.GEMINI_MODEL = 'load-test-model'
+        gemini_api.GEMINI_LATENCY_TARGET = None
+        levels = [run_level(concurrency, args.rounds, args) for concurrency in args.concurrency]
+    result = {
+        'repos': args.repos,
+        'workers': args.workers,
+        'coalesce_ms': args.coalesce_ms,
+        'github_delay': args.github_delay,
+        'gemini_delay': args.gemini_delay,
+        'levels': levels,
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
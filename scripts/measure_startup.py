@@ -0,0 +1,121 @@
+"""起動時間を計測し、重いモジュールが起動時に読み込まれていないかを確認する
+
+python -X importtime の出力からモジュールごとの読み込み時間を集計し、
+表示環境がある場合はウィンドウを作成して最初の描画が終わるまでの時間も計測する。
+ウィンドウなしの実行（python -m codediary）で読み込む日誌生成処理の読み込み時間と、tkinterを読み込んでいないかも確認する。
+使い方: python -m scripts.measure_startup --check --max-import-ms 300
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+ROOT_DIR = Path(__file__).parent.parent
+STARTUP_MODULE = 'app.main_window'
+HEAVY_MODULES = ('google.genai', 'requests', 'httpx', 'tkcalendar')
+HEADLESS_MODULE = 'service.programming_diary_generator'
+GUI_MODULES = ('tkinter', 'tkcalendar')
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+FIRST_PAINT_PATTERN = re.compile(r'^first_paint_ms=([\d.]+)$', re.MULTILINE)
+
+FIRST_PAINT_CODE = """
+import time
+start = time.perf_counter()
+import tkinter as tk
+from app.main_window import CodeDiaryMainWindow
+root = tk.Tk()
+window = CodeDiaryMainWindow(root)
+root.update()
+print(f"first_paint_ms={(time.perf_counter() - start) * 1000:.1f}")
+window.io_executor.shutdown(wait=False)
+root.destroy()
+"""
+
+
+def parse_import_times(stderr: str) -> List[Dict]:
+    """-X importtime の出力をモジュール名・自身の時間・累積時間・階層の一覧にする"""
+    entries = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            entries.append({
+                'module': match.group(4),
+                'self_ms': int(match.group(1)) / 1000,
+                'cumulative_ms': int(match.group(2)) / 1000,
+                'depth': len(match.group(3)) // 2,
+            })
+    return entries
+
+
+def measure_import_time(module: str = STARTUP_MODULE, watched: Sequence[str] = HEAVY_MODULES) -> Dict:
+    """新しいプロセスでモジュールを読み込み、読み込み時間とwatchedのうち読み込まれたモジュールを返す"""
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=ROOT_DIR, capture_output=True, text=True, check=True
+    )
+    entries = parse_import_times(completed.stderr)
+    target = next(entry for entry in entries if entry['module'] == module)
+    imported = {entry['module'] for entry in entries}
+    slowest = sorted(entries, key=lambda entry: entry['self_ms'], reverse=True)[:10]
+    return {
+        'module': module,
+        'import_ms': target['cumulative_ms'],
+        'heavy_modules': [name for name in watched if name in imported],
+        'slowest': [{'module': entry['module'], 'self_ms': entry['self_ms']} for entry in slowest],
+    }
+
+
+def measure_headless_import() -> Dict:
+    """ウィンドウなしの実行で読み込む日誌生成処理の読み込み時間と、読み込まれたGUIのモジュールを返す"""
+    result = measure_import_time(HEADLESS_MODULE, GUI_MODULES)
+    return {'module': HEADLESS_MODULE, 'import_ms': result['import_ms'], 'gui_modules': result['heavy_modules']}
+
+
+def measure_first_paint() -> Optional[float]:
+    """ウィンドウの最初の描画が終わるまでの時間。表示環境がない場合はNone
+
+    インタプリタの起動時間を含めないよう、子プロセスの中で計測して出力した値を返す"""
+    if os.name != 'nt' and sys.platform != 'darwin' and not os.environ.get('DISPLAY'):
+        return None
+    completed = subprocess.run([sys.executable, '-c', FIRST_PAINT_CODE],
+                               cwd=ROOT_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        return None
+    return parse_first_paint(completed.stdout)
+
+
+def parse_first_paint(stdout: str) -> Optional[float]:
+    """FIRST_PAINT_CODEが出力したfirst_paint_ms=の行からミリ秒を読み取る。見つからない場合はNone"""
+    match = FIRST_PAINT_PATTERN.search(stdout)
+    if match is None:
+        print(f"最初の描画までの時間を読み取れませんでした: {stdout!r}", file=sys.stderr)
+        return None
+    return float(match.group(1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='読み込み時間の計測回数（中央値を採用）')
+    parser.add_argument('--check', action='store_true', help='基準を超えた場合に終了コード1で終了する')
+    parser.add_argument('--max-import-ms', type=float, default=300.0, help='--check時の読み込み時間の上限')
+    args = parser.parse_args()
+
+    runs = [measure_import_time() for _ in range(args.repeat)]
+    runs.sort(key=lambda run: run['import_ms'])
+    result = runs[len(runs) // 2]
+    result['first_paint_ms'] = measure_first_paint()
+    result['headless'] = measure_headless_import()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.check and (result['heavy_modules'] or result['headless']['gui_modules']
+                       or result['import_ms'] > args.max_import_ms):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""日誌保存中のTkイベントループの遅延を、メインスレッドで保存した場合とワーカーで保存した場合で比較する
+
+10ミリ秒ごとのafterタイマーが予定よりどれだけ遅れて実行されたかをイベントループの遅延として記録する。
+表示環境が必要（Windows、またはX11のDISPLAYが設定された環境）。
+使い方: python -m scripts.measure_ui_lag --size-mb 8
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+from scripts.benchmark_diary_merge import build_existing_diary, build_new_diary
+from service.diary_file_service import save_diary
+
+TICK_MS = 10
+
+
+class EventLoopLagMonitor:
+    """一定間隔のafterタイマーの遅れを計測する"""
+
+    def __init__(self, root: tk.Tk):
+        self.root = root
+        self.lags: List[float] = []
+        self._expected = 0.0
+        self._running = False
+
+    def start(self):
+        self._running = True
+        self._expected = time.perf_counter() + TICK_MS / 1000
+        self.root.after(TICK_MS, self._tick)
+
+    def stop(self):
+        self._running = False
+
+    def _tick(self):
+        now = time.perf_counter()
+        self.lags.append(max(0.0, now - self._expected))
+        if self._running:
+            self._expected = now + TICK_MS / 1000
+            self.root.after(TICK_MS, self._tick)
+
+
+def measure(root: tk.Tk, file_path: Path, existing_content: str, new_content: str, use_worker: bool) -> dict:
+    """1回の保存の間のイベントループ遅延を計測"""
+    file_path.write_text(existing_content, encoding='utf-8')
+    monitor = EventLoopLagMonitor(root)
+    executor = ThreadPoolExecutor(max_workers=1)
+    done = []
+
+    def save():
+        save_diary(file_path, new_content)
+        root.after(0, done.append, True)
+
+    monitor.start()
+    if use_worker:
+        root.after(50, lambda: executor.submit(save))
+    else:
+        root.after(50, save)
+
+    while not done:
+        root.update()
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        root.update()
+    monitor.stop()
+    executor.shutdown()
+
+    return {
+        'max_lag_ms': round(max(monitor.lags) * 1000, 1),
+        'p95_lag_ms': round(statistics.quantiles(monitor.lags, n=20)[-1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=8.0, help='既存日誌の容量(MB)')
+    parser.add_argument('--sections', type=int, default=500)
+    args = parser.parse_args()
+
+    existing_content = build_existing_diary(args.sections, args.size_mb)
+    new_content = build_new_diary(args.sections)
+    root = tk.Tk()
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = Path(temp_dir) / 'lag_プログラミング学習日誌.md'
+            result = {
+                'size_bytes': len(existing_content.encode('utf-8')),
+                'main_thread': measure(root, file_path, existing_content, new_content, use_worker=False),
+                'io_worker': measure(root, file_path, existing_content, new_content, use_worker=True),
+            }
+    finally:
+        root.destroy()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+CommitRange = Tuple[str, Optional[str]]
+
+
+class CommitCache:
+    """取得済みのコミット一覧を期間ごとにメモリ上で一定時間保持する"""
+
+    DEFAULT_TTL_SECONDS = 600
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[CommitRange, Tuple[float, List[Dict]]] = {}  # 期間 -> (有効期限, コミット一覧)
+        self._lock = threading.Lock()
+
+    def get(self, since_date: str, until_date: Optional[str]) -> Optional[List[Dict]]:
+        """有効期限内のコミット一覧を返す。期限切れ・未取得の場合はNone"""
+        with self._lock:
+            entry = self._entries.get((since_date, until_date))
+            if entry is None:
+                return None
+            expires_at, commits = entry
+            if time.monotonic() > expires_at:
+                del self._entries[(since_date, until_date)]
+                return None
+            return commits
+
+    def get_covering(self, since_date: str, until_date: Optional[str]) -> Optional[List[Dict]]:
+        """期間を含む有効期限内の取得結果があれば、期間内（JSTの日付）のコミットのみを返す"""
+        last_date = until_date or since_date
+        with self._lock:
+            self._purge_expired()
+            for (entry_since, entry_until), (_, commits) in self._entries.items():
+                if not entry_since <= since_date <= last_date <= (entry_until or entry_since):
+                    continue
+                return [commit for commit in commits if since_date <= commit['timestamp'][:10] <= last_date]
+        return None
+
+    def put(self, since_date: str, until_date: Optional[str], commits: List[Dict],
+            ttl_seconds: Optional[float] = None) -> None:
+        """期間のコミット一覧を保存。ttl_secondsを省略した場合は既定の有効期間を使う"""
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._purge_expired()
+            self._entries[(since_date, until_date)] = (time.monotonic() + ttl, commits)
+
+    def invalidate(self, since_date: str, until_date: Optional[str]) -> None:
+        """期間のコミット一覧を破棄"""
+        with self._lock:
+            self._entries.pop((since_date, until_date), None)
+
+    def _purge_expired(self) -> None:
+        """期限切れの期間を破棄する。serve・daemonのように長く動くプロセスで取得結果が溜まり続けないようにする
+
+        _lockを取得した状態で呼び出す"""
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at < now]:
+            del self._entries[key]
@@ -0,0 +1,62 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.config_manager import get_data_dir
+
+
+class DaySummaryCache:
+    """日付ごとの生成結果をコミット集合のフィンガープリントと共に保存するキャッシュ
+
+    同じ日のコミットが変わっていなければ、再生成せずに保存済みの結果を再利用する"""
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self._cache_dir = cache_dir
+
+    @property
+    def cache_dir(self) -> Path:
+        """キャッシュの保存先ディレクトリ。未指定時はデータディレクトリ配下を使用"""
+        if self._cache_dir is None:
+            self._cache_dir = get_data_dir() / 'day_cache'
+        return self._cache_dir
+
+    @staticmethod
+    def fingerprint(commits: List[Dict], model_name: str, prompt_template: str) -> str:
+        """コミット集合・モデル名・プロンプトからフィンガープリントを計算"""
+        digest = hashlib.sha256()
+        digest.update(model_name.encode('utf-8'))
+        digest.update(hashlib.sha256(prompt_template.encode('utf-8')).digest())
+        for commit in sorted(commits, key=lambda c: (c.get('hash', ''), c.get('message', ''))):
+            digest.update(commit.get('hash', '').encode('utf-8'))
+            digest.update(commit.get('message', '').encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, day: str) -> Path:
+        return self.cache_dir / f"{day}.json"
+
+    def get(self, day: str, fingerprint: str) -> Optional[str]:
+        """フィンガープリントが一致する場合のみ保存済みの生成結果を返す"""
+        try:
+            entry = json.loads(self._entry_path(day).read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry.get('fingerprint') != fingerprint:
+            return None
+        return entry.get('content')
+
+    def put(self, day: str, fingerprint: str, content: str, model_name: str,
+            input_tokens: int, output_tokens: int) -> None:
+        """生成結果を日付単位で保存。保存に失敗しても日誌生成は継続する"""
+        entry = {
+            'fingerprint': fingerprint,
+            'content': content,
+            'model': model_name,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+        }
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._entry_path(day).write_text(json.dumps(entry, ensure_ascii=False), encoding='utf-8')
+        except OSError as e:
+            print(f"日付別キャッシュの保存に失敗しました: {day} {e}")
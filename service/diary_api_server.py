@@ -0,0 +1,341 @@
+import json
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from service.diary_file_service import build_diary_path, save_diary
+from service.diary_job_queue import (JOB_CANCELLED, JOB_DONE, JOB_FAILED, JOB_FETCHING, JOB_GENERATING,
+                                     JOB_QUEUED, DiaryJob, DiaryJobQueue)
+from service.run_metrics import RunMetricsLedger, to_prometheus
+
+if TYPE_CHECKING:
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+STATUS_CODES = {
+    JOB_QUEUED: 'queued',
+    JOB_FETCHING: 'fetching',
+    JOB_GENERATING: 'generating',
+    JOB_DONE: 'done',
+    JOB_CANCELLED: 'cancelled',
+    JOB_FAILED: 'failed',
+}
+
+
+def _validate_date(value: Any, name: str) -> str:
+    """YYYY-MM-DD形式の日付を検証して返す。不正な場合はValueErrorを送出する"""
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}はYYYY-MM-DD形式で指定してください: {value}")
+    return value
+
+
+def _validate_timeout(value: Any, default: float) -> float:
+    """待機の秒数を検証して返す。未指定の場合はdefault。0以上の数でない場合はValueErrorを送出する"""
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        seconds = None
+    if seconds is None or isinstance(value, bool) or not seconds >= 0:
+        raise ValueError(f"timeoutは0以上の秒数で指定してください: {value}")
+    return seconds
+
+
+def _validate_length(value: Optional[str]) -> int:
+    """Content-Lengthを検証して返す。未指定の場合は0。0以上の整数でない場合はValueErrorを送出する"""
+    try:
+        length = int(value or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise ValueError(f"Content-Lengthは0以上の整数で指定してください: {value}")
+    return length
+
+
+def merge_overlapping(ranges: List[Tuple[str, str]]) -> List[Tuple[str, str, int]]:
+    """重なる期間をまとめ、(開始日, 終了日, まとめた期間の数)の一覧を返す"""
+    merged: List[List[Any]] = []
+    for since_date, until_date in sorted(ranges):
+        if merged and since_date <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], until_date)
+            merged[-1][2] += 1
+        else:
+            merged.append([since_date, until_date, 1])
+    return [(since_date, until_date, count) for since_date, until_date, count in merged]
+
+
+class _Batch:
+    """coalesce_window秒の間に受け付けたジョブと、まとめて取得した期間"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.jobs: List[DiaryJob] = []
+        self.fetched: List[Tuple[str, str]] = []
+        self.remaining = 0
+
+
+class DiaryAPI:
+    """HTTP APIから受け付けた日誌生成をジョブキューで実行し、同時に届いた要求をまとめる
+
+    同じ期間の要求は1つのジョブを共有する。coalesce_window秒以内に届いた重なる期間の要求は、
+    期間を合わせてコミットを1回で取得してから生成を始める。同じ日のAI呼び出しはジェネレーター側で1回にまとまる"""
+
+    DEFAULT_COALESCE_WINDOW = 0.05
+
+    def __init__(self, generator: 'ProgrammingDiaryGenerator',
+                 max_workers: int = DiaryJobQueue.DEFAULT_MAX_WORKERS,
+                 coalesce_window: float = DEFAULT_COALESCE_WINDOW):
+        self.generator = generator
+        self.coalesce_window = coalesce_window
+        self.queue = DiaryJobQueue(lambda: generator, max_workers, on_finished=self._on_job_finished)
+        self._batch: Optional[_Batch] = None
+        self._batches: Dict[int, _Batch] = {}
+        self._save_requested: set = set()
+        self._lock = threading.Lock()
+
+    def generate(self, since_date: str, until_date: Optional[str] = None, save: bool = False) -> DiaryJob:
+        """期間の日誌生成を受け付けてジョブを返す。saveを指定すると完了時に日誌ファイルへ保存する"""
+        with self._lock:
+            batch = self._batch
+            if batch is None and self.coalesce_window > 0:
+                batch = self._batch = _Batch()
+                timer = threading.Timer(self.coalesce_window, self._dispatch, args=(batch,))
+                timer.daemon = True
+                timer.start()
+            job = self.queue.submit(since_date, until_date, ready=batch.ready if batch is not None else None)
+            if batch is not None and job.ready is batch.ready and job not in batch.jobs:
+                batch.jobs.append(job)
+                batch.remaining += 1
+                self._batches[job.job_id] = batch
+            if save:
+                self._save_requested.add(job.job_id)
+        return job
+
+    def _dispatch(self, batch: _Batch) -> None:
+        """受付を締め切り、重なる期間をまとめてコミットを取得してからジョブを開始させる"""
+        with self._lock:
+            if self._batch is batch:
+                self._batch = None
+            ranges = [(job.since_date, job.until_date or job.since_date) for job in batch.jobs
+                      if not job.cancel_token.cancelled]
+        try:
+            for since_date, until_date, count in merge_overlapping(ranges):
+                if count > 1:
+                    print(f"重なる期間の要求{count}件のコミットをまとめて取得します: {since_date} から {until_date}")
+                    self.generator.fetch_commits(since_date, until_date)
+                    batch.fetched.append((since_date, until_date))
+        except Exception as e:
+            # まとめた取得に失敗した場合は、各ジョブが自分の期間を取得する
+            print(f"コミットのまとめ取得に失敗しました: {e}")
+        finally:
+            batch.ready.set()
+
+    def _on_job_finished(self, job: DiaryJob) -> None:
+        """保存を指定されたジョブの日誌を保存し、まとめて取得したコミットを使い終えたら破棄する
+
+        保存が終わるまでは_save_requestedに残し、describeでは保存中として返す"""
+        with self._lock:
+            save = job.job_id in self._save_requested
+            batch = self._batches.pop(job.job_id, None)
+            if batch is not None:
+                batch.remaining -= 1
+            fetched = batch.fetched if batch is not None and batch.remaining == 0 else []
+
+        try:
+            if save and job.status == JOB_DONE and job.result is not None:
+                file_path = build_diary_path(job.until_date or job.since_date)
+                save_diary(file_path, job.result[0])
+                job.saved_path = str(file_path)
+        finally:
+            with self._lock:
+                self._save_requested.discard(job.job_id)
+        # 次の要求が古いコミットを使わないよう、まとめて取得した期間は生成し終えた時点で破棄する
+        for since_date, until_date in fetched:
+            self.generator.commit_cache.invalidate(since_date, until_date)
+
+    def get(self, job_id: int) -> Optional[DiaryJob]:
+        return self.queue.get(job_id)
+
+    def cancel(self, job_id: int) -> bool:
+        return self.queue.cancel(job_id)
+
+    def describe(self, job: DiaryJob) -> Dict[str, Any]:
+        """ジョブの状態をJSONで返せる形にする。完了していれば生成結果も含める
+
+        生成が終わっても保存を指定された日誌の保存が終わるまではsavingとし、生成結果は含めない"""
+        self.queue.apply_progress()
+        with self._lock:
+            saving = job.status == JOB_DONE and job.job_id in self._save_requested
+        result: Dict[str, Any] = {
+            'id': job.job_id,
+            'since': job.since_date,
+            'until': job.until_date,
+            'status': 'saving' if saving else STATUS_CODES[job.status],
+            'detail': job.detail,
+            'elapsed_seconds': round(job.elapsed_seconds, 2),
+        }
+        if job.error:
+            result['error'] = job.error
+        if job.status == JOB_DONE and job.result is not None and not saving:
+            content, input_tokens, output_tokens, model_name = job.result
+            result.update({'content': content, 'input_tokens': input_tokens, 'output_tokens': output_tokens,
+                           'model': model_name})
+            if job.saved_path is not None:
+                result['saved_path'] = job.saved_path
+        return result
+
+    @staticmethod
+    def read_diary(day: str) -> Optional[Tuple[str, str]]:
+        """保存済みの日誌の(パス, 内容)を返す。ファイルがない場合はNone"""
+        file_path = build_diary_path(day)
+        try:
+            return str(file_path), file_path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+
+    def shutdown(self) -> None:
+        self.queue.shutdown()
+
+
+class DiaryAPIServer:
+    """DiaryAPIをHTTPで公開するサーバー
+
+    POST /generate（since・until・save・wait・timeout）で生成を受け付け、GET /jobs/{id} で状態と結果、
+    DELETE /jobs/{id} で中止、GET /diary?date=YYYY-MM-DD で保存済みの日誌、GET /metrics で計測結果の台帳を返す"""
+
+    DEFAULT_WAIT_TIMEOUT = 600.0
+
+    def __init__(self, api: DiaryAPI, host: str = '127.0.0.1', port: int = 0):
+        self.api = api
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("サーバーが起動していません")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _build_handler(self):
+        api = self.api
+        wait_timeout = self.DEFAULT_WAIT_TIMEOUT
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _reply(self, status: int, payload: Any):
+                self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+                           'application/json; charset=utf-8')
+
+            def _send(self, status: int, body: bytes, content_type: str):
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def _find_job(self, path: str) -> Optional[DiaryJob]:
+                parts = path.strip('/').split('/')
+                if len(parts) != 2 or parts[0] != 'jobs' or not parts[1].isdigit():
+                    self._reply(404, {'error': 'Not Found'})
+                    return None
+                job = api.get(int(parts[1]))
+                if job is None:
+                    self._reply(404, {'error': f"ジョブが見つかりません: {parts[1]}"})
+                return job
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                try:
+                    length = _validate_length(self.headers.get('Content-Length'))
+                except ValueError as e:
+                    # 本文を読み飛ばせないため、応答後に接続を閉じる
+                    self.close_connection = True
+                    self._reply(400, {'error': str(e)})
+                    return
+                raw_body = self.rfile.read(length) if length else b''
+                if url.path != '/generate':
+                    self._reply(404, {'error': 'Not Found'})
+                    return
+                try:
+                    request = json.loads(raw_body or b'{}')
+                    since_date = _validate_date(request.get('since'), 'since')
+                    until_date = request.get('until')
+                    if until_date is not None:
+                        until_date = _validate_date(until_date, 'until')
+                        if since_date > until_date:
+                            raise ValueError(f"開始日が終了日より後になっています: {since_date} > {until_date}")
+                    timeout = _validate_timeout(request.get('timeout'), wait_timeout)
+                except (ValueError, AttributeError) as e:
+                    self._reply(400, {'error': str(e)})
+                    return
+
+                job = api.generate(since_date, until_date, save=bool(request.get('save')))
+                if request.get('wait'):
+                    job.wait(timeout)
+                self._reply(200 if job.done.is_set() else 202, api.describe(job))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/metrics':
+                    self._send(200, to_prometheus(RunMetricsLedger().read()).encode('utf-8'),
+                               'text/plain; version=0.0.4; charset=utf-8')
+                    return
+                if url.path == '/diary':
+                    query = {key: values[0] for key, values in parse_qs(url.query).items()}
+                    try:
+                        day = _validate_date(query.get('date'), 'date')
+                    except ValueError as e:
+                        self._reply(400, {'error': str(e)})
+                        return
+                    diary = api.read_diary(day)
+                    if diary is None:
+                        self._reply(404, {'error': f"日誌が見つかりません: {day}"})
+                    else:
+                        self._reply(200, {'date': day, 'path': diary[0], 'content': diary[1]})
+                    return
+
+                job = self._find_job(url.path)
+                if job is not None:
+                    self._reply(200, api.describe(job))
+
+            def do_DELETE(self):
+                job = self._find_job(urlparse(self.path).path)
+                if job is not None:
+                    self._reply(200, {'id': job.job_id, 'cancelled': api.cancel(job.job_id)})
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'DiaryAPIServer':
+        """別スレッドで要求の受付を開始する"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._build_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.api.shutdown()
+
+    def __enter__(self) -> 'DiaryAPIServer':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
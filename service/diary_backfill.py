@@ -0,0 +1,236 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from service.diary_file_service import build_diary_path, save_diary
+from service.progress import GenerationProgress, ProgressCallback
+from service.run_metrics import record_run
+from utils.cancellation import CancellationToken, raise_if_cancelled
+from utils.config_manager import get_data_dir
+from utils.exceptions import CancelledError
+from utils.file_utils import atomic_write_text
+from utils.rate_limiter import RateLimiter
+from utils.tracing import bind
+
+if TYPE_CHECKING:
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+
+def plan_days(since_date: str, until_date: str) -> List[str]:
+    """期間内の日付(YYYY-MM-DD)を古い順に並べる"""
+    start = date.fromisoformat(since_date)
+    end = date.fromisoformat(until_date)
+    return [(start + timedelta(days=offset)).isoformat() for offset in range((end - start).days + 1)]
+
+
+class BackfillCheckpoint:
+    """バックフィルの完了済みの日付をファイルに記録し、中断後の再実行で続きから再開できるようにする"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._days: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        try:
+            self._days = json.loads(path.read_text(encoding='utf-8')).get('days', {})
+        except (FileNotFoundError, ValueError):
+            pass
+
+    @classmethod
+    def for_range(cls, since_date: str, until_date: str) -> 'BackfillCheckpoint':
+        """期間ごとの記録ファイル（データディレクトリのbackfill配下）を開く"""
+        return cls(get_data_dir() / 'backfill' / f"{since_date}_{until_date}.json")
+
+    def is_done(self, day: str) -> bool:
+        with self._lock:
+            return day in self._days
+
+    def record(self, day: str, entry: Dict) -> None:
+        """日付を完了として記録し、すぐにファイルへ書き込む"""
+        with self._lock:
+            self._days[day] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.path, json.dumps({'days': self._days}, ensure_ascii=False, indent=2))
+
+    def clear(self) -> None:
+        """記録を消して最初からやり直せるようにする"""
+        with self._lock:
+            self._days = {}
+            self.path.unlink(missing_ok=True)
+
+
+class BackfillResult:
+    """バックフィル1回分の結果"""
+
+    def __init__(self, days_total: int):
+        self.days_total = days_total
+        self.generated: List[str] = []
+        self.empty: List[str] = []
+        self.resumed: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.cancelled = False
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_days = 0
+        self.commits = 0
+        self.fetch_seconds = 0.0
+        self.rate_wait_seconds = 0.0
+        self.elapsed_seconds = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'days_total': self.days_total,
+            'generated': len(self.generated),
+            'empty': len(self.empty),
+            'resumed': len(self.resumed),
+            'failed': self.failed,
+            'cancelled': self.cancelled,
+            'commits': self.commits,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cached_days': self.cached_days,
+            'fetch_seconds': round(self.fetch_seconds, 2),
+            'rate_wait_seconds': round(self.rate_wait_seconds, 2),
+            'elapsed_seconds': round(self.elapsed_seconds, 2),
+        }
+
+
+class DiaryBackfill:
+    """長い期間の日誌を1日1ノートでまとめて作成する
+
+    コミットは期間全体を1回で取得して日ごとに振り分け、AI呼び出しはRateLimiterで回数を抑えながら並行して行う。
+    作成した日はチェックポイントに記録するため、中断しても再実行すれば残りの日（コミットのなかった日を含む）だけを処理する"""
+
+    DEFAULT_MAX_WORKERS = 4
+    DEFAULT_REQUESTS_PER_MINUTE = 30
+
+    def __init__(self, generator: 'ProgrammingDiaryGenerator', max_workers: int = DEFAULT_MAX_WORKERS,
+                 requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE):
+        self.generator = generator
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = (RateLimiter(requests_per_minute, burst=self.max_workers)
+                             if requests_per_minute else None)
+
+    @staticmethod
+    def _group_by_day(commits: List[Dict]) -> Dict[str, List[Dict]]:
+        """コミットをJSTの日付ごとにまとめる"""
+        commits_by_day: Dict[str, List[Dict]] = {}
+        for commit in commits:
+            commits_by_day.setdefault(commit['timestamp'][:10], []).append(commit)
+        return commits_by_day
+
+    def run(self, since_date: str, until_date: str, checkpoint: Optional[BackfillCheckpoint] = None,
+            cancel_token: Optional[CancellationToken] = None,
+            progress: Optional[ProgressCallback] = None) -> BackfillResult:
+        """期間内の未完了の日の日誌を作成して保存する。中止された場合は完了した日までを記録して戻る"""
+        with record_run('backfill', since_date, until_date) as run:
+            result = self._run(since_date, until_date, checkpoint, cancel_token, progress)
+            run.update(commits=result.commits, days=len(result.generated), failed_days=len(result.failed))
+            if result.cancelled:
+                run['status'] = 'cancelled'
+            elif result.failed:
+                run['status'] = 'partial'
+            return result
+
+    def _run(self, since_date: str, until_date: str, checkpoint: Optional[BackfillCheckpoint] = None,
+             cancel_token: Optional[CancellationToken] = None,
+             progress: Optional[ProgressCallback] = None) -> BackfillResult:
+        """runの本体"""
+        start = time.perf_counter()
+        checkpoint = checkpoint or BackfillCheckpoint.for_range(since_date, until_date)
+        days = plan_days(since_date, until_date)
+        result = BackfillResult(len(days))
+        result.resumed = [day for day in days if checkpoint.is_done(day)]
+        pending = [day for day in days if not checkpoint.is_done(day)]
+        if not pending:
+            result.elapsed_seconds = time.perf_counter() - start
+            return result
+
+        try:
+            fetch_start = time.perf_counter()
+            commits_by_day = self._group_by_day(
+                self.generator.fetch_commits(pending[0], pending[-1], cancel_token, progress)
+            )
+            result.fetch_seconds = time.perf_counter() - fetch_start
+        except CancelledError:
+            result.cancelled = True
+            result.elapsed_seconds = time.perf_counter() - start
+            return result
+        except Exception as e:
+            # レート制限などで全件を取得できなかった場合は、欠けたコミットから作成せず全ての日を失敗として再実行に回す
+            print(f"バックフィルでコミットの取得に失敗しました: {e}")
+            result.failed = {day: str(e) for day in pending}
+            result.elapsed_seconds = time.perf_counter() - start
+            return result
+
+        # コミットのない日はチェックポイントに記録しない。まだpushされていないコミットなどがある可能性があり、
+        # 再実行時にもう一度取得して確かめる
+        result.empty = [day for day in pending if day not in commits_by_day]
+        work = [day for day in pending if day in commits_by_day]
+        result.commits = sum(len(commits_by_day[day]) for day in work)
+
+        def report():
+            if progress is not None:
+                progress(GenerationProgress(len(result.generated) + len(result.failed), len(work),
+                                            result.input_tokens, result.output_tokens, result.cached_days))
+
+        report()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='backfill')
+        try:
+            futures = {
+                executor.submit(bind(self._generate_day), day, commits_by_day[day], checkpoint, cancel_token): day
+                for day in work
+            }
+            for future in as_completed(futures):
+                day = futures[future]
+                try:
+                    entry = future.result()
+                except CancelledError:
+                    result.cancelled = True
+                    continue
+                except Exception as e:
+                    print(f"バックフィルで日誌の作成に失敗しました: {day} {e}")
+                    result.failed[day] = str(e)
+                    report()
+                    continue
+                result.generated.append(day)
+                result.input_tokens += entry['input_tokens']
+                result.output_tokens += entry['output_tokens']
+                result.rate_wait_seconds += entry['rate_wait_seconds']
+                if entry['model'] is None:
+                    result.cached_days += 1
+                report()
+        except KeyboardInterrupt:
+            # Ctrl+Cで止めた場合は未着手の日を取り消す。完了した日はチェックポイントに記録済みのため再実行で続きから再開できる
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        result.generated.sort()
+        result.elapsed_seconds = time.perf_counter() - start
+        return result
+
+    def _generate_day(self, day: str, commits: List[Dict], checkpoint: BackfillCheckpoint,
+                      cancel_token: Optional[CancellationToken] = None) -> Dict:
+        """1日分の日誌を作成して保存し、チェックポイントに記録する"""
+        raise_if_cancelled(cancel_token)
+        rate_wait_seconds = 0.0
+        # 保存済みの結果を返す日はAIを呼び出さないため、呼び出し回数の枠を使わない
+        if self.rate_limiter is not None and not self.generator.is_day_cached(day, commits):
+            rate_wait_seconds = self.rate_limiter.acquire(cancel_token)
+        content, input_tokens, output_tokens, model_name = self.generator.generate_day(day, commits, cancel_token)
+
+        file_path = build_diary_path(day)
+        save_diary(file_path, content)
+        entry = {
+            'path': str(file_path),
+            'commits': len(commits),
+            'model': model_name,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+        }
+        checkpoint.record(day, entry)
+        return {**entry, 'rate_wait_seconds': rate_wait_seconds}
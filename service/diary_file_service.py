@@ -1,9 +1,15 @@
+import os
 import re
 import subprocess
+import sys
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
 
+from service.diary_search_index import DiarySearchIndex
 from utils.config_manager import load_config
+from utils.file_utils import atomic_write_text
+from utils.tracing import span
 
 SECTION_HEADING_PATTERN = re.compile(r'^## .*$', re.MULTILINE)
 
@@ -30,32 +36,205 @@ def _split_sections(content: str) -> List[Tuple[str, str]]:
     return sections
 
 
-def _merge_content(existing_content: str, new_content: str) -> str:
-    """既存の内容に新しい内容を見出しごとに追記する。新しい内容は見出しの直後（既存本文の前）へ挿入する"""
-    merged = [[heading, body] for heading, body in _split_sections(existing_content)]
-    indexes = {heading: index for index, (heading, _) in enumerate(merged)}
+def extract_sections(content: str, headings: Iterable[str]) -> Dict[str, str]:
+    """指定した見出し(## ...)の本文を取り出す。本文が空・見出しがない場合は含めない"""
+    wanted = set(headings)
+    return {heading: body for heading, body in _split_sections(content) if heading in wanted and body}
 
-    for heading, body in _split_sections(new_content):
-        if not body:
-            continue
-        if heading in indexes:
-            section = merged[indexes[heading]]
-            section[1] = f"{body}\n\n{section[1]}".strip()
-        else:
-            indexes[heading] = len(merged)
-            merged.append([heading, body])
 
-    return "\n\n".join(f"{heading}\n\n{body}".strip() for heading, body in merged) + "\n"
+def _find_headings(content: str) -> List[Tuple[int, int]]:
+    """見出し(##)行の(開始位置, 終了位置)一覧を返す。正規表現の行頭照合より速いstr.findで走査する"""
+    headings: List[Tuple[int, int]] = []
+    newline = -1 if content.startswith('## ') else content.find('\n## ')
+    if newline < 0 and not content.startswith('## '):
+        return headings
+
+    while True:
+        start = newline + 1
+        end = content.find('\n', start)
+        end = len(content) if end < 0 else end
+        headings.append((start, end))
+        newline = content.find('\n## ', end)
+        if newline < 0:
+            return headings
+
+
+def _skip_blank(content: str, position: int, end: int) -> int:
+    """positionから空白・改行を読み飛ばした位置を返す"""
+    while position < end and content[position] in ' \t\r\n':
+        position += 1
+    return position
+
+
+def _index_sections(content: str) -> Tuple[int, Dict[str, Tuple[int, int, int]]]:
+    """見出しの前の部分の終了位置と、見出しごとの(見出し行の終了位置, 本文の開始位置, 節の終了位置)を1回の走査で求める
+
+    同じ見出しが複数ある場合は、従来の追記と同じく最後のものを使う。
+    """
+    headings = _find_headings(content)
+    offsets: Dict[str, Tuple[int, int, int]] = {}
 
+    for index, (heading_start, heading_end) in enumerate(headings):
+        section_end = headings[index + 1][0] if index + 1 < len(headings) else len(content)
+        body_start = _skip_blank(content, heading_end, section_end)
+        offsets[content[heading_start:heading_end].strip()] = (heading_end, body_start, section_end)
 
-def save_diary(file_path: Path, content: str) -> None:
-    """日誌内容をMarkdownファイルとして保存する。同名ファイルがある場合は見出しごとに追記する"""
-    file_path.parent.mkdir(parents=True, exist_ok=True)
-    if file_path.exists():
-        content = _merge_content(file_path.read_text(encoding='utf-8'), content)
-    file_path.write_text(content, encoding='utf-8')
+    preamble_end = headings[0][0] if headings else len(content)
+    return preamble_end, offsets
 
 
-def launch_obsidian() -> None:
-    """Obsidianを起動"""
-    subprocess.Popen([load_config().get('Obsidian', 'obsidian_path')])
+def _merge_content(existing_content: str, new_content: str) -> str:
+    """既存の内容に新しい内容を見出しごとに追記する。新しい内容は見出しの直後（既存本文の前）へ挿入する
+
+    既存の内容は組み立て直さず、見出し位置の索引をもとに挿入箇所へ差し込むだけにする。
+    """
+    preamble_end, offsets = _index_sections(existing_content)
+    insertions: List[Tuple[int, str]] = []
+    appended: List[str] = []
+
+    for heading, body in _split_sections(new_content):
+        if not body:
+            continue
+        if not heading:
+            insertions.append((0, f"{body}\n\n"))
+            continue
+        if heading not in offsets:
+            appended.append(f"{heading}\n\n{body}\n")
+            continue
+
+        heading_end, body_start, _ = offsets[heading]
+        separator = existing_content[heading_end:body_start]
+        prefix = "\n" * max(0, 2 - separator.count("\n"))
+        suffix = "\n\n" if body_start < len(existing_content) else "\n"
+        insertions.append((body_start, f"{prefix}{body}{suffix}"))
+
+    if not insertions and not appended:
+        return existing_content
+
+    pieces = []
+    position = 0
+    for offset, text in sorted(insertions, key=lambda insertion: insertion[0]):
+        pieces.append(existing_content[position:offset])
+        pieces.append(text)
+        position = offset
+    pieces.append(existing_content[position:])
+
+    if appended:
+        tail = "".join(pieces).rstrip()
+        return (f"{tail}\n\n" if tail else "") + "\n".join(appended)
+    return "".join(pieces)
+
+
+def combine_daily_diaries(daily_contents: List[Tuple[str, str]]) -> str:
+    """日付ごとの日誌を見出しごとにまとめて1つの日誌にする。各本文の前に日付の小見出しを付ける"""
+    if len(daily_contents) == 1:
+        return daily_contents[0][1]
+
+    combined: Dict[str, List[str]] = {}
+    for label, content in daily_contents:
+        for heading, body in _split_sections(content):
+            bodies = combined.setdefault(heading, [])
+            if body:
+                bodies.append(f"### {label}\n\n{body}")
+
+    return "\n\n".join(f"{heading}\n\n" + "\n\n".join(bodies) if bodies else heading
+                       for heading, bodies in combined.items()).strip() + "\n"
+
+
+def _update_search_index(file_path: Path) -> None:
+    """保存した日誌を検索インデックスに反映。失敗しても保存自体は成功として扱う"""
+    try:
+        DiarySearchIndex(file_path.parent).update_file(file_path)
+    except Exception as e:
+        print(f"検索インデックスの更新に失敗しました: {e}")
+
+
+def save_diary(file_path: Path, content: str) -> bool:
+    """日誌内容をMarkdownファイルとして保存する。同名ファイルがある場合は見出しごとに追記する
+
+    書き込みは一時ファイルからの置き換えで行う。新しい内容が空のセクションのみで、
+    追記後の内容がファイル全体と同じになる場合は書き込まない。
+    書き込んだ場合は検索インデックスも更新してTrueを返す。
+    """
+    with span('save_diary', path=str(file_path)) as current:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            existing_content = file_path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            existing_content = None
+
+        if existing_content is not None:
+            with span('merge', existing_chars=len(existing_content)):
+                content = _merge_content(existing_content, content)
+            if content == existing_content:
+                current.set(written=False)
+                return False
+
+        with span('write', chars=len(content)):
+            atomic_write_text(file_path, content)
+        with span('update_search_index'):
+            _update_search_index(file_path)
+        current.set(written=True)
+        return True
+
+
+def _find_vault_root(file_path: Path) -> Optional[Path]:
+    """ファイルを含むObsidian保管庫（.obsidianフォルダがあるフォルダ）を探す"""
+    for directory in file_path.resolve().parents:
+        if (directory / '.obsidian').is_dir():
+            return directory
+    return None
+
+
+def build_obsidian_uri(file_path: Path) -> str:
+    """ノートを開くobsidian:// URIを組み立てる。保管庫が分からない場合は絶対パスで指定する"""
+    vault_root = _find_vault_root(file_path)
+    if vault_root is None:
+        return f"obsidian://open?path={quote(str(file_path.resolve()), safe='')}"
+
+    vault_name = load_config().get('Obsidian', 'vault_name', fallback='') or vault_root.name
+    note = file_path.resolve().relative_to(vault_root).with_suffix('').as_posix()
+    return f"obsidian://open?vault={quote(vault_name, safe='')}&file={quote(note, safe='')}"
+
+
+def is_obsidian_running(executable: str) -> bool:
+    """Obsidianのプロセスが起動しているかを判定。判定できない場合はFalse"""
+    try:
+        if os.name == 'nt':
+            image_name = re.split(r'[\\/]', executable)[-1]
+            output = subprocess.run(
+                ['tasklist', '/FI', f'IMAGENAME eq {image_name}', '/NH'],
+                capture_output=True, text=True, timeout=5,
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+            ).stdout
+            return image_name.lower() in output.lower()
+        return subprocess.run(['pgrep', '-f', re.escape(executable)], capture_output=True, timeout=5).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def _open_uri(uri: str) -> None:
+    """OS標準の方法でURIを開く。起動中のObsidianにノートを開かせるため新しいプロセスは作らない"""
+    if os.name == 'nt':
+        os.startfile(uri)
+    elif sys.platform == 'darwin':
+        subprocess.Popen(['open', uri])
+    else:
+        subprocess.Popen(['xdg-open', uri])
+
+
+def launch_obsidian(file_path: Optional[Path] = None) -> None:
+    """Obsidianでノートを開く。起動中ならURIで既存のウィンドウに開かせ、未起動の場合のみ実行ファイルを起動する"""
+    with span('launch_obsidian') as current:
+        executable = load_config().get('Obsidian', 'obsidian_path')
+        if file_path is None:
+            subprocess.Popen([executable])
+            return
+
+        uri = build_obsidian_uri(file_path)
+        running = is_obsidian_running(executable)
+        current.set(running=running)
+        if running:
+            _open_uri(uri)
+        else:
+            subprocess.Popen([executable, uri])
@@ -0,0 +1,207 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+from service.progress import FetchProgress, ProgressQueue
+from utils.cancellation import CancellationToken
+from utils.exceptions import CancelledError
+
+if TYPE_CHECKING:
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+JOB_QUEUED = "待機中"
+JOB_FETCHING = "取得中"
+JOB_GENERATING = "生成中"
+JOB_DONE = "完了"
+JOB_CANCELLED = "中止"
+JOB_FAILED = "失敗"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_CANCELLED, JOB_FAILED)
+
+
+class DiaryJob:
+    """期間1つ分の日誌生成ジョブの状態"""
+
+    def __init__(self, job_id: int, since_date: str, until_date: Optional[str]):
+        self.job_id = job_id
+        self.since_date = since_date
+        self.until_date = until_date
+        self.status = JOB_QUEUED
+        self.detail = ""
+        # ワーカースレッドからの進捗。apply_progressで表示する側のスレッドから状態に反映する
+        self.progress = ProgressQueue()
+        self.cancel_token = CancellationToken()
+        self.ready: Optional[threading.Event] = None
+        self.done = threading.Event()
+        self.result: Optional[Tuple[str, int, int, str]] = None
+        self.error: Optional[str] = None
+        # APIからsaveを指定された場合に保存した日誌のパス。ジョブと一緒に一覧から削除される
+        self.saved_path: Optional[str] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """ジョブの終了（終了時の通知の処理を含む）を待つ。timeout秒以内に終了しなければFalse"""
+        return self.done.wait(timeout)
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """実行開始からの経過秒数。待機中は0"""
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def format(self) -> str:
+        """一覧表示用の1行。例: #2 01/08〜01/14 生成中 12秒 生成: 3/7日 ..."""
+        period = self.since_date[5:].replace('-', '/')
+        if self.until_date and self.until_date != self.since_date:
+            period += f"〜{self.until_date[5:].replace('-', '/')}"
+        text = f"#{self.job_id} {period} {self.status}"
+        if self.started_at is not None:
+            text += f" {self.elapsed_seconds:.0f}秒"
+        if self.error:
+            text += f" {self.error}"
+        elif self.detail and not self.finished:
+            text += f" {self.detail}"
+        return text
+
+
+class DiaryJobQueue:
+    """複数期間の日誌生成を少数のワーカーで並行して実行するキュー
+
+    重なる期間のジョブはProgrammingDiaryGeneratorを共有し、取得済み・取得中のコミットを使い回す。
+    進捗はジョブごとのProgressQueueに溜め、apply_progressで表示する側のスレッドから反映する。
+    ジョブの終了はon_finishedでワーカースレッドから通知する"""
+
+    DEFAULT_MAX_WORKERS = 3
+    MAX_FINISHED_JOBS = 10
+
+    def __init__(self, get_generator: Callable[[], 'ProgrammingDiaryGenerator'],
+                 max_workers: int = DEFAULT_MAX_WORKERS,
+                 on_finished: Optional[Callable[[DiaryJob], None]] = None):
+        self.get_generator = get_generator
+        self.on_finished = on_finished
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='diary-job')
+        self._jobs: List[DiaryJob] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, since_date: str, until_date: Optional[str] = None,
+               ready: Optional[threading.Event] = None) -> DiaryJob:
+        """期間のジョブを追加。同じ期間のジョブが実行中・待機中であればそのジョブを返す
+
+        readyを指定するとセットされるまで待機中のまま実行を始めない（まとめて取得するコミットの準備待ちに使う）"""
+        with self._lock:
+            for job in self._jobs:
+                if not job.finished and (job.since_date, job.until_date) == (since_date, until_date):
+                    return job
+            job = DiaryJob(next(self._ids), since_date, until_date)
+            job.ready = ready
+            self._jobs.append(job)
+            self._prune_finished()
+        self._executor.submit(self._run, job)
+        return job
+
+    def _prune_finished(self):
+        """終了済みのジョブを新しいものから一定件数だけ残す。_lockを取得した状態で呼び出す"""
+        finished = [job for job in self._jobs if job.finished]
+        for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            self._jobs.remove(job)
+
+    def jobs(self) -> List[DiaryJob]:
+        """追加順のジョブ一覧"""
+        with self._lock:
+            return list(self._jobs)
+
+    def has_active_jobs(self) -> bool:
+        """待機中・実行中のジョブがあるか"""
+        with self._lock:
+            return any(not job.finished for job in self._jobs)
+
+    def get(self, job_id: int) -> Optional[DiaryJob]:
+        with self._lock:
+            return next((job for job in self._jobs if job.job_id == job_id), None)
+
+    def cancel(self, job_id: int) -> bool:
+        """ジョブを中止する。待機中のジョブは実行せずにすぐ中止済みとする。終了済み・存在しない場合はFalse"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_token.cancel()
+        with self._lock:
+            not_started = job.started_at is None and not job.finished
+            if not_started:
+                job.status = JOB_CANCELLED
+        if not_started:
+            self._notify_finished(job)
+        return True
+
+    def cancel_all(self):
+        """待機中・実行中の全ジョブを中止"""
+        for job in self.jobs():
+            self.cancel(job.job_id)
+
+    def shutdown(self, wait: bool = False):
+        """全ジョブを中止してワーカーを終了"""
+        self.cancel_all()
+        self._executor.shutdown(wait=wait)
+
+    def apply_progress(self):
+        """溜まった進捗をまとめて取り出し、ジョブごとに最新の進捗から状態と詳細を更新する
+
+        TkのUIスレッドなど、ジョブの状態を表示する側のスレッドから呼び出す"""
+        for job in self.jobs():
+            events = job.progress.drain_latest()
+            if not events:
+                continue
+            with self._lock:
+                if job.finished:
+                    continue
+                job.status = JOB_FETCHING if isinstance(events[-1], FetchProgress) else JOB_GENERATING
+                job.detail = events[-1].format()
+
+    def _run(self, job: DiaryJob):
+        """ワーカースレッドでジョブを実行し、結果と終了状態を記録する"""
+        if job.ready is not None:
+            while not job.ready.wait(0.1) and not job.cancel_token.cancelled:
+                pass
+        with self._lock:
+            if job.finished:
+                return
+            job.started_at = time.monotonic()
+            job.status = JOB_FETCHING
+        try:
+            generator = self.get_generator()
+            job.result = generator.generate_diary(
+                since_date=job.since_date,
+                until_date=job.until_date,
+                cancel_token=job.cancel_token,
+                progress=job.progress.put
+            )
+            status = JOB_DONE
+        except CancelledError:
+            status = JOB_CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            status = JOB_FAILED
+        # apply_progressが終了後の状態を進捗で上書きしないよう、終了状態はロックを取得して記録する
+        with self._lock:
+            job.status = status
+            job.finished_at = time.monotonic()
+        self._notify_finished(job)
+
+    def _notify_finished(self, job: DiaryJob):
+        """ジョブの終了をon_finishedに通知し、終了を待っている側に知らせる"""
+        if self.on_finished is not None:
+            try:
+                self.on_finished(job)
+            except Exception as e:
+                print(f"ジョブ終了時の処理でエラーが発生しました: #{job.job_id} {e}")
+        job.done.set()
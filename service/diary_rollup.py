@@ -0,0 +1,221 @@
+import hashlib
+import re
+from datetime import date, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from service.day_summary_cache import DaySummaryCache
+from service.diary_file_service import build_diary_path, extract_sections
+from service.prompt_compactor import format_date_label
+from utils.cancellation import CancellationToken, raise_if_cancelled
+from utils.config_manager import get_data_dir, load_config
+from utils.file_utils import atomic_write_text
+from utils.token_estimator import estimate_tokens
+
+if TYPE_CHECKING:
+    from external_service.gemini_api import GeminiAPIClient
+
+ROLLUP_SECTIONS = ('## 作業内容', '## 学びと気づき')
+FREE_TEXT_HEADING = '## 自由記載'
+HEADING_PATTERN = re.compile(r'^(#+) ', re.MULTILINE)
+
+
+class RollupResult:
+    """週次・月次まとめ1件分の結果"""
+
+    def __init__(self, label: str, path: Path, input_tokens: int, output_tokens: int,
+                 source_tokens: int, cached: bool):
+        self.label = label
+        self.path = path
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.source_tokens = source_tokens
+        self.cached = cached
+
+
+def week_start(day: date) -> date:
+    """その日を含む週の月曜日"""
+    return day - timedelta(days=day.weekday())
+
+
+def _demote_headings(text: str, levels: int = 2) -> str:
+    """抜粋を入れ子にするため見出しのレベルを下げる"""
+    return HEADING_PATTERN.sub(lambda match: '#' * (len(match.group(1)) + levels) + ' ', text)
+
+
+def _period_label(days: List[date]) -> str:
+    return f"{days[0].strftime('%m/%d')}〜{days[-1].strftime('%m/%d')}"
+
+
+class DiaryRollupGenerator:
+    """保存済みの日誌から週次・月次のまとめを生成する。GitHubへの問い合わせは行わない
+
+    月次は月内の週（月をまたぐ週は月内の日のみ）のまとめを入力にするため、週次の生成結果をそのまま再利用する。
+    入力が前回と同じ期間はキャッシュした結果を使い、AIを呼び出さない"""
+
+    def __init__(self, ai_client: 'GeminiAPIClient', rollup_dir: Optional[Path] = None,
+                 cache: Optional[DaySummaryCache] = None):
+        self.ai_client = ai_client
+        self._rollup_dir = rollup_dir
+        self.cache = cache or DaySummaryCache(get_data_dir() / 'rollup_cache')
+        self.prompt_template_path = Path(__file__).parent.parent / "utils" / "rollup_prompt_template.md"
+
+    @property
+    def rollup_dir(self) -> Path:
+        """まとめの保存先。未設定時は日誌フォルダと同じ階層の02_Rollup"""
+        if self._rollup_dir is None:
+            config = load_config()
+            rollup_path = config.get('Path', 'rollup_path', fallback='')
+            self._rollup_dir = (Path(rollup_path) if rollup_path
+                                else Path(config.get('Path', 'daily_path')).parent / '02_Rollup')
+        return self._rollup_dir
+
+    def _load_prompt_template(self) -> str:
+        """まとめ用のプロンプトテンプレートを読み込む"""
+        try:
+            return self.prompt_template_path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            raise Exception(f"プロンプトテンプレートファイルが見つかりません: {self.prompt_template_path}")
+
+    @staticmethod
+    def _load_daily_excerpt(day: date) -> Optional[str]:
+        """保存済みの日誌から作業内容と学びと気づきのみを取り出す。日誌がない日はNone"""
+        try:
+            content = build_diary_path(day.strftime('%Y-%m-%d')).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            return None
+
+        sections = extract_sections(content, ROLLUP_SECTIONS)
+        if not sections:
+            return None
+        body = "\n\n".join(f"#{heading}\n\n{_demote_headings(text)}" for heading, text in sections.items())
+        return f"### {format_date_label(day.isoformat())}\n\n{body}"
+
+    def _summarize(self, key: str, label: str, source_text: str, prompt_template: str,
+                   cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int, bool]:
+        """抜粋からまとめを生成。入力が前回と同じ場合はキャッシュを返す"""
+        model_name = self.ai_client.default_model or ''
+        fingerprint = hashlib.sha256(f"{model_name}\n{prompt_template}\n{source_text}".encode('utf-8')).hexdigest()
+        cached_content = self.cache.get(key, fingerprint)
+        if cached_content is not None:
+            print(f"   キャッシュ使用: {label}")
+            return cached_content, 0, 0, True
+
+        prompt = f"{prompt_template}\n\n## 対象期間\n\n{label}\n\n## 日誌の抜粋\n\n{source_text}"
+        content, input_tokens, output_tokens, used_model = self.ai_client.generate(prompt, cancel_token)
+        # 高速モデルへの切り替えやヘッジ要求で既定のモデル以外の結果になった場合は、既定のモデルの結果として保存しない
+        if used_model == self.ai_client.default_model:
+            self.cache.put(key, fingerprint, content, used_model, input_tokens, output_tokens)
+        print(f"   生成: {label} (入力トークン={input_tokens} 出力トークン={output_tokens})")
+        return content, input_tokens, output_tokens, False
+
+    def _summarize_days(self, days: List[date], prompt_template: str,
+                        cancel_token: Optional[CancellationToken] = None) -> Optional[Tuple[str, int, int, bool, int]]:
+        """連続した日の日誌をまとめる。日誌が1件もない場合はNone"""
+        excerpts = [excerpt for excerpt in map(self._load_daily_excerpt, days) if excerpt]
+        if not excerpts:
+            return None
+
+        source_text = "\n\n".join(excerpts)
+        key = f"days-{days[0].isoformat()}_{days[-1].isoformat()}"
+        label = f"{days[0].year}年 {_period_label(days)}"
+        content, input_tokens, output_tokens, cached = self._summarize(
+            key, label, source_text, prompt_template, cancel_token
+        )
+        return content, input_tokens, output_tokens, cached, estimate_tokens(source_text)
+
+    def _write_note(self, path: Path, content: str) -> None:
+        """まとめを保存。既存ノートの自由記載は引き継ぎ、内容が変わらない場合は書き込まない"""
+        try:
+            existing_content: Optional[str] = path.read_text(encoding='utf-8')
+        except FileNotFoundError:
+            existing_content = None
+
+        content = content.rstrip()
+        free_text = extract_sections(existing_content or '', [FREE_TEXT_HEADING]).get(FREE_TEXT_HEADING)
+        if free_text and FREE_TEXT_HEADING not in extract_sections(content, [FREE_TEXT_HEADING]):
+            if not content.endswith(FREE_TEXT_HEADING):
+                content += f"\n\n{FREE_TEXT_HEADING}"
+            content += f"\n\n{free_text}"
+        content += "\n"
+
+        if content == existing_content:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(path, content)
+
+    def generate_week(self, monday: date, prompt_template: Optional[str] = None,
+                      cancel_token: Optional[CancellationToken] = None) -> Optional[RollupResult]:
+        """月曜日から始まる1週間のまとめを生成して保存。日誌がない週はNone"""
+        prompt_template = prompt_template or self._load_prompt_template()
+        days = [monday + timedelta(days=offset) for offset in range(7)]
+        summary = self._summarize_days(days, prompt_template, cancel_token)
+        if summary is None:
+            return None
+
+        content, input_tokens, output_tokens, cached, source_tokens = summary
+        iso_year, iso_week, _ = monday.isocalendar()
+        path = self.rollup_dir / f"{iso_year}-W{iso_week:02d}_週次振り返り.md"
+        self._write_note(path, content)
+        return RollupResult(f"{iso_year}年 第{iso_week}週 ({_period_label(days)})", path,
+                            input_tokens, output_tokens, source_tokens, cached)
+
+    def generate_month(self, year: int, month: int, prompt_template: Optional[str] = None,
+                       cancel_token: Optional[CancellationToken] = None) -> Optional[RollupResult]:
+        """月内の週ごとのまとめを入力にして1か月のまとめを生成して保存。日誌がない月はNone"""
+        prompt_template = prompt_template or self._load_prompt_template()
+        first_day = date(year, month, 1)
+        segments: List[List[date]] = []
+        day = first_day
+        while day.month == month:
+            if not segments or week_start(day) != week_start(segments[-1][0]):
+                segments.append([])
+            segments[-1].append(day)
+            day += timedelta(days=1)
+
+        week_summaries = []
+        input_tokens = output_tokens = source_tokens = 0
+        all_cached = True
+        for segment in segments:
+            summary = self._summarize_days(segment, prompt_template, cancel_token)
+            if summary is None:
+                continue
+            content, segment_input, segment_output, cached, segment_source = summary
+            week_summaries.append(f"### {_period_label(segment)}\n\n{_demote_headings(content.strip())}")
+            input_tokens += segment_input
+            output_tokens += segment_output
+            source_tokens += segment_source
+            all_cached = all_cached and cached
+
+        if not week_summaries:
+            return None
+
+        label = f"{year}年{month}月"
+        content, month_input, month_output, cached = self._summarize(
+            f"month-{year}-{month:02d}", label, "\n\n".join(week_summaries), prompt_template, cancel_token
+        )
+        path = self.rollup_dir / f"{year}-{month:02d}_月次振り返り.md"
+        self._write_note(path, content)
+        return RollupResult(label, path, input_tokens + month_input, output_tokens + month_output,
+                            source_tokens, all_cached and cached)
+
+    def generate_rollups(self, since_date: date, until_date: date,
+                         cancel_token: Optional[CancellationToken] = None) -> List[RollupResult]:
+        """期間に含まれる週と月のまとめを生成。入力が変わっていない週・月はAIを呼び出さない"""
+        self.ai_client.initialize()
+        prompt_template = self._load_prompt_template()
+        results: List[Optional[RollupResult]] = []
+
+        monday = week_start(since_date)
+        while monday <= until_date:
+            raise_if_cancelled(cancel_token)
+            results.append(self.generate_week(monday, prompt_template, cancel_token))
+            monday += timedelta(days=7)
+
+        year, month = since_date.year, since_date.month
+        while (year, month) <= (until_date.year, until_date.month):
+            raise_if_cancelled(cancel_token)
+            results.append(self.generate_month(year, month, prompt_template, cancel_token))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        return [result for result in results if result is not None]
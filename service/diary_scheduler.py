@@ -0,0 +1,247 @@
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from service.diary_file_service import build_diary_path, save_diary
+from service.run_metrics import record_run
+from utils.cancellation import CancellationToken
+from utils.config_manager import get_data_dir, load_config
+from utils.exceptions import CancelledError
+from utils.file_utils import atomic_write_text
+
+if TYPE_CHECKING:
+    from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+JST = timezone(timedelta(hours=9))
+
+
+class SchedulerState:
+    """日次実行の状態（同期した日時・日ごとの同期済みのコミット・最後の実行結果）をファイルに保存する"""
+
+    FIELDS = ('synced_at', 'synced_hashes', 'last_run_at', 'last_success_at', 'last_error', 'last_result')
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.synced_at: Optional[str] = None
+        # 日付(YYYY-MM-DD)ごとの日誌に書き込み済みのコミットのハッシュ。以前の形式の状態ファイルではNone
+        self.synced_hashes: Optional[Dict[str, List[str]]] = None
+        self.last_run_at: Optional[str] = None
+        self.last_success_at: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.last_result: Optional[Dict] = None
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return
+        for field in self.FIELDS:
+            setattr(self, field, data.get(field))
+
+    @classmethod
+    def load(cls) -> 'SchedulerState':
+        """データディレクトリのscheduler_state.jsonを読み込む"""
+        return cls(get_data_dir() / 'scheduler_state.json')
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+
+
+class DiaryScheduler:
+    """毎日決まった時刻に、前回の同期以降の新しいコミットから日誌を作成して日付ごとのノートへ追記する常駐処理
+
+    ジェネレーター（GitHubのセッション・Geminiクライアント）は実行をまたいで保持し、実行の少し前に接続を準備する。
+    待機中はEvent.waitで眠るためCPUをほとんど使わない。停止していた間の日は次の実行でまとめて作成する"""
+
+    DEFAULT_RUN_AT = '23:30'
+    DEFAULT_MAX_CATCH_UP_DAYS = 7
+    DEFAULT_RETRY_MINUTES = 30
+    WARM_UP_SECONDS = 60
+    # 設定の変更や時計のずれ（スリープ復帰など）に追従するため、長い待機もこの秒数ごとに起きて予定を計算し直す
+    MAX_SLEEP_SECONDS = 300
+
+    def __init__(self, generator: 'ProgrammingDiaryGenerator', state: Optional[SchedulerState] = None,
+                 clock: Optional[Callable[[], datetime]] = None):
+        self.generator = generator
+        self.state = state or SchedulerState.load()
+        self.runs = 0
+        self._now = clock or (lambda: datetime.now(JST))
+        self._stop = threading.Event()
+        self._cancel_token: Optional[CancellationToken] = None
+        self._retry_at: Optional[datetime] = None
+
+    def _run_time(self, day: date) -> datetime:
+        """config.iniの[Scheduler] run_at（HH:MM、JST）からその日の実行時刻を求める"""
+        run_at = load_config().get('Scheduler', 'run_at', fallback=self.DEFAULT_RUN_AT)
+        try:
+            hour, minute = (int(part) for part in run_at.split(':'))
+        except ValueError:
+            print(f"[Scheduler] run_at の形式が不正なため {self.DEFAULT_RUN_AT} を使用します: {run_at}")
+            hour, minute = (int(part) for part in self.DEFAULT_RUN_AT.split(':'))
+        return datetime(day.year, day.month, day.day, hour, minute, tzinfo=JST)
+
+    def next_run_at(self, now: datetime) -> datetime:
+        """次に実行する時刻。直近の予定時刻より後に成功していなければ、その予定時刻（過ぎていればすぐに実行）"""
+        if self._retry_at is not None:
+            return self._retry_at
+
+        today = now.astimezone(JST).date()
+        due = self._run_time(today)
+        if due > now:
+            due = self._run_time(today - timedelta(days=1))
+        if self.state.last_success_at is not None and datetime.fromisoformat(self.state.last_success_at) < due:
+            return due
+
+        next_run = self._run_time(today)
+        return next_run if next_run > now else self._run_time(today + timedelta(days=1))
+
+    def sync_range(self, now: datetime) -> Tuple[str, str]:
+        """取得する期間。前回同期した日から今日まで（初回は今日のみ、[Scheduler] max_catch_up_daysの日数まで）"""
+        today = now.astimezone(JST).date()
+        since = today
+        if self.state.synced_at is not None:
+            since = datetime.fromisoformat(self.state.synced_at).astimezone(JST).date()
+
+        max_days = load_config().getint('Scheduler', 'max_catch_up_days', fallback=self.DEFAULT_MAX_CATCH_UP_DAYS)
+        earliest = today - timedelta(days=max(1, max_days) - 1)
+        if since < earliest:
+            print(f"前回の同期から{(today - since).days}日経過しているため、{earliest}以降のみ作成します")
+            since = earliest
+        return since.isoformat(), today.isoformat()
+
+    def _new_commits(self, commits: List[Dict]) -> List[Dict]:
+        """まだ日誌に書き込んでいないコミットのみを返す
+
+        コミットの日時ではなくハッシュで判定するため、前回の実行より前に作成して後からpushしたコミットも対象になる。
+        """
+        if self.state.synced_at is None:
+            return commits
+        if self.state.synced_hashes is None:
+            # ハッシュを記録していない以前の形式の状態ファイルでは、前回の同期より後の日時のコミットのみとする
+            synced_at = datetime.fromisoformat(self.state.synced_at)
+            return [commit for commit in commits if datetime.fromisoformat(commit['timestamp']) > synced_at]
+        return [commit for commit in commits
+                if commit.get('hash') not in self.state.synced_hashes.get(commit['timestamp'][:10], ())]
+
+    def _record_synced(self, commits: List[Dict], next_since_date: str) -> None:
+        """書き込んだコミットのハッシュを記録する。次回の取得期間（next_since_date以降）より前の日の記録は捨てる"""
+        synced_hashes = dict(self.state.synced_hashes or {})
+        for commit in commits:
+            hashes = synced_hashes.setdefault(commit['timestamp'][:10], [])
+            if commit.get('hash') not in hashes:
+                hashes.append(commit.get('hash'))
+        self.state.synced_hashes = {day: hashes for day, hashes in sorted(synced_hashes.items())
+                                    if day >= next_since_date}
+
+    def _schedule_retry(self, now: datetime) -> None:
+        """[Scheduler] retry_minutes（既定30分）後に再実行する"""
+        retry_minutes = load_config().getfloat('Scheduler', 'retry_minutes', fallback=self.DEFAULT_RETRY_MINUTES)
+        self._retry_at = now + timedelta(minutes=retry_minutes)
+
+    def run_once(self) -> Dict:
+        """前回の同期以降の新しいコミットから日ごとに日誌を作成して保存する。失敗した場合は同期日時を進めない"""
+        now = self._now()
+        try:
+            since_date, until_date = self.sync_range(now)
+            with record_run('daemon', since_date, until_date) as run:
+                result = self._sync(now, since_date, until_date)
+                run.update(commits=result['commits'], days=len(result['saved']))
+                return result
+        except Exception as e:
+            self.state.last_error = str(e)
+            self.state.save()
+            # 状態ファイルの同期日時が壊れている場合など、_syncの前に失敗した場合も再実行の時刻を決める
+            if not isinstance(e, CancelledError):
+                self._schedule_retry(now)
+            raise
+
+    def _sync(self, now: datetime, since_date: str, until_date: str) -> Dict:
+        """run_onceの本体"""
+        token = self._cancel_token = CancellationToken()
+        start = time.perf_counter()
+        self.state.last_run_at = now.isoformat()
+        print(f"日次の日誌作成を開始します: {since_date} から {until_date}")
+
+        try:
+            # レート制限などで全件を取得できなかった場合はAPIErrorで失敗させ、同期済みの状態を進めずに再実行する
+            commits = self._new_commits(self.generator.fetch_commits(since_date, until_date, token))
+            commits_by_day: Dict[str, List[Dict]] = {}
+            for commit in commits:
+                commits_by_day.setdefault(commit['timestamp'][:10], []).append(commit)
+
+            saved: Dict[str, str] = {}
+            input_tokens = output_tokens = 0
+            for day in sorted(commits_by_day):
+                content, day_input_tokens, day_output_tokens, _ = self.generator.generate_day(
+                    day, commits_by_day[day], token
+                )
+                file_path = build_diary_path(day)
+                save_diary(file_path, content)
+                saved[day] = str(file_path)
+                input_tokens += day_input_tokens
+                output_tokens += day_output_tokens
+        finally:
+            self._cancel_token = None
+
+        # 次回は後からpushされたコミットも含めて取得し直すため、この期間の取得結果は破棄する
+        self.generator.commit_cache.invalidate(since_date, until_date)
+        self._retry_at = None
+        self.runs += 1
+        self._record_synced(commits, until_date)
+        self.state.synced_at = now.isoformat()
+        self.state.last_success_at = now.isoformat()
+        self.state.last_error = None
+        self.state.last_result = {
+            'since': since_date,
+            'until': until_date,
+            'commits': len(commits),
+            'saved': saved,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'elapsed_seconds': round(time.perf_counter() - start, 2),
+        }
+        self.state.save()
+        print(f"日次の日誌作成が完了しました: 新しいコミット{len(commits)}件、{len(saved)}日分を保存")
+        return self.state.last_result
+
+    def _warm_up(self) -> None:
+        """実行直前にGemini・GitHubへの接続を準備する"""
+        try:
+            self.generator.prepare()
+        except Exception as e:
+            print(f"接続の準備に失敗しました: {e}")
+
+    def run_forever(self) -> None:
+        """stop()が呼ばれるまで、予定時刻ごとにrun_onceを実行する"""
+        warmed_for: Optional[datetime] = None
+        while not self._stop.is_set():
+            now = self._now()
+            next_run = self.next_run_at(now)
+            seconds = (next_run - now).total_seconds()
+            if seconds > 0:
+                if seconds <= self.WARM_UP_SECONDS and warmed_for != next_run:
+                    self._warm_up()
+                    warmed_for = next_run
+                until_warm_up = seconds - self.WARM_UP_SECONDS
+                self._stop.wait(min(until_warm_up if until_warm_up > 0 else seconds, self.MAX_SLEEP_SECONDS))
+                continue
+
+            try:
+                self.run_once()
+            except CancelledError:
+                print("日次の日誌作成を中止しました")
+            except Exception as e:
+                retry = f"{self._retry_at:%H:%M}に再実行します" if self._retry_at is not None else "次の予定時刻に再実行します"
+                print(f"日次の日誌作成に失敗しました。{retry}: {e}")
+
+    def stop(self) -> None:
+        """待機を終了し、実行中の作成があれば中止する"""
+        self._stop.set()
+        token = self._cancel_token
+        if token is not None:
+            token.cancel()
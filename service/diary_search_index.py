@@ -0,0 +1,179 @@
+import re
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from utils.config_manager import get_data_dir, load_config
+
+DIARY_FILE_PATTERN = '*_プログラミング学習日誌.md'
+DIARY_DATE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})_')
+# trigramトークナイザーは3文字未満の語を索引で引けないため、短い語はLIKEで本文を照合する
+MIN_MATCH_CHARS = 3
+SNIPPET_CHARS = 40
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS diary_files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    date TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS diary_fts USING fts5(content, tokenize = 'trigram');
+"""
+
+
+class SearchHit:
+    """検索結果の1件分"""
+
+    def __init__(self, path: Path, date: str, snippet: str):
+        self.path = path
+        self.date = date
+        self.snippet = snippet
+
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _make_snippet(content: str, terms: List[str]) -> str:
+    """最初に見つかった検索語の前後を1行の抜粋にする"""
+    lowered = content.lower()
+    positions = [position for position in (lowered.find(term.lower()) for term in terms) if position >= 0]
+    position = min(positions, default=0)
+    start = max(0, position - SNIPPET_CHARS // 2)
+    snippet = " ".join(content[start:start + SNIPPET_CHARS].split())
+    return ("…" if start > 0 else "") + snippet + ("…" if start + SNIPPET_CHARS < len(content) else "")
+
+
+class DiarySearchIndex:
+    """日誌フォルダの全文検索インデックス（SQLite FTS5、trigramトークナイザー）
+
+    保存時の更新と、更新日時・サイズを比較する再走査で差分のみを反映する"""
+
+    def __init__(self, daily_dir: Optional[Path] = None, db_path: Optional[Path] = None):
+        self._daily_dir = daily_dir
+        self._db_path = db_path
+
+    @property
+    def daily_dir(self) -> Path:
+        """検索対象の日誌フォルダ。未指定時は設定ファイルのdaily_pathを使用"""
+        if self._daily_dir is None:
+            self._daily_dir = Path(load_config().get('Path', 'daily_path'))
+        return self._daily_dir
+
+    @property
+    def db_path(self) -> Path:
+        """インデックスの保存先。未指定時はデータディレクトリ配下を使用"""
+        if self._db_path is None:
+            self._db_path = get_data_dir() / 'diary_index.sqlite3'
+        return self._db_path
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(self.db_path, timeout=5)
+        connection.executescript(SCHEMA)
+        return connection
+
+    @staticmethod
+    def _diary_date(path: Path) -> str:
+        match = DIARY_DATE_PATTERN.match(path.name)
+        return match.group(1) if match else ''
+
+    @staticmethod
+    def _upsert(connection: sqlite3.Connection, path: Path, mtime_ns: int, size: int, content: str) -> None:
+        row = connection.execute("SELECT id FROM diary_files WHERE path = ?", (str(path),)).fetchone()
+        if row is None:
+            cursor = connection.execute(
+                "INSERT INTO diary_files (path, date, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                (str(path), DiarySearchIndex._diary_date(path), mtime_ns, size)
+            )
+            connection.execute("INSERT INTO diary_fts (rowid, content) VALUES (?, ?)", (cursor.lastrowid, content))
+        else:
+            connection.execute("UPDATE diary_files SET mtime_ns = ?, size = ? WHERE id = ?", (mtime_ns, size, row[0]))
+            connection.execute("UPDATE diary_fts SET content = ? WHERE rowid = ?", (content, row[0]))
+
+    @staticmethod
+    def _delete(connection: sqlite3.Connection, file_id: int) -> None:
+        connection.execute("DELETE FROM diary_fts WHERE rowid = ?", (file_id,))
+        connection.execute("DELETE FROM diary_files WHERE id = ?", (file_id,))
+
+    def update_file(self, path: Path) -> None:
+        """1つの日誌ファイルをインデックスに反映。ファイルがなければインデックスから削除する"""
+        with closing(self._connect()) as connection, connection:
+            try:
+                stat = path.stat()
+                content = path.read_text(encoding='utf-8')
+            except FileNotFoundError:
+                row = connection.execute("SELECT id FROM diary_files WHERE path = ?", (str(path),)).fetchone()
+                if row is not None:
+                    self._delete(connection, row[0])
+                return
+            self._upsert(connection, path, stat.st_mtime_ns, stat.st_size, content)
+
+    def refresh(self) -> int:
+        """日誌フォルダを走査し、更新日時・サイズが変わったファイルと削除されたファイルのみ反映する。反映件数を返す
+
+        日誌フォルダの外で保存時に追加したノートは、ファイルが残っている限りインデックスに残す"""
+        current: Dict[str, Tuple[Path, int, int]] = {}
+        if self.daily_dir.is_dir():
+            for path in self.daily_dir.glob(DIARY_FILE_PATTERN):
+                stat = path.stat()
+                current[str(path)] = (path, stat.st_mtime_ns, stat.st_size)
+
+        changed = 0
+        with closing(self._connect()) as connection, connection:
+            indexed = {path: (file_id, mtime_ns, size) for file_id, path, mtime_ns, size
+                       in connection.execute("SELECT id, path, mtime_ns, size FROM diary_files")}
+
+            for path_text, (file_id, _, _) in indexed.items():
+                if path_text in current:
+                    continue
+                # --outputなどで日誌フォルダの外に保存したノートは走査の対象外のため、ファイルが消えた場合のみ削除する
+                path = Path(path_text)
+                if path.parent == self.daily_dir or not path.exists():
+                    self._delete(connection, file_id)
+                    changed += 1
+
+            for path_text, (path, mtime_ns, size) in current.items():
+                if path_text in indexed and indexed[path_text][1:] == (mtime_ns, size):
+                    continue
+                try:
+                    content = path.read_text(encoding='utf-8')
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"検索インデックスに追加できませんでした: {path.name} {e}")
+                    continue
+                self._upsert(connection, path, mtime_ns, size, content)
+                changed += 1
+
+        return changed
+
+    def search(self, query: str, limit: int = 50) -> List[SearchHit]:
+        """空白区切りのすべての語を含む日誌を新しい日付順に返す"""
+        terms = query.split()
+        if not terms:
+            return []
+
+        conditions = []
+        parameters: List[object] = []
+        long_terms = [term for term in terms if len(term) >= MIN_MATCH_CHARS]
+        if long_terms:
+            conditions.append("diary_fts MATCH ?")
+            parameters.append(" AND ".join('"{}"'.format(term.replace('"', '""')) for term in long_terms))
+        for term in terms:
+            if len(term) < MIN_MATCH_CHARS:
+                conditions.append("diary_fts.content LIKE ? ESCAPE '\\'")
+                parameters.append(f"%{_escape_like(term)}%")
+        parameters.append(limit)
+
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                "SELECT diary_files.path, diary_files.date, diary_fts.content "
+                "FROM diary_fts JOIN diary_files ON diary_files.id = diary_fts.rowid "
+                f"WHERE {' AND '.join(conditions)} "
+                "ORDER BY diary_files.date DESC, diary_files.path DESC LIMIT ?",
+                parameters
+            ).fetchall()
+
+        return [SearchHit(Path(path), date, _make_snippet(content, terms)) for path, date, content in rows]
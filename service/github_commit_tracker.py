@@ -1,17 +1,75 @@
 import os
-from concurrent.futures import ThreadPoolExecutor
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError, as_completed
 from datetime import datetime, timedelta, timezone
 from typing import Callable, Dict, List, Any, Tuple, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 from service.git_commit_history import BaseCommitService
+from service.progress import FetchProgress, ProgressCallback
+from utils.cancellation import CancellationToken, activate, on_cancel, raise_if_cancelled
+from utils.exceptions import APIError, CancelledError
+from utils.tracing import bind, span
+
+
+class _AbortableConnectionMixin:
+    """中止時に通信中のソケットを切断し、応答待ちのスレッドをすぐに解放する"""
+
+    def request(self, *args, **kwargs):
+        on_cancel(self._abort)
+        return super().request(*args, **kwargs)
+
+    def _abort(self):
+        sock = self.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _AbortableHTTPConnection(_AbortableConnectionMixin, HTTPConnection):
+    pass
+
+
+class _AbortableHTTPSConnection(_AbortableConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _AbortableHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _AbortableHTTPConnection
+
+
+class _AbortableHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _AbortableHTTPSConnection
+
+
+class _AbortableHTTPAdapter(HTTPAdapter):
+    """中止トークンで通信中の接続を切断できる接続プールを使うアダプター"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _AbortableHTTPConnectionPool,
+            'https': _AbortableHTTPSConnectionPool,
+        }
 
 
 class GitHubCommitTracker(BaseCommitService):
     """GitHubユーザーの複数リポジトリのコミット履歴をAPI経由で取得"""
 
     MAX_WORKERS = 8
+    DEFAULT_BASE_URL = 'https://api.github.com'
+    # 長い期間のコミットを少ない要求で取得するため、GitHub APIの上限の件数をページごとに要求する
+    COMMITS_PER_PAGE = 100
+    # コミットがないものとして扱う応答（存在しないリポジトリ・空のリポジトリ）
+    NO_COMMITS_STATUSES = (404, 409)
 
     def __init__(self, token: Optional[str] = None, username: Optional[str] = None):
         super().__init__()
@@ -25,7 +83,73 @@ class GitHubCommitTracker(BaseCommitService):
             'Authorization': f'token {self.token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        self.base_url = 'https://api.github.com'
+        # GitHub Enterpriseやローカルのスタブサーバーを使う場合はGITHUB_API_URLで接続先を変更できる
+        self.base_url = os.getenv('GITHUB_API_URL', self.DEFAULT_BASE_URL).rstrip('/')
+        # 並列取得のスレッド数分の接続を保持し、リポジトリごとのTLS接続をやり直さないようにする
+        # 中止時は通信中の接続を切断し、タイムアウトを待たずにスレッドとソケットを解放する
+        self.session = requests.Session()
+        adapter = _AbortableHTTPAdapter(pool_maxsize=self.MAX_WORKERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # 直近の応答ヘッダーから分かるAPIの残り回数とリセット時刻（UNIX時刻）。未取得の間はNone
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset_at: Optional[float] = None
+        self.bytes_received = 0
+        self._stats_lock = threading.Lock()
+        # 取得中のリポジトリ一覧。同時に実行される複数の日誌生成は1回の一覧取得を共有する
+        self._repositories_in_flight: Optional[Future] = None
+
+    def _get(self, url: str, params: Dict[str, Any],
+             cancel_token: Optional[CancellationToken] = None) -> requests.Response:
+        """GETリクエストを送信。中止された場合は通信中の接続を切断してCancelledErrorを送出する"""
+        with span('github.request', path=url[len(self.base_url):], page=params.get('page')) as current:
+            if cancel_token is None:
+                response = self.session.get(url, headers=self.headers, params=params, timeout=30)
+            else:
+                with activate(cancel_token):
+                    try:
+                        response = self.session.get(url, headers=self.headers, params=params, timeout=30)
+                    except requests.exceptions.RequestException:
+                        cancel_token.raise_if_cancelled()
+                        raise
+            current.set(status=response.status_code)
+        self._record_response(response)
+        return response
+
+    def _record_response(self, response: requests.Response):
+        """受信した本文の容量と、応答ヘッダーから分かるAPIの残り回数・リセット時刻を記録"""
+        try:
+            size = len(response.content)
+        except TypeError:
+            size = 0
+        try:
+            remaining: Optional[int] = int(response.headers['X-RateLimit-Remaining'])
+            reset_at = float(response.headers.get('X-RateLimit-Reset', 0))
+        except (KeyError, TypeError, ValueError):
+            remaining = None
+            reset_at = 0.0
+
+        with self._stats_lock:
+            self.bytes_received += size
+            if remaining is None:
+                return
+            # 並列取得の応答は順不同で届くため、同じリセット時刻の間は最小の残り回数を使う
+            if reset_at == self.rate_limit_reset_at and self.rate_limit_remaining is not None:
+                remaining = min(remaining, self.rate_limit_remaining)
+            self.rate_limit_remaining = remaining
+            self.rate_limit_reset_at = reset_at
+
+    @staticmethod
+    def _is_rate_limited(response: requests.Response) -> bool:
+        """403の応答がレート制限（残り回数0・Retry-After付き）によるものか"""
+        return (response.headers.get('X-RateLimit-Remaining') == '0'
+                or response.headers.get('Retry-After') is not None)
+
+    def has_rate_budget(self, required: int) -> bool:
+        """APIの残り回数がrequired以上あるか。未取得またはリセット時刻を過ぎている場合はTrue"""
+        if self.rate_limit_remaining is None or time.time() >= (self.rate_limit_reset_at or 0):
+            return True
+        return self.rate_limit_remaining >= required
 
     def _convert_date_to_utc_range(self, start_date: str, end_date: Optional[str] = None) -> Tuple[str, str]:
         """日付文字列をUTC ISO形式の範囲に変換"""
@@ -40,7 +164,38 @@ class GitHubCommitTracker(BaseCommitService):
             until_jst.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
         )
 
-    def get_user_repositories(self) -> List[Dict[str, Any]]:
+    def get_user_repositories(self, cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
+        """認証ユーザーがアクセス可能な全リポジトリを取得。別スレッドが取得中であればその結果を共有する"""
+        with self._stats_lock:
+            pending = self._repositories_in_flight
+            if pending is None:
+                pending = self._repositories_in_flight = Future()
+                is_owner = True
+            else:
+                is_owner = False
+
+        if not is_owner:
+            while True:
+                try:
+                    return list(pending.result(timeout=0.1))
+                except TimeoutError:
+                    raise_if_cancelled(cancel_token)
+                except CancelledError:
+                    # 取得していた側が中止した場合は自分で取得し直す
+                    return self._list_repositories(cancel_token)
+
+        try:
+            repos = self._list_repositories(cancel_token)
+            pending.set_result(repos)
+            return list(repos)
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._stats_lock:
+                self._repositories_in_flight = None
+
+    def _list_repositories(self, cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
         """認証ユーザーがアクセス可能な全リポジトリをページネーションで取得"""
         repos = []
         page = 1
@@ -56,24 +211,23 @@ class GitHubCommitTracker(BaseCommitService):
             }
 
             try:
-                response = requests.get(url, headers=self.headers, params=params, timeout=30)
-
-                if response.status_code != 200:
-                    print(f"リポジトリ取得エラー: {response.status_code}")
-                    break
+                response = self._get(url, params, cancel_token)
+            except requests.exceptions.RequestException as e:
+                print(f"リポジトリ取得中にネットワークエラーが発生: {e}")
+                raise APIError(f"リポジトリ一覧を取得できませんでした: {e}")
 
-                page_repos = response.json()
-                if not page_repos:
-                    break
+            if response.status_code != 200:
+                print(f"リポジトリ取得エラー: {response.status_code}")
+                raise APIError(f"リポジトリ一覧を取得できませんでした: HTTP {response.status_code}")
 
-                repos.extend(page_repos)
-                page += 1
+            page_repos = response.json()
+            if not page_repos:
+                break
 
-                if len(page_repos) < per_page:
-                    break
+            repos.extend(page_repos)
+            page += 1
 
-            except requests.exceptions.RequestException as e:
-                print(f"リポジトリ取得中にネットワークエラーが発生: {e}")
+            if len(page_repos) < per_page:
                 break
 
         return repos
@@ -83,53 +237,120 @@ class GitHubCommitTracker(BaseCommitService):
         """since以降にpushされていないリポジトリを除外し、無駄なAPI呼び出しを省く"""
         return [repo for repo in repos if repo.get('pushed_at') is None or repo['pushed_at'] >= since]
 
+    def _discover_repositories(self, since: str,
+                               cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
+        """アクセス可能なリポジトリのうち、since以降にpushされたものを取得対象として返す"""
+        with span('github.discover_repositories') as current:
+            all_repos = self.get_user_repositories(cancel_token)
+            repos = self._filter_repos_by_push_date(all_repos, since)
+            current.set(repositories=len(all_repos), targets=len(repos))
+            return repos
+
     def _collect_commits(self, repos: List[Dict[str, Any]],
-                         fetch_commits: Callable[[str], List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
-        """リポジトリごとのコミット取得を並列実行し、結果をまとめる"""
+                         fetch_commits: Callable[[str], List[Dict[str, Any]]],
+                         cancel_token: Optional[CancellationToken] = None,
+                         progress: Optional[ProgressCallback] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """リポジトリごとのコミット取得を並列実行し、結果をまとめる。1リポジトリ終わるごとに進捗を通知する"""
         repo_names = [repo['name'] for repo in repos]
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        start = time.perf_counter()
+        start_bytes = self.bytes_received
+
+        def report():
+            if progress is not None:
+                progress(FetchProgress(
+                    len(results), len(repo_names), sum(len(commits) for commits in results.values()),
+                    self.bytes_received - start_bytes, time.perf_counter() - start, self.rate_limit_remaining
+                ))
+
+        report()
+        with span('github.fetch_repos', repos=len(repo_names)) as current, \
+                ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = {executor.submit(bind(fetch_commits), name): name for name in repo_names}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                report()
+            current.set(commits=sum(len(commits) for commits in results.values()),
+                        bytes=self.bytes_received - start_bytes)
+        raise_if_cancelled(cancel_token)
+
+        return {name: results[name] for name in repo_names if results[name]}
+
+    def _get_repo_commits(self, repo_name: str, since: str, until: str,
+                          cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
+        """リポジトリの期間内のコミット一覧をページネーションで全件取得。全件を取得できなかった場合はAPIErrorを送出"""
+        with span('github.fetch_repo', repo=repo_name) as current:
+            commits = self._get_repo_commit_pages(repo_name, since, until, cancel_token)
+            current.set(commits=len(commits))
+            return commits
+
+    def _get_repo_commit_pages(self, repo_name: str, since: str, until: str,
+                               cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
+        """_get_repo_commitsの本体。コミット一覧を1ページずつ取得する
+
+        存在しない・空のリポジトリとアクセスを拒否されたリポジトリは空の一覧を返し、
+        レート制限・サーバーエラー・通信エラーで全件を取得できなかった場合はAPIErrorを送出する"""
+        url = f'{self.base_url}/repos/{self.username}/{repo_name}/commits'
+        commits: List[Dict[str, Any]] = []
+        page = 1
 
-        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
-            results = list(executor.map(fetch_commits, repo_names))
+        while True:
+            params = {
+                'author': self.username,
+                'since': since,
+                'until': until,
+                'per_page': self.COMMITS_PER_PAGE,
+                'page': page
+            }
 
-        return {name: commits for name, commits in zip(repo_names, results) if commits}
+            try:
+                response = self._get(url, params, cancel_token)
+            except requests.exceptions.RequestException as e:
+                print(f"リポジトリ {repo_name} のコミット取得中にネットワークエラー: {e}")
+                raise APIError(f"リポジトリ {repo_name} のコミットを取得できませんでした: {e}")
+
+            if response.status_code in self.NO_COMMITS_STATUSES:
+                return []
+            if response.status_code == 403 and not self._is_rate_limited(response):
+                # アクセス権のないリポジトリ（SAML認証が必要な組織など）は再実行しても取得できないため対象外とする
+                print(f"リポジトリ {repo_name} へのアクセスが拒否されたため対象外とします")
+                return []
+            if response.status_code != 200:
+                # レート制限・サーバーエラーなどで途中までしか取得できない場合は、欠けた結果を完全なものとして返さない
+                print(f"リポジトリ {repo_name} のコミット取得エラー: {response.status_code}")
+                raise APIError(f"リポジトリ {repo_name} のコミットを取得できませんでした: HTTP {response.status_code}")
+            page_commits = response.json()
 
-    def get_commits_for_repo_by_date(self, repo_name: str, target_date: str) -> List[Dict[str, Any]]:
+            commits.extend(page_commits)
+            if len(page_commits) < self.COMMITS_PER_PAGE:
+                return commits
+            page += 1
+
+    def get_commits_for_repo_by_date(self, repo_name: str, target_date: str,
+                                     cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
         """指定リポジトリから特定日付のコミット一覧を取得"""
         try:
             since, until = self._convert_date_to_utc_range(target_date)
         except ValueError:
             raise ValueError(f"日付形式が不正です: {target_date}。YYYY-MM-DD形式で入力してください。")
 
-        url = f'{self.base_url}/repos/{self.username}/{repo_name}/commits'
-        params = {
-            'author': self.username,
-            'since': since,
-            'until': until
-        }
-
-        try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
+        return self._get_repo_commits(repo_name, since, until, cancel_token)
 
-            if response.status_code == 404:
-                return []
-            elif response.status_code != 200:
-                print(f"リポジトリ {repo_name} のコミット取得エラー: {response.status_code}")
-                return []
-
-            return response.json()
-
-        except requests.exceptions.RequestException as e:
-            print(f"リポジトリ {repo_name} のコミット取得中にネットワークエラー: {e}")
-            return []
-
-    def get_all_commits_by_date(self, target_date: str) -> Dict[str, List[Dict[str, Any]]]:
+    def get_all_commits_by_date(self, target_date: str, cancel_token: Optional[CancellationToken] = None,
+                                progress: Optional[ProgressCallback] = None) -> Dict[str, List[Dict[str, Any]]]:
         """全リポジトリから特定日付のコミットを取得。リポジトリ名をキーとした辞書で返す"""
         since, _ = self._convert_date_to_utc_range(target_date)
-        repos = self._filter_repos_by_push_date(self.get_user_repositories(), since)
+        repos = self._discover_repositories(since, cancel_token)
+        raise_if_cancelled(cancel_token)
 
         print(f"チェック対象リポジトリ数: {len(repos)}")
 
-        return self._collect_commits(repos, lambda name: self.get_commits_for_repo_by_date(name, target_date))
+        return self._collect_commits(
+            repos,
+            lambda name: self.get_commits_for_repo_by_date(name, target_date, cancel_token),
+            cancel_token,
+            progress
+        )
 
     def get_today_commits(self) -> Dict[str, List[Dict[str, Any]]]:
         """本日のコミット一覧を取得"""
@@ -172,92 +393,88 @@ class GitHubCommitTracker(BaseCommitService):
 
         return '\n'.join(output)
 
-    def get_commits_for_diary_generation(self, target_date: str) -> List[Dict[str, Any]]:
+    def get_commits_for_diary_generation(self, target_date: str, cancel_token: Optional[CancellationToken] = None,
+                                         progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
         """特定日付のコミットを日誌生成用フォーマットで取得しリポジトリ名をメッセージに含める"""
-        commits_by_repo = self.get_all_commits_by_date(target_date)
-        formatted_commits = []
-
-        for repo_name, commits in commits_by_repo.items():
-            for commit in commits:
-                try:
-                    formatted_commits.append(self._format_commit_data(
-                        hash_val=commit['sha'],
-                        author_name=commit['commit']['author']['name'],
-                        author_email=commit['commit']['author']['email'],
-                        timestamp=commit['commit']['author']['date'],
-                        message=f"[{repo_name}] {commit['commit']['message']}",
-                        repository=repo_name
-                    ))
-
-                except (KeyError, ValueError) as e:
-                    print(f"コミット情報の変換でエラー: {e}")
-                    continue
-
-        formatted_commits.sort(key=lambda x: x['timestamp'], reverse=True)
+        commits_by_repo = self.get_all_commits_by_date(target_date, cancel_token, progress)
+        with span('format_commits', repositories=len(commits_by_repo)) as current:
+            formatted_commits = []
+
+            for repo_name, commits in commits_by_repo.items():
+                for commit in commits:
+                    try:
+                        formatted_commits.append(self._format_commit_data(
+                            hash_val=commit['sha'],
+                            author_name=commit['commit']['author']['name'],
+                            author_email=commit['commit']['author']['email'],
+                            timestamp=commit['commit']['author']['date'],
+                            message=f"[{repo_name}] {commit['commit']['message']}",
+                            repository=repo_name
+                        ))
+
+                    except (KeyError, ValueError) as e:
+                        print(f"コミット情報の変換でエラー: {e}")
+                        continue
+
+            formatted_commits.sort(key=lambda x: x['timestamp'], reverse=True)
+            current.set(commits=len(formatted_commits))
 
         return formatted_commits
 
-    def get_commits_for_repo_by_date_range(self, repo_name: str, since_date: str, until_date: str) -> List[Dict[str, Any]]:
+    def get_commits_for_repo_by_date_range(self, repo_name: str, since_date: str, until_date: str,
+                                           cancel_token: Optional[CancellationToken] = None) -> List[Dict[str, Any]]:
         """指定リポジトリから日付範囲内のコミット一覧を取得"""
         try:
             since, until = self._convert_date_to_utc_range(since_date, until_date)
         except ValueError:
             raise ValueError(f"日付形式が不正です。YYYY-MM-DD形式で入力してください。")
 
-        url = f'{self.base_url}/repos/{self.username}/{repo_name}/commits'
-        params = {
-            'author': self.username,
-            'since': since,
-            'until': until
-        }
-
-        try:
-            response = requests.get(url, headers=self.headers, params=params, timeout=30)
-            if response.status_code == 404:
-                return []
-            elif response.status_code != 200:
-                print(f"リポジトリ {repo_name} のコミット取得エラー: {response.status_code}")
-                return []
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"リポジトリ {repo_name} のコミット取得中にネットワークエラー: {e}")
-            return []
+        return self._get_repo_commits(repo_name, since, until, cancel_token)
 
-    def get_all_commits_by_date_range(self, since_date: str, until_date: str) -> Dict[str, List[Dict[str, Any]]]:
+    def get_all_commits_by_date_range(self, since_date: str, until_date: str,
+                                      cancel_token: Optional[CancellationToken] = None,
+                                      progress: Optional[ProgressCallback] = None) -> Dict[str, List[Dict[str, Any]]]:
         """全リポジトリから日付範囲内のコミットを取得"""
         since, _ = self._convert_date_to_utc_range(since_date, until_date)
-        repos = self._filter_repos_by_push_date(self.get_user_repositories(), since)
+        repos = self._discover_repositories(since, cancel_token)
+        raise_if_cancelled(cancel_token)
 
         print(f"チェック対象リポジトリ数: {len(repos)}")
         print(f"期間: {since_date} から {until_date}")
 
         return self._collect_commits(
             repos,
-            lambda name: self.get_commits_for_repo_by_date_range(name, since_date, until_date)
+            lambda name: self.get_commits_for_repo_by_date_range(name, since_date, until_date, cancel_token),
+            cancel_token,
+            progress
         )
 
-    def get_commits_for_diary_generation_range(self, since_date: str, until_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    def get_commits_for_diary_generation_range(self, since_date: str, until_date: Optional[str] = None,
+                                               cancel_token: Optional[CancellationToken] = None,
+                                               progress: Optional[ProgressCallback] = None) -> List[Dict[str, Any]]:
         """日付範囲のコミットを日誌生成用フォーマットで取得"""
         if until_date is None:
-            return self.get_commits_for_diary_generation(since_date)
-
-        commits_by_repo = self.get_all_commits_by_date_range(since_date, until_date)
-        formatted_commits = []
-
-        for repo_name, commits in commits_by_repo.items():
-            for commit in commits:
-                try:
-                    formatted_commits.append(self._format_commit_data(
-                        hash_val=commit['sha'],
-                        author_name=commit['commit']['author']['name'],
-                        author_email=commit['commit']['author']['email'],
-                        timestamp=commit['commit']['author']['date'],
-                        message=f"[{repo_name}] {commit['commit']['message']}",
-                        repository=repo_name
-                    ))
-                except (KeyError, ValueError) as e:
-                    print(f"コミット情報の変換でエラー: {e}")
-                    continue
-
-        formatted_commits.sort(key=lambda x: x['timestamp'], reverse=True)
+            return self.get_commits_for_diary_generation(since_date, cancel_token, progress)
+
+        commits_by_repo = self.get_all_commits_by_date_range(since_date, until_date, cancel_token, progress)
+        with span('format_commits', repositories=len(commits_by_repo)) as current:
+            formatted_commits = []
+
+            for repo_name, commits in commits_by_repo.items():
+                for commit in commits:
+                    try:
+                        formatted_commits.append(self._format_commit_data(
+                            hash_val=commit['sha'],
+                            author_name=commit['commit']['author']['name'],
+                            author_email=commit['commit']['author']['email'],
+                            timestamp=commit['commit']['author']['date'],
+                            message=f"[{repo_name}] {commit['commit']['message']}",
+                            repository=repo_name
+                        ))
+                    except (KeyError, ValueError) as e:
+                        print(f"コミット情報の変換でエラー: {e}")
+                        continue
+
+            formatted_commits.sort(key=lambda x: x['timestamp'], reverse=True)
+            current.set(commits=len(formatted_commits))
         return formatted_commits
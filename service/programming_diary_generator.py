@@ -1,15 +1,34 @@
+import threading
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 from external_service.gemini_api import GeminiAPIClient
+from service.commit_cache import CommitCache
+from service.day_summary_cache import DaySummaryCache
+from service.diary_file_service import build_diary_path, combine_daily_diaries
 from service.github_commit_tracker import GitHubCommitTracker
+from service.progress import GenerationProgress, ProgressCallback
+from service.prompt_compactor import CommitPromptCompactor, estimate_uncompacted_tokens, format_date_label
+from service.run_metrics import record_run
+from utils.cancellation import CancellationToken, raise_if_cancelled
 from utils.config_manager import load_config
 from utils.env_loader import load_environment_variables
+from utils.exceptions import CancelledError
+from utils.profiling import StageProfiler, is_profiling_enabled, profile_dir_for, profile_stage
+from utils.token_estimator import estimate_tokens
+from utils.tracing import span
+
+COMMIT_HISTORY_HEADING = "\n\n## Git コミット履歴\n\n"
 
 
 class ProgrammingDiaryGenerator:
     """Gitコミット履歴からGeminiを使用して日誌を生成"""
+
+    PREFETCH_TTL_SECONDS = 120
+    PREFETCH_MIN_RATE_REMAINING = 500
+
     def __init__(self):
         load_environment_variables()
         self.config = load_config()
@@ -17,6 +36,16 @@ class ProgrammingDiaryGenerator:
         self.prompt_template_path = self._get_prompt_template_path()
         self.jst = timezone(timedelta(hours=9))
         self.default_model: Optional[str] = None
+        self.day_cache = DaySummaryCache()
+        self.prompt_compactor = CommitPromptCompactor()
+        self.commit_cache = CommitCache()
+        self.github_tracker: Optional[GitHubCommitTracker] = None
+        # 取得中（先読み・生成）の期間と完了通知。同じ期間や含まれる期間の取得は完了を待ってキャッシュを使う
+        self._fetching: Dict[Tuple[str, Optional[str]], threading.Event] = {}
+        self._fetch_lock = threading.Lock()
+        # 生成中の日（日付, フィンガープリント）と完了通知。同じ日を並行して生成する場合は完了を待って結果を共有する
+        self._generating: Dict[Tuple[str, str], threading.Event] = {}
+        self._generate_lock = threading.Lock()
         self._initialize_ai_client()
 
     def _get_prompt_template_path(self) -> str:
@@ -34,6 +63,25 @@ class ProgrammingDiaryGenerator:
             print(f"AIクライアントの初期化でエラーが発生しました: {e}")
             raise
 
+    def start_warm_up(self):
+        """AIクライアントの接続確立をバックグラウンドで開始"""
+        if self.ai_client is not None:
+            self.ai_client.start_warm_up()
+
+    def _get_github_tracker(self) -> GitHubCommitTracker:
+        """GitHubクライアントを初回のみ作成し、以降は同じセッション（接続プール）を再利用する"""
+        if self.github_tracker is None:
+            self.github_tracker = GitHubCommitTracker()
+        return self.github_tracker
+
+    def prepare(self):
+        """Gemini・GitHubへの接続準備を済ませる。起動直後にバックグラウンドスレッドから呼び出す"""
+        self.start_warm_up()
+        try:
+            self._get_github_tracker()
+        except ValueError as e:
+            print(f"GitHubクライアントの準備をスキップしました: {e}")
+
     def _load_prompt_template(self) -> str:
         """プロンプトテンプレートファイルを読み込む"""
         try:
@@ -44,73 +92,330 @@ class ProgrammingDiaryGenerator:
         except Exception as e:
             raise Exception(f"プロンプトテンプレートの読み込みに失敗しました: {e}")
 
-    def _format_commits_for_prompt(self, commits: List[Dict]) -> str:
-        """コミット情報を生成AIプロンプト用にフォーマット"""
+    def _format_commits_for_prompt(self, commits: List[Dict], reserved_tokens: int = 0) -> str:
+        """コミット情報を日付・リポジトリごとにまとめ、入力トークン数の上限内に圧縮してフォーマット"""
         if not commits:
             return "コミット履歴がありません。"
 
-        formatted_commits = []
+        return self.prompt_compactor.compact(commits, reserved_tokens)
+
+    @staticmethod
+    def _group_commits_by_day(commits: List[Dict]) -> Dict[str, List[Dict]]:
+        """コミットをJSTの日付(YYYY-MM-DD)ごとにまとめる。日付を解析できないコミットは空文字のキーにまとめる"""
+        commits_by_day: Dict[str, List[Dict]] = {}
         for commit in commits:
             try:
-                dt = datetime.fromisoformat(commit['timestamp'])
-                weekdays = ['月', '火', '水', '木', '金', '土', '日']
-                weekday = weekdays[dt.weekday()]
-                date_str = dt.strftime(f"%Y年%m月%d日({weekday})")
-            except (ValueError, IndexError):
-                date_str = commit['timestamp']
+                day = datetime.fromisoformat(commit['timestamp']).strftime('%Y-%m-%d')
+            except ValueError:
+                day = ''
+            commits_by_day.setdefault(day, []).append(commit)
+        return commits_by_day
+
+    def _generate_content(self, commits: List[Dict], prompt_template: str,
+                          cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int, str]:
+        """コミット一覧からプロンプトを組み立ててAIで日誌を生成。使用したモデル名も返す"""
+        if self.ai_client is None or self.default_model is None:
+            raise Exception("AIクライアントまたはモデルが設定されていません")
+
+        with span('build_prompt', commits=len(commits)) as current:
+            # テンプレートと見出しの分を差し引いた残りをコミット履歴に割り当てる
+            template_tokens = estimate_tokens(f"{prompt_template}{COMMIT_HISTORY_HEADING}")
+            formatted_commits = self._format_commits_for_prompt(commits, template_tokens)
+            full_prompt = f"{prompt_template}{COMMIT_HISTORY_HEADING}{formatted_commits}"
+            uncompacted_tokens = template_tokens + estimate_uncompacted_tokens(commits)
+            prompt_tokens = estimate_tokens(full_prompt)
+            current.set(uncompacted_tokens=uncompacted_tokens, prompt_tokens=prompt_tokens)
+        print(f"   入力トークン概算: 圧縮前={uncompacted_tokens} "
+              f"圧縮後={prompt_tokens} (上限={self.prompt_compactor.max_input_tokens})")
+
+        return self.ai_client.generate(full_prompt, cancel_token)
+
+    def _generate_day_summary(self, day: str, commits: List[Dict], prompt_template: str,
+                              cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int, Optional[str]]:
+        """1日分の日誌を生成。コミットが前回と同じ日はキャッシュした結果を返し、モデル名はNoneとする
+
+        同じ日・同じコミットを他のジョブが生成中であれば完了を待ち、AIを重複して呼び出さない"""
+        with span('generate_day', day=day, commits=len(commits)) as current:
+            content, input_tokens, output_tokens, model_name = self._generate_day_summary_once(
+                day, commits, prompt_template, cancel_token
+            )
+            current.set(cached=model_name is None, input_tokens=input_tokens, output_tokens=output_tokens)
+            return content, input_tokens, output_tokens, model_name
+
+    def _day_fingerprint(self, commits: List[Dict], prompt_template: str) -> str:
+        """日付別キャッシュのフィンガープリント"""
+        return self.day_cache.fingerprint(commits, self.default_model, prompt_template)
+
+    def _generate_day_summary_once(self, day: str, commits: List[Dict], prompt_template: str,
+                                   cancel_token: Optional[CancellationToken] = None
+                                   ) -> Tuple[str, int, int, Optional[str]]:
+        """_generate_day_summaryの本体。キャッシュの確認と重複した生成の待ち合わせを行う"""
+        if not day or self.default_model is None:
+            return self._generate_content(commits, prompt_template, cancel_token)
+
+        fingerprint = self._day_fingerprint(commits, prompt_template)
+        key = (day, fingerprint)
+        while True:
+            cached_content = self.day_cache.get(day, fingerprint)
+            if cached_content is not None:
+                print(f"   キャッシュ使用: {day} ({len(commits)}件)")
+                return cached_content, 0, 0, None
+            with self._generate_lock:
+                pending = self._generating.get(key)
+                if pending is None:
+                    done = self._generating[key] = threading.Event()
+                    break
+            # 生成していた側が中止・失敗した場合はキャッシュがないため、次の周回で自分で生成する
+            print(f"   実行中の生成の完了を待ちます: {day}")
+            while not pending.wait(0.1):
+                raise_if_cancelled(cancel_token)
+
+        try:
+            content, input_tokens, output_tokens, model_name = self._generate_content(
+                commits, prompt_template, cancel_token
+            )
+            # 高速モデルへの切り替えやヘッジ要求で既定のモデル以外の結果になった場合は、既定のモデルの結果として保存しない
+            if model_name == self.default_model:
+                self.day_cache.put(day, fingerprint, content, model_name, input_tokens, output_tokens)
+        finally:
+            with self._generate_lock:
+                del self._generating[key]
+            done.set()
+        print(f"   生成: {day} ({len(commits)}件)")
+        return content, input_tokens, output_tokens, model_name
+
+    def _fetch_commits(self, since_date: str, until_date: Optional[str],
+                       cancel_token: Optional[CancellationToken] = None,
+                       progress: Optional[ProgressCallback] = None) -> List[Dict]:
+        """GitHub APIからコミットを取得。先読み済み・取得済みの期間（含む期間を含む）は取得済みのコミットを再利用する
+
+        同じ期間や含む期間を他の生成・先読みが取得中であれば完了を待ち、重複して取得しない"""
+        with span('fetch_commits', since=since_date, until=until_date) as current:
+            while True:
+                cached_commits = self._get_cached_commits(since_date, until_date)
+                if cached_commits is not None:
+                    print(f"   取得済みのコミットを再利用: {since_date} から {until_date or since_date}")
+                    current.set(cached=True, commits=len(cached_commits))
+                    return cached_commits
+                done = self._start_fetching(since_date, until_date)
+                if done is not None:
+                    break
+                # 取得していた側が中止・失敗した場合はキャッシュがないため、次の周回で自分で取得する
+                self._wait_for_fetching(since_date, until_date, cancel_token)
+
+            try:
+                commits = self._request_commits(since_date, until_date, cancel_token, progress)
+                self.commit_cache.put(since_date, until_date, commits)
+                current.set(cached=False, commits=len(commits))
+                return commits
+            finally:
+                self._finish_fetching(since_date, until_date, done)
+
+    def fetch_commits(self, since_date: str, until_date: Optional[str] = None,
+                      cancel_token: Optional[CancellationToken] = None,
+                      progress: Optional[ProgressCallback] = None) -> List[Dict]:
+        """期間のコミットをまとめて取得する。長い期間を1回で取得してから日ごとに生成する場合に使う"""
+        return self._fetch_commits(since_date, until_date, cancel_token, progress)
+
+    def generate_day(self, day: str, commits: List[Dict],
+                     cancel_token: Optional[CancellationToken] = None) -> Tuple[str, int, int, Optional[str]]:
+        """取得済みの1日分のコミットから日誌を生成。コミットが前回と同じ日は保存済みの結果を返し、モデル名はNoneとする"""
+        if self.ai_client is None:
+            raise Exception("AIクライアントが初期化されていません")
+        self.ai_client.initialize()
+        return self._generate_day_summary(day, commits, self._load_prompt_template(), cancel_token)
 
-            commit_info = f"日時: {date_str}\nメッセージ: {commit['message']}\n"
-            formatted_commits.append(commit_info)
+    def is_day_cached(self, day: str, commits: List[Dict]) -> bool:
+        """1日分のコミットの生成結果が保存済みで、generate_dayがAIを呼び出さずに返せるか"""
+        if not day or self.default_model is None:
+            return False
+        fingerprint = self._day_fingerprint(commits, self._load_prompt_template())
+        return self.day_cache.get(day, fingerprint) is not None
 
-        return "\n".join(formatted_commits)
+    def _get_cached_commits(self, since_date: str, until_date: Optional[str]) -> Optional[List[Dict]]:
+        """同じ期間、なければ期間を含む取得済みのコミットを返す"""
+        commits = self.commit_cache.get(since_date, until_date)
+        if commits is None:
+            commits = self.commit_cache.get_covering(since_date, until_date)
+        return commits
+
+    def _find_fetching(self, since_date: str, until_date: Optional[str]) -> Optional[threading.Event]:
+        """期間を含む取得中の期間の完了通知を返す。_fetch_lockを取得した状態で呼び出す"""
+        last_date = until_date or since_date
+        for (fetch_since, fetch_until), done in self._fetching.items():
+            if fetch_since <= since_date <= last_date <= (fetch_until or fetch_since):
+                return done
+        return None
+
+    def _start_fetching(self, since_date: str, until_date: Optional[str]) -> Optional[threading.Event]:
+        """期間を取得中として登録し完了通知を返す。期間を含む取得が実行中の場合はNone"""
+        with self._fetch_lock:
+            if self._find_fetching(since_date, until_date) is not None:
+                return None
+            done = self._fetching[(since_date, until_date)] = threading.Event()
+            return done
+
+    def _finish_fetching(self, since_date: str, until_date: Optional[str], done: threading.Event):
+        """取得中の登録を解除し、完了を待っている生成に通知する"""
+        with self._fetch_lock:
+            del self._fetching[(since_date, until_date)]
+        done.set()
+
+    def _wait_for_fetching(self, since_date: str, until_date: Optional[str],
+                           cancel_token: Optional[CancellationToken] = None):
+        """期間を含む取得が実行中であれば完了を待つ"""
+        with self._fetch_lock:
+            pending = self._find_fetching(since_date, until_date)
+        if pending is None:
+            return
+        print(f"   実行中のコミット取得の完了を待ちます: {since_date} から {until_date or since_date}")
+        while not pending.wait(0.1):
+            raise_if_cancelled(cancel_token)
+
+    def prefetch_commits(self, since_date: str, until_date: Optional[str] = None,
+                         cancel_token: Optional[CancellationToken] = None) -> bool:
+        """選択中の期間のコミットを生成前に取得してキャッシュする
+
+        取得済み・同じ期間を取得中・GitHub APIの残り回数が少ない場合は何もせずFalseを返す"""
+        if self._get_cached_commits(since_date, until_date) is not None:
+            return False
+
+        github_tracker = self._get_github_tracker()
+        min_remaining = self.config.getint('GITHUB', 'prefetch_min_rate_remaining',
+                                           fallback=self.PREFETCH_MIN_RATE_REMAINING)
+        if not github_tracker.has_rate_budget(min_remaining):
+            print(f"GitHub APIの残り回数が少ないため先読みを省略しました: 残り{github_tracker.rate_limit_remaining}回")
+            return False
+
+        done = self._start_fetching(since_date, until_date)
+        if done is None:
+            return False
+        try:
+            commits = self._request_commits(since_date, until_date, cancel_token)
+            ttl_seconds = self.config.getfloat('GITHUB', 'prefetch_ttl_seconds', fallback=self.PREFETCH_TTL_SECONDS)
+            self.commit_cache.put(since_date, until_date, commits, ttl_seconds=ttl_seconds)
+            print(f"コミットを先読みしました: {since_date} から {until_date or since_date} ({len(commits)}件)")
+            return True
+        finally:
+            self._finish_fetching(since_date, until_date, done)
+
+    def _request_commits(self, since_date: str, until_date: Optional[str],
+                         cancel_token: Optional[CancellationToken] = None,
+                         progress: Optional[ProgressCallback] = None) -> List[Dict]:
+        """GitHub APIからコミットを取得"""
+        github_tracker = self._get_github_tracker()
+        print(f"   GitHubユーザー: {github_tracker.username}")
+
+        if until_date:
+            commits = github_tracker.get_commits_for_diary_generation_range(
+                since_date, until_date, cancel_token=cancel_token, progress=progress
+            )
+            print(f"   検索期間: {since_date} から {until_date}")
+        else:
+            commits = github_tracker.get_commits_for_diary_generation(
+                since_date, cancel_token=cancel_token, progress=progress
+            )
+            print(f"   検索期間: {since_date}")
+
+        return commits
+
+    def _generate_from_commits(self, commits: List[Dict], cancel_token: Optional[CancellationToken] = None,
+                               progress: Optional[ProgressCallback] = None,
+                               profiler: Optional[StageProfiler] = None) -> Tuple[str, int, int, str]:
+        """コミット一覧から日付ごとに日誌を生成して1つにまとめる。1日終わるごとに進捗を通知する"""
+        prompt_template = self._load_prompt_template()
+        commits_by_day = self._group_commits_by_day(commits)
+
+        used_models: List[str] = []
+        if not commits_by_day:
+            if progress is not None:
+                progress(GenerationProgress(0, 1, 0, 0))
+            with profile_stage(profiler, 'generate'):
+                diary_content, input_tokens, output_tokens, model_name = self._generate_content(
+                    commits, prompt_template, cancel_token
+                )
+            used_models.append(model_name)
+            if progress is not None:
+                progress(GenerationProgress(1, 1, input_tokens, output_tokens))
+        else:
+            daily_contents = []
+            input_tokens = output_tokens = cached_days = 0
+            if progress is not None:
+                progress(GenerationProgress(0, len(commits_by_day), 0, 0))
+            with profile_stage(profiler, 'generate'):
+                for day in sorted(commits_by_day):
+                    raise_if_cancelled(cancel_token)
+                    day_commits = commits_by_day[day]
+                    content, day_input_tokens, day_output_tokens, model_name = self._generate_day_summary(
+                        day, day_commits, prompt_template, cancel_token
+                    )
+                    daily_contents.append((format_date_label(day_commits[0]['timestamp']), content))
+                    input_tokens += day_input_tokens
+                    output_tokens += day_output_tokens
+                    if model_name is None:
+                        cached_days += 1
+                    elif model_name not in used_models:
+                        used_models.append(model_name)
+                    if progress is not None:
+                        progress(GenerationProgress(len(daily_contents), len(commits_by_day),
+                                                    input_tokens, output_tokens, cached_days))
+            with profile_stage(profiler, 'merge'), span('merge_days', days=len(daily_contents)):
+                diary_content = combine_daily_diaries(daily_contents)
+
+        return diary_content, input_tokens, output_tokens, ", ".join(used_models) or self.default_model or ''
 
     def generate_diary(self,
                        since_date: Optional[str] = None,
                        until_date: Optional[str] = None,
-                       days: Optional[int] = None) -> Tuple[str, int, int, str]:
-        """GitHub APIから複数リポジトリのコミットを取得しAIで日誌を生成"""
+                       days: Optional[int] = None,
+                       cancel_token: Optional[CancellationToken] = None,
+                       progress: Optional[ProgressCallback] = None,
+                       profile_dir: Optional[Path] = None) -> Tuple[str, int, int, str]:
+        """GitHub APIから複数リポジトリのコミットを取得しAIで日誌を生成。中止された場合はCancelledErrorを送出する
+
+        progressを指定するとコミット取得と日ごとの生成の進捗を通知する（ワーカースレッドから呼び出される）。
+        profile_dirを指定するか[Debug] profileが有効な場合は、段階ごとのCPUプロファイルとメモリ確保の報告を書き出す"""
         try:
-            if self.ai_client is None:
-                raise Exception("AIクライアントが初期化されていません")
-            self.ai_client.initialize()
-
-            if days:
-                since_date = (datetime.now(self.jst) - timedelta(days=days)).strftime('%Y-%m-%d')
-                until_date = (datetime.now(self.jst) + timedelta(days=1)).strftime('%Y-%m-%d')
-
-            print(f"🔍 デバッグ情報:")
-            print(f"   使用モデル: {self.default_model}")
-            print(f"   データソース: GitHub API (複数リポジトリ)")
-
-            github_tracker = GitHubCommitTracker()
-            print(f"   GitHubユーザー: {github_tracker.username}")
-
-            if since_date and until_date:
-                commits = github_tracker.get_commits_for_diary_generation_range(since_date, until_date)
-                print(f"   検索期間: {since_date} から {until_date}")
-            elif since_date:
-                commits = github_tracker.get_commits_for_diary_generation(since_date)
-                print(f"   検索期間: {since_date}")
-            else:
-                today = datetime.now().strftime('%Y-%m-%d')
-                commits = github_tracker.get_commits_for_diary_generation(today)
-                print(f"   検索期間: {today}")
-
-            print(f"   取得したコミット数: {len(commits)}")
-
-            prompt_template = self._load_prompt_template()
-            formatted_commits = self._format_commits_for_prompt(commits)
-            full_prompt = f"{prompt_template}\n\n## Git コミット履歴\n\n{formatted_commits}"
-
-            if self.ai_client is None or self.default_model is None:
-                raise Exception("AIクライアントまたはモデルが設定されていません")
-
-            diary_content, input_tokens, output_tokens = self.ai_client.generate_content(
-                prompt=full_prompt,
-                model_name=self.default_model
-            )
+            with record_run('generate', since_date, until_date) as run, \
+                    span('generate_diary', since=since_date, until=until_date, days=days) as current:
+                if self.ai_client is None:
+                    raise Exception("AIクライアントが初期化されていません")
+                self.ai_client.initialize()
+
+                if days:
+                    since_date = (datetime.now(self.jst) - timedelta(days=days)).strftime('%Y-%m-%d')
+                    until_date = (datetime.now(self.jst) + timedelta(days=1)).strftime('%Y-%m-%d')
 
-            return diary_content, input_tokens, output_tokens, self.default_model
+                print(f"🔍 デバッグ情報:")
+                print(f"   使用モデル: {self.default_model}")
+                print(f"   データソース: GitHub API (複数リポジトリ)")
 
+                if not since_date:
+                    since_date = datetime.now().strftime('%Y-%m-%d')
+                    until_date = None
+
+                if profile_dir is None and is_profiling_enabled():
+                    profile_dir = profile_dir_for(build_diary_path(until_date or since_date))
+                profiler = StageProfiler(profile_dir) if profile_dir is not None else None
+
+                with profiler if profiler is not None else nullcontext():
+                    with profile_stage(profiler, 'fetch'):
+                        commits = self._fetch_commits(since_date, until_date, cancel_token, progress)
+                    print(f"   取得したコミット数: {len(commits)}")
+
+                    try:
+                        result = self._generate_from_commits(commits, cancel_token, progress, profiler)
+                    finally:
+                        if profiler is not None:
+                            print(f"   プロファイルを保存しました: {profile_dir}")
+
+                # 取得時に保持したコミットは、AI呼び出しに失敗・中止した場合のみ再実行のために残す
+                self.commit_cache.invalidate(since_date, until_date)
+                current.set(commits=len(commits), input_tokens=result[1], output_tokens=result[2])
+                run.update(since=since_date, until=until_date, commits=len(commits))
+                return result
+
+        except CancelledError:
+            raise
         except Exception as e:
             raise Exception(f"プログラミング日記の生成に失敗しました: {e}")
@@ -0,0 +1,76 @@
+import queue
+from typing import Callable, Dict, List, Optional, Union
+
+
+class FetchProgress:
+    """GitHubからのコミット取得の進捗"""
+
+    stage = 'fetch'
+
+    def __init__(self, repos_done: int, repos_total: int, commits_found: int, bytes_received: int,
+                 elapsed_seconds: float, rate_limit_remaining: Optional[int] = None):
+        self.repos_done = repos_done
+        self.repos_total = repos_total
+        self.commits_found = commits_found
+        self.bytes_received = bytes_received
+        self.elapsed_seconds = elapsed_seconds
+        self.rate_limit_remaining = rate_limit_remaining
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes_received / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def format(self) -> str:
+        text = (f"取得: リポジトリ {self.repos_done}/{self.repos_total} コミット{self.commits_found}件 "
+                f"{self.bytes_received / 1024:.0f}KB ({self.bytes_per_second / 1024:.0f}KB/秒)")
+        if self.rate_limit_remaining is not None:
+            text += f" API残り{self.rate_limit_remaining}回"
+        return text
+
+
+class GenerationProgress:
+    """AIによる日誌生成の進捗（日単位）"""
+
+    stage = 'generate'
+
+    def __init__(self, days_done: int, days_total: int, input_tokens: int, output_tokens: int,
+                 cached_days: int = 0):
+        self.days_done = days_done
+        self.days_total = days_total
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cached_days = cached_days
+
+    def format(self) -> str:
+        text = (f"生成: {self.days_done}/{self.days_total}日 "
+                f"トークン 入力={self.input_tokens} 出力={self.output_tokens}")
+        if self.cached_days:
+            text += f" キャッシュ{self.cached_days}日"
+        return text
+
+
+ProgressEvent = Union[FetchProgress, GenerationProgress]
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class ProgressQueue:
+    """ワーカースレッドから進捗を受け取り、UIスレッドでまとめて取り出すキュー"""
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    def put(self, event: ProgressEvent):
+        """進捗を追加。どのスレッドからでも呼び出せる"""
+        self._queue.put(event)
+
+    def drain_latest(self) -> List[ProgressEvent]:
+        """溜まった進捗を全て取り出し、段階ごとに最新の1件のみを発生順に返す"""
+        latest: Dict[str, ProgressEvent] = {}
+        while True:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            latest.pop(event.stage, None)
+            latest[event.stage] = event
+        return list(latest.values())
@@ -0,0 +1,151 @@
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.config_manager import load_config
+from utils.token_estimator import estimate_tokens
+
+TRAILER_PATTERN = re.compile(
+    r'^(Signed-off-by|Co-authored-by|Reviewed-by|Acked-by|Tested-by|Reported-by|Change-Id):',
+    re.IGNORECASE
+)
+REPOSITORY_PREFIX_PATTERN = re.compile(r'^\[([^\]]+)\]\s*')
+NORMALIZE_PATTERN = re.compile(r'[\W\d_]+')
+WEEKDAYS = ['月', '火', '水', '木', '金', '土', '日']
+DEFAULT_MAX_INPUT_TOKENS = 8000
+TRUNCATION_NOTE = "…（入力トークン数の上限を超えるため以降を省略）"
+
+
+def format_date_label(timestamp: str) -> str:
+    """タイムスタンプを「YYYY年MM月DD日(曜)」形式に変換。解析できない場合はそのまま返す"""
+    try:
+        dt = datetime.fromisoformat(timestamp)
+        return dt.strftime(f"%Y年%m月%d日({WEEKDAYS[dt.weekday()]})")
+    except (ValueError, IndexError):
+        return timestamp
+
+
+def estimate_uncompacted_tokens(commits: List[Dict]) -> int:
+    """圧縮前の形式（1コミットごとに日時とメッセージ全文）で送った場合のトークン数を概算"""
+    return sum(estimate_tokens(f"日時: {format_date_label(commit.get('timestamp', ''))}\n"
+                               f"メッセージ: {commit.get('message', '')}\n")
+               for commit in commits)
+
+
+class CommitPromptCompactor:
+    """コミット履歴を日付・リポジトリごとにまとめ、入力トークン数の上限内に圧縮する
+
+    max_input_tokensはプロンプトテンプレートを含む入力全体の上限。compactのreserved_tokensに
+    テンプレートなどコミット履歴以外の分を渡し、残りをコミット履歴に割り当てる。
+    """
+
+    def __init__(self, max_input_tokens: Optional[int] = None,
+                 max_body_lines: Optional[int] = None,
+                 max_line_chars: Optional[int] = None):
+        config = load_config()
+        self.max_input_tokens = (max_input_tokens if max_input_tokens is not None
+                                 else config.getint('Prompt', 'max_input_tokens', fallback=DEFAULT_MAX_INPUT_TOKENS))
+        self.max_body_lines = (max_body_lines if max_body_lines is not None
+                               else config.getint('Prompt', 'max_body_lines', fallback=3))
+        self.max_line_chars = (max_line_chars if max_line_chars is not None
+                               else config.getint('Prompt', 'max_line_chars', fallback=120))
+
+    def _split_message(self, commit: Dict) -> Tuple[str, str, List[str]]:
+        """コミットメッセージをリポジトリ名・件名・トレーラーを除いた本文行に分ける"""
+        message = commit.get('message', '')
+        repository = commit.get('repository', '')
+        prefix = REPOSITORY_PREFIX_PATTERN.match(message)
+        if prefix:
+            repository = repository or prefix.group(1)
+            message = message[prefix.end():]
+
+        lines = message.strip().splitlines() or ['']
+        body = [line.strip() for line in lines[1:]
+                if line.strip() and not TRAILER_PATTERN.match(line.strip())]
+        return repository, lines[0].strip(), body
+
+    def _trim_body(self, body: List[str], max_lines: int) -> List[str]:
+        """本文を行数と1行あたりの文字数の上限で切り詰める"""
+        trimmed = [line if len(line) <= self.max_line_chars else line[:self.max_line_chars] + '…'
+                   for line in body[:max_lines]]
+        if len(body) > max_lines and max_lines > 0:
+            trimmed.append(f"…ほか{len(body) - max_lines}行")
+        return trimmed
+
+    def _group_commits(self, commits: List[Dict]) -> Dict[str, Dict[str, List[Dict]]]:
+        """コミットを古い順に日付→リポジトリでまとめ、ほぼ同一のメッセージは件数にまとめる"""
+        grouped: Dict[str, Dict[str, List[Dict]]] = {}
+        seen: Dict[Tuple[str, str, str], Dict] = {}
+
+        for commit in sorted(commits, key=lambda c: c.get('timestamp', '')):
+            date_label = format_date_label(commit.get('timestamp', ''))
+            repository, subject, body = self._split_message(commit)
+            key = (date_label, repository, NORMALIZE_PATTERN.sub('', subject.lower()))
+
+            if key[2] and key in seen:
+                seen[key]['count'] += 1
+                continue
+
+            entry = {'subject': subject, 'body': body, 'count': 1}
+            seen[key] = entry
+            grouped.setdefault(date_label, {}).setdefault(repository, []).append(entry)
+
+        return grouped
+
+    def _render(self, grouped: Dict[str, Dict[str, List[Dict]]], max_lines: int,
+                max_entries: Optional[int]) -> str:
+        """まとめたコミットをプロンプト用のテキストに変換"""
+        output = []
+        for date_label, repositories in grouped.items():
+            output.append(f"### {date_label}")
+            for repository, entries in repositories.items():
+                if repository:
+                    output.append(f"[{repository}]")
+                shown = entries if max_entries is None else entries[:max_entries]
+                for entry in shown:
+                    count = f" (×{entry['count']})" if entry['count'] > 1 else ''
+                    output.append(f"- {entry['subject']}{count}")
+                    output.extend(f"  {line}" for line in self._trim_body(entry['body'], max_lines))
+                if len(entries) > len(shown):
+                    output.append(f"- …ほか{len(entries) - len(shown)}件")
+            output.append("")
+        return "\n".join(output).strip()
+
+    @staticmethod
+    def _truncate(text: str, budget: int) -> str:
+        """行単位で末尾を削り、省略の注記を含めて上限内に収める。注記も入らない場合は空文字"""
+        lines = text.splitlines()
+        low, high = 0, len(lines)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens("\n".join(lines[:middle] + [TRUNCATION_NOTE])) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        if low == 0 and estimate_tokens(TRUNCATION_NOTE) > budget:
+            return ""
+        return "\n".join(lines[:low] + [TRUNCATION_NOTE])
+
+    def compact(self, commits: List[Dict], reserved_tokens: int = 0) -> str:
+        """コミット履歴を圧縮する。上限を超える場合は本文、件数の順に削り、それでも超える場合は末尾を切り詰める"""
+        grouped = self._group_commits(commits)
+        budget = self.max_input_tokens - reserved_tokens
+
+        text = self._render(grouped, self.max_body_lines, None)
+        if estimate_tokens(text) <= budget:
+            return text
+
+        text = self._render(grouped, 0, None)
+        max_entries = max((len(entries) for repositories in grouped.values()
+                           for entries in repositories.values()), default=1)
+        while estimate_tokens(text) > budget and max_entries > 1:
+            max_entries //= 2
+            text = self._render(grouped, 0, max_entries)
+
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            return text
+        print(f"   警告: コミット履歴が入力トークン数の上限を{tokens - max(budget, 0)}トークン超えるため末尾を省略します "
+              f"(コミット履歴={tokens} 割り当て={max(budget, 0)} 上限={self.max_input_tokens} "
+              f"テンプレート等={reserved_tokens})")
+        return self._truncate(text, budget)
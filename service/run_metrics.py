@@ -0,0 +1,315 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.config_manager import get_data_dir, load_config
+from utils.exceptions import CancelledError
+from utils.tracing import SpanRecorder, record_spans
+
+# 区間名と、台帳に記録する段階名の対応。同じ段階の区間が複数ある場合（日ごとの生成など）は合計する
+STAGE_SPANS = {
+    'fetch_commits': 'fetch',
+    'github.discover_repositories': 'discover_repositories',
+    'github.fetch_repos': 'fetch_repos',
+    'format_commits': 'format_commits',
+    'build_prompt': 'build_prompt',
+    'gemini.generate': 'llm',
+    'merge_days': 'merge_days',
+    'save_diary': 'save',
+}
+# リポジトリごとのコミット取得時間のヒストグラムの区切り(ミリ秒)。最後に上限なしの区間が続く
+REPO_FETCH_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# 1Mトークンあたりの料金（米ドル）の既定値。[Metrics] input_cost_per_million / output_cost_per_million で変更する
+DEFAULT_INPUT_COST_PER_MILLION = 0.30
+DEFAULT_OUTPUT_COST_PER_MILLION = 2.50
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近傍順位法のパーセンタイル"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def build_histogram(values_ms: List[float]) -> Dict[str, Any]:
+    """値を区切りごとの件数（累積しない）にまとめる"""
+    counts = [0] * (len(REPO_FETCH_BUCKETS_MS) + 1)
+    for value in values_ms:
+        index = next((i for i, bound in enumerate(REPO_FETCH_BUCKETS_MS) if value <= bound),
+                     len(REPO_FETCH_BUCKETS_MS))
+        counts[index] += 1
+    return {'bounds': list(REPO_FETCH_BUCKETS_MS), 'counts': counts, 'sum': round(sum(values_ms), 1)}
+
+
+def merge_histograms(histograms: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """区切りが同じヒストグラムを足し合わせる。区切りが異なる記録（古い形式）は除く"""
+    counts = [0] * (len(REPO_FETCH_BUCKETS_MS) + 1)
+    total = 0.0
+    for histogram in histograms:
+        if histogram.get('bounds') != list(REPO_FETCH_BUCKETS_MS):
+            continue
+        counts = [a + b for a, b in zip(counts, histogram['counts'])]
+        total += histogram['sum']
+    return {'bounds': list(REPO_FETCH_BUCKETS_MS), 'counts': counts, 'sum': round(total, 1)}
+
+
+def histogram_quantile(quantile: float, histogram: Dict[str, Any]) -> Optional[float]:
+    """ヒストグラムから分位点を区切り内の線形補間で求める（Prometheusのhistogram_quantileと同じ考え方）"""
+    total = sum(histogram['counts'])
+    if total == 0:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(histogram['bounds'], histogram['counts']):
+        if count and cumulative + count >= rank:
+            return round(lower + (bound - lower) * (rank - cumulative) / count, 1)
+        cumulative += count
+        lower = bound
+    # 上限なしの区間に入る場合は最後の区切りの値を返す
+    return float(histogram['bounds'][-1])
+
+
+def _count_cache(spans: List[Dict]) -> Dict[str, int]:
+    hits = sum(1 for event in spans if event['args'].get('cached'))
+    return {'hits': hits, 'misses': len(spans) - hits}
+
+
+def _count_statuses(spans: List[Dict]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for event in spans:
+        status = str(event['args'].get('status') or event['args'].get('error') or 'ok')
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def estimate_cost(input_tokens: int, output_tokens: int) -> float:
+    """トークン数から料金の概算（米ドル）を求める"""
+    config = load_config()
+    input_rate = config.getfloat('Metrics', 'input_cost_per_million', fallback=DEFAULT_INPUT_COST_PER_MILLION)
+    output_rate = config.getfloat('Metrics', 'output_cost_per_million', fallback=DEFAULT_OUTPUT_COST_PER_MILLION)
+    return round((input_tokens * input_rate + output_tokens * output_rate) / 1_000_000, 6)
+
+
+def build_run_record(recorder: SpanRecorder, run: Dict[str, Any], status: str, duration_seconds: float) -> Dict:
+    """1回の実行で集めた区間から台帳の記録を組み立てる"""
+    stages: Dict[str, float] = {}
+    for span_name, stage in STAGE_SPANS.items():
+        spans = recorder.spans(span_name)
+        if spans:
+            stages[stage] = round(sum(event['dur'] for event in spans) / 1000, 1)
+
+    llm_spans = recorder.spans('gemini.generate')
+    input_tokens = sum(event['args'].get('input_tokens', 0) for event in llm_spans)
+    output_tokens = sum(event['args'].get('output_tokens', 0) for event in llm_spans)
+    models = sorted({event['args']['used_model'] for event in llm_spans if event['args'].get('used_model')})
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        **run,
+        'status': status,
+        'duration_ms': round(duration_seconds * 1000, 1),
+        'stages_ms': stages,
+        'repo_fetch_ms': build_histogram([event['dur'] / 1000 for event in recorder.spans('github.fetch_repo')]),
+        'requests': {
+            'github': _count_statuses(recorder.spans('github.request')),
+            'gemini': _count_statuses(recorder.spans('gemini.request')),
+        },
+        'cache': {
+            'commits': _count_cache(recorder.spans('fetch_commits')),
+            'days': _count_cache(recorder.spans('generate_day')),
+        },
+        'models': models,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cost_usd': estimate_cost(input_tokens, output_tokens),
+    }
+
+
+class RunMetricsLedger:
+    """生成1回ごとの計測結果（段階ごとの所要時間・要求数・キャッシュ・トークン数・料金）をJSON Linesで追記する台帳"""
+
+    def __init__(self, path: Optional[Path] = None):
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Path:
+        if self._path is None:
+            self._path = get_data_dir() / 'run_metrics.jsonl'
+        return self._path
+
+    def append(self, record: Dict) -> None:
+        """記録を1行追記する。保存に失敗しても生成結果には影響させない"""
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            except OSError as e:
+                print(f"計測結果の保存に失敗しました: {e}")
+
+    def read(self, last: Optional[int] = None) -> List[Dict]:
+        """記録を古い順に返す。lastを指定すると直近の件数だけを返す。壊れた行は読み飛ばす"""
+        try:
+            lines = self.path.read_text(encoding='utf-8').splitlines()
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records[-last:] if last else records
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    return {'p50': percentile(values, 50), 'p90': percentile(values, 90),
+            'p99': percentile(values, 99), 'max': max(values)}
+
+
+def _sum_counts(counts_list: List[Dict[str, int]]) -> Dict[str, int]:
+    total: Dict[str, int] = {}
+    for counts in counts_list:
+        for key, count in counts.items():
+            total[key] = total.get(key, 0) + count
+    return dict(sorted(total.items()))
+
+
+def summarize(records: List[Dict]) -> Dict[str, Any]:
+    """記録の一覧から所要時間のパーセンタイル・要求数・キャッシュ利用率・トークン数・料金をまとめる"""
+    if not records:
+        return {'runs': 0}
+
+    stage_names = sorted({stage for record in records for stage in record.get('stages_ms', {})})
+    fetch_histogram = merge_histograms([record['repo_fetch_ms'] for record in records if 'repo_fetch_ms' in record])
+    cache: Dict[str, Dict[str, Any]] = {}
+    for name in ('commits', 'days'):
+        counts = _sum_counts([record.get('cache', {}).get(name, {}) for record in records])
+        lookups = counts.get('hits', 0) + counts.get('misses', 0)
+        cache[name] = {**counts, 'hit_ratio': round(counts.get('hits', 0) / lookups, 3) if lookups else None}
+
+    return {
+        'runs': len(records),
+        'from': records[0]['timestamp'],
+        'to': records[-1]['timestamp'],
+        'status': _sum_counts([{record['status']: 1} for record in records]),
+        'duration_ms': _percentiles([record['duration_ms'] for record in records]),
+        'stages_ms': {
+            stage: _percentiles([record['stages_ms'][stage] for record in records if stage in record['stages_ms']])
+            for stage in stage_names
+        },
+        'repo_fetch_ms': {
+            'count': sum(fetch_histogram['counts']),
+            'p50': histogram_quantile(0.5, fetch_histogram),
+            'p90': histogram_quantile(0.9, fetch_histogram),
+            'p99': histogram_quantile(0.99, fetch_histogram),
+        },
+        'requests': {
+            service: _sum_counts([record.get('requests', {}).get(service, {}) for record in records])
+            for service in ('github', 'gemini')
+        },
+        'cache': cache,
+        'input_tokens': sum(record.get('input_tokens', 0) for record in records),
+        'output_tokens': sum(record.get('output_tokens', 0) for record in records),
+        'cost_usd': round(sum(record.get('cost_usd', 0) for record in records), 6),
+    }
+
+
+def _labels(**labels: str) -> str:
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels.items()) + '}'
+
+
+def to_prometheus(records: List[Dict]) -> str:
+    """台帳の記録をPrometheusのテキスト形式（node_exporterのtextfile collector向け）に変換する
+
+    回数・トークン数・料金・ヒストグラムは全記録の累計、段階ごとの所要時間は記録の分位点とする"""
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List[Tuple[str, float]]):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{name}{labels} {value:g}' for labels, value in samples)
+
+    metric('codediary_runs_total', 'counter', 'Diary generation runs by kind and status.', [
+        (_labels(kind=kind, status=status), count)
+        for (kind, status), count in _sum_counts(
+            [{(record.get('kind', ''), record['status']): 1} for record in records]).items()
+    ])
+
+    lines.append('# HELP codediary_stage_duration_seconds Time spent per pipeline stage in one run.')
+    lines.append('# TYPE codediary_stage_duration_seconds summary')
+    for stage in sorted({stage for record in records for stage in record.get('stages_ms', {})}):
+        values = [record['stages_ms'][stage] / 1000 for record in records if stage in record['stages_ms']]
+        for quantile in (0.5, 0.9, 0.99):
+            lines.append(f'codediary_stage_duration_seconds{_labels(stage=stage, quantile=f"{quantile:g}")} '
+                         f'{percentile(values, quantile * 100):g}')
+        lines.append(f'codediary_stage_duration_seconds_sum{_labels(stage=stage)} {sum(values):g}')
+        lines.append(f'codediary_stage_duration_seconds_count{_labels(stage=stage)} {len(values)}')
+
+    histogram = merge_histograms([record['repo_fetch_ms'] for record in records if 'repo_fetch_ms' in record])
+    lines.append('# HELP codediary_repo_fetch_duration_seconds Commit fetch time per repository.')
+    lines.append('# TYPE codediary_repo_fetch_duration_seconds histogram')
+    cumulative = 0
+    for bound, count in zip(histogram['bounds'] + ['+Inf'], histogram['counts']):
+        cumulative += count
+        le = bound if bound == '+Inf' else f'{bound / 1000:g}'
+        lines.append(f'codediary_repo_fetch_duration_seconds_bucket{_labels(le=le)} {cumulative}')
+    lines.append(f'codediary_repo_fetch_duration_seconds_sum {histogram["sum"] / 1000:g}')
+    lines.append(f'codediary_repo_fetch_duration_seconds_count {cumulative}')
+
+    metric('codediary_requests_total', 'counter', 'Requests to external APIs by service and status.', [
+        (_labels(service=service, status=status), count)
+        for service in ('github', 'gemini')
+        for status, count in _sum_counts([record.get('requests', {}).get(service, {}) for record in records]).items()
+    ])
+    metric('codediary_cache_lookups_total', 'counter', 'Cache lookups by cache and result.', [
+        (_labels(cache=name, result=result), count)
+        for name in ('commits', 'days')
+        for result, count in _sum_counts([record.get('cache', {}).get(name, {}) for record in records]).items()
+    ])
+    metric('codediary_tokens_total', 'counter', 'Gemini tokens by direction.', [
+        (_labels(direction='input'), sum(record.get('input_tokens', 0) for record in records)),
+        (_labels(direction='output'), sum(record.get('output_tokens', 0) for record in records)),
+    ])
+    metric('codediary_estimated_cost_usd_total', 'counter', 'Estimated Gemini cost in US dollars.', [
+        ('', sum(record.get('cost_usd', 0) for record in records)),
+    ])
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def record_run(kind: str, since_date: Optional[str] = None, until_date: Optional[str] = None,
+               ledger: Optional[RunMetricsLedger] = None) -> Iterator[Dict[str, Any]]:
+    """withの間の処理を1回の実行として計測し、終了時に台帳へ追記する
+
+    返す辞書に項目を追加すると記録に含める（期間が処理中に決まる場合など）。statusを設定すると正常終了時の状態として記録する。
+    [Metrics] enabled = falseの場合は記録しない"""
+    run: Dict[str, Any] = {'kind': kind, 'since': since_date, 'until': until_date}
+    if not load_config().getboolean('Metrics', 'enabled', fallback=True):
+        yield run
+        return
+
+    start = time.perf_counter()
+    status = 'ok'
+    with record_spans() as recorder:
+        try:
+            yield run
+        except CancelledError:
+            status = 'cancelled'
+            raise
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            if status == 'ok':
+                status = run.pop('status', status)
+            (ledger or RunMetricsLedger()).append(
+                build_run_record(recorder, run, status, time.perf_counter() - start)
+            )
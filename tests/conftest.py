@@ -40,6 +40,14 @@ def setup_test_environment():
             del os.environ[key]
 
 
+@pytest.fixture(autouse=True)
+def isolated_data_dir(tmp_path, monkeypatch):
+    """キャッシュ等の作業ファイルをテストごとの一時ディレクトリに保存する"""
+    data_dir = tmp_path / 'codediary_data'
+    monkeypatch.setenv('CODEDIARY_DATA_DIR', str(data_dir))
+    return data_dir
+
+
 @pytest.fixture
 def mock_datetime():
     """datetimeオブジェクトのモック"""
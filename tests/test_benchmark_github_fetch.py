@@ -0,0 +1,74 @@
+import pytest
+
+from scripts.benchmark_github_fetch import compare, measure_fetch
+from scripts.fake_github_server import FakeGitHubServer, build_repositories
+
+
+@pytest.fixture
+def github_env(monkeypatch):
+    """トラッカーがスタブサーバーへ接続するよう環境変数を設定する"""
+    monkeypatch.setenv('GITHUB_TOKEN', 'test_token')
+    monkeypatch.setenv('GITHUB_USERNAME', 'test_user')
+
+    def connect(server: FakeGitHubServer):
+        monkeypatch.setenv('GITHUB_API_URL', server.url)
+    return connect
+
+
+class TestBenchmarkGitHubFetch:
+    """GitHubコミット取得ベンチマークとスタブサーバーの合成データ・障害注入のテストクラス"""
+
+    def test_build_repositories_spreads_commits_over_period(self):
+        """指定した数のコミットを期間内（JST）に等間隔で割り当てる"""
+        repos = build_repositories(3, 10, '2024-01-01', 5, body_lines=1)
+
+        assert len(repos) == 3
+        dates = [commit['commit']['author']['date'] for commit in repos['repo-000']]
+        assert len(dates) == 10
+        assert dates[0] == '2023-12-31T15:00:00Z'
+        assert dates[-1] < '2024-01-05T15:00:00Z'
+        assert '\n- ' in repos['repo-000'][0]['commit']['message']
+
+    def test_measure_fetch_pages_through_all_commits(self, github_env):
+        """全コミットをページ単位で取得し、要求数・受信量・ピークメモリを記録する"""
+        with FakeGitHubServer(build_repositories(3, 250, '2024-01-01', 10)) as server:
+            github_env(server)
+            result = measure_fetch(server, '2024-01-01', '2024-01-10')
+
+        assert result['commits'] == 750
+        assert result['requests'] == 1 + 3 * 3  # リポジトリ一覧 + リポジトリごとに3ページ
+        assert result['bytes'] > 0
+        assert result['peak_memory_kb'] > 0
+
+    def test_injected_errors_are_counted(self, github_env):
+        """注入した障害の応答はステータスごとに数え、全件を取得できなかった回は取得失敗とする"""
+        with FakeGitHubServer(build_repositories(2, 5, '2024-01-01', 1)) as server:
+            github_env(server)
+            server.fail_statuses = [None, 502]  # リポジトリ一覧は通常どおり、最初のコミット一覧で502
+            result = measure_fetch(server, '2024-01-01', '2024-01-01')
+
+        assert server.status_counts[502] == 1
+        assert result['commits'] == 0
+        assert result['failed'] == 1
+
+    def test_rate_limit_is_enforced(self, github_env):
+        """enforce_rate_limitを有効にすると残り回数が0の間は403を返す"""
+        with FakeGitHubServer(build_repositories(2, 5, '2024-01-01', 1)) as server:
+            github_env(server)
+            server.rate_limit_remaining = 1
+            server.enforce_rate_limit = True
+            result = measure_fetch(server, '2024-01-01', '2024-01-01')
+
+        assert result['commits'] == 0
+        assert result['failed'] == 1
+        assert server.status_counts[403] == 2
+
+    def test_compare_reports_change_ratio(self):
+        """前回の結果との比較で指標ごとの増加率を返す"""
+        baseline = {'median': {'wall_ms': 100.0, 'requests': 10, 'bytes': 1000, 'peak_memory_kb': 50.0}}
+        current = {'median': {'wall_ms': 150.0, 'requests': 10, 'bytes': 900, 'peak_memory_kb': 50.0}}
+
+        comparison = compare(current, baseline)
+
+        assert comparison['wall_ms']['change'] == 0.5
+        assert comparison['bytes']['change'] == -0.1
@@ -0,0 +1,216 @@
+import threading
+import time
+
+import pytest
+
+from external_service.gemini_api import GeminiAPIClient
+from scripts.fake_gemini_server import FakeGeminiServer
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+from service.github_commit_tracker import GitHubCommitTracker
+from utils.cancellation import CancellationToken, activate, child_token, on_cancel
+from utils.exceptions import CancelledError
+
+CANCEL_LATENCY_LIMIT = 1.0
+
+
+def run_and_cancel(target, token, cancel_after=0.3):
+    """別スレッドで処理を実行して途中で中止し、例外と中止から終了までの時間を返す"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = target()
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    time.sleep(cancel_after)
+    cancelled_at = time.perf_counter()
+    token.cancel()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    return outcome.get('error'), time.perf_counter() - cancelled_at
+
+
+class TestCancellationToken:
+    """CancellationTokenクラスのテストクラス"""
+
+    def test_cancel_calls_callbacks_once(self):
+        """中止時に登録済みの処理を1回だけ呼び出す"""
+        token = CancellationToken()
+        calls = []
+        token.register(lambda: calls.append('a'))
+        unregister = token.register(lambda: calls.append('b'))
+        unregister()
+
+        token.cancel()
+        token.cancel()
+
+        assert calls == ['a']
+        with pytest.raises(CancelledError):
+            token.raise_if_cancelled()
+
+    def test_register_after_cancel_runs_immediately(self):
+        """中止済みのトークンに登録した処理はすぐに呼び出す"""
+        token = CancellationToken()
+        token.cancel()
+        calls = []
+
+        token.register(lambda: calls.append('a'))
+
+        assert calls == ['a']
+
+    def test_wait_returns_on_cancel(self):
+        """待機中に中止されるとすぐにCancelledErrorを送出する"""
+        token = CancellationToken()
+
+        error, latency = run_and_cancel(lambda: token.wait(30), token, cancel_after=0.1)
+
+        assert isinstance(error, CancelledError)
+        assert latency < CANCEL_LATENCY_LIMIT
+
+    def test_child_token_follows_parent_only(self):
+        """子のトークンは親の中止で中止されるが、子だけを中止しても親には影響しない"""
+        parent = CancellationToken()
+        first, _ = child_token(parent)
+        second, unlink = child_token(parent)
+
+        first.cancel()
+        assert not parent.cancelled
+
+        unlink()
+        parent.cancel()
+        assert first.cancelled
+        assert not second.cancelled
+
+    def test_on_cancel_is_released_after_scope(self):
+        """activateの範囲を抜けるとon_cancelで登録した処理は解除される"""
+        token = CancellationToken()
+        calls = []
+        with activate(token):
+            on_cancel(lambda: calls.append('in scope'))
+        on_cancel(lambda: calls.append('no scope'))
+
+        token.cancel()
+
+        assert calls == []
+
+
+class TestGitHubCancellation:
+    """GitHubCommitTrackerの中止のテストクラス"""
+
+    @pytest.fixture
+    def tracker(self):
+        tracker = GitHubCommitTracker(token='test_token', username='test_user')
+        yield tracker
+        tracker.session.close()
+
+    @staticmethod
+    def commits_by_repo(count):
+        return {f'repo-{index}': [build_commit(f'{index:040d}', f'コミット{index}', '2024-01-15T01:00:00Z')]
+                for index in range(count)}
+
+    def test_cancel_while_listing_repositories(self, tracker):
+        """リポジトリ一覧の応答待ちで中止すると接続を切断してすぐに戻る"""
+        with FakeGitHubServer(self.commits_by_repo(3), response_delay=10) as server:
+            tracker.base_url = server.url
+            token = CancellationToken()
+
+            error, latency = run_and_cancel(
+                lambda: tracker.get_commits_for_diary_generation_range('2024-01-15', '2024-01-16', token), token
+            )
+
+        assert isinstance(error, CancelledError)
+        assert latency < CANCEL_LATENCY_LIMIT
+
+    def test_cancel_while_fetching_commits_in_parallel(self, tracker):
+        """並列のコミット取得中に中止すると全ワーカーが終了してから戻り、残りのリポジトリには問い合わせない"""
+        with FakeGitHubServer(self.commits_by_repo(20), commits_delay=10) as server:
+            tracker.base_url = server.url
+            token = CancellationToken()
+
+            error, latency = run_and_cancel(
+                lambda: tracker.get_commits_for_diary_generation_range('2024-01-15', '2024-01-16', token), token
+            )
+            time.sleep(0.2)
+
+            assert isinstance(error, CancelledError)
+            assert latency < CANCEL_LATENCY_LIMIT
+            assert server.request_count <= 1 + GitHubCommitTracker.MAX_WORKERS
+
+    def test_session_is_reusable_after_cancel(self, tracker):
+        """中止後も同じセッションで取得できる"""
+        with FakeGitHubServer(self.commits_by_repo(2), commits_delay=10) as server:
+            tracker.base_url = server.url
+            token = CancellationToken()
+            run_and_cancel(lambda: tracker.get_all_commits_by_date('2024-01-15', token), token)
+
+            server.commits_delay = 0
+
+            assert len(tracker.get_all_commits_by_date('2024-01-15', CancellationToken())) == 2
+
+
+class TestGeminiCancellation:
+    """GeminiAPIClientの中止のテストクラス"""
+
+    @pytest.fixture
+    def server(self):
+        with FakeGeminiServer(response_text="## 作業内容\n\nテスト") as server:
+            yield server
+
+    @pytest.fixture
+    def client(self, server):
+        client = GeminiAPIClient()
+        client.api_key = 'test_key'
+        client.default_model = 'test-model'
+        client.base_url = server.url
+        client.initialize()
+        return client
+
+    def test_cancel_in_flight_request(self, client, server):
+        """応答待ちで中止すると要求を打ち切り、次の生成ではクライアントを作り直す"""
+        server.response_delay = 10
+        token = CancellationToken()
+
+        error, latency = run_and_cancel(lambda: client.generate("プロンプト", token), token)
+
+        assert isinstance(error, CancelledError)
+        assert latency < CANCEL_LATENCY_LIMIT
+        assert client.client is None
+
+        server.response_delay = 0
+        client.initialize()
+        assert client.generate("プロンプト")[0] == "## 作業内容\n\nテスト"
+
+    def test_cancel_during_retry_backoff(self, client, server):
+        """再試行の待機中に中止すると次の要求を送らずに戻る"""
+        server.fail_statuses = [503]
+        client.RETRY_BASE_DELAY = 20
+        client.RETRY_MAX_DELAY = 20
+        token = CancellationToken()
+
+        error, latency = run_and_cancel(lambda: client.generate_content("プロンプト", 'test-model', None, token),
+                                        token, cancel_after=0.5)
+
+        assert isinstance(error, CancelledError)
+        assert latency < CANCEL_LATENCY_LIMIT
+        assert server.request_count == 1
+
+    def test_cancel_does_not_abort_other_requests(self, client, server):
+        """別の生成の要求が通信中であればクライアントを閉じず、中止した要求のみすぐに戻る"""
+        server.response_delay = 1.0
+        other = {}
+        other_thread = threading.Thread(
+            target=lambda: other.update(result=client.generate("プロンプト", CancellationToken())), daemon=True
+        )
+        other_thread.start()
+        token = CancellationToken()
+
+        error, latency = run_and_cancel(lambda: client.generate("プロンプト", token), token)
+        other_thread.join(timeout=5)
+
+        assert isinstance(error, CancelledError)
+        assert latency < CANCEL_LATENCY_LIMIT
+        assert other['result'][0] == "## 作業内容\n\nテスト"
+        assert client.client is not None
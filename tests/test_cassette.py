@@ -0,0 +1,97 @@
+import gzip
+import time
+
+import pytest
+
+from external_service.gemini_api import GeminiAPIClient
+from scripts.cassette import CassettePlayer, CassetteRecorder, load_cassette
+from scripts.fake_gemini_server import FakeGeminiServer
+from scripts.fake_github_server import FakeGitHubServer, build_repositories
+from service.github_commit_tracker import GitHubCommitTracker
+
+
+def _run_session(monkeypatch, urls):
+    """接続先をurlsに向けてコミット取得と日誌生成を1回ずつ行い、結果を返す"""
+    monkeypatch.setenv('GITHUB_API_URL', urls['github'])
+    tracker = GitHubCommitTracker(token='secret_token', username='test_user')
+    commits = tracker.get_commits_for_diary_generation_range('2024-01-01', '2024-01-02')
+
+    client = GeminiAPIClient()
+    client.api_key = 'secret_key'
+    client.default_model = 'test-model'
+    client.base_url = urls['gemini']
+    client.max_retries = 0
+    client.initialize()
+    start = time.perf_counter()
+    generated = client.generate_content("日誌を作成してください", 'test-model')
+    return commits, generated, time.perf_counter() - start
+
+
+@pytest.fixture
+def cassette_path(monkeypatch, tmp_path):
+    """GitHub・Geminiのスタブへの通信を記録したカセットを作る"""
+    path = tmp_path / 'session.json.gz'
+    with FakeGitHubServer(build_repositories(2, 120, '2024-01-01', 2)) as github, \
+            FakeGeminiServer(response_text="## 作業内容\n\n記録した応答\n", response_delay=0.3) as gemini, \
+            CassetteRecorder({'github': github.url, 'gemini': gemini.url}) as recorder:
+        recorded = _run_session(monkeypatch, recorder.urls)
+        recorder.save(path)
+    return path, recorded
+
+
+class TestCassette:
+    """通信の記録・再生のテストクラス"""
+
+    def test_record_saves_compressed_interactions_without_secrets(self, cassette_path):
+        """すべての要求・応答と所要時間を圧縮して保存し、認証情報は保存しない"""
+        path, (commits, generated, _) = cassette_path
+
+        cassette = load_cassette(path)
+        services = [entry['service'] for entry in cassette['interactions']]
+        assert services.count('github') == 1 + 2 * 2  # リポジトリ一覧 + リポジトリごとに2ページ
+        assert services.count('gemini') == 1
+        assert all(entry['duration'] >= 0 for entry in cassette['interactions'])
+        raw = gzip.decompress(path.read_bytes()).decode('utf-8')
+        assert 'secret_token' not in raw
+        assert 'secret_key' not in raw
+        assert len(commits) == 240
+        assert "記録した応答" in generated[0]
+
+    def test_replay_returns_recorded_responses_offline(self, monkeypatch, cassette_path):
+        """元のサーバーを止めた状態でも記録と同じ結果を返す"""
+        path, (commits, generated, _) = cassette_path
+
+        with CassettePlayer(load_cassette(path), latency_scale=0) as player:
+            replayed_commits, replayed_generated, _ = _run_session(monkeypatch, player.urls)
+
+        assert replayed_commits == commits
+        assert replayed_generated == generated
+        assert player.misses == []
+        assert player.served == 6
+
+    def test_replay_scales_recorded_latency(self, monkeypatch, cassette_path):
+        """記録時の所要時間に倍率をかけて応答を遅らせる"""
+        path, (_, _, recorded_seconds) = cassette_path
+        cassette = load_cassette(path)
+
+        with CassettePlayer(cassette, latency_scale=0) as player:
+            _, _, instant_seconds = _run_session(monkeypatch, player.urls)
+        with CassettePlayer(cassette, latency_scale=1.0) as player:
+            _, _, original_seconds = _run_session(monkeypatch, player.urls)
+
+        assert recorded_seconds >= 0.3
+        assert instant_seconds < 0.25
+        assert original_seconds >= 0.3
+
+    def test_unknown_request_is_reported_as_miss(self, monkeypatch, cassette_path):
+        """記録にない要求には404を返し、missesに記録する"""
+        path, _ = cassette_path
+
+        with CassettePlayer(load_cassette(path), latency_scale=0) as player:
+            monkeypatch.setenv('GITHUB_API_URL', player.urls['github'])
+            tracker = GitHubCommitTracker(token='secret_token', username='other_user')
+            assert tracker.get_commits_for_repo_by_date_range('unknown-repo', '2024-01-01', '2024-01-02') == []
+
+        assert player.misses == ['github GET /repos/other_user/unknown-repo/commits'
+                                 '?author=other_user&since=2023-12-31T15%3A00%3A00Z'
+                                 '&until=2024-01-02T15%3A00%3A00Z&per_page=100&page=1']
@@ -0,0 +1,182 @@
+import json
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from codediary.cli import EXIT_ERROR, EXIT_OK, main
+from scripts.fake_gemini_server import FakeGeminiServer
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """GitHub APIとGemini APIのスタブサーバーを起動し、接続先を環境変数・設定に反映する"""
+    commits_by_repo = {
+        'repo-a': [build_commit('a' * 40, '機能追加', '2024-01-15T01:00:00Z')],
+        'repo-b': [build_commit('b' * 40, '不具合修正', '2024-01-16T02:00:00Z')],
+    }
+    with FakeGitHubServer(commits_by_repo) as github, \
+            FakeGeminiServer(response_text="## 作業内容\n\nCLIから生成") as gemini:
+        monkeypatch.setenv('GITHUB_TOKEN', 'test_token')
+        monkeypatch.setenv('GITHUB_USERNAME', 'test_user')
+        monkeypatch.setenv('GITHUB_API_URL', github.url)
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_API_KEY', 'test_key')
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_MODEL', 'test-model')
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_BASE_URL', gemini.url)
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_LATENCY_TARGET', None)
+        yield github, gemini
+
+
+class TestGenerateCommand:
+    """codediary generateコマンドのテストクラス"""
+
+    def test_generate_saves_diary_and_prints_json(self, servers, tmp_path, capsys):
+        """日誌を生成して指定のファイルに保存し、所要時間とトークン数をJSONで出力する"""
+        github, gemini = servers
+        output = tmp_path / 'diary.md'
+
+        exit_code = main(['generate', '--since', '2024-01-15', '--until', '2024-01-16',
+                          '--output', str(output), '--no-obsidian'])
+
+        result = json.loads(capsys.readouterr().out)
+        assert exit_code == EXIT_OK
+        assert result['status'] == 'ok'
+        assert result['output'] == str(output)
+        assert result['written'] is True
+        assert set(result['timings']) == {'import_ms', 'init_ms', 'generate_ms', 'save_ms', 'total_ms'}
+        assert "CLIから生成" in output.read_text(encoding='utf-8')
+        assert gemini.request_count == 2
+        assert github.paths.count('/user/repos') == 1
+
+    def test_trace_option_writes_stage_spans(self, servers, tmp_path, capsys):
+        """--traceを指定すると取得・整形・プロンプト組み立て・Gemini呼び出し・保存の区間を書き出す"""
+        from utils.tracing import read_trace
+        trace_path = tmp_path / 'trace.json'
+
+        exit_code = main(['--trace', str(trace_path), 'generate', '--since', '2024-01-15', '--until', '2024-01-16',
+                          '--output', str(tmp_path / 'diary.md'), '--no-obsidian'])
+
+        result = json.loads(capsys.readouterr().out)
+        spans = [event for event in read_trace(trace_path) if event['ph'] == 'X']
+        names = [event['name'] for event in spans]
+        assert exit_code == EXIT_OK
+        assert result['trace'] == str(trace_path)
+        for name in ('generate_diary', 'fetch_commits', 'github.discover_repositories', 'format_commits',
+                     'generate_day', 'build_prompt', 'gemini.generate', 'gemini.request', 'merge_days',
+                     'save_diary', 'write'):
+            assert name in names
+        assert sorted(event['args']['repo'] for event in spans if event['name'] == 'github.fetch_repo') == \
+            ['repo-a', 'repo-b']
+        assert [event['args']['day'] for event in spans if event['name'] == 'generate_day'] == \
+            ['2024-01-15', '2024-01-16']
+
+    def test_profile_option_writes_reports_next_to_diary(self, servers, tmp_path, capsys):
+        """--profileを指定すると段階ごとの.profとメモリ確保の報告を日誌と同じフォルダに書き出す"""
+        output = tmp_path / 'diary.md'
+
+        exit_code = main(['generate', '--since', '2024-01-15', '--until', '2024-01-16',
+                          '--output', str(output), '--no-obsidian', '--profile'])
+
+        result = json.loads(capsys.readouterr().out)
+        profile_dir = tmp_path / 'diary_profile'
+        assert exit_code == EXIT_OK
+        assert result['profile'] == str(profile_dir)
+        assert sorted(path.name for path in profile_dir.iterdir()) == [
+            '01_fetch.prof', '01_fetch_allocations.txt', '02_generate.prof', '02_generate_allocations.txt',
+            '03_merge.prof', '03_merge_allocations.txt',
+        ]
+
+    def test_invalid_range_reports_error(self, servers, tmp_path, capsys):
+        """開始日が終了日より後の場合は終了コード1でエラーをJSONで出力し、何も保存しない"""
+        output = tmp_path / 'diary.md'
+
+        exit_code = main(['generate', '--since', '2024-01-16', '--until', '2024-01-15',
+                          '--output', str(output), '--no-obsidian'])
+
+        result = json.loads(capsys.readouterr().out)
+        assert exit_code == EXIT_ERROR
+        assert result['status'] == 'error'
+        assert not output.exists()
+
+    def test_invalid_date_format_is_rejected(self, capsys):
+        """日付の形式が不正な場合は引数エラーで終了する"""
+        with pytest.raises(SystemExit):
+            main(['generate', '--since', '2024/01/15'])
+
+        assert "YYYY-MM-DD" in capsys.readouterr().err
+
+
+class TestBackfillCommand:
+    """codediary backfillコマンドのテストクラス"""
+
+    def test_backfill_writes_note_per_day_and_resumes(self, servers, tmp_path, capsys):
+        """期間を1回で取得して1日1ノートを保存し、再実行ではコミットのなかった日だけを取得し直す"""
+        github, gemini = servers
+        args = ['backfill', '--since', '2024-01-14', '--until', '2024-01-16', '--rate', '0']
+
+        with patch('service.diary_backfill.build_diary_path', side_effect=lambda day: tmp_path / f'{day}.md'):
+            exit_code = main(args)
+            result = json.loads(capsys.readouterr().out)
+            rerun_exit_code = main(args)
+            rerun = json.loads(capsys.readouterr().out)
+
+        assert exit_code == EXIT_OK
+        assert rerun_exit_code == EXIT_OK
+        assert result['generated'] == 2
+        assert result['empty'] == 1
+        assert gemini.request_count == 2
+        assert sorted(path.name for path in tmp_path.glob('*.md')) == ['2024-01-15.md', '2024-01-16.md']
+        assert rerun['resumed'] == 2
+        assert rerun['empty'] == 1
+        assert github.paths.count('/user/repos') == 2
+        assert gemini.request_count == 2
+
+    def test_backfill_requires_start_date(self, servers, capsys):
+        """開始日の指定がない場合はエラーを出力する"""
+        exit_code = main(['backfill'])
+
+        assert exit_code == EXIT_ERROR
+        assert json.loads(capsys.readouterr().out)['status'] == 'error'
+
+
+class TestDaemonCommand:
+    """codediary daemonコマンドのテストクラス"""
+
+    def test_daemon_once_syncs_today(self, servers, tmp_path, capsys):
+        """--onceでは今日の分をすぐに作成して保存先をJSONで出力する"""
+        github, gemini = servers
+
+        with patch('service.diary_scheduler.datetime') as mock_datetime, \
+                patch('service.diary_scheduler.build_diary_path', side_effect=lambda day: tmp_path / f'{day}.md'):
+            mock_datetime.now.return_value = datetime(2024, 1, 15, 23, 30, tzinfo=timezone(timedelta(hours=9)))
+            mock_datetime.fromisoformat = datetime.fromisoformat
+            exit_code = main(['daemon', '--once'])
+
+        result = json.loads(capsys.readouterr().out)
+        assert exit_code == EXIT_OK
+        assert list(result['saved']) == ['2024-01-15']
+        assert gemini.request_count == 1
+
+
+class TestMetricsCommand:
+    """codediary metricsコマンドのテストクラス"""
+
+    def test_metrics_summarizes_runs_and_writes_prometheus(self, servers, tmp_path, capsys):
+        """生成のたびに記録した計測結果を集計してJSONで出力し、Prometheus形式のファイルも書き出す"""
+        for _ in range(2):
+            main(['generate', '--since', '2024-01-15', '--until', '2024-01-16',
+                  '--output', str(tmp_path / 'diary.md'), '--no-obsidian'])
+        capsys.readouterr()
+        prometheus_path = tmp_path / 'textfile' / 'codediary.prom'
+
+        exit_code = main(['metrics', '--last', '2', '--prometheus', str(prometheus_path)])
+
+        result = json.loads(capsys.readouterr().out)
+        assert exit_code == EXIT_OK
+        assert result['runs'] == 2
+        assert result['status'] == {'ok': 2}
+        assert set(result['duration_ms']) == {'p50', 'p90', 'p99', 'max'}
+        assert result['cache']['days']['hit_ratio'] == 0.5
+        assert result['repo_fetch_ms']['count'] == 4
+        assert 'codediary_runs_total{kind="generate",status="ok"} 2' in prometheus_path.read_text(encoding='utf-8')
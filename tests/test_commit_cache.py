@@ -0,0 +1,53 @@
+from unittest.mock import patch
+
+from service.commit_cache import CommitCache
+
+
+class TestCommitCache:
+    """CommitCacheクラスのテストクラス"""
+
+    def test_put_and_get(self):
+        """保存した期間のコミット一覧を取得できる"""
+        cache = CommitCache()
+        commits = [{'hash': 'abc123'}]
+
+        cache.put('2024-01-01', '2024-01-02', commits)
+
+        assert cache.get('2024-01-01', '2024-01-02') == commits
+        assert cache.get('2024-01-01', None) is None
+
+    def test_expired_entry_is_discarded(self):
+        """有効期限を過ぎたコミット一覧は返さない"""
+        cache = CommitCache(ttl_seconds=10)
+
+        with patch('service.commit_cache.time.monotonic', return_value=100.0) as monotonic:
+            cache.put('2024-01-01', None, [{'hash': 'abc123'}])
+            monotonic.return_value = 111.0
+            assert cache.get('2024-01-01', None) is None
+
+    def test_expired_entries_are_purged_on_put_and_get_covering(self):
+        """期限切れの期間は別の期間の保存・包含検索のときにも破棄し、溜まり続けない"""
+        cache = CommitCache(ttl_seconds=10)
+
+        with patch('service.commit_cache.time.monotonic', return_value=100.0) as monotonic:
+            cache.put('2024-01-01', '2024-01-07', [{'hash': 'abc123', 'timestamp': '2024-01-03T10:00:00+09:00'}])
+            cache.put('2024-01-08', None, [])
+            monotonic.return_value = 111.0
+
+            assert cache.get_covering('2024-01-02', '2024-01-04') is None
+            assert cache._entries == {}
+
+            cache.put('2024-01-09', None, [])
+            monotonic.return_value = 122.0
+            cache.put('2024-01-10', None, [])
+            assert list(cache._entries) == [('2024-01-10', None)]
+
+    def test_invalidate(self):
+        """破棄した期間は取得できない"""
+        cache = CommitCache()
+        cache.put('2024-01-01', None, [])
+
+        cache.invalidate('2024-01-01', None)
+        cache.invalidate('2024-01-02', None)
+
+        assert cache.get('2024-01-01', None) is None
@@ -0,0 +1,111 @@
+import configparser
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+from service.github_commit_tracker import GitHubCommitTracker
+from service.programming_diary_generator import ProgrammingDiaryGenerator
+from utils.cancellation import CancellationToken
+from utils.exceptions import CancelledError
+
+
+@pytest.fixture
+def server():
+    """2リポジトリ分のコミットを返すGitHub APIのスタブサーバー"""
+    commits_by_repo = {
+        'repo-a': [build_commit('a' * 40, '機能追加', '2024-01-15T01:00:00Z')],
+        'repo-b': [build_commit('b' * 40, '不具合修正', '2024-01-16T02:00:00Z')],
+    }
+    with FakeGitHubServer(commits_by_repo) as server:
+        yield server
+
+
+@pytest.fixture
+def generator(server):
+    """スタブサーバーに接続し、AI呼び出しをモックにした日誌生成クラス"""
+    config = configparser.ConfigParser()
+    config.read_dict({'GITHUB': {'prefetch_min_rate_remaining': '50', 'prefetch_ttl_seconds': '60'}})
+    ai_client = Mock()
+    ai_client.default_model = 'test-model'
+    ai_client.generate.return_value = ("## 作業内容\n\n内容", 100, 20, 'test-model')
+
+    with patch('service.programming_diary_generator.load_environment_variables'), \
+         patch('service.programming_diary_generator.load_config', return_value=config), \
+         patch('service.programming_diary_generator.GeminiAPIClient', return_value=ai_client):
+        generator = ProgrammingDiaryGenerator()
+    generator.github_tracker = GitHubCommitTracker(token='test_token', username='test_user')
+    generator.github_tracker.base_url = server.url
+    with patch.object(generator, '_load_prompt_template', return_value="テンプレート"):
+        yield generator
+    generator.github_tracker.session.close()
+
+
+class TestCommitPrefetch:
+    """ProgrammingDiaryGenerator.prefetch_commitsのテストクラス"""
+
+    def test_generation_after_prefetch_skips_github(self, generator, server):
+        """先読みした期間の生成ではGitHubに問い合わせずAI呼び出しのみ行う"""
+        assert generator.prefetch_commits('2024-01-15', '2024-01-16') is True
+        requests_after_prefetch = server.request_count
+
+        generator.generate_diary(since_date='2024-01-15', until_date='2024-01-16')
+
+        assert server.request_count == requests_after_prefetch
+        assert generator.ai_client.generate.call_count == 2
+
+    def test_prefetch_is_not_repeated(self, generator, server):
+        """先読み済みの期間は再取得しない"""
+        generator.prefetch_commits('2024-01-15', '2024-01-16')
+        request_count = server.request_count
+
+        assert generator.prefetch_commits('2024-01-15', '2024-01-16') is False
+        assert server.request_count == request_count
+
+    def test_superseded_prefetch_is_cancelled(self, generator, server):
+        """期間の変更で中止した先読みはすぐに終了し、キャッシュに残さない"""
+        server.commits_delay = 10
+        token = CancellationToken()
+        errors = []
+
+        def prefetch():
+            try:
+                generator.prefetch_commits('2024-01-15', '2024-01-16', token)
+            except CancelledError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=prefetch)
+        thread.start()
+        time.sleep(0.3)
+
+        token.cancel()
+        thread.join(timeout=1)
+
+        assert not thread.is_alive()
+        assert len(errors) == 1
+        assert generator.commit_cache.get('2024-01-15', '2024-01-16') is None
+        assert generator._fetching == {}
+
+    def test_generation_waits_for_running_prefetch(self, generator, server):
+        """同じ期間の先読みが実行中の場合は完了を待ち、重複して取得しない"""
+        server.commits_delay = 0.5
+        thread = threading.Thread(target=generator.prefetch_commits, args=('2024-01-15', '2024-01-16'))
+        thread.start()
+        time.sleep(0.2)
+
+        generator.generate_diary(since_date='2024-01-15', until_date='2024-01-16')
+        thread.join()
+
+        assert server.paths.count('/user/repos') == 1
+
+    def test_prefetch_respects_rate_budget(self, generator, server):
+        """GitHub APIの残り回数が設定値を下回る場合は先読みしない"""
+        server.rate_limit_remaining = 52
+        generator.prefetch_commits('2024-01-15', '2024-01-16')
+        request_count = server.request_count
+
+        assert generator.github_tracker.rate_limit_remaining == 49
+        assert generator.prefetch_commits('2024-01-01', '2024-01-02') is False
+        assert server.request_count == request_count
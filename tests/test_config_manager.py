@@ -0,0 +1,140 @@
+import configparser
+import os
+import threading
+
+import pytest
+
+from utils import config_manager
+from utils.config_manager import flush_config, load_config, subscribe_config, update_config
+
+
+@pytest.fixture
+def config_path(tmp_path, monkeypatch):
+    """一時フォルダの設定ファイルを読み書きするよう切り替える"""
+    path = tmp_path / 'config.ini'
+    path.write_text("[Path]\ndaily_path = C:\\Diary\n\n[WindowSettings]\nwindow_x = 10\n", encoding='utf-8')
+    monkeypatch.setattr(config_manager, 'CONFIG_PATH', str(path))
+    monkeypatch.setattr(config_manager, '_cached_config', None)
+    monkeypatch.setattr(config_manager, '_cached_signature', None)
+    monkeypatch.setattr(config_manager, '_pending_changes', {})
+    monkeypatch.setattr(config_manager, '_subscribers', [])
+    yield path
+    if config_manager._save_timer is not None:
+        config_manager._save_timer.cancel()
+    monkeypatch.setattr(config_manager, '_save_timer', None)
+
+
+def edit(path, content):
+    """更新日時が確実に変わるよう書き換える"""
+    stat = path.stat()
+    path.write_text(content, encoding='utf-8')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+class TestLoadConfig:
+    """load_config関数のテストクラス"""
+
+    def test_unchanged_file_is_not_parsed_again(self, config_path, mocker):
+        """ファイルが変わっていなければ解析せずキャッシュを返す"""
+        parse = mocker.spy(config_manager, '_parse_config')
+
+        first = load_config()
+        second = load_config()
+
+        assert first is second
+        assert parse.call_count == 1
+
+    def test_reloads_in_place_and_notifies(self, config_path):
+        """変更されたファイルは同じオブジェクトに読み込み直し、購読者に通知する"""
+        config = load_config()
+        notified = []
+        subscribe_config(notified.append)
+
+        edit(config_path, "[Path]\ndaily_path = D:\\Diary\n")
+
+        assert load_config() is config
+        assert config.get('Path', 'daily_path') == 'D:\\Diary'
+        assert not config.has_section('WindowSettings')
+        assert notified == [config]
+
+    def test_invalid_edit_keeps_previous_config(self, config_path):
+        """解析できない変更の場合は前回の設定を使い続ける"""
+        config = load_config()
+
+        edit(config_path, "daily_path without section\n")
+
+        assert load_config().get('Path', 'daily_path') == 'C:\\Diary'
+
+    def test_reads_wait_for_reload_to_finish(self, config_path, monkeypatch):
+        """再読み込みで中身を入れ替えている間に別スレッドから読んでも、入れ替え後の値を返す"""
+        config = load_config()
+        read_dict = config.read_dict
+        readers = []
+        results = []
+
+        def read():
+            try:
+                results.append(config.get('Path', 'daily_path'))
+            except configparser.Error as e:
+                results.append(e)
+
+        def read_during_replace(*args, **kwargs):
+            # 古いセクションを削除し、新しい内容を読み込む前に別スレッドから読む
+            reader = threading.Thread(target=read)
+            readers.append(reader)
+            reader.start()
+            reader.join(timeout=0.2)
+            read_dict(*args, **kwargs)
+
+        monkeypatch.setattr(config, 'read_dict', read_during_replace)
+        edit(config_path, "[Path]\ndaily_path = D:\\Diary\n")
+        load_config()
+        readers[0].join(timeout=5)
+
+        assert results == ['D:\\Diary']
+
+
+class TestUpdateConfig:
+    """update_config・flush_config関数のテストクラス"""
+
+    def test_batches_updates_into_one_write(self, config_path, mocker):
+        """連続した変更は待ち時間の後に1回だけ保存する"""
+        write = mocker.spy(config_manager, 'atomic_write_text')
+
+        for x in range(5):
+            update_config({'WindowSettings': {'window_x': str(100 + x)}}, delay=60)
+        assert write.call_count == 0
+
+        flush_config()
+
+        assert write.call_count == 1
+        assert 'window_x = 104' in config_path.read_text(encoding='utf-8')
+
+    def test_unchanged_values_are_not_written(self, config_path, mocker):
+        """値が変わらない場合は保存しない"""
+        write = mocker.spy(config_manager, 'atomic_write_text')
+
+        update_config({'WindowSettings': {'window_x': '10'}}, delay=60)
+        flush_config()
+
+        assert write.call_count == 0
+
+    def test_debounced_save_runs_after_delay(self, config_path):
+        """待ち時間が過ぎると自動で保存する"""
+        update_config({'WindowSettings': {'window_y': '20'}}, delay=0.05)
+
+        config_manager._save_timer.join(timeout=5)
+
+        assert 'window_y = 20' in config_path.read_text(encoding='utf-8')
+
+    def test_keeps_external_edits_and_pending_changes(self, config_path):
+        """保存待ちの間に外部で編集された内容と、アプリの変更の両方を保存する"""
+        load_config()
+        update_config({'WindowSettings': {'window_x': '300'}}, delay=60)
+
+        edit(config_path, "[Path]\ndaily_path = D:\\Diary\n\n[WindowSettings]\nwindow_x = 10\n")
+        flush_config()
+
+        content = config_path.read_text(encoding='utf-8')
+        assert 'daily_path = D:\\Diary' in content
+        assert 'window_x = 300' in content
@@ -0,0 +1,54 @@
+from service.day_summary_cache import DaySummaryCache
+
+
+class TestDaySummaryCache:
+    """DaySummaryCacheクラスのテストクラス"""
+
+    COMMITS = [
+        {'hash': 'abc123', 'message': '[repo] 初期コミット'},
+        {'hash': 'def456', 'message': '[repo] 機能追加'},
+    ]
+
+    def test_fingerprint_ignores_commit_order(self):
+        """コミットの並び順が違ってもフィンガープリントは同じ"""
+        first = DaySummaryCache.fingerprint(self.COMMITS, 'model', 'template')
+        second = DaySummaryCache.fingerprint(list(reversed(self.COMMITS)), 'model', 'template')
+
+        assert first == second
+
+    def test_fingerprint_changes_with_commits_model_and_template(self):
+        """コミット・モデル・プロンプトのいずれかが変わるとフィンガープリントも変わる"""
+        base = DaySummaryCache.fingerprint(self.COMMITS, 'model', 'template')
+
+        assert base != DaySummaryCache.fingerprint(self.COMMITS[:1], 'model', 'template')
+        assert base != DaySummaryCache.fingerprint(self.COMMITS, 'other-model', 'template')
+        assert base != DaySummaryCache.fingerprint(self.COMMITS, 'model', 'other-template')
+
+    def test_put_and_get(self, tmp_path):
+        """保存した結果をフィンガープリントが一致する場合に取得できる"""
+        cache = DaySummaryCache(tmp_path)
+
+        cache.put('2024-01-15', 'fp', '## 作業内容\n\n内容', 'model', 100, 200)
+
+        assert cache.get('2024-01-15', 'fp') == '## 作業内容\n\n内容'
+
+    def test_get_returns_none_when_fingerprint_differs(self, tmp_path):
+        """フィンガープリントが異なる場合はNoneを返す"""
+        cache = DaySummaryCache(tmp_path)
+        cache.put('2024-01-15', 'fp', '内容', 'model', 100, 200)
+
+        assert cache.get('2024-01-15', 'changed') is None
+
+    def test_get_returns_none_when_missing_or_broken(self, tmp_path):
+        """キャッシュが存在しない・壊れている場合はNoneを返す"""
+        cache = DaySummaryCache(tmp_path)
+        (tmp_path / '2024-01-16.json').write_text('{broken', encoding='utf-8')
+
+        assert cache.get('2024-01-15', 'fp') is None
+        assert cache.get('2024-01-16', 'fp') is None
+
+    def test_default_cache_dir_uses_data_dir(self, isolated_data_dir):
+        """保存先を指定しない場合はデータディレクトリ配下を使用する"""
+        cache = DaySummaryCache()
+
+        assert cache.cache_dir == isolated_data_dir / 'day_cache'
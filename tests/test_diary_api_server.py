@@ -0,0 +1,224 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from unittest.mock import Mock, patch
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+import pytest
+
+from scripts.fake_gemini_server import FakeGeminiServer
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+from service.diary_api_server import DiaryAPI, DiaryAPIServer, merge_overlapping
+
+
+def _request(url: str, method: str = 'GET', payload=None):
+    """APIに要求を送り、(ステータス, JSON)を返す"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def api_server(monkeypatch, tmp_path):
+    """GitHub・Geminiのスタブサーバーに接続したAPIサーバーを起動する"""
+    commits_by_repo = {
+        repo: [build_commit(f'{repo}{day}'.ljust(40, '0'), f'{repo}の変更{day}', f'2024-01-{day:02d}T01:00:00Z')
+               for day in range(1, 8)]
+        for repo in ('repo-a', 'repo-b')
+    }
+    with FakeGitHubServer(commits_by_repo, commits_delay=0.1) as github, \
+            FakeGeminiServer(response_text="## 作業内容\n\nAPIから生成\n", response_delay=0.1) as gemini:
+        monkeypatch.setenv('GITHUB_TOKEN', 'test_token')
+        monkeypatch.setenv('GITHUB_USERNAME', 'test_user')
+        monkeypatch.setenv('GITHUB_API_URL', github.url)
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_API_KEY', 'test_key')
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_MODEL', 'test-model')
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_BASE_URL', gemini.url)
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_LATENCY_TARGET', None)
+        from service.programming_diary_generator import ProgrammingDiaryGenerator
+
+        with patch('service.diary_api_server.build_diary_path', side_effect=lambda day: tmp_path / f'{day}.md'), \
+                DiaryAPIServer(DiaryAPI(ProgrammingDiaryGenerator(), max_workers=4, coalesce_window=0.1)) as server:
+            yield server, github, gemini
+
+
+class TestMergeOverlapping:
+    """merge_overlapping関数のテストクラス"""
+
+    def test_merges_only_overlapping_ranges(self):
+        """重なる期間のみをまとめ、まとめた数を返す"""
+        ranges = [('2024-01-03', '2024-01-05'), ('2024-01-01', '2024-01-03'), ('2024-01-10', '2024-01-10')]
+
+        assert merge_overlapping(ranges) == [('2024-01-01', '2024-01-05', 2), ('2024-01-10', '2024-01-10', 1)]
+
+
+class TestDiaryAPI:
+    """DiaryAPIクラスのテストクラス"""
+
+    def test_saved_path_is_dropped_with_pruned_job(self, tmp_path):
+        """保存した日誌のパスはジョブと一緒に一覧から削除され、ジョブの数だけ溜まり続けない"""
+        generator = Mock()
+        generator.generate_diary.return_value = ("## 作業内容", 10, 5, 'test-model')
+        api = DiaryAPI(generator, max_workers=1, coalesce_window=0)
+        try:
+            with patch('service.diary_api_server.build_diary_path', side_effect=lambda day: tmp_path / f'{day}.md'):
+                jobs = []
+                for day in range(1, api.queue.MAX_FINISHED_JOBS + 3):
+                    job = api.generate(f'2024-01-{day:02d}', save=True)
+                    assert job.wait(5)
+                    jobs.append(job)
+        finally:
+            api.shutdown()
+
+        assert api.get(jobs[0].job_id) is None
+        assert api.describe(jobs[-1])['saved_path'].endswith('2024-01-12.md')
+
+    def test_reports_saving_until_diary_is_saved(self, tmp_path):
+        """生成が終わっても保存が終わるまではsavingを返し、保存後にdoneと保存先を返す"""
+        generator = Mock()
+        generator.generate_diary.return_value = ("## 作業内容", 10, 5, 'test-model')
+        api = DiaryAPI(generator, max_workers=1, coalesce_window=0)
+        saving = threading.Event()
+        release = threading.Event()
+
+        def slow_save(file_path, content):
+            saving.set()
+            release.wait(5)
+            return True
+
+        try:
+            with patch('service.diary_api_server.build_diary_path', side_effect=lambda day: tmp_path / f'{day}.md'), \
+                    patch('service.diary_api_server.save_diary', side_effect=slow_save):
+                job = api.generate('2024-01-01', save=True)
+                assert saving.wait(5)
+
+                described = api.describe(job)
+                assert described['status'] == 'saving'
+                assert 'content' not in described
+                assert 'saved_path' not in described
+
+                release.set()
+                assert job.wait(5)
+        finally:
+            api.shutdown()
+
+        described = api.describe(job)
+        assert described['status'] == 'done'
+        assert described['saved_path'].endswith('2024-01-01.md')
+
+
+class TestDiaryAPIServer:
+    """DiaryAPIServerクラスのテストクラス"""
+
+    def test_generate_and_wait_returns_content(self, api_server):
+        """wait指定の生成は完了まで待って内容とトークン数を返し、ジョブの状態も取得できる"""
+        server, github, gemini = api_server
+
+        status, job = _request(f'{server.url}/generate', 'POST',
+                               {'since': '2024-01-01', 'until': '2024-01-02', 'wait': True})
+
+        assert status == 200
+        assert job['status'] == 'done'
+        assert "APIから生成" in job['content']
+        assert job['output_tokens'] > 0
+        assert _request(f'{server.url}/jobs/{job["id"]}') == (200, job)
+
+    def test_concurrent_same_range_shares_one_job(self, api_server):
+        """同じ期間の同時要求は1つのジョブを共有し、GitHub・Geminiへの要求も1回分になる"""
+        server, github, gemini = api_server
+        payload = {'since': '2024-01-01', 'until': '2024-01-01', 'wait': True}
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            results = list(executor.map(lambda _: _request(f'{server.url}/generate', 'POST', payload), range(5)))
+
+        assert {job['id'] for _, job in results} == {results[0][1]['id']}
+        assert all(job['status'] == 'done' for _, job in results)
+        assert gemini.request_count == 1
+        assert github.paths.count('/user/repos') == 1
+
+    def test_overlapping_ranges_share_fetch_and_llm_calls(self, api_server):
+        """重なる期間の同時要求はコミットを1回で取得し、同じ日のAI呼び出しも1回にまとめる"""
+        server, github, gemini = api_server
+        ranges = [('2024-01-01', '2024-01-04'), ('2024-01-03', '2024-01-06'), ('2024-01-02', '2024-01-05')]
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(
+                lambda r: _request(f'{server.url}/generate', 'POST', {'since': r[0], 'until': r[1], 'wait': True}),
+                ranges
+            ))
+
+        assert all(job['status'] == 'done' for _, job in results)
+        commit_paths = [path for path in github.paths if path.endswith('/commits')]
+        assert len(commit_paths) == 2  # 2リポジトリ × 1回
+        assert gemini.request_count == 6  # 01-01〜01-06の各日1回
+
+    def test_save_and_fetch_diary(self, api_server):
+        """save指定の生成は日誌ファイルに保存し、GET /diaryで内容を取得できる"""
+        server, github, gemini = api_server
+
+        status, job = _request(f'{server.url}/generate', 'POST',
+                               {'since': '2024-01-07', 'save': True, 'wait': True})
+        assert status == 200
+        assert job['saved_path'].endswith('2024-01-07.md')
+
+        status, diary = _request(f'{server.url}/diary?date=2024-01-07')
+        assert status == 200
+        assert "APIから生成" in diary['content']
+        assert _request(f'{server.url}/diary?date=2024-01-08')[0] == 404
+
+    def test_invalid_requests(self, api_server):
+        """日付の形式・順序が不正な要求は400、存在しないジョブは404を返す"""
+        server, github, gemini = api_server
+
+        assert _request(f'{server.url}/generate', 'POST', {'since': '2024/01/01'})[0] == 400
+        assert _request(f'{server.url}/generate', 'POST', {'since': '2024-01-05', 'until': '2024-01-01'})[0] == 400
+        assert _request(f'{server.url}/jobs/999')[0] == 404
+        assert gemini.request_count == 0
+
+    @pytest.mark.parametrize('length', ['abc', '-1'])
+    def test_invalid_content_length_is_rejected(self, api_server, length):
+        """Content-Lengthが0以上の整数でない要求はジョブを追加せずに400を返す"""
+        server, github, gemini = api_server
+        connection = HTTPConnection(urlparse(server.url).netloc, timeout=10)
+        try:
+            connection.putrequest('POST', '/generate')
+            connection.putheader('Content-Length', length)
+            connection.endheaders()
+            response = connection.getresponse()
+
+            assert response.status == 400
+            assert 'Content-Length' in json.loads(response.read())['error']
+        finally:
+            connection.close()
+        assert server.api.queue.jobs() == []
+
+    def test_invalid_timeout_is_rejected_before_queueing(self, api_server):
+        """timeoutが秒数でない要求はジョブを追加せずに400を返す"""
+        server, github, gemini = api_server
+
+        for timeout in ('abc', -1, [1]):
+            status, body = _request(f'{server.url}/generate', 'POST',
+                                    {'since': '2024-01-07', 'wait': True, 'timeout': timeout})
+            assert status == 400
+            assert 'timeout' in body['error']
+        assert server.api.queue.jobs() == []
+
+    def test_metrics_endpoint_returns_prometheus_text(self, api_server):
+        """GET /metricsは計測結果の台帳をPrometheusのテキスト形式で返す"""
+        server, github, gemini = api_server
+        _request(f'{server.url}/generate', 'POST', {'since': '2024-01-07', 'wait': True})
+
+        with urlopen(f'{server.url}/metrics', timeout=10) as response:
+            content_type = response.headers['Content-Type']
+            text = response.read().decode('utf-8')
+
+        assert content_type.startswith('text/plain; version=0.0.4')
+        assert 'codediary_runs_total{kind="generate",status="ok"} 1' in text
+        assert 'codediary_requests_total{service="gemini",status="ok"} 1' in text
@@ -0,0 +1,174 @@
+import json
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from service.diary_backfill import BackfillCheckpoint, DiaryBackfill, plan_days
+from utils.cancellation import CancellationToken
+from utils.exceptions import APIError
+
+
+def _commit(day: str, message: str) -> dict:
+    return {'hash': message, 'author_name': 'Test User', 'timestamp': f'{day}T10:00:00+09:00',
+            'message': f'[repo] {message}'}
+
+
+class TestDiaryBackfill:
+    """DiaryBackfillクラスのテストクラス"""
+
+    @pytest.fixture
+    def generator(self):
+        """期間のコミット取得と1日分の生成だけを行うジェネレーターのモック"""
+        generator = Mock()
+        generator.fetch_commits.return_value = [
+            _commit('2024-01-01', '初期実装'),
+            _commit('2024-01-01', 'テスト追加'),
+            _commit('2024-01-03', '不具合修正'),
+        ]
+        generator.generate_day.side_effect = lambda day, commits, cancel_token=None: (f"# {day}", 10, 5, 'model')
+        return generator
+
+    @pytest.fixture
+    def diary_dir(self, tmp_path):
+        """日誌の保存先を一時ディレクトリにする"""
+        diary_dir = tmp_path / 'diary'
+        with patch('service.diary_backfill.build_diary_path', side_effect=lambda day: diary_dir / f'{day}.md'):
+            yield diary_dir
+
+    @pytest.fixture
+    def checkpoint(self, tmp_path):
+        return BackfillCheckpoint(tmp_path / 'checkpoint.json')
+
+    def test_plan_days(self):
+        """期間内の日付を古い順に並べる"""
+        assert plan_days('2024-01-30', '2024-02-02') == ['2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02']
+
+    def test_run_writes_one_note_per_day(self, generator, diary_dir, checkpoint):
+        """期間のコミットを1回で取得し、コミットのある日ごとにノートを保存する"""
+        result = DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-03', checkpoint)
+
+        generator.fetch_commits.assert_called_once()
+        assert generator.fetch_commits.call_args.args[:2] == ('2024-01-01', '2024-01-03')
+        assert result.generated == ['2024-01-01', '2024-01-03']
+        assert result.empty == ['2024-01-02']
+        assert result.commits == 3
+        assert result.input_tokens == 20
+        assert sorted(path.name for path in diary_dir.iterdir()) == ['2024-01-01.md', '2024-01-03.md']
+        commits_by_day = {call.args[0]: len(call.args[1]) for call in generator.generate_day.call_args_list}
+        assert commits_by_day == {'2024-01-01': 2, '2024-01-03': 1}
+
+    def test_checkpoint_records_each_day(self, generator, diary_dir, checkpoint):
+        """作成した日をファイルに記録し、コミットのない日は取得エラーの可能性があるため記録しない"""
+        DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-03', checkpoint)
+
+        days = json.loads(checkpoint.path.read_text(encoding='utf-8'))['days']
+        assert set(days) == {'2024-01-01', '2024-01-03'}
+        assert days['2024-01-01']['commits'] == 2
+
+    def test_empty_day_is_fetched_again_on_resume(self, generator, diary_dir, checkpoint):
+        """取得できなかった日は再実行で取得し直して作成する"""
+        generator.fetch_commits.return_value = [_commit('2024-01-01', '初期実装')]
+        first = DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-02', checkpoint)
+        assert first.empty == ['2024-01-02']
+
+        generator.fetch_commits.return_value = [_commit('2024-01-02', '遅れて取得できた変更')]
+        resumed = DiaryBackfill(generator, requests_per_minute=None).run(
+            '2024-01-01', '2024-01-02', BackfillCheckpoint(checkpoint.path)
+        )
+
+        assert generator.fetch_commits.call_args.args[:2] == ('2024-01-02', '2024-01-02')
+        assert resumed.generated == ['2024-01-02']
+        assert resumed.empty == []
+
+    def test_resume_regenerates_only_failed_day(self, generator, diary_dir, checkpoint):
+        """失敗した日だけを再実行で作成し、取得もその日までの期間に絞る"""
+        def fail_on_first_day(day, commits, cancel_token=None):
+            if day == '2024-01-01':
+                raise Exception("API error")
+            return f"# {day}", 10, 5, 'model'
+
+        generator.generate_day.side_effect = fail_on_first_day
+        first = DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-03', checkpoint)
+        assert set(first.failed) == {'2024-01-01'}
+
+        generator.generate_day.reset_mock()
+        generator.generate_day.side_effect = lambda day, commits, cancel_token=None: (f"# {day}", 10, 5, 'model')
+        resumed = DiaryBackfill(generator, requests_per_minute=None).run(
+            '2024-01-01', '2024-01-03', BackfillCheckpoint(checkpoint.path)
+        )
+
+        assert resumed.generated == ['2024-01-01']
+        assert resumed.resumed == ['2024-01-03']
+        assert generator.fetch_commits.call_args.args[:2] == ('2024-01-01', '2024-01-02')
+        assert generator.generate_day.call_count == 1
+
+    def test_incomplete_fetch_fails_days_without_checkpoint(self, generator, diary_dir, checkpoint):
+        """コミットを全件取得できなかった場合は作成せず、全ての日を失敗として再実行で取得し直す"""
+        generator.fetch_commits.side_effect = APIError("HTTP 502")
+        first = DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-03', checkpoint)
+
+        assert set(first.failed) == {'2024-01-01', '2024-01-02', '2024-01-03'}
+        generator.generate_day.assert_not_called()
+        assert not checkpoint.path.exists()
+
+        generator.fetch_commits.side_effect = None
+        resumed = DiaryBackfill(generator, requests_per_minute=None).run(
+            '2024-01-01', '2024-01-03', BackfillCheckpoint(checkpoint.path)
+        )
+        assert resumed.generated == ['2024-01-01', '2024-01-03']
+
+    def test_completed_range_does_nothing(self, generator, diary_dir, checkpoint):
+        """全日完了済みの期間はコミットを取得しない"""
+        generator.fetch_commits.return_value = [_commit(f'2024-01-0{day}', f'変更{day}') for day in range(1, 4)]
+        DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-03', checkpoint)
+        generator.fetch_commits.reset_mock()
+
+        result = DiaryBackfill(generator, requests_per_minute=None).run('2024-01-01', '2024-01-03', checkpoint)
+
+        generator.fetch_commits.assert_not_called()
+        assert len(result.resumed) == 3
+
+    def test_days_are_generated_in_parallel(self, generator, diary_dir, checkpoint):
+        """日ごとの生成を並行して行う"""
+        generator.fetch_commits.return_value = [_commit(f'2024-01-0{day}', f'変更{day}') for day in range(1, 5)]
+
+        def slow_generate(day, commits, cancel_token=None):
+            time.sleep(0.2)
+            return f"# {day}", 10, 5, 'model'
+
+        generator.generate_day.side_effect = slow_generate
+        start = time.perf_counter()
+        result = DiaryBackfill(generator, max_workers=4, requests_per_minute=None).run(
+            '2024-01-01', '2024-01-04', checkpoint
+        )
+
+        assert len(result.generated) == 4
+        assert time.perf_counter() - start < 0.6
+
+    def test_cancelled_run_keeps_checkpoint(self, generator, diary_dir, checkpoint):
+        """中止した場合は生成せずに戻り、既に完了していた日の記録は残す"""
+        checkpoint.record('2024-01-02', {'path': None, 'commits': 0})
+        token = CancellationToken()
+        token.cancel()
+
+        result = DiaryBackfill(generator, requests_per_minute=None).run(
+            '2024-01-01', '2024-01-03', checkpoint, cancel_token=token
+        )
+
+        assert result.cancelled is True
+        assert result.generated == []
+        generator.generate_day.assert_not_called()
+        assert BackfillCheckpoint(checkpoint.path).is_done('2024-01-02')
+
+    def test_cached_day_does_not_use_rate_limit(self, generator, diary_dir, checkpoint):
+        """保存済みの結果を返す日はAI呼び出しの回数の枠を使わない"""
+        generator.is_day_cached.side_effect = lambda day, commits: day == '2024-01-01'
+        backfill = DiaryBackfill(generator, requests_per_minute=60)
+        backfill.rate_limiter = Mock()
+        backfill.rate_limiter.acquire.return_value = 0.0
+
+        backfill.run('2024-01-01', '2024-01-03', checkpoint)
+
+        assert backfill.rate_limiter.acquire.call_count == 1
+        assert generator.generate_day.call_count == 2
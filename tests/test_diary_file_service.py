@@ -1,9 +1,21 @@
+import configparser
+import os
+import subprocess
+import sys
+import time
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 import pytest
 
-from service.diary_file_service import build_diary_path, launch_obsidian, save_diary
+from service.diary_file_service import (
+    build_diary_path,
+    build_obsidian_uri,
+    combine_daily_diaries,
+    is_obsidian_running,
+    launch_obsidian,
+    save_diary
+)
 
 
 @pytest.fixture
@@ -17,6 +29,33 @@ def mock_config():
     return config
 
 
+@pytest.fixture
+def stub_obsidian(tmp_path):
+    """起動時の引数を記録するObsidianの代わりの実行ファイル"""
+    log_path = tmp_path / 'invocations.log'
+    executable = tmp_path / 'stub_obsidian'
+    executable.write_text(
+        f"#!{sys.executable}\n"
+        "import sys, time\n"
+        f"open({str(log_path)!r}, 'a', encoding='utf-8').write(repr(sys.argv[1:]) + '\\n')\n"
+        "time.sleep(float(sys.argv[2]) if len(sys.argv) > 2 else 0)\n",
+        encoding='utf-8'
+    )
+    executable.chmod(0o755)
+    config = configparser.ConfigParser()
+    config.read_dict({'Obsidian': {'obsidian_path': str(executable)}})
+    return executable, log_path, config
+
+
+def wait_for_invocations(log_path, count):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        if log_path.exists() and len(log_path.read_text(encoding='utf-8').splitlines()) >= count:
+            break
+        time.sleep(0.02)
+    return log_path.read_text(encoding='utf-8').splitlines() if log_path.exists() else []
+
+
 class TestBuildDiaryPath:
     """build_diary_path関数のテストクラス"""
 
@@ -88,6 +127,82 @@ class TestSaveDiary:
             '## 作業内容\n\n新内容\n\n旧内容\n\n## 自由記載\n\n手書きメモ\n'
         )
 
+    def test_preserves_existing_formatting(self, tmp_path):
+        """既存本文の空行や小見出しは組み立て直さずそのまま残す"""
+        file_path = tmp_path / '2026-08-09_プログラミング学習日誌.md'
+        file_path.write_text('メモ\n\n## 作業内容\n\n### 午前\n\n\n旧内容  \n\n## 自由記載\n', encoding='utf-8')
+
+        save_diary(file_path, '## 作業内容\n\n新内容\n\n## 自由記載\n\n追記\n')
+
+        assert file_path.read_text(encoding='utf-8') == (
+            'メモ\n\n## 作業内容\n\n新内容\n\n### 午前\n\n\n旧内容  \n\n## 自由記載\n\n追記\n'
+        )
+
+    def test_same_content_is_appended_again(self, tmp_path):
+        """同じ内容を再保存した場合も、既存本文と照合せずに追記する"""
+        file_path = tmp_path / '2026-08-09_プログラミング学習日誌.md'
+        file_path.write_text('## 作業内容\n\n旧内容\n', encoding='utf-8')
+        content = '## 作業内容\n\n新内容\n'
+
+        assert save_diary(file_path, content) is True
+        assert save_diary(file_path, content) is True
+
+        assert file_path.read_text(encoding='utf-8') == '## 作業内容\n\n新内容\n\n新内容\n\n旧内容\n'
+
+    def test_unchanged_file_is_not_written(self, tmp_path):
+        """追記する本文がなくファイル全体が変わらない場合は書き換えない"""
+        file_path = tmp_path / '2026-08-09_プログラミング学習日誌.md'
+        file_path.write_text('## 作業内容\n\n旧内容\n', encoding='utf-8')
+        modified_time = file_path.stat().st_mtime_ns
+
+        assert save_diary(file_path, '## 作業内容\n\n## 学びと気づき\n') is False
+
+        assert file_path.read_text(encoding='utf-8') == '## 作業内容\n\n旧内容\n'
+        assert file_path.stat().st_mtime_ns == modified_time
+
+    def test_duplicate_heading_inserts_into_last_one(self, tmp_path):
+        """同じ見出しが複数ある場合は最後の見出しに挿入する"""
+        file_path = tmp_path / '2026-08-09_プログラミング学習日誌.md'
+        file_path.write_text('## 作業内容\n\n1回目\n\n## 作業内容\n\n2回目\n', encoding='utf-8')
+
+        save_diary(file_path, '## 作業内容\n\n新内容\n')
+
+        assert file_path.read_text(encoding='utf-8') == '## 作業内容\n\n1回目\n\n## 作業内容\n\n新内容\n\n2回目\n'
+
+    def test_write_failure_keeps_original(self, tmp_path, mocker):
+        """書き込みに失敗しても元のファイルは壊れず、一時ファイルも残らない"""
+        file_path = tmp_path / '2026-08-09_プログラミング学習日誌.md'
+        file_path.write_text('## 作業内容\n\n旧内容\n', encoding='utf-8')
+        mocker.patch('utils.file_utils.os.fsync', side_effect=OSError("disk full"))
+
+        with pytest.raises(OSError):
+            save_diary(file_path, '## 作業内容\n\n新内容\n')
+
+        assert file_path.read_text(encoding='utf-8') == '## 作業内容\n\n旧内容\n'
+        assert list(tmp_path.iterdir()) == [file_path]
+
+
+class TestCombineDailyDiaries:
+    """combine_daily_diaries関数のテストクラス"""
+
+    def test_single_day_returned_as_is(self):
+        """1日分のみの場合はそのまま返す"""
+        content = '## 作業内容\n\n内容\n'
+
+        assert combine_daily_diaries([('2024年01月15日(月)', content)]) == content
+
+    def test_groups_bodies_by_heading_in_date_order(self):
+        """見出しごとに日付の小見出し付きで本文をまとめ、空の見出しも残す"""
+        result = combine_daily_diaries([
+            ('1月15日', '## 作業内容\n\n月曜\n\n## 自由記載\n\n'),
+            ('1月16日', '## 作業内容\n\n火曜\n\n## 知見集\n\n- 知見\n'),
+        ])
+
+        assert result == (
+            '## 作業内容\n\n### 1月15日\n\n月曜\n\n### 1月16日\n\n火曜\n\n'
+            '## 自由記載\n\n## 知見集\n\n### 1月16日\n\n- 知見\n'
+        )
+
 
 class TestLaunchObsidian:
     """launch_obsidian関数のテストクラス"""
@@ -109,3 +224,67 @@ class TestLaunchObsidian:
 
             with pytest.raises(FileNotFoundError, match="Obsidian not found"):
                 launch_obsidian()
+
+
+@pytest.mark.skipif(os.name == 'nt', reason="スタブの実行ファイルはPOSIX環境でのみ起動できる")
+class TestLaunchObsidianWithNote:
+    """ノートを指定したlaunch_obsidian関数のテストクラス"""
+
+    @pytest.fixture
+    def note(self, tmp_path):
+        """保管庫内の日誌ノート"""
+        vault = tmp_path / 'プログラミング学習日誌'
+        (vault / '.obsidian').mkdir(parents=True)
+        note = vault / '01_Daily' / '2026-08-09_プログラミング学習日誌.md'
+        note.parent.mkdir()
+        note.write_text('テスト', encoding='utf-8')
+        return note
+
+    def test_build_uri_with_vault_and_file(self, note, stub_obsidian):
+        """保管庫名と保管庫内の相対パスでURIを組み立てる"""
+        with patch('service.diary_file_service.load_config', return_value=stub_obsidian[2]):
+            uri = build_obsidian_uri(note)
+
+        assert uri == ('obsidian://open?vault=%E3%83%97%E3%83%AD%E3%82%B0%E3%83%A9%E3%83%9F%E3%83%B3%E3%82%B0'
+                       '%E5%AD%A6%E7%BF%92%E6%97%A5%E8%AA%8C&file=01_Daily%2F2026-08-09_%E3%83%97%E3%83%AD%E3%82'
+                       '%B0%E3%83%A9%E3%83%9F%E3%83%B3%E3%82%B0%E5%AD%A6%E7%BF%92%E6%97%A5%E8%AA%8C')
+
+    def test_build_uri_outside_vault_uses_path(self, tmp_path, stub_obsidian):
+        """保管庫が見つからない場合は絶対パスで指定する"""
+        note = tmp_path / 'note.md'
+
+        with patch('service.diary_file_service.load_config', return_value=stub_obsidian[2]):
+            assert build_obsidian_uri(note).startswith('obsidian://open?path=%2F')
+
+    def test_cold_starts_with_note_uri_when_not_running(self, note, stub_obsidian):
+        """起動していない場合のみ実行ファイルをノートのURI付きで起動する"""
+        executable, log_path, config = stub_obsidian
+
+        with patch('service.diary_file_service.load_config', return_value=config), \
+             patch('service.diary_file_service._open_uri') as mock_open_uri:
+            launch_obsidian(note)
+
+        invocations = wait_for_invocations(log_path, 1)
+        assert len(invocations) == 1
+        assert 'obsidian://open?vault=' in invocations[0]
+        mock_open_uri.assert_not_called()
+
+    def test_running_instance_opens_uri_without_new_process(self, note, stub_obsidian):
+        """起動中の場合は新しいプロセスを作らずURIでノートを開く"""
+        executable, log_path, config = stub_obsidian
+        running = subprocess.Popen([str(executable), 'running', '5'])
+        try:
+            wait_for_invocations(log_path, 1)
+            assert is_obsidian_running(str(executable))
+
+            with patch('service.diary_file_service.load_config', return_value=config), \
+                 patch('service.diary_file_service._open_uri') as mock_open_uri:
+                launch_obsidian(note)
+
+            mock_open_uri.assert_called_once_with(build_obsidian_uri(note))
+            assert wait_for_invocations(log_path, 1) == ["['running', '5']"]
+        finally:
+            running.kill()
+            running.wait()
+
+        assert not is_obsidian_running(str(executable))
@@ -0,0 +1,205 @@
+import configparser
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+from service.diary_job_queue import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_FAILED,
+    JOB_GENERATING,
+    JOB_QUEUED,
+    DiaryJob,
+    DiaryJobQueue
+)
+from service.github_commit_tracker import GitHubCommitTracker
+from service.programming_diary_generator import ProgrammingDiaryGenerator
+from service.progress import FetchProgress, GenerationProgress
+
+AI_DELAY = 0.5
+
+
+def wait_until_finished(queue, timeout=10):
+    """全ジョブが終わるまで待つ"""
+    deadline = time.monotonic() + timeout
+    while queue.has_active_jobs():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def server():
+    """3日分・2リポジトリのコミットを返すGitHub APIのスタブサーバー"""
+    commits_by_repo = {
+        'repo-a': [build_commit('a1' * 20, '機能追加', '2024-01-15T01:00:00Z'),
+                   build_commit('a2' * 20, 'テスト追加', '2024-01-16T01:00:00Z')],
+        'repo-b': [build_commit('b1' * 20, '不具合修正', '2024-01-17T02:00:00Z')],
+    }
+    with FakeGitHubServer(commits_by_repo, commits_delay=0.2) as server:
+        yield server
+
+
+@pytest.fixture
+def generator(server):
+    """スタブサーバーに接続し、1回の生成に一定時間かかるAIのモックを使う日誌生成クラス"""
+    def generate(prompt, cancel_token=None):
+        if cancel_token is not None:
+            cancel_token.wait(AI_DELAY)
+        else:
+            time.sleep(AI_DELAY)
+        return "## 作業内容\n\n内容", 100, 20, 'test-model'
+
+    ai_client = Mock()
+    ai_client.default_model = 'test-model'
+    ai_client.generate.side_effect = generate
+
+    with patch('service.programming_diary_generator.load_environment_variables'), \
+         patch('service.programming_diary_generator.load_config', return_value=configparser.ConfigParser()), \
+         patch('service.programming_diary_generator.GeminiAPIClient', return_value=ai_client):
+        generator = ProgrammingDiaryGenerator()
+    generator.github_tracker = GitHubCommitTracker(token='test_token', username='test_user')
+    generator.github_tracker.base_url = server.url
+    with patch.object(generator, '_load_prompt_template', return_value="テンプレート"):
+        yield generator
+    generator.github_tracker.session.close()
+
+
+class TestDiaryJob:
+    """DiaryJobクラスのテストクラス"""
+
+    def test_format(self):
+        """期間・番号・状態を1行で表示する"""
+        job = DiaryJob(2, '2024-01-08', '2024-01-14')
+
+        assert job.format() == "#2 01/08〜01/14 待機中"
+
+
+class TestDiaryJobQueue:
+    """DiaryJobQueueクラスのテストクラス"""
+
+    def test_batch_runs_in_parallel(self, generator):
+        """複数期間のジョブは並行して実行され、全体の時間は各ジョブの合計より短い"""
+        queue = DiaryJobQueue(lambda: generator, max_workers=3)
+
+        start = time.perf_counter()
+        jobs = [queue.submit(day, day) for day in ('2024-01-15', '2024-01-16', '2024-01-17')]
+        wait_until_finished(queue)
+        elapsed = time.perf_counter() - start
+
+        assert [job.status for job in jobs] == [JOB_DONE] * 3
+        assert all(job.result[0] == "## 作業内容\n\n内容" for job in jobs)
+        assert elapsed < AI_DELAY * 2
+        queue.shutdown()
+
+    def test_overlapping_jobs_share_fetched_commits(self, generator, server):
+        """期間を含むジョブが取得中のコミットを待って使い、GitHubへの問い合わせを重複させない"""
+        queue = DiaryJobQueue(lambda: generator, max_workers=3)
+
+        week = queue.submit('2024-01-15', '2024-01-17')
+        time.sleep(0.1)
+        day = queue.submit('2024-01-16', '2024-01-16')
+        wait_until_finished(queue)
+
+        assert week.status == day.status == JOB_DONE
+        assert server.paths.count('/user/repos') == 1
+        assert server.request_count == 3
+        queue.shutdown()
+
+    def test_same_range_is_not_submitted_twice(self, generator):
+        """同じ期間のジョブが実行中であれば新しいジョブを作らない"""
+        queue = DiaryJobQueue(lambda: generator)
+
+        first = queue.submit('2024-01-15', '2024-01-15')
+        second = queue.submit('2024-01-15', '2024-01-15')
+        wait_until_finished(queue)
+
+        assert first is second
+        assert len(queue.jobs()) == 1
+        queue.shutdown()
+
+    def test_job_waits_until_ready(self, generator):
+        """readyを指定したジョブはセットされるまで待機中のままで、wait()で終了を待てる"""
+        ready = threading.Event()
+        queue = DiaryJobQueue(lambda: generator)
+
+        job = queue.submit('2024-01-15', '2024-01-15', ready=ready)
+        assert job.wait(0.3) is False
+        assert job.status == JOB_QUEUED
+
+        ready.set()
+        assert job.wait(10) is True
+        assert job.status == JOB_DONE
+        queue.shutdown()
+
+    def test_cancel_queued_job(self, generator):
+        """待機中のジョブは実行せずにすぐ中止済みとなり、実行中のジョブには影響しない"""
+        finished = []
+        queue = DiaryJobQueue(lambda: generator, max_workers=1, on_finished=finished.append)
+
+        running = queue.submit('2024-01-15', '2024-01-15')
+        queued = queue.submit('2024-01-16', '2024-01-16')
+        assert queued.status == JOB_QUEUED
+
+        assert queue.cancel(queued.job_id) is True
+        assert queued.status == JOB_CANCELLED
+        wait_until_finished(queue)
+
+        assert running.status == JOB_DONE
+        assert queued.started_at is None
+        assert finished == [queued, running]
+        assert generator.ai_client.generate.call_count == 1
+        queue.shutdown()
+
+    def test_progress_is_applied_by_caller_thread(self, generator):
+        """ワーカーからの進捗はapply_progressを呼ぶまで状態に反映せず、ジョブごとに最新の1件だけを反映する"""
+        started = threading.Event()
+        release = threading.Event()
+
+        def generate_diary(since_date, until_date, cancel_token=None, progress=None):
+            progress(FetchProgress(1, 2, 3, 100, 1.0))
+            progress(GenerationProgress(1, 1, 100, 20))
+            started.set()
+            release.wait(5)
+            return "## 作業内容\n\n内容", 100, 20, 'test-model'
+
+        stub = Mock()
+        stub.generate_diary.side_effect = generate_diary
+        queue = DiaryJobQueue(lambda: stub)
+        job = queue.submit('2024-01-15', '2024-01-15')
+        assert started.wait(5)
+        assert job.detail == ""
+
+        queue.apply_progress()
+
+        assert job.status == JOB_GENERATING
+        assert job.detail == GenerationProgress(1, 1, 100, 20).format()
+        release.set()
+        assert job.wait(5)
+        job.progress.put(FetchProgress(2, 2, 3, 200, 2.0))
+        queue.apply_progress()
+        assert job.status == JOB_DONE
+        queue.shutdown()
+
+    def test_failed_job_records_error(self, generator):
+        """生成に失敗したジョブはエラー内容を記録し、他のジョブは続行する"""
+        outcomes = [generator, RuntimeError("初期化に失敗しました")]
+
+        def get_generator():
+            outcome = outcomes.pop()
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        queue = DiaryJobQueue(get_generator, max_workers=2)
+
+        jobs = [queue.submit('2024-01-15', '2024-01-15'), queue.submit('2024-01-16', '2024-01-16')]
+        wait_until_finished(queue)
+
+        failed = [job for job in jobs if job.status == JOB_FAILED]
+        assert len(failed) == 1
+        assert failed[0].error == "初期化に失敗しました"
+        assert "初期化に失敗しました" in failed[0].format()
+        queue.shutdown()
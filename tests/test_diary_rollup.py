@@ -0,0 +1,129 @@
+from datetime import date
+from unittest.mock import Mock, patch
+
+import pytest
+
+from service.diary_rollup import DiaryRollupGenerator, week_start
+
+
+@pytest.fixture
+def daily_dir(tmp_path):
+    """日誌フォルダ"""
+    directory = tmp_path / '01_Daily'
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def ai_client():
+    """プロンプトを記録するAIクライアントのモック"""
+    client = Mock()
+    client.default_model = 'test-model'
+    client.prompts = []
+
+    def generate(prompt, cancel_token=None):
+        client.prompts.append(prompt)
+        return f"## 作業内容\n\nまとめ{len(client.prompts)}\n\n## 自由記載\n", 100, 20, 'test-model'
+
+    client.generate.side_effect = generate
+    return client
+
+
+@pytest.fixture
+def generator(ai_client, daily_dir, tmp_path):
+    """一時フォルダの日誌を読むまとめ生成クラス"""
+    with patch('service.diary_rollup.build_diary_path',
+               side_effect=lambda day: daily_dir / f"{day}_プログラミング学習日誌.md"):
+        yield DiaryRollupGenerator(ai_client, rollup_dir=tmp_path / '02_Rollup')
+
+
+def write_diary(daily_dir, day, work='作業', learning='事実：学び'):
+    (daily_dir / f"{day}_プログラミング学習日誌.md").write_text(
+        f"## 作業内容\n\n{work}\n\n## 学びと気づき\n\n{learning}\n\n## 知見集\n\n- 知見\n\n## 自由記載\n\n手書き\n",
+        encoding='utf-8'
+    )
+
+
+class TestDiaryRollupGenerator:
+    """DiaryRollupGeneratorクラスのテストクラス"""
+
+    def test_week_start(self):
+        """週の始まりは月曜日"""
+        assert week_start(date(2026, 8, 9)) == date(2026, 8, 3)
+        assert week_start(date(2026, 8, 3)) == date(2026, 8, 3)
+
+    def test_week_uses_only_work_and_learning_sections(self, generator, ai_client, daily_dir, tmp_path):
+        """週次まとめには作業内容と学びと気づきのみを渡し、週ごとのノートに保存する"""
+        write_diary(daily_dir, '2026-08-03', work='検索機能を実装')
+        write_diary(daily_dir, '2026-08-05', learning='事実：索引の更新漏れ')
+
+        result = generator.generate_week(date(2026, 8, 3))
+
+        prompt = ai_client.prompts[0]
+        assert '検索機能を実装' in prompt and '索引の更新漏れ' in prompt
+        assert '2026年08月03日(月)' in prompt
+        assert '知見' not in prompt.split('## 日誌の抜粋')[1]
+        assert '手書き' not in prompt
+        assert result.path == tmp_path / '02_Rollup' / '2026-W32_週次振り返り.md'
+        assert result.path.read_text(encoding='utf-8') == "## 作業内容\n\nまとめ1\n\n## 自由記載\n"
+
+    def test_week_without_diaries(self, generator, ai_client):
+        """日誌がない週はAIを呼び出さずNoneを返す"""
+        assert generator.generate_week(date(2026, 8, 3)) is None
+        ai_client.generate.assert_not_called()
+
+    def test_month_reuses_weekly_summaries(self, generator, ai_client, daily_dir):
+        """月次まとめは週ごとのまとめから作り、生成済みの週は再利用する"""
+        write_diary(daily_dir, '2026-07-31')
+        write_diary(daily_dir, '2026-08-04')
+        write_diary(daily_dir, '2026-08-12')
+        generator.generate_week(date(2026, 8, 3))
+        generator.generate_week(date(2026, 8, 10))
+        assert ai_client.generate.call_count == 2
+
+        result = generator.generate_month(2026, 8)
+
+        assert ai_client.generate.call_count == 3
+        month_prompt = ai_client.prompts[-1]
+        assert 'まとめ1' in month_prompt and 'まとめ2' in month_prompt
+        assert '2026年08月04日' not in month_prompt
+        assert result.path.name == '2026-08_月次振り返り.md'
+
+    def test_rollups_are_incremental(self, generator, ai_client, daily_dir):
+        """入力が変わっていない週・月は再生成せず、日誌が増えた週と月のみ再生成する"""
+        write_diary(daily_dir, '2026-08-04')
+        write_diary(daily_dir, '2026-08-12')
+        generator.generate_rollups(date(2026, 8, 3), date(2026, 8, 16))
+        first_calls = ai_client.generate.call_count
+
+        results = generator.generate_rollups(date(2026, 8, 3), date(2026, 8, 16))
+        assert ai_client.generate.call_count == first_calls
+        assert all(result.cached for result in results)
+
+        write_diary(daily_dir, '2026-08-13')
+        generator.generate_rollups(date(2026, 8, 3), date(2026, 8, 16))
+        assert ai_client.generate.call_count == first_calls + 2
+
+    def test_fast_model_result_is_not_cached(self, generator, ai_client, daily_dir):
+        """既定のモデル以外（高速モデルへの切り替えなど）で生成したまとめは保存せず、次回は生成し直す"""
+        write_diary(daily_dir, '2026-08-04')
+        ai_client.generate.side_effect = lambda prompt, cancel_token=None: ("## 作業内容\n\n簡易まとめ\n", 50, 10,
+                                                                            'fast-model')
+        generator.generate_rollups(date(2026, 8, 3), date(2026, 8, 9))
+        first_calls = ai_client.generate.call_count
+
+        results = generator.generate_rollups(date(2026, 8, 3), date(2026, 8, 9))
+
+        assert ai_client.generate.call_count == first_calls * 2
+        assert not any(result.cached for result in results)
+
+    def test_regeneration_keeps_free_text(self, generator, daily_dir):
+        """再生成してもまとめノートの自由記載は引き継ぐ"""
+        write_diary(daily_dir, '2026-08-04')
+        result = generator.generate_week(date(2026, 8, 3))
+        result.path.write_text("## 作業内容\n\n古いまとめ\n\n## 自由記載\n\n振り返りメモ\n", encoding='utf-8')
+
+        write_diary(daily_dir, '2026-08-05')
+        generator.generate_week(date(2026, 8, 3))
+
+        assert result.path.read_text(encoding='utf-8') == "## 作業内容\n\nまとめ2\n\n## 自由記載\n\n振り返りメモ\n"
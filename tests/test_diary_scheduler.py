@@ -0,0 +1,212 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+import pytest
+
+from service.commit_cache import CommitCache
+from service.diary_scheduler import DiaryScheduler, SchedulerState
+from utils.exceptions import APIError
+
+JST = timezone(timedelta(hours=9))
+
+
+def _commit(timestamp: str, message: str) -> dict:
+    return {'hash': message, 'author_name': 'Test User', 'timestamp': timestamp, 'message': f'[repo] {message}'}
+
+
+class TestDiaryScheduler:
+    """DiarySchedulerクラスのテストクラス"""
+
+    @pytest.fixture
+    def generator(self):
+        """期間のコミット取得と1日分の生成だけを行うジェネレーターのモック"""
+        generator = Mock()
+        generator.commit_cache = CommitCache()
+        generator.fetch_commits.return_value = []
+        generator.generate_day.side_effect = (
+            lambda day, commits, cancel_token=None: (f"## 作業内容\n\n{' '.join(c['hash'] for c in commits)}\n",
+                                                     10, 5, 'model')
+        )
+        return generator
+
+    @pytest.fixture
+    def diary_dir(self, tmp_path):
+        """日誌の保存先を一時ディレクトリにする"""
+        diary_dir = tmp_path / 'diary'
+        with patch('service.diary_scheduler.build_diary_path', side_effect=lambda day: diary_dir / f'{day}.md'):
+            yield diary_dir
+
+    @pytest.fixture
+    def state(self, tmp_path):
+        return SchedulerState(tmp_path / 'scheduler_state.json')
+
+    @staticmethod
+    def _scheduler(generator, state, now: datetime) -> DiaryScheduler:
+        return DiaryScheduler(generator, state, clock=lambda: now)
+
+    def test_next_run_is_today_before_run_time(self, generator, state):
+        """初回は当日の実行時刻（既定23:30）まで待つ"""
+        now = datetime(2024, 1, 15, 10, 0, tzinfo=JST)
+
+        assert self._scheduler(generator, state, now).next_run_at(now) == datetime(2024, 1, 15, 23, 30, tzinfo=JST)
+
+    def test_next_run_is_tomorrow_after_success(self, generator, state):
+        """当日の実行が成功していれば翌日の実行時刻まで待つ"""
+        state.last_success_at = datetime(2024, 1, 15, 23, 30, tzinfo=JST).isoformat()
+        now = datetime(2024, 1, 15, 23, 45, tzinfo=JST)
+
+        assert self._scheduler(generator, state, now).next_run_at(now) == datetime(2024, 1, 16, 23, 30, tzinfo=JST)
+
+    def test_missed_run_is_due_immediately(self, generator, state):
+        """停止中に実行時刻を過ぎていた場合は、起動後すぐに実行する"""
+        state.last_success_at = datetime(2024, 1, 12, 23, 30, tzinfo=JST).isoformat()
+        now = datetime(2024, 1, 15, 10, 0, tzinfo=JST)
+
+        assert self._scheduler(generator, state, now).next_run_at(now) <= now
+
+    def test_sync_range_catches_up_missed_days(self, generator, state):
+        """前回同期した日から今日までを取得し、max_catch_up_days（既定7日）より前は対象外にする"""
+        now = datetime(2024, 1, 15, 23, 30, tzinfo=JST)
+        state.synced_at = datetime(2024, 1, 12, 23, 30, tzinfo=JST).isoformat()
+        assert self._scheduler(generator, state, now).sync_range(now) == ('2024-01-12', '2024-01-15')
+
+        state.synced_at = datetime(2023, 12, 1, 23, 30, tzinfo=JST).isoformat()
+        assert self._scheduler(generator, state, now).sync_range(now) == ('2024-01-09', '2024-01-15')
+
+    def test_run_once_generates_only_new_commits(self, generator, diary_dir, state):
+        """前回の同期より後のコミットのみを日ごとに生成し、既存のノートに追記する"""
+        state.synced_at = datetime(2024, 1, 14, 23, 30, tzinfo=JST).isoformat()
+        (diary_dir / '2024-01-14.md').parent.mkdir(parents=True)
+        (diary_dir / '2024-01-14.md').write_text("## 作業内容\n\nold\n", encoding='utf-8')
+        generator.fetch_commits.return_value = [
+            _commit('2024-01-14T22:00:00+09:00', 'old'),
+            _commit('2024-01-14T23:50:00+09:00', 'late'),
+            _commit('2024-01-15T10:00:00+09:00', 'today'),
+        ]
+        now = datetime(2024, 1, 15, 23, 30, tzinfo=JST)
+
+        result = self._scheduler(generator, state, now).run_once()
+
+        assert generator.fetch_commits.call_args.args[:2] == ('2024-01-14', '2024-01-15')
+        assert result['commits'] == 2
+        assert sorted(result['saved']) == ['2024-01-14', '2024-01-15']
+        previous_day = (diary_dir / '2024-01-14.md').read_text(encoding='utf-8')
+        assert 'old' in previous_day and 'late' in previous_day
+        assert 'today' in (diary_dir / '2024-01-15.md').read_text(encoding='utf-8')
+
+        saved_state = SchedulerState(state.path)
+        assert saved_state.synced_at == now.isoformat()
+        assert saved_state.last_success_at == now.isoformat()
+        assert saved_state.last_error is None
+
+    def test_run_once_without_new_commits_saves_nothing(self, generator, diary_dir, state):
+        """新しいコミットがなければ生成・保存せずに同期日時だけを進める"""
+        state.synced_at = datetime(2024, 1, 15, 23, 30, tzinfo=JST).isoformat()
+        generator.fetch_commits.return_value = [_commit('2024-01-15T10:00:00+09:00', 'synced')]
+        now = datetime(2024, 1, 16, 23, 30, tzinfo=JST)
+
+        result = self._scheduler(generator, state, now).run_once()
+
+        assert result['saved'] == {}
+        generator.generate_day.assert_not_called()
+        assert state.synced_at == now.isoformat()
+
+    def test_failed_run_keeps_sync_point_and_retries(self, generator, diary_dir, state):
+        """生成に失敗した場合は同期日時を進めず、retry_minutes（既定30分）後に再実行する"""
+        synced_at = datetime(2024, 1, 14, 23, 30, tzinfo=JST).isoformat()
+        state.synced_at = synced_at
+        generator.fetch_commits.return_value = [_commit('2024-01-15T10:00:00+09:00', 'today')]
+        generator.generate_day.side_effect = Exception("API error")
+        now = datetime(2024, 1, 15, 23, 30, tzinfo=JST)
+        scheduler = self._scheduler(generator, state, now)
+
+        with pytest.raises(Exception, match="API error"):
+            scheduler.run_once()
+
+        saved_state = SchedulerState(state.path)
+        assert saved_state.synced_at == synced_at
+        assert saved_state.last_error == "API error"
+        assert scheduler.next_run_at(now) == now + timedelta(minutes=30)
+
+    def test_run_forever_runs_missed_day_then_idles_until_stopped(self, generator, diary_dir, state):
+        """起動時に遅れている分を1回実行し、その後は次の実行時刻まで眠って停止要求ですぐに終わる"""
+        state.last_success_at = state.synced_at = datetime(2024, 1, 13, 23, 30, tzinfo=JST).isoformat()
+        generator.fetch_commits.return_value = [_commit('2024-01-14T10:00:00+09:00', 'missed')]
+        scheduler = self._scheduler(generator, state, datetime(2024, 1, 15, 10, 0, tzinfo=JST))
+        thread = threading.Thread(target=scheduler.run_forever)
+
+        thread.start()
+        time.sleep(0.3)
+        scheduler.stop()
+        thread.join(timeout=2)
+
+        assert not thread.is_alive()
+        assert scheduler.runs == 1
+        assert (diary_dir / '2024-01-14.md').exists()
+
+    def test_commit_pushed_after_run_is_synced_next_time(self, generator, diary_dir, state):
+        """前回の実行より前に作成して実行後にpushしたコミットも、ハッシュで判定して次回に書き込む"""
+        generator.fetch_commits.return_value = [_commit('2024-01-15T10:00:00+09:00', 'pushed')]
+        self._scheduler(generator, state, datetime(2024, 1, 15, 23, 30, tzinfo=JST)).run_once()
+
+        generator.generate_day.reset_mock()
+        generator.fetch_commits.return_value = [
+            _commit('2024-01-15T10:00:00+09:00', 'pushed'),
+            _commit('2024-01-15T23:00:00+09:00', 'late_push'),
+            _commit('2024-01-16T10:00:00+09:00', 'today'),
+        ]
+        result = self._scheduler(generator, SchedulerState(state.path),
+                                 datetime(2024, 1, 16, 23, 30, tzinfo=JST)).run_once()
+
+        assert result['commits'] == 2
+        generated = {call.args[0]: [c['hash'] for c in call.args[1]] for call in generator.generate_day.call_args_list}
+        assert generated == {'2024-01-15': ['late_push'], '2024-01-16': ['today']}
+        assert SchedulerState(state.path).synced_hashes == {'2024-01-16': ['today']}
+
+    def test_incomplete_fetch_keeps_synced_state_and_retries(self, generator, diary_dir, state):
+        """コミットを全件取得できなかった場合は何も書き込まず同期済みの状態を進めず、再実行で同じ期間を取得し直す"""
+        generator.fetch_commits.return_value = [_commit('2024-01-14T10:00:00+09:00', 'first')]
+        self._scheduler(generator, state, datetime(2024, 1, 14, 23, 30, tzinfo=JST)).run_once()
+        synced = SchedulerState(state.path)
+
+        generator.generate_day.reset_mock()
+        generator.fetch_commits.side_effect = APIError("リポジトリ repo のコミットを取得できませんでした: HTTP 403")
+        now = datetime(2024, 1, 16, 23, 30, tzinfo=JST)
+        scheduler = self._scheduler(generator, SchedulerState(state.path), now)
+        with pytest.raises(APIError):
+            scheduler.run_once()
+
+        failed = SchedulerState(state.path)
+        assert (failed.synced_at, failed.synced_hashes) == (synced.synced_at, synced.synced_hashes)
+        assert 'HTTP 403' in failed.last_error
+        generator.generate_day.assert_not_called()
+        assert scheduler.next_run_at(now) == now + timedelta(minutes=30)
+
+        generator.fetch_commits.side_effect = None
+        generator.fetch_commits.return_value = [
+            _commit('2024-01-14T10:00:00+09:00', 'first'),
+            _commit('2024-01-15T10:00:00+09:00', 'missed'),
+        ]
+        result = self._scheduler(generator, SchedulerState(state.path), now + timedelta(minutes=30)).run_once()
+
+        assert generator.fetch_commits.call_args.args[:2] == ('2024-01-14', '2024-01-17')
+        assert result['commits'] == 1
+
+    def test_corrupt_state_schedules_retry_without_stopping(self, generator, diary_dir, state):
+        """状態ファイルの同期日時が壊れていても常駐処理は止まらず、retry_minutes後に再実行する"""
+        state.last_success_at = datetime(2024, 1, 14, 23, 30, tzinfo=JST).isoformat()
+        state.synced_at = 'broken'
+        now = datetime(2024, 1, 15, 23, 30, tzinfo=JST)
+        scheduler = self._scheduler(generator, state, now)
+        thread = threading.Thread(target=scheduler.run_forever)
+
+        thread.start()
+        time.sleep(0.3)
+        scheduler.stop()
+        thread.join(timeout=2)
+
+        assert not thread.is_alive()
+        assert scheduler.next_run_at(now) == now + timedelta(minutes=30)
+        assert SchedulerState(state.path).last_error is not None
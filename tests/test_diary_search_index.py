@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from service.diary_file_service import save_diary
+from service.diary_search_index import DiarySearchIndex
+
+
+@pytest.fixture
+def daily_dir(tmp_path):
+    """日誌フォルダ"""
+    directory = tmp_path / '01_Daily'
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def index(daily_dir, tmp_path):
+    """一時フォルダに保存する検索インデックス"""
+    return DiarySearchIndex(daily_dir, tmp_path / 'index.sqlite3')
+
+
+def write_diary(daily_dir, date, content):
+    path = daily_dir / f"{date}_プログラミング学習日誌.md"
+    path.write_text(content, encoding='utf-8')
+    return path
+
+
+class TestDiarySearchIndex:
+    """DiarySearchIndexクラスのテストクラス"""
+
+    def test_search_japanese_terms(self, index, daily_dir):
+        """日本語の語句で検索でき、新しい日付順に並ぶ"""
+        write_diary(daily_dir, '2026-08-01', '## 作業内容\n\n検索インデックスを実装\n')
+        write_diary(daily_dir, '2026-08-02', '## 作業内容\n\nインデックスの不具合を修正\n')
+        write_diary(daily_dir, '2026-08-03', '## 作業内容\n\n画面を調整\n')
+        index.refresh()
+
+        hits = index.search('インデックス')
+
+        assert [hit.date for hit in hits] == ['2026-08-02', '2026-08-01']
+        assert 'インデックス' in hits[0].snippet
+
+    def test_search_short_terms_and_multiple_terms(self, index, daily_dir):
+        """3文字未満の語も検索でき、空白区切りの語はすべて含むものに絞り込む"""
+        write_diary(daily_dir, '2026-08-01', '設計を見直した。SQLiteを導入\n')
+        write_diary(daily_dir, '2026-08-02', '設計書を作成\n')
+        index.refresh()
+
+        assert [hit.date for hit in index.search('設計')] == ['2026-08-02', '2026-08-01']
+        assert [hit.date for hit in index.search('設計 sqlite')] == ['2026-08-01']
+        assert index.search('100%') == []
+
+    def test_refresh_applies_only_changes(self, index, daily_dir):
+        """再走査では変更・追加・削除されたファイルのみ反映する"""
+        first = write_diary(daily_dir, '2026-08-01', '旧い内容です\n')
+        second = write_diary(daily_dir, '2026-08-02', '変わらない内容\n')
+        assert index.refresh() == 2
+        assert index.refresh() == 0
+
+        first.write_text('新しい内容です\n', encoding='utf-8')
+        os.utime(first, ns=(first.stat().st_atime_ns, first.stat().st_mtime_ns + 1_000_000_000))
+        second.unlink()
+        write_diary(daily_dir, '2026-08-03', '追加した内容\n')
+
+        assert index.refresh() == 3
+        assert [hit.date for hit in index.search('内容')] == ['2026-08-03', '2026-08-01']
+        assert index.search('旧い内容') == []
+
+    def test_refresh_keeps_notes_saved_outside_daily_dir(self, index, daily_dir, tmp_path):
+        """日誌フォルダの外に保存したノートは再走査で削除せず、ファイルが消えた場合のみ削除する"""
+        write_diary(daily_dir, '2026-08-01', 'フォルダ内の内容\n')
+        outside = tmp_path / 'today.md'
+        outside.write_text('フォルダ外の内容\n', encoding='utf-8')
+        index.update_file(outside)
+
+        index.refresh()
+        assert [hit.path for hit in index.search('フォルダ外')] == [outside]
+
+        outside.unlink()
+        assert index.refresh() == 1
+        assert index.search('フォルダ外') == []
+
+    def test_save_diary_updates_index(self, daily_dir, isolated_data_dir):
+        """日誌の保存時にインデックスが更新される"""
+        path = daily_dir / '2026-08-09_プログラミング学習日誌.md'
+
+        save_diary(path, '## 作業内容\n\n全文検索を追加\n')
+
+        hits = DiarySearchIndex(daily_dir).search('全文検索')
+        assert [hit.path for hit in hits] == [path]
@@ -0,0 +1,304 @@
+import json
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from external_service.gemini_api import GeminiAPIClient
+from external_service.model_policy import ModelSelectionPolicy, thinking_level_from_budget
+from scripts.fake_gemini_server import FakeGeminiServer
+from utils.cancellation import CancellationToken
+from utils.exceptions import APIError, CancelledError
+
+
+class TestGeminiAPIClient:
+    """GeminiAPIClientクラスのテストクラス"""
+
+    @pytest.fixture
+    def server(self):
+        """ローカルのGemini APIスタブサーバー"""
+        with FakeGeminiServer(response_text="## 作業内容\n\nテスト") as server:
+            yield server
+
+    @pytest.fixture
+    def client(self, server):
+        """スタブサーバーに接続するクライアント"""
+        client = GeminiAPIClient()
+        client.api_key = 'test_key'
+        client.default_model = 'test-model'
+        client.base_url = server.url
+        return client
+
+    def test_initialize_reuses_client(self, client):
+        """2回目以降の初期化では既存のクライアントを再利用する"""
+        client.initialize()
+        first = client.client
+
+        client.initialize()
+
+        assert client.client is first
+
+    def test_initialize_without_api_key(self, client):
+        """APIキーが未設定の場合はAPIErrorを送出する"""
+        client.api_key = None
+
+        with pytest.raises(APIError, match="Gemini API初期化エラー"):
+            client.initialize()
+
+    def test_generate_content(self, client):
+        """生成結果とトークン数を返す"""
+        client.initialize()
+
+        text, input_tokens, output_tokens = client.generate_content("プロンプト", 'test-model')
+
+        assert text == "## 作業内容\n\nテスト"
+        assert input_tokens == len("プロンプト")
+        assert output_tokens == len("## 作業内容\n\nテスト")
+
+    def test_warm_up_connection_is_reused(self, client, server):
+        """ウォームアップで確立した接続を生成リクエストで再利用する"""
+        client.warm_up()
+        client.generate_content("プロンプト", 'test-model')
+        client.generate_content("プロンプト", 'test-model')
+
+        assert client.warm_up_seconds is not None
+        assert server.connection_count == 1
+        assert server.request_count == 2
+
+    def test_start_warm_up_runs_in_background(self, client, server):
+        """バックグラウンドスレッドでウォームアップする"""
+        client.start_warm_up().join(timeout=5)
+
+        assert client.client is not None
+        assert server.connection_count == 1
+
+    def test_start_warm_up_failure_is_not_raised(self, client, capsys):
+        """ウォームアップの失敗は例外にせずログ出力のみ"""
+        client.api_key = None
+
+        client.start_warm_up().join(timeout=5)
+
+        assert "ウォームアップに失敗しました" in capsys.readouterr().out
+
+    def test_generate_passes_thinking_level_and_records_decision(self, client, server, isolated_data_dir):
+        """選んだ思考レベルを送信し、判断内容と実測レイテンシを記録する"""
+        client.policy = ModelSelectionPolicy(thinking_level='low')
+        client.initialize()
+
+        text, _, _, model_name = client.generate("プロンプト")
+
+        assert model_name == 'test-model'
+        assert server.requests[0]['generation_config'] == {'thinking_level': 'low'}
+        entry = json.loads((isolated_data_dir / 'gemini_latency.jsonl').read_text(encoding='utf-8'))
+        assert entry['selected_model'] == 'test-model'
+        assert entry['used_model'] == 'test-model'
+        assert entry['hedged'] is False
+        assert entry['latency_seconds'] >= 0
+
+    def test_generate_hedges_to_fast_model_after_deadline(self, client, server):
+        """レイテンシ目標を超えた場合は高速モデルにも要求し、先に返った結果を使う"""
+        server.model_delays = {'test-model': 3.0, 'fast-model': 0.0}
+        client.policy = ModelSelectionPolicy(fast_model='fast-model', latency_target=0.3)
+        client.policy.predict_seconds = lambda model, tokens: 0.1
+        client.initialize()
+
+        start = time.perf_counter()
+        _, _, _, model_name = client.generate("プロンプト")
+
+        assert model_name == 'fast-model'
+        assert time.perf_counter() - start < 2.0
+        assert [request['model'] for request in server.requests] == ['test-model', 'fast-model']
+
+    def test_hedge_cancels_losing_request(self, client, server):
+        """先に返った結果を採用したら、負けた側の要求は中止して通信を打ち切る"""
+        server.model_delays = {'test-model': 3.0, 'fast-model': 0.0}
+        client.policy = ModelSelectionPolicy(fast_model='fast-model', latency_target=0.3)
+        client.policy.predict_seconds = lambda model, tokens: 0.1
+        client.initialize()
+        tokens = {}
+        generate_content = client.generate_content
+
+        def record_token(prompt, model_name, thinking_level=None, cancel_token=None):
+            tokens[model_name] = cancel_token
+            return generate_content(prompt, model_name, thinking_level, cancel_token)
+
+        client.generate_content = record_token
+        client.generate("プロンプト")
+
+        assert tokens['test-model'].cancelled
+        deadline = time.monotonic() + 2
+        while client._in_flight and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert client._in_flight == []
+
+    def test_hedge_win_keeps_client_open(self, client, server):
+        """負けた側の要求の中止ではクライアントを閉じず、次の要求もウォームアップ済みの接続を使う"""
+        server.model_delays = {'test-model': 3.0, 'fast-model': 0.0}
+        client.policy = ModelSelectionPolicy(fast_model='fast-model', latency_target=0.3)
+        client.policy.predict_seconds = lambda model, tokens: 0.1
+        client.initialize()
+        warmed_client = client.client
+
+        with patch.object(warmed_client, 'close') as close:
+            client.generate("プロンプト")
+
+        close.assert_not_called()
+        assert client.client is warmed_client
+
+    def test_user_cancel_during_hedge_closes_client(self, client, server):
+        """利用者が中止した場合は、ヘッジ要求を含む通信中の要求をクライアントごと打ち切る"""
+        server.model_delays = {'test-model': 3.0, 'fast-model': 3.0}
+        client.policy = ModelSelectionPolicy(fast_model='fast-model', latency_target=0.2)
+        client.policy.predict_seconds = lambda model, tokens: 0.1
+        client.initialize()
+        token = CancellationToken()
+        threading.Timer(0.5, token.cancel).start()
+
+        start = time.perf_counter()
+        with pytest.raises(CancelledError):
+            client.generate("プロンプト", cancel_token=token)
+
+        assert time.perf_counter() - start < 2.0
+        assert client.client is None
+
+    @pytest.mark.parametrize("value, expected", [(None, 3), ('5', 5), ('abc', 3), ('-1', 3), ('0', 0)])
+    def test_max_retries_from_env_is_parsed_leniently(self, value, expected):
+        """GEMINI_MAX_RETRIESの不正な値ではクライアントの作成に失敗せず既定値を使う"""
+        with patch('external_service.gemini_api.GEMINI_MAX_RETRIES', value):
+            assert GeminiAPIClient().max_retries == expected
+
+
+class TestModelSelectionPolicy:
+    """ModelSelectionPolicyクラスのテストクラス"""
+
+    @pytest.mark.parametrize("budget, expected", [
+        (None, None),
+        ('0', 'minimal'),
+        ('1024', 'low'),
+        ('4096', 'medium'),
+        ('24576', 'high'),
+        ('medium', 'medium'),
+        ('invalid', None),
+    ])
+    def test_thinking_level_from_budget(self, budget, expected):
+        """思考トークン数を思考レベルに変換する"""
+        assert thinking_level_from_budget(budget) == expected
+
+    def test_selects_primary_without_target(self, tmp_path):
+        """レイテンシ目標がない場合は常に主モデルを使う"""
+        policy = ModelSelectionPolicy(fast_model='fast', thinking_level='high', log_path=tmp_path / 'log.jsonl')
+
+        decision = policy.select('primary', 100000)
+
+        assert (decision.model, decision.thinking_level, decision.reason) == ('primary', 'high', 'primary')
+
+    def test_reduces_thinking_then_switches_to_fast_model(self, tmp_path):
+        """予測が目標を超える場合は思考レベルを下げ、それでも下げられない場合は高速モデルを選ぶ"""
+        policy = ModelSelectionPolicy(fast_model='fast', thinking_level='high', latency_target=5.0,
+                                      log_path=tmp_path / 'log.jsonl')
+
+        assert policy.select('primary', 100).reason == 'primary'
+        assert policy.select('primary', 10000).thinking_level == 'low'
+
+        policy.thinking_level = 'low'
+        decision = policy.select('primary', 10000)
+        assert (decision.model, decision.thinking_level, decision.reason) == ('fast', 'minimal', 'fast_model')
+
+    def test_prediction_uses_recorded_latency(self, tmp_path):
+        """記録した実測値からモデルごとの予測を行い、次回起動時も記録を読み込む"""
+        log_path = tmp_path / 'log.jsonl'
+        policy = ModelSelectionPolicy(latency_target=5.0, log_path=log_path)
+        decision = policy.select('primary', 1000)
+
+        policy.record(decision, 'primary', 1.0, False, 1000, 200)
+
+        assert ModelSelectionPolicy(log_path=log_path).predict_seconds('primary', 2000) == pytest.approx(2.0)
+
+
+class TestGeminiAPIClientRetry:
+    """GeminiAPIClientの再試行とヘッジ要求のテストクラス"""
+
+    @pytest.fixture
+    def server(self):
+        """障害と遅延を注入できるGemini APIスタブサーバー"""
+        with FakeGeminiServer(response_text="生成結果") as server:
+            yield server
+
+    @pytest.fixture
+    def client(self, server):
+        """再試行の待ち時間を短くしたクライアント"""
+        client = GeminiAPIClient()
+        client.api_key = 'test_key'
+        client.default_model = 'test-model'
+        client.base_url = server.url
+        client.RETRY_BASE_DELAY = 0.01
+        client.policy = ModelSelectionPolicy()
+        client.initialize()
+        return client
+
+    @pytest.mark.parametrize("status_code", [429, 500, 503])
+    def test_retries_transient_status(self, client, server, status_code):
+        """429・5xxは同じプロンプトで再試行して成功する"""
+        server.fail_statuses = [status_code, status_code]
+
+        text, _, _ = client.generate_content("同じプロンプト", 'test-model')
+
+        assert text == "生成結果"
+        assert server.request_count == 3
+        assert {request['input'] for request in server.requests} == {"同じプロンプト"}
+
+    def test_does_not_retry_client_error(self, client, server):
+        """400などの恒久的なエラーは再試行しない"""
+        server.fail_statuses = [400]
+
+        with pytest.raises(APIError, match="Gemini API呼び出しエラー"):
+            client.generate_content("プロンプト", 'test-model')
+
+        assert server.request_count == 1
+
+    def test_gives_up_after_max_retries(self, client, server):
+        """再試行回数の上限を超えるとAPIErrorを送出する"""
+        client.max_retries = 2
+        server.fail_statuses = [503, 503, 503, 503]
+
+        with pytest.raises(APIError):
+            client.generate_content("プロンプト", 'test-model')
+
+        assert server.request_count == 3
+
+    def test_retries_timeout(self, client, server):
+        """タイムアウトした要求は再試行する"""
+        client.request_timeout = 0.3
+        server.request_delays = [1.0, 1.0]
+
+        text, _, _ = client.generate_content("プロンプト", 'test-model')
+
+        assert text == "生成結果"
+        assert server.request_count >= 2
+
+    def test_retry_delay_grows_exponentially_and_honors_retry_after(self, client):
+        """待ち時間は指数的に増え、Retry-Afterヘッダーがあればそれに従う"""
+        client.RETRY_BASE_DELAY = 1.0
+        error = Exception("503")
+
+        assert 0.5 <= client._retry_delay(0, error) <= 1.0
+        assert 4.0 <= client._retry_delay(3, error) <= 8.0
+
+        error.response = type('Response', (), {'headers': {'retry-after': '7'}})()
+        assert client._retry_delay(0, error) == 7.0
+
+    def test_hedges_duplicate_after_latency_percentile(self, client, server, tmp_path):
+        """実測レイテンシのパーセンタイルを超えても応答がない場合は同じ要求を重複して送る"""
+        client.policy = ModelSelectionPolicy(hedge_percentile=95, log_path=tmp_path / 'log.jsonl')
+        decision = client.policy.select('test-model', 10)
+        for _ in range(5):
+            client.policy.record(decision, 'test-model', 0.2, False, 10, 10)
+        server.request_delays = [3.0]
+
+        start = time.perf_counter()
+        _, _, _, model_name = client.generate("プロンプト")
+
+        assert model_name == 'test-model'
+        assert time.perf_counter() - start < 2.0
+        assert server.request_count == 2
@@ -5,6 +5,7 @@ import pytest
 import requests
 
 from service.github_commit_tracker import GitHubCommitTracker
+from utils.exceptions import APIError
 
 
 class TestGitHubCommitTracker:
@@ -104,7 +105,7 @@ class TestGitHubCommitTracker:
             with pytest.raises(ValueError, match="GitHub TokenとUsernameが設定されていません"):
                 GitHubCommitTracker()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_user_repositories_success(self, mock_get, tracker, sample_repo_data):
         """リポジトリ取得成功テスト"""
         mock_response = Mock()
@@ -123,7 +124,7 @@ class TestGitHubCommitTracker:
         assert args[0] == 'https://api.github.com/user/repos'
         assert kwargs['headers']['Authorization'] == 'token test_token_123'
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_user_repositories_pagination(self, mock_get, tracker, sample_repo_data):
         """リポジトリ取得のページネーションテスト"""
         # 100件の完全なページを作成してページネーションをテスト
@@ -146,31 +147,31 @@ class TestGitHubCommitTracker:
         assert len(repos) == 102  # 100 + 2
         assert mock_get.call_count == 2
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_user_repositories_http_error(self, mock_get, tracker, capsys):
         """リポジトリ取得HTTPエラーテスト"""
         mock_response = Mock()
         mock_response.status_code = 401
         mock_get.return_value = mock_response
 
-        repos = tracker.get_user_repositories()
+        with pytest.raises(APIError, match="HTTP 401"):
+            tracker.get_user_repositories()
 
-        assert repos == []
         captured = capsys.readouterr()
         assert "リポジトリ取得エラー: 401" in captured.out
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_user_repositories_network_error(self, mock_get, tracker, capsys):
         """リポジトリ取得ネットワークエラーテスト"""
         mock_get.side_effect = requests.exceptions.RequestException("Network error")
 
-        repos = tracker.get_user_repositories()
+        with pytest.raises(APIError, match="リポジトリ一覧を取得できませんでした"):
+            tracker.get_user_repositories()
 
-        assert repos == []
         captured = capsys.readouterr()
         assert "ネットワークエラーが発生" in captured.out
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_commits_for_repo_by_date_success(self, mock_get, tracker, sample_commit_data):
         """日付指定コミット取得成功テスト"""
         mock_response = Mock()
@@ -195,7 +196,7 @@ class TestGitHubCommitTracker:
         with pytest.raises(ValueError, match="日付形式が不正です"):
             tracker.get_commits_for_repo_by_date('test-repo', 'invalid-date')
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_commits_for_repo_by_date_repo_not_found(self, mock_get, tracker):
         """リポジトリが見つからない場合のテスト"""
         mock_response = Mock()
@@ -206,27 +207,27 @@ class TestGitHubCommitTracker:
 
         assert commits == []
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_commits_for_repo_by_date_http_error(self, mock_get, tracker, capsys):
         """コミット取得HTTPエラーテスト"""
         mock_response = Mock()
         mock_response.status_code = 500
         mock_get.return_value = mock_response
 
-        commits = tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
+        with pytest.raises(APIError, match="HTTP 500"):
+            tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
 
-        assert commits == []
         captured = capsys.readouterr()
         assert "コミット取得エラー: 500" in captured.out
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_commits_for_repo_by_date_network_error(self, mock_get, tracker, capsys):
         """コミット取得ネットワークエラーテスト"""
         mock_get.side_effect = requests.exceptions.RequestException("Network error")
 
-        commits = tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
+        with pytest.raises(APIError, match="コミットを取得できませんでした"):
+            tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
 
-        assert commits == []
         captured = capsys.readouterr()
         assert "ネットワークエラー" in captured.out
 
@@ -273,7 +274,7 @@ class TestGitHubCommitTracker:
                 all_commits = tracker.get_all_commits_by_date('2024-01-15')
 
                 assert list(all_commits.keys()) == ['active']
-                mock_fetch.assert_called_once_with('active', '2024-01-15')
+                mock_fetch.assert_called_once_with('active', '2024-01-15', None)
 
     def test_collect_commits_preserves_repo_order(self, tracker):
         """並列取得でもリポジトリ順が保たれることのテスト"""
@@ -355,7 +356,7 @@ class TestGitHubCommitTracker:
             captured = capsys.readouterr()
             assert "コミット情報の変換でエラー" in captured.out
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_commits_for_repo_by_date_range_success(self, mock_get, tracker, sample_commit_data):
         """日付範囲指定コミット取得成功テスト"""
         mock_response = Mock()
@@ -373,6 +374,24 @@ class TestGitHubCommitTracker:
         assert kwargs['params']['since'] == '2024-01-14T15:00:00Z'
         assert kwargs['params']['until'] == '2024-01-16T15:00:00Z'
 
+    @patch('requests.Session.get')
+    def test_get_commits_for_repo_by_date_range_pagination(self, mock_get, tracker, sample_commit_data):
+        """長い期間のコミットはページを順に取得して全件を返す"""
+        full_page = Mock()
+        full_page.status_code = 200
+        full_page.json.return_value = sample_commit_data * 50  # 100件
+        last_page = Mock()
+        last_page.status_code = 200
+        last_page.json.return_value = sample_commit_data
+        mock_get.side_effect = [full_page, last_page]
+
+        commits = tracker.get_commits_for_repo_by_date_range('test-repo', '2024-01-01', '2024-06-30')
+
+        assert len(commits) == 102
+        assert mock_get.call_count == 2
+        assert [call.kwargs['params']['page'] for call in mock_get.call_args_list] == [1, 2]
+        assert mock_get.call_args.kwargs['params']['per_page'] == 100
+
     def test_get_commits_for_repo_by_date_range_invalid_date(self, tracker):
         """無効な日付範囲のテスト"""
         with pytest.raises(ValueError, match="日付形式が不正です"):
@@ -400,13 +419,13 @@ class TestGitHubCommitTracker:
                 all_commits = tracker.get_all_commits_by_date_range('2024-01-15', '2024-01-16')
 
                 assert list(all_commits.keys()) == ['active']
-                mock_fetch.assert_called_once_with('active', '2024-01-15', '2024-01-16')
+                mock_fetch.assert_called_once_with('active', '2024-01-15', '2024-01-16', None)
 
     def test_get_commits_for_diary_generation_range_single_date(self, tracker):
         """日誌生成用コミット取得（単一日付）テスト"""
         with patch.object(tracker, 'get_commits_for_diary_generation', return_value=[]) as mock_single:
             tracker.get_commits_for_diary_generation_range('2024-01-15')
-            mock_single.assert_called_once_with('2024-01-15')
+            mock_single.assert_called_once_with('2024-01-15', None, None)
 
     def test_get_commits_for_diary_generation_range_date_range(self, tracker, sample_commit_data):
         """日誌生成用コミット取得（日付範囲）テスト"""
@@ -436,26 +455,40 @@ class TestGitHubCommitTracker:
             captured = capsys.readouterr()
             assert "コミット情報の変換でエラー" in captured.out
 
-    @pytest.mark.parametrize("status_code,expected_empty", [
-        (200, False),
-        (404, True),
-        (401, True),
-        (500, True)
+    @pytest.mark.parametrize("status_code,headers,expected", [
+        (200, {}, 1),
+        (404, {}, 0),
+        (409, {}, 0),
+        (403, {}, 0),
+        (403, {'X-RateLimit-Remaining': '0'}, APIError),
+        (429, {'Retry-After': '60'}, APIError),
+        (401, {}, APIError),
+        (500, {}, APIError)
     ])
-    @patch('requests.get')
-    def test_get_commits_status_codes(self, mock_get, tracker, status_code, expected_empty):
-        """様々なHTTPステータスコードのテスト"""
+    @patch('requests.Session.get')
+    def test_get_commits_status_codes(self, mock_get, tracker, status_code, headers, expected):
+        """存在しない・空・アクセス拒否のリポジトリは空の一覧、レート制限やサーバーエラーは取得失敗とする"""
         mock_response = Mock()
         mock_response.status_code = status_code
+        mock_response.headers = headers
         mock_response.json.return_value = [{'test': 'data'}] if status_code == 200 else []
         mock_get.return_value = mock_response
 
-        commits = tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
-
-        if expected_empty:
-            assert commits == []
+        if expected is APIError:
+            with pytest.raises(APIError):
+                tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
         else:
-            assert len(commits) == 1
+            assert len(tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')) == expected
+
+    @patch('requests.Session.get')
+    def test_error_on_later_page_does_not_return_partial_commits(self, mock_get, tracker):
+        """2ページ目以降の取得に失敗した場合も、取得済みのページだけを完全な結果として返さない"""
+        full_page = Mock(status_code=200, headers={})
+        full_page.json.return_value = [{'sha': f'{index:040d}'} for index in range(tracker.COMMITS_PER_PAGE)]
+        mock_get.side_effect = [full_page, Mock(status_code=502, headers={})]
+
+        with pytest.raises(APIError, match="HTTP 502"):
+            tracker.get_commits_for_repo_by_date('test-repo', '2024-01-15')
 
     def test_commit_sorting_by_timestamp(self, tracker):
         """タイムスタンプでのコミットソートテスト"""
@@ -0,0 +1,85 @@
+import pstats
+import threading
+import tracemalloc
+
+from utils.profiling import StageProfiler, profile_dir_for, profile_stage
+
+
+def _allocate_lists():
+    return [list(range(100)) for _ in range(2000)]
+
+
+class TestStageProfiler:
+    """段階ごとのCPUプロファイルとメモリ確保の計測のテストクラス"""
+
+    def test_stage_writes_prof_and_allocation_report(self, tmp_path):
+        """段階ごとに番号付きの.profと、確保量の増加が多い箇所の報告を書き出す"""
+        with StageProfiler(tmp_path / 'profile') as profiler:
+            with profiler.stage('fetch'):
+                kept = _allocate_lists()
+            with profiler.stage('generate'):
+                sum(range(1000))
+
+        names = sorted(path.name for path in profiler.files)
+        assert names == ['01_fetch.prof', '01_fetch_allocations.txt', '02_generate.prof', '02_generate_allocations.txt']
+        stats = pstats.Stats(str(tmp_path / 'profile' / '01_fetch.prof'))
+        assert any(function == '_allocate_lists' for _, _, function in stats.stats)
+        report = (tmp_path / 'profile' / '01_fetch_allocations.txt').read_text(encoding='utf-8')
+        assert report.startswith("段階: fetch")
+        assert 'test_profiling.py' in report.split("確保量の増加が多い箇所")[1].splitlines()[1]
+        assert "_allocate_lists" in report
+        assert len(kept) == 2000
+
+    def test_report_is_written_when_stage_fails(self, tmp_path):
+        """段階が例外で終わった場合も報告を書き出し、例外はそのまま送出する"""
+        profiler = StageProfiler(tmp_path)
+        try:
+            with profiler, profiler.stage('generate'):
+                raise RuntimeError("失敗")
+        except RuntimeError:
+            pass
+
+        assert (tmp_path / '01_generate_allocations.txt').exists()
+
+    def test_concurrent_stage_skips_cpu_profile(self, tmp_path):
+        """別スレッドでcProfileを使用中の段階は、CPUプロファイルを省いてメモリの報告だけを書き出す"""
+        entered = threading.Event()
+        release = threading.Event()
+
+        def hold_stage():
+            with StageProfiler(tmp_path / 'first') as first, first.stage('fetch'):
+                entered.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=hold_stage)
+        thread.start()
+        entered.wait(5)
+        try:
+            with StageProfiler(tmp_path / 'second') as second, second.stage('fetch'):
+                pass
+        finally:
+            release.set()
+            thread.join()
+
+        assert [path.name for path in second.files] == ['01_fetch_allocations.txt']
+        assert "CPUプロファイルは省略" in (tmp_path / 'second' / '01_fetch_allocations.txt').read_text(encoding='utf-8')
+        assert (tmp_path / 'first' / '01_fetch.prof').exists()
+        assert not tracemalloc.is_tracing()
+
+    def test_keeps_tracemalloc_started_by_caller(self, tmp_path):
+        """呼び出し元が有効にしていたtracemallocは終了後も止めない"""
+        tracemalloc.start()
+        try:
+            with StageProfiler(tmp_path) as profiler, profiler.stage('fetch'):
+                pass
+            assert tracemalloc.is_tracing()
+        finally:
+            tracemalloc.stop()
+
+    def test_disabled_stage_is_noop(self, tmp_path):
+        """profilerがない場合は何も計測せず、ファイルも作らない"""
+        with profile_stage(None, 'fetch'):
+            pass
+
+        assert not tracemalloc.is_tracing()
+        assert profile_dir_for(tmp_path / '2024-01-21_日誌.md') == tmp_path / '2024-01-21_日誌_profile'
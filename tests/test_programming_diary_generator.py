@@ -1,3 +1,5 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from unittest.mock import Mock, patch, mock_open
@@ -5,6 +7,8 @@ from unittest.mock import Mock, patch, mock_open
 import pytest
 
 from service.programming_diary_generator import ProgrammingDiaryGenerator
+from utils.cancellation import CancellationToken
+from utils.exceptions import CancelledError
 
 
 class TestProgrammingDiaryGenerator:
@@ -40,10 +44,11 @@ class TestProgrammingDiaryGenerator:
         mock_client = Mock()
         mock_client.default_model = 'test-model'
         mock_client.initialize.return_value = True
-        mock_client.generate_content.return_value = (
+        mock_client.generate.return_value = (
             "# テスト日誌\n\n**機能追加**\n- 初期コミット実装",
             100,  # input_tokens
-            200   # output_tokens
+            200,  # output_tokens
+            'test-model'
         )
         return mock_client
 
@@ -159,9 +164,9 @@ class TestProgrammingDiaryGenerator:
         assert output_tokens == 200
         assert model_name == 'test-model'
         mock_ai_client.initialize.assert_called_once()
-        mock_ai_client.generate_content.assert_called_once()
+        mock_ai_client.generate.assert_called_once()
         mock_github_tracker.get_commits_for_diary_generation_range.assert_called_once_with(
-            "2024-01-01", "2024-01-02"
+            "2024-01-01", "2024-01-02", cancel_token=None, progress=None
         )
 
     def test_generate_diary_with_days_parameter(self, generator, mock_github_tracker, mock_ai_client):
@@ -195,3 +200,148 @@ class TestProgrammingDiaryGenerator:
         with patch.object(generator, '_load_prompt_template', return_value=mock_template):
             with pytest.raises(Exception, match="プログラミング日記の生成に失敗しました"):
                 generator.generate_diary()
+
+    def test_generate_diary_reuses_cached_days(self, generator, mock_github_tracker, mock_ai_client):
+        """範囲を広げて再生成した場合はコミットが変わっていない日をキャッシュから再利用する"""
+        monday = {'hash': 'a1', 'timestamp': '2024-01-15T10:00:00+09:00', 'message': '[repo] 月曜の作業'}
+        tuesday = {'hash': 'b2', 'timestamp': '2024-01-16T10:00:00+09:00', 'message': '[repo] 火曜の作業'}
+        mock_ai_client.generate.side_effect = [
+            ("## 作業内容\n\n月曜", 100, 10, 'test-model'),
+            ("## 作業内容\n\n火曜", 120, 20, 'test-model'),
+        ]
+
+        with patch.object(generator, '_load_prompt_template', return_value="テンプレート"), \
+             patch('service.programming_diary_generator.GitHubCommitTracker', return_value=mock_github_tracker):
+            mock_github_tracker.get_commits_for_diary_generation_range.return_value = [monday]
+            generator.generate_diary(since_date="2024-01-15", until_date="2024-01-15")
+
+            mock_github_tracker.get_commits_for_diary_generation_range.return_value = [tuesday, monday]
+            result, input_tokens, output_tokens, _ = generator.generate_diary(
+                since_date="2024-01-15", until_date="2024-01-16"
+            )
+
+        assert mock_ai_client.generate.call_count == 2
+        assert input_tokens == 120
+        assert output_tokens == 20
+        assert result == (
+            "## 作業内容\n\n### 2024年01月15日(月)\n\n月曜\n\n### 2024年01月16日(火)\n\n火曜\n"
+        )
+
+    def test_same_day_generated_concurrently_calls_ai_once(self, generator, mock_ai_client):
+        """同じ日・同じコミットを並行して生成した場合はAIを1回だけ呼び出し、結果を共有する"""
+        commits = [{'hash': 'a1', 'timestamp': '2024-01-15T10:00:00+09:00', 'message': '[repo] 作業'}]
+
+        def slow_generate(prompt, cancel_token=None):
+            time.sleep(0.2)
+            return "## 作業内容\n\n共有", 100, 10, 'test-model'
+
+        mock_ai_client.generate.side_effect = slow_generate
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(
+                lambda _: generator._generate_day_summary('2024-01-15', commits, "テンプレート"), range(3)
+            ))
+
+        assert mock_ai_client.generate.call_count == 1
+        assert {content for content, _, _, _ in results} == {"## 作業内容\n\n共有"}
+        assert sorted(model for _, _, _, model in results if model) == ['test-model']
+
+    def test_fast_model_result_is_not_cached(self, generator, mock_ai_client):
+        """高速モデルで生成した結果は保存せず、次回は既定のモデルで生成し直す"""
+        commits = [{'hash': 'a1', 'timestamp': '2024-01-15T10:00:00+09:00', 'message': '[repo] 作業'}]
+        mock_ai_client.generate.side_effect = [
+            ("## 作業内容\n\n高速", 100, 10, 'fast-model'),
+            ("## 作業内容\n\n既定", 100, 10, 'test-model'),
+        ]
+
+        first = generator._generate_day_summary('2024-01-15', commits, "テンプレート")
+        second = generator._generate_day_summary('2024-01-15', commits, "テンプレート")
+        third = generator._generate_day_summary('2024-01-15', commits, "テンプレート")
+
+        assert first[3] == 'fast-model'
+        assert second[3] == 'test-model'
+        assert third == ("## 作業内容\n\n既定", 0, 0, None)
+        assert mock_ai_client.generate.call_count == 2
+
+    def test_is_day_cached_after_generation(self, generator):
+        """生成済みの日はAIを呼び出さずに返せると判定し、コミットが変わると判定しない"""
+        commits = [{'hash': 'a1', 'timestamp': '2024-01-15T10:00:00+09:00', 'message': '[repo] 作業'}]
+
+        with patch.object(generator, '_load_prompt_template', return_value="テンプレート"):
+            assert generator.is_day_cached('2024-01-15', commits) is False
+            generator._generate_day_summary('2024-01-15', commits, "テンプレート")
+
+            assert generator.is_day_cached('2024-01-15', commits) is True
+            assert generator.is_day_cached('2024-01-15', commits + [{'hash': 'b2', 'message': '追加'}]) is False
+
+    def test_generate_diary_regenerates_changed_day(self, generator, mock_github_tracker, mock_ai_client):
+        """コミットが追加された日は再生成する"""
+        first = {'hash': 'a1', 'timestamp': '2024-01-15T10:00:00+09:00', 'message': '[repo] 作業1'}
+        second = {'hash': 'a2', 'timestamp': '2024-01-15T18:00:00+09:00', 'message': '[repo] 作業2'}
+
+        with patch.object(generator, '_load_prompt_template', return_value="テンプレート"), \
+             patch('service.programming_diary_generator.GitHubCommitTracker', return_value=mock_github_tracker):
+            mock_github_tracker.get_commits_for_diary_generation_range.return_value = [first]
+            generator.generate_diary(since_date="2024-01-15", until_date="2024-01-15")
+
+            mock_github_tracker.get_commits_for_diary_generation_range.return_value = [second, first]
+            generator.generate_diary(since_date="2024-01-15", until_date="2024-01-15")
+
+        assert mock_ai_client.generate.call_count == 2
+
+    def test_generate_diary_reuses_fetched_commits_after_ai_failure(self, generator, mock_github_tracker,
+                                                                    mock_ai_client):
+        """AI呼び出しに失敗した期間を再実行した場合はGitHubから再取得しない"""
+        mock_ai_client.generate.side_effect = [
+            Exception("503 UNAVAILABLE"),
+            ("## 作業内容\n\n内容", 100, 200, 'test-model'),
+        ]
+
+        with patch.object(generator, '_load_prompt_template', return_value="テンプレート"), \
+             patch('service.programming_diary_generator.GitHubCommitTracker',
+                   return_value=mock_github_tracker) as mock_tracker_class:
+            with pytest.raises(Exception, match="503 UNAVAILABLE"):
+                generator.generate_diary(since_date="2024-01-01", until_date="2024-01-02")
+
+            result, _, _, _ = generator.generate_diary(since_date="2024-01-01", until_date="2024-01-02")
+
+        assert result == "## 作業内容\n\n内容"
+        assert mock_tracker_class.call_count == 1
+        mock_github_tracker.get_commits_for_diary_generation_range.assert_called_once()
+        assert generator.commit_cache.get("2024-01-01", "2024-01-02") is None
+
+    def test_generate_diary_cancelled_keeps_fetched_commits(self, generator, mock_github_tracker, mock_ai_client):
+        """AI呼び出し中に中止した場合はCancelledErrorをそのまま送出し、取得時に保持したコミットを残す"""
+        token = CancellationToken()
+
+        def cancel_during_generation(prompt, cancel_token):
+            cancel_token.cancel()
+            cancel_token.raise_if_cancelled()
+
+        mock_ai_client.generate.side_effect = cancel_during_generation
+
+        with patch.object(generator, '_load_prompt_template', return_value="テンプレート"), \
+             patch('service.programming_diary_generator.GitHubCommitTracker', return_value=mock_github_tracker), \
+             patch.object(generator.commit_cache, 'put', wraps=generator.commit_cache.put) as put:
+            with pytest.raises(CancelledError):
+                generator.generate_diary(since_date="2024-01-01", until_date="2024-01-02", cancel_token=token)
+
+        assert mock_ai_client.generate.call_args[0][1] is token
+        put.assert_called_once()
+        assert generator.commit_cache.get("2024-01-01", "2024-01-02") is not None
+
+    def test_generate_diary_reports_progress_per_day(self, generator, mock_github_tracker, mock_ai_client):
+        """日ごとの生成が終わるたびに生成済み日数とトークン数を通知する"""
+        mock_github_tracker.get_commits_for_diary_generation_range.return_value = [
+            {'hash': 'a', 'author_name': 'Test User', 'timestamp': '2024-01-01T10:00:00+09:00', 'message': '1日目'},
+            {'hash': 'b', 'author_name': 'Test User', 'timestamp': '2024-01-02T10:00:00+09:00', 'message': '2日目'},
+        ]
+        events = []
+
+        with patch.object(generator, '_load_prompt_template', return_value="テンプレート"), \
+             patch('service.programming_diary_generator.GitHubCommitTracker', return_value=mock_github_tracker):
+            generator.generate_diary(since_date="2024-01-01", until_date="2024-01-02", progress=events.append)
+
+        assert [(event.days_done, event.days_total) for event in events] == [(0, 2), (1, 2), (2, 2)]
+        assert events[-1].input_tokens == 200
+        assert events[-1].output_tokens == 400
+        assert mock_github_tracker.get_commits_for_diary_generation_range.call_args.kwargs['progress'] == events.append
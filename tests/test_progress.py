@@ -0,0 +1,69 @@
+import threading
+
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+from service.github_commit_tracker import GitHubCommitTracker
+from service.progress import FetchProgress, GenerationProgress, ProgressQueue
+
+
+class TestProgressQueue:
+    """ProgressQueueクラスのテストクラス"""
+
+    def test_drain_keeps_latest_event_per_stage(self):
+        """段階ごとに最新の進捗のみを、最後に更新された順に返す"""
+        progress_queue = ProgressQueue()
+        progress_queue.put(FetchProgress(1, 3, 2, 100, 1.0))
+        progress_queue.put(GenerationProgress(0, 2, 0, 0))
+        progress_queue.put(FetchProgress(3, 3, 5, 300, 2.0))
+
+        events = progress_queue.drain_latest()
+
+        assert [event.stage for event in events] == ['generate', 'fetch']
+        assert events[1].repos_done == 3
+        assert progress_queue.drain_latest() == []
+
+    def test_put_from_many_threads(self):
+        """複数スレッドから追加した進捗を取りこぼさない"""
+        progress_queue = ProgressQueue()
+        threads = [threading.Thread(target=lambda: [progress_queue.put(GenerationProgress(i, 100, 0, 0))
+                                                    for i in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        events = progress_queue.drain_latest()
+
+        assert len(events) == 1
+        assert events[0].days_done == 99
+
+    def test_format(self):
+        """取得件数・受信量・速度・APIの残り回数を表示用の文字列にする"""
+        text = FetchProgress(2, 5, 7, 20480, 2.0, rate_limit_remaining=4990).format()
+
+        assert text == "取得: リポジトリ 2/5 コミット7件 20KB (10KB/秒) API残り4990回"
+        assert GenerationProgress(1, 3, 120, 40, cached_days=1).format() == (
+            "生成: 1/3日 トークン 入力=120 出力=40 キャッシュ1日"
+        )
+
+
+class TestFetchProgress:
+    """コミット取得の進捗通知のテストクラス"""
+
+    def test_collect_commits_reports_each_repository(self):
+        """リポジトリごとに取得済み件数・コミット数・受信量・APIの残り回数を通知する"""
+        commits_by_repo = {f'repo-{index}': [build_commit(f'{index:040d}', 'コミット', '2024-01-15T01:00:00Z')]
+                           for index in range(5)}
+        events = []
+        tracker = GitHubCommitTracker(token='test_token', username='test_user')
+        with FakeGitHubServer(commits_by_repo) as server:
+            server.rate_limit_remaining = 1000
+            tracker.base_url = server.url
+
+            tracker.get_commits_for_diary_generation_range('2024-01-15', '2024-01-16', progress=events.append)
+        tracker.session.close()
+
+        assert [event.repos_done for event in events] == [0, 1, 2, 3, 4, 5]
+        assert all(event.repos_total == 5 for event in events)
+        assert events[-1].commits_found == 5
+        assert events[-1].bytes_received > 0
+        assert events[-1].rate_limit_remaining == 994
@@ -0,0 +1,125 @@
+from service.prompt_compactor import CommitPromptCompactor, estimate_uncompacted_tokens, format_date_label
+from utils.token_estimator import estimate_tokens
+
+
+class TestEstimateTokens:
+    """estimate_tokens関数のテストクラス"""
+
+    def test_empty_text(self):
+        """空文字は0トークン"""
+        assert estimate_tokens('') == 0
+
+    def test_japanese_counts_one_token_per_char(self):
+        """日本語は1文字1トークンとして数える"""
+        assert estimate_tokens('日本語テスト') == 6
+
+    def test_ascii_counts_four_chars_per_token(self):
+        """英数字は4文字1トークンとして数える"""
+        assert estimate_tokens('abcdefgh') == 2
+        assert estimate_tokens('abcdefghi') == 3
+
+
+class TestCommitPromptCompactor:
+    """CommitPromptCompactorクラスのテストクラス"""
+
+    def _commit(self, timestamp, message, repository='repo'):
+        return {'timestamp': timestamp, 'message': f"[{repository}] {message}", 'repository': repository}
+
+    def test_format_date_label(self):
+        """日付ラベルに曜日が付き、解析できない場合はそのまま返す"""
+        assert format_date_label('2024-01-15T10:00:00+09:00') == '2024年01月15日(月)'
+        assert format_date_label('invalid') == 'invalid'
+
+    def test_groups_by_date_and_repository_in_chronological_order(self):
+        """日付とリポジトリの見出しは1回だけ出力され、古い順に並ぶ"""
+        compactor = CommitPromptCompactor(max_input_tokens=10000)
+        commits = [
+            self._commit('2024-01-16T09:00:00+09:00', '火曜の作業'),
+            self._commit('2024-01-15T18:00:00+09:00', '月曜の作業2', 'other'),
+            self._commit('2024-01-15T10:00:00+09:00', '月曜の作業1'),
+        ]
+
+        result = compactor.compact(commits)
+
+        assert result == (
+            '### 2024年01月15日(月)\n[repo]\n- 月曜の作業1\n[other]\n- 月曜の作業2\n\n'
+            '### 2024年01月16日(火)\n[repo]\n- 火曜の作業'
+        )
+
+    def test_drops_trailers_and_trims_body(self):
+        """トレーラー行を除き、本文を行数と文字数の上限で切り詰める"""
+        compactor = CommitPromptCompactor(max_input_tokens=10000, max_body_lines=2, max_line_chars=5)
+        message = ('機能追加\n\n説明1\n説明2は長い文章です\n説明3\n\n'
+                   'Signed-off-by: User <user@example.com>\nCo-authored-by: Other <other@example.com>')
+
+        result = compactor.compact([self._commit('2024-01-15T10:00:00+09:00', message)])
+
+        assert 'Signed-off-by' not in result
+        assert 'Co-authored-by' not in result
+        assert '  説明1\n  説明2は長…\n  …ほか1行' in result
+
+    def test_collapses_near_identical_messages(self):
+        """数字や記号だけが異なるメッセージは件数付きの1行にまとめる"""
+        compactor = CommitPromptCompactor(max_input_tokens=10000)
+        commits = [
+            self._commit('2024-01-15T10:00:00+09:00', 'Update README'),
+            self._commit('2024-01-15T11:00:00+09:00', 'update readme (2)'),
+            self._commit('2024-01-15T12:00:00+09:00', 'Update README'),
+        ]
+
+        result = compactor.compact(commits)
+
+        assert result.count('- Update README (×3)') == 1
+        assert 'readme (2)' not in result
+
+    def test_enforces_token_budget(self):
+        """上限を超える場合は本文を省き、件数を絞って上限内に収める"""
+        compactor = CommitPromptCompactor(max_input_tokens=60, max_body_lines=3)
+        subjects = ['認証', '検索', '画面', '設定', '保存', '通知', '集計', '印刷', '履歴', '翻訳', '共有', '同期']
+        commits = [self._commit(f'2024-01-15T{hour:02d}:00:00+09:00', f'{subject}機能を追加\n\n詳細な説明文')
+                   for hour, subject in zip(range(10, 22), subjects)]
+
+        result = compactor.compact(commits)
+
+        assert estimate_tokens(result) <= 60
+        assert '詳細な説明文' not in result
+        assert 'ほか' in result
+
+    def test_compacted_prompt_is_smaller_than_uncompacted(self):
+        """圧縮後のトークン数は圧縮前より少ない"""
+        compactor = CommitPromptCompactor(max_input_tokens=10000)
+        commits = [self._commit(f'2024-01-15T{hour:02d}:00:00+09:00',
+                                'テスト修正\n\n' + '長い本文\n' * 10 + 'Signed-off-by: User <u@example.com>')
+                   for hour in range(10, 15)]
+
+        assert estimate_tokens(compactor.compact(commits)) < estimate_uncompacted_tokens(commits)
+
+    def test_truncates_when_one_entry_per_repository_still_exceeds_budget(self, capsys):
+        """件数を1件まで絞っても上限を超える場合は末尾を省略して上限内に収め、超過量を警告する"""
+        compactor = CommitPromptCompactor(max_input_tokens=40)
+        commits = [self._commit(f'2024-01-{day:02d}T10:00:00+09:00', f'{day}日の作業内容を記録', f'repo{day}')
+                   for day in range(1, 11)]
+
+        result = compactor.compact(commits)
+
+        assert estimate_tokens(result) <= 40
+        assert result.startswith('### 2024年01月01日(月)')
+        assert result.endswith('以降を省略）')
+        assert '警告' in capsys.readouterr().out
+
+    def test_reserved_tokens_reduce_budget_for_commits(self):
+        """テンプレート分として予約したトークン数を差し引いた残りにコミット履歴を収める"""
+        compactor = CommitPromptCompactor(max_input_tokens=100)
+        subjects = ['認証', '検索', '画面', '設定', '保存', '通知', '集計', '印刷', '履歴', '翻訳']
+        commits = [self._commit(f'2024-01-15T{hour:02d}:00:00+09:00', f'{subject}機能の作業内容を記録')
+                   for hour, subject in zip(range(10, 20), subjects)]
+
+        assert estimate_tokens(compactor.compact(commits)) > 60
+        assert estimate_tokens(compactor.compact(commits, reserved_tokens=60)) <= 40
+
+    def test_explicit_zero_limit_is_not_replaced_by_default(self):
+        """明示的に0を指定した上限は既定値に置き換えない"""
+        compactor = CommitPromptCompactor(max_input_tokens=0)
+
+        assert compactor.max_input_tokens == 0
+        assert compactor.compact([self._commit('2024-01-15T10:00:00+09:00', '作業')]) == ''
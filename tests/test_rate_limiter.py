@@ -0,0 +1,48 @@
+import threading
+import time
+
+import pytest
+
+from utils.cancellation import CancellationToken
+from utils.exceptions import CancelledError
+from utils.rate_limiter import RateLimiter
+
+
+class TestRateLimiter:
+    """RateLimiterクラスのテストクラス"""
+
+    def test_burst_is_allowed_without_waiting(self):
+        """burst回までは待たずに許可する"""
+        limiter = RateLimiter(60, burst=3)
+
+        assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+    def test_waits_for_interval_after_burst(self):
+        """burstを使い切ると次の許可まで60/rate秒待つ"""
+        limiter = RateLimiter(600, burst=1)
+        limiter.acquire()
+
+        start = time.perf_counter()
+        waited = limiter.acquire()
+        elapsed = time.perf_counter() - start
+
+        assert waited > 0
+        assert 0.08 <= elapsed < 0.5
+
+    def test_cancel_while_waiting(self):
+        """待っている間に中止するとCancelledErrorを送出する"""
+        limiter = RateLimiter(1, burst=1)
+        limiter.acquire()
+        token = CancellationToken()
+        threading.Timer(0.05, token.cancel).start()
+
+        start = time.perf_counter()
+        with pytest.raises(CancelledError):
+            limiter.acquire(token)
+
+        assert time.perf_counter() - start < 1.0
+
+    def test_invalid_rate_raises_error(self):
+        """回数に0以下を指定するとValueErrorを送出する"""
+        with pytest.raises(ValueError):
+            RateLimiter(0)
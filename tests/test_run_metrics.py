@@ -0,0 +1,123 @@
+import pytest
+
+from scripts.fake_gemini_server import FakeGeminiServer
+from scripts.fake_github_server import FakeGitHubServer, build_commit
+from service.run_metrics import (RunMetricsLedger, build_histogram, histogram_quantile, merge_histograms,
+                                 record_run, summarize, to_prometheus)
+from utils.exceptions import CancelledError
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    """GitHub・Geminiのスタブサーバーに接続した生成器を作る"""
+    commits_by_repo = {
+        'repo-a': [build_commit('a' * 40, '機能追加', '2024-01-15T01:00:00Z')],
+        'repo-b': [build_commit('b' * 40, '不具合修正', '2024-01-16T02:00:00Z')],
+    }
+    with FakeGitHubServer(commits_by_repo) as github, FakeGeminiServer() as gemini:
+        monkeypatch.setenv('GITHUB_TOKEN', 'test_token')
+        monkeypatch.setenv('GITHUB_USERNAME', 'test_user')
+        monkeypatch.setenv('GITHUB_API_URL', github.url)
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_API_KEY', 'test_key')
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_MODEL', 'test-model')
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_BASE_URL', gemini.url)
+        monkeypatch.setattr('external_service.gemini_api.GEMINI_LATENCY_TARGET', None)
+        from service.programming_diary_generator import ProgrammingDiaryGenerator
+        yield ProgrammingDiaryGenerator()
+
+
+def _record(timestamp, duration_ms, fetch_ms, llm_ms, status='ok', day_hits=0):
+    return {
+        'timestamp': timestamp, 'kind': 'generate', 'status': status, 'duration_ms': duration_ms,
+        'stages_ms': {'fetch': fetch_ms, 'llm': llm_ms},
+        'repo_fetch_ms': build_histogram([fetch_ms / 2, fetch_ms]),
+        'requests': {'github': {'200': 3}, 'gemini': {'ok': 2 - day_hits}},
+        'cache': {'commits': {'hits': 0, 'misses': 1}, 'days': {'hits': day_hits, 'misses': 2 - day_hits}},
+        'input_tokens': 1000, 'output_tokens': 500, 'cost_usd': 0.0015,
+    }
+
+
+class TestRunMetrics:
+    """実行ごとの計測結果の台帳のテストクラス"""
+
+    def test_generate_diary_appends_record(self, generator):
+        """日誌を生成するたびに段階ごとの所要時間・要求数・キャッシュ・トークン数・料金を1行追記する"""
+        generator.generate_diary('2024-01-15', '2024-01-16')
+        generator.generate_diary('2024-01-15', '2024-01-16')
+
+        first, second = RunMetricsLedger().read()
+        assert first['kind'] == 'generate'
+        assert (first['since'], first['until'], first['status'], first['commits']) == \
+            ('2024-01-15', '2024-01-16', 'ok', 2)
+        assert {'fetch', 'discover_repositories', 'fetch_repos', 'format_commits', 'build_prompt', 'llm',
+                'merge_days'} <= set(first['stages_ms'])
+        assert sum(first['repo_fetch_ms']['counts']) == 2
+        assert first['requests']['github'] == {'200': 3}
+        assert first['requests']['gemini'] == {'ok': 2}
+        assert first['cache']['days'] == {'hits': 0, 'misses': 2}
+        assert first['input_tokens'] > 0 and first['cost_usd'] > 0
+        assert first['models'] == ['test-model']
+        # 2回目は日ごとの生成結果を再利用し、AIを呼び出さない
+        assert second['cache']['days'] == {'hits': 2, 'misses': 0}
+        assert second['requests']['gemini'] == {}
+        assert second['input_tokens'] == 0
+
+    def test_record_run_marks_cancelled_and_failed_runs(self):
+        """中止・失敗した実行も状態付きで記録し、例外はそのまま送出する"""
+        with pytest.raises(CancelledError):
+            with record_run('generate', '2024-01-15'):
+                raise CancelledError("中止")
+        with pytest.raises(ValueError):
+            with record_run('generate', '2024-01-16'):
+                raise ValueError("失敗")
+        with record_run('backfill', '2024-01-17') as run:
+            run['status'] = 'partial'
+
+        assert [record['status'] for record in RunMetricsLedger().read()] == ['cancelled', 'error', 'partial']
+
+    def test_histogram_quantile_interpolates_within_bucket(self):
+        """ヒストグラムを足し合わせ、分位点を区切り内の線形補間で求める"""
+        histogram = merge_histograms([build_histogram([10, 20, 30]), build_histogram([60, 80, 200, 20000])])
+
+        assert histogram['counts'][:3] == [3, 2, 1]
+        assert histogram['counts'][-1] == 1
+        assert histogram_quantile(0.5, histogram) == pytest.approx(50 + 50 * 0.5 / 2)
+        assert histogram_quantile(0.99, histogram) == 10000.0
+        assert histogram_quantile(0.5, build_histogram([])) is None
+
+    def test_summarize_reports_percentiles_and_ratios(self, tmp_path):
+        """直近の記録から所要時間のパーセンタイル、キャッシュ利用率、トークン数と料金の合計をまとめる"""
+        ledger = RunMetricsLedger(tmp_path / 'metrics.jsonl')
+        for index in range(10):
+            ledger.append(_record(f'2024-01-{index + 1:02d}T23:30:00', 1000 * (index + 1), 100 * (index + 1),
+                                  500, day_hits=index % 2))
+        (tmp_path / 'metrics.jsonl').open('a', encoding='utf-8').write('壊れた行\n')
+
+        summary = summarize(ledger.read(last=4))
+
+        assert summary['runs'] == 4
+        assert summary['from'] == '2024-01-07T23:30:00'
+        assert summary['duration_ms'] == {'p50': 8000, 'p90': 10000, 'p99': 10000, 'max': 10000}
+        assert summary['stages_ms']['llm']['p50'] == 500
+        assert summary['cache']['days'] == {'hits': 2, 'misses': 6, 'hit_ratio': 0.25}
+        assert summary['requests']['github'] == {'200': 12}
+        assert summary['input_tokens'] == 4000
+        assert summary['cost_usd'] == pytest.approx(0.006)
+        assert summarize([]) == {'runs': 0}
+
+    def test_prometheus_export(self):
+        """回数・トークン数・料金は累計、段階の所要時間は分位点、リポジトリごとの取得時間は累積ヒストグラムで出力する"""
+        records = [_record('2024-01-01T23:30:00', 1000, 100, 500), _record('2024-01-02T23:30:00', 2000, 400, 700,
+                                                                          status='error')]
+
+        text = to_prometheus(records)
+
+        assert 'codediary_runs_total{kind="generate",status="error"} 1' in text
+        assert 'codediary_stage_duration_seconds{stage="llm",quantile="0.5"} 0.5' in text
+        assert 'codediary_stage_duration_seconds_count{stage="fetch"} 2' in text
+        assert 'codediary_repo_fetch_duration_seconds_bucket{le="0.1"} 2' in text
+        assert 'codediary_repo_fetch_duration_seconds_bucket{le="+Inf"} 4' in text
+        assert 'codediary_requests_total{service="github",status="200"} 6' in text
+        assert 'codediary_cache_lookups_total{cache="days",result="misses"} 4' in text
+        assert 'codediary_tokens_total{direction="output"} 1000' in text
+        assert '# TYPE codediary_repo_fetch_duration_seconds histogram' in text
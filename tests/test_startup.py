@@ -0,0 +1,41 @@
+from scripts.measure_startup import (GUI_MODULES, measure_headless_import, measure_import_time, parse_first_paint,
+                                     parse_import_times)
+
+
+class TestStartup:
+    """起動時のモジュール読み込みのテストクラス"""
+
+    def test_parse_import_times(self):
+        """-X importtime の出力から時間と階層を読み取る"""
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   _json\n"
+            "import time:      2500 |       2620 | json\n"
+        )
+
+        entries = parse_import_times(stderr)
+
+        assert entries == [
+            {'module': '_json', 'self_ms': 0.12, 'cumulative_ms': 0.12, 'depth': 1},
+            {'module': 'json', 'self_ms': 2.5, 'cumulative_ms': 2.62, 'depth': 0},
+        ]
+
+    def test_parse_first_paint(self):
+        """子プロセスの出力から、子プロセス内で計測した最初の描画までの時間を読み取る"""
+        assert parse_first_paint("設定を読み込みました\nfirst_paint_ms=123.4\n") == 123.4
+        assert parse_first_paint("") is None
+
+    def test_main_window_does_not_import_heavy_modules(self):
+        """メインウィンドウの読み込み時にAI・HTTPクライアントを読み込まない"""
+        result = measure_import_time('app.main_window')
+
+        assert result['heavy_modules'] == []
+
+    def test_main_window_does_not_import_tkcalendar(self):
+        """カレンダー（tkcalendar・babel）はウィジェットの作成時まで読み込まない"""
+        assert measure_import_time('app.main_window', ('tkcalendar', 'babel'))['heavy_modules'] == []
+
+    def test_headless_generation_does_not_import_tkinter(self):
+        """ウィンドウなしの実行で読み込む処理はtkinterを読み込まない"""
+        assert measure_import_time('codediary.cli', GUI_MODULES)['heavy_modules'] == []
+        assert measure_headless_import()['gui_modules'] == []
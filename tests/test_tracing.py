@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+
+import pytest
+
+from utils import tracing
+from utils.tracing import bind, disable_tracing, enable_tracing, read_trace, record_spans, span
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    """テストごとのトレースファイルに記録し、終了後に記録を止める"""
+    path = tmp_path / 'trace.json'
+    enable_tracing(path)
+    yield path
+    disable_tracing()
+
+
+def _spans(path):
+    return [event for event in read_trace(path) if event['ph'] == 'X']
+
+
+class TestTracing:
+    """処理段階の区間記録のテストクラス"""
+
+    def test_disabled_span_records_nothing(self, tmp_path):
+        """無効の間は共有の何もしない区間を返し、属性の追加も無視する"""
+        disable_tracing()
+
+        with span('stage', repo='a') as current:
+            current.set(commits=1)
+
+        assert span('other') is current
+        assert not tracing.is_tracing_enabled()
+
+    def test_nested_spans_are_written_with_timings_and_attributes(self, trace_path):
+        """入れ子の区間を開始時刻・所要時間・属性付きで1行ずつ書き出す"""
+        with span('outer', since='2024-01-01') as outer:
+            with span('inner'):
+                time.sleep(0.01)
+            outer.set(commits=3)
+        disable_tracing()
+
+        spans = {event['name']: event for event in _spans(trace_path)}
+        outer, inner = spans['outer'], spans['inner']
+        assert outer['args'] == {'since': '2024-01-01', 'commits': 3}
+        assert inner['dur'] >= 10_000
+        assert outer['ts'] <= inner['ts']
+        assert inner['ts'] + inner['dur'] <= outer['ts'] + outer['dur']
+        assert outer['tid'] == inner['tid']
+
+    def test_trace_file_is_loadable_as_chrome_trace(self, trace_path):
+        """閉じ括弧を補えばJSON配列として読め、スレッド名のメタデータも含む"""
+        worker = threading.Thread(target=lambda: span('worker_stage').__enter__().__exit__(None, None, None),
+                                  name='fetch-worker')
+        with span('main_stage'):
+            worker.start()
+            worker.join()
+        disable_tracing()
+
+        text = trace_path.read_text(encoding='utf-8')
+        events = json.loads(text.rstrip().rstrip(',') + ']')
+        thread_names = {event['args']['name'] for event in events if event['ph'] == 'M'}
+        assert 'fetch-worker' in thread_names
+        assert {event['name'] for event in events if event['ph'] == 'X'} == {'main_stage', 'worker_stage'}
+
+    def test_exception_is_recorded_and_propagated(self, trace_path):
+        """区間内で送出された例外は種類を属性に記録してそのまま送出する"""
+        with pytest.raises(ValueError):
+            with span('failing'):
+                raise ValueError("失敗")
+        disable_tracing()
+
+        assert _spans(trace_path)[0]['args'] == {'error': 'ValueError'}
+
+    def test_enabled_from_environment(self, tmp_path, monkeypatch):
+        """環境変数CODEDIARY_TRACE_FILEに出力先を指定すると記録を始める"""
+        path = tmp_path / 'env_trace.json'
+        monkeypatch.setenv(tracing.TRACE_FILE_ENV, str(path))
+        try:
+            assert tracing.configure_tracing_from_env() is True
+            with span('from_env'):
+                pass
+        finally:
+            disable_tracing()
+
+        assert [event['name'] for event in _spans(path)] == ['from_env']
+
+    def test_record_spans_collects_own_and_bound_threads(self):
+        """record_spansは自スレッドとbindで引き継いだスレッドの区間だけを集め、終了後は無効に戻る"""
+        disable_tracing()
+
+        def fetch(repo):
+            with span('fetch_repo', repo=repo):
+                pass
+
+        with record_spans() as recorder:
+            with span('stage'):
+                bound = threading.Thread(target=bind(fetch), args=('bound',))
+                unbound = threading.Thread(target=fetch, args=('unbound',))
+                for thread in (bound, unbound):
+                    thread.start()
+                    thread.join()
+
+        assert [event['args']['repo'] for event in recorder.spans('fetch_repo')] == ['bound']
+        assert len(recorder.spans('stage')) == 1
+        assert not tracing.is_tracing_enabled()
+
+    def test_disabled_overhead_is_negligible(self):
+        """無効の間の区間1回あたりの負荷はマイクロ秒未満の水準に収まる"""
+        disable_tracing()
+        iterations = 100_000
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with span('stage', repo='a') as current:
+                current.set(commits=1)
+        per_span = (time.perf_counter() - start) / iterations
+
+        assert per_span < 5e-6
@@ -0,0 +1,99 @@
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from utils.exceptions import CancelledError
+
+_local = threading.local()
+
+
+class CancellationToken:
+    """処理の中止を伝えるトークン
+
+    cancelを呼ぶと登録済みの処理（通信中の接続の切断など）を実行し、
+    以降のraise_if_cancelled・waitでCancelledErrorを送出させる"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        """中止を要求し、登録済みの処理を呼び出す。2回目以降は何もしない"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"中止処理でエラーが発生しました: {e}")
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """中止時に呼び出す処理を登録し、登録を解除する関数を返す。中止済みの場合はすぐに呼び出す"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unregister(callback)
+        callback()
+        return lambda: None
+
+    def _unregister(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def raise_if_cancelled(self):
+        """中止済みの場合はCancelledErrorを送出"""
+        if self._event.is_set():
+            raise CancelledError("処理を中止しました")
+
+    def wait(self, seconds: float):
+        """指定秒数待つ。待っている間に中止された場合はすぐにCancelledErrorを送出"""
+        self._event.wait(seconds)
+        self.raise_if_cancelled()
+
+
+def child_token(parent: Optional[CancellationToken]) -> Tuple[CancellationToken, Callable[[], None]]:
+    """親のトークンが中止されると一緒に中止される子のトークンと、親との連動を解除する関数を返す
+
+    子のトークンだけを中止しても親には影響しない（ヘッジ要求で負けた側だけを打ち切る場合など）"""
+    token = CancellationToken()
+    if parent is None:
+        return token, lambda: None
+    return token, parent.register(token.cancel)
+
+
+def raise_if_cancelled(token: Optional[CancellationToken]):
+    """トークンが指定されていて中止済みの場合はCancelledErrorを送出"""
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def activate(token: CancellationToken) -> Iterator[None]:
+    """このスレッドで実行する処理にトークンを設定する。終了時にon_cancelで登録した処理を解除する"""
+    token.raise_if_cancelled()
+    previous = getattr(_local, 'scope', None)
+    _local.scope = (token, [])
+    try:
+        yield
+    finally:
+        _, unregisters = _local.scope
+        _local.scope = previous
+        for unregister in unregisters:
+            unregister()
+
+
+def on_cancel(callback: Callable[[], None]):
+    """activateで設定したトークンが中止されたときに呼び出す処理を登録。トークンがなければ何もしない"""
+    scope = getattr(_local, 'scope', None)
+    if scope is not None:
+        token, unregisters = scope
+        unregisters.append(token.register(callback))
@@ -1,8 +1,13 @@
 import configparser
+import io
 import os
 import sys
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 
 from utils.env_loader import load_environment_variables
+from utils.file_utils import atomic_write_text
 
 
 def get_config_path():
@@ -17,41 +22,213 @@ def get_config_path():
 
 CONFIG_PATH = get_config_path()
 
-_cached_config = None
+SAVE_DELAY_SECONDS = 1.0
+
+_cached_config: Optional[configparser.ConfigParser] = None
+_cached_signature: Optional[Tuple[int, int]] = None
+_pending_changes: Dict[str, Dict[str, str]] = {}
+_save_timer: Optional[threading.Timer] = None
+_subscribers: List[Callable[[configparser.ConfigParser], None]] = []
+_lock = threading.RLock()
 
 load_environment_variables()
 
 
+def _file_signature() -> Tuple[int, int]:
+    """再読み込みの要否を判定するための更新日時とサイズ"""
+    stat = os.stat(CONFIG_PATH)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _LockedConfigParser(configparser.ConfigParser):
+    """読み込みの間は_lockを保持する設定オブジェクト
+
+    再読み込みでは同じオブジェクトの中身を入れ替えるため、入れ替え中に別スレッドから読むと
+    セクションが見つからない場合がある。読み込みも_lockを取得し、入れ替えの完了を待たせる。
+    getint・getbooleanやセクション経由の読み込み（config['Path']['daily_path']）もgetを通る"""
+
+    def get(self, section, option, **kwargs):
+        with _lock:
+            return super().get(section, option, **kwargs)
+
+    def items(self, *args, **kwargs):
+        with _lock:
+            return super().items(*args, **kwargs)
+
+    def sections(self):
+        with _lock:
+            return super().sections()
+
+    def options(self, section):
+        with _lock:
+            return super().options(section)
+
+    def has_section(self, section):
+        with _lock:
+            return super().has_section(section)
+
+    def has_option(self, section, option):
+        with _lock:
+            return super().has_option(section, option)
+
+    def __getitem__(self, key):
+        with _lock:
+            return super().__getitem__(key)
+
+    def __contains__(self, key):
+        with _lock:
+            return super().__contains__(key)
+
+
+def _parse_config() -> configparser.ConfigParser:
+    """設定ファイルを解析する"""
+    config = _LockedConfigParser()
+    with open(CONFIG_PATH, encoding='utf-8') as f:
+        config.read_file(f)
+    return config
+
+
+def _replace_contents(target: configparser.ConfigParser, source: configparser.ConfigParser) -> None:
+    """保持している設定オブジェクトを差し替えずに中身だけ入れ替え、参照している側にも反映させる"""
+    for section in target.sections():
+        target.remove_section(section)
+    target.read_dict({section: dict(source.items(section, raw=True)) for section in source.sections()})
+
+
+def _apply_changes(config: configparser.ConfigParser, changes: Dict[str, Dict[str, str]]) -> None:
+    for section, values in changes.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for key, value in values.items():
+            config.set(section, key, value)
+
+
 def load_config(force_reload: bool = False) -> configparser.ConfigParser:
-    """設定ファイルを読み込む。キャッシュを使用して多重読み込みを防止"""
-    global _cached_config
-    if _cached_config is None or force_reload:
-        config = configparser.ConfigParser()
+    """設定ファイルを読み込む。更新日時とサイズが前回と同じ間は解析せずキャッシュを返す
+
+    ファイルが変更されていれば同じオブジェクトの中身を更新し、購読者に通知する。
+    変更後の内容が解析できない場合は前回の設定を使い続ける。
+    """
+    global _cached_config, _cached_signature
+    with _lock:
         try:
-            with open(CONFIG_PATH, encoding='utf-8') as f:
-                config.read_file(f)
+            signature = _file_signature()
+            if _cached_config is not None and signature == _cached_signature and not force_reload:
+                return _cached_config
+            config = _parse_config()
         except FileNotFoundError:
             print(f"設定ファイルが見つかりません: {CONFIG_PATH}")
             raise
         except configparser.Error as e:
             print(f"設定ファイルの解析中にエラーが発生しました: {e}")
-            raise
-        _cached_config = config
-    return _cached_config
+            if _cached_config is None:
+                raise
+            _cached_signature = signature
+            return _cached_config
+
+        _apply_changes(config, _pending_changes)
+        _cached_signature = signature
+        if _cached_config is None:
+            _cached_config = config
+            return _cached_config
+        _replace_contents(_cached_config, config)
+        reloaded = _cached_config
+        subscribers = list(_subscribers)
+
+    for callback in subscribers:
+        try:
+            callback(reloaded)
+        except Exception as e:
+            print(f"設定変更の通知中にエラーが発生しました: {e}")
+    return reloaded
+
+
+def subscribe_config(callback: Callable[[configparser.ConfigParser], None]) -> None:
+    """設定ファイルが変更されたときに呼び出す関数を登録。変更を検出したスレッドから呼び出される"""
+    with _lock:
+        _subscribers.append(callback)
 
 
 def save_config(config: configparser.ConfigParser):
-    """設定ファイルに設定を保存し、キャッシュを更新"""
-    global _cached_config
-    try:
-        with open(CONFIG_PATH, 'w', encoding='utf-8') as configfile:
-            config.write(configfile)
-        _cached_config = config
-    except IOError as e:
-        print(f"設定ファイルの保存中にエラーが発生しました: {e}")
-        raise
+    """設定ファイルに設定を保存し、キャッシュを更新。内容が変わらない場合は書き込まない"""
+    global _cached_config, _cached_signature
+    buffer = io.StringIO()
+    config.write(buffer)
+    content = buffer.getvalue()
+    with _lock:
+        try:
+            with open(CONFIG_PATH, encoding='utf-8') as f:
+                unchanged = f.read() == content
+        except FileNotFoundError:
+            unchanged = False
+        try:
+            if not unchanged:
+                atomic_write_text(Path(CONFIG_PATH), content)
+            _cached_signature = _file_signature()
+        except OSError as e:
+            print(f"設定ファイルの保存中にエラーが発生しました: {e}")
+            raise
+        if _cached_config is None:
+            _cached_config = _LockedConfigParser()
+        if _cached_config is not config:
+            _replace_contents(_cached_config, config)
+
+
+def update_config(changes: Dict[str, Dict[str, str]], delay: float = SAVE_DELAY_SECONDS) -> None:
+    """設定値を変更し、delay秒後にまとめて保存する。値が変わらない項目は保存対象にしない"""
+    global _save_timer
+    with _lock:
+        config = load_config()
+        changed = {
+            section: {key: value for key, value in values.items() if config.get(section, key, fallback=None) != value}
+            for section, values in changes.items()
+        }
+        changed = {section: values for section, values in changed.items() if values}
+        if not changed:
+            return
+
+        _apply_changes(config, changed)
+        for section, values in changed.items():
+            _pending_changes.setdefault(section, {}).update(values)
+
+        if _save_timer is not None:
+            _save_timer.cancel()
+        _save_timer = threading.Timer(delay, flush_config)
+        _save_timer.daemon = True
+        _save_timer.start()
+
+
+def flush_config() -> None:
+    """保存待ちの変更があればすぐに保存する。保存前に外部での編集を読み込み、変更はその上に反映する"""
+    global _save_timer
+    with _lock:
+        if _save_timer is not None:
+            _save_timer.cancel()
+            _save_timer = None
+        if not _pending_changes:
+            return
+        try:
+            config = load_config()
+            save_config(config)
+            _pending_changes.clear()
+        except Exception as e:
+            print(f"設定ファイルの保存中にエラーが発生しました: {e}")
+
+
+def get_data_dir() -> Path:
+    """キャッシュなどの作業ファイルを保存するディレクトリを取得。未設定時はホーム配下の.codediaryを使用"""
+    data_path = os.environ.get('CODEDIARY_DATA_DIR') or load_config().get('Path', 'data_path', fallback='')
+    data_dir = Path(data_path) if data_path else Path.home() / '.codediary'
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
 
 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 GEMINI_MODEL = os.environ.get("GEMINI_MODEL")
 GEMINI_THINKING_BUDGET = os.environ.get("GEMINI_THINKING_BUDGET")
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL")
+GEMINI_FAST_MODEL = os.environ.get("GEMINI_FAST_MODEL")
+GEMINI_LATENCY_TARGET = os.environ.get("GEMINI_LATENCY_TARGET")
+GEMINI_MAX_RETRIES = os.environ.get("GEMINI_MAX_RETRIES")
+GEMINI_TIMEOUT = os.environ.get("GEMINI_TIMEOUT")
+GEMINI_HEDGE_PERCENTILE = os.environ.get("GEMINI_HEDGE_PERCENTILE")
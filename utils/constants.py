@@ -3,4 +3,7 @@ MESSAGES = {
     "APPEND_TITLE": "追記確認",
     "APPEND_CONFIRM": "{}\nは既に存在します。項目ごとに追記しますか？",
     "DIARY_SAVE_ERROR": "日誌の保存に失敗しました: {}",
+    "OBSIDIAN_LAUNCH_ERROR": "Obsidianの起動に失敗しました: {}",
+    "CANCELLING": "中止しています...",
+    "CANCELLED": "処理を中止しました",
 }
@@ -3,9 +3,16 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+_loaded = False
+
 
 def load_environment_variables():
-    """プロジェクトルートの.envファイルから環境変数を読み込む"""
+    """プロジェクトルートの.envファイルから環境変数を読み込む。2回目以降の呼び出しでは何もしない"""
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+
     base_dir = Path(__file__).parent.parent
     env_path = os.path.join(base_dir, '.env')
 
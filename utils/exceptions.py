@@ -6,3 +6,8 @@ class AppError(Exception):
 class APIError(AppError):
     """外部API呼び出しで発生するエラー"""
     pass
+
+
+class CancelledError(AppError):
+    """ユーザーの操作で処理が中止された"""
+    pass
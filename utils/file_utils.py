@@ -0,0 +1,53 @@
+import os
+import stat
+import tempfile
+import time
+from pathlib import Path
+
+REPLACE_RETRY_COUNT = 3
+REPLACE_RETRY_DELAY = 0.1
+
+
+def _fsync_directory(directory: Path) -> None:
+    """リネーム結果をディスクに確定させるためディレクトリをfsyncする。Windowsでは不要なため何もしない"""
+    if os.name == 'nt':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _replace(source: str, destination: Path) -> None:
+    """一時ファイルで置き換える。同期ソフトが一時的にファイルを掴んでいる場合に備えて数回再試行する"""
+    for attempt in range(REPLACE_RETRY_COUNT):
+        try:
+            os.replace(source, destination)
+            return
+        except PermissionError:
+            if attempt == REPLACE_RETRY_COUNT - 1:
+                raise
+            time.sleep(REPLACE_RETRY_DELAY)
+
+
+def atomic_write_text(path: Path, content: str, encoding: str = 'utf-8') -> None:
+    """同じフォルダの一時ファイルに書き込みfsyncした後、リネームで置き換える。途中で異常終了しても元のファイルは壊れない"""
+    fd, temp_path = tempfile.mkstemp(prefix=f".{path.name}.", suffix='.tmp', dir=path.parent)
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding) as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(temp_path, 0o644)
+        _replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(path.parent)
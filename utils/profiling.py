@@ -0,0 +1,137 @@
+"""処理段階ごとのCPUプロファイル（cProfile）とメモリ確保（tracemalloc）の計測
+
+StageProfilerのstage()で囲んだ段階ごとに、snakevizやpstatsで開ける.profファイルと、
+メモリ確保の多い箇所を並べたテキストの報告を出力先のフォルダに書き出す。
+無効の場合はStageProfilerを作らず、profile_stage()が何もしないコンテキストを返すだけにする。
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from utils.config_manager import load_config
+
+DEFAULT_TOP_ALLOCATIONS = 25
+DEFAULT_TOP_FUNCTIONS = 25
+# cProfileは同時に1つしか有効にできない（Python 3.12以降）ため、並行して計測する段階はCPUプロファイルを省く
+_cpu_profile_lock = threading.Lock()
+# 並行して計測する実行があるうちはtracemallocを止めないよう、計測中のStageProfilerの数を数える
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_started = False
+_IGNORED_FRAMES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+)
+
+
+class StageProfiler:
+    """段階ごとの計測結果を出力先のフォルダに書き出す。withの間はtracemallocを有効にする"""
+
+    def __init__(self, output_dir: Path, top_allocations: int = DEFAULT_TOP_ALLOCATIONS,
+                 top_functions: int = DEFAULT_TOP_FUNCTIONS):
+        self.output_dir = output_dir
+        self.top_allocations = top_allocations
+        self.top_functions = top_functions
+        self.files: List[Path] = []
+        self._stage_count = 0
+
+    def __enter__(self) -> 'StageProfiler':
+        global _tracemalloc_users, _tracemalloc_started
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with _tracemalloc_lock:
+            if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _tracemalloc_started = True
+            _tracemalloc_users += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        global _tracemalloc_users, _tracemalloc_started
+        with _tracemalloc_lock:
+            _tracemalloc_users -= 1
+            # 呼び出し元が以前から有効にしていたtracemallocは止めない
+            if _tracemalloc_users == 0 and _tracemalloc_started:
+                tracemalloc.stop()
+                _tracemalloc_started = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """withで囲んだ段階を計測し、終了時（例外で抜けた場合も）に.profと確保箇所の報告を書き出す"""
+        self._stage_count += 1
+        prefix = f"{self._stage_count:02d}_{name}"
+        profiler = cProfile.Profile() if _cpu_profile_lock.acquire(blocking=False) else None
+        before = tracemalloc.take_snapshot().filter_traces(_IGNORED_FRAMES)
+        tracemalloc.reset_peak()
+        start_size = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # デバッガなど他のプロファイラが有効な場合はCPUプロファイルを省く
+                    _cpu_profile_lock.release()
+                    profiler = None
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                _cpu_profile_lock.release()
+            elapsed = time.perf_counter() - start
+            current_size, peak_size = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(_IGNORED_FRAMES)
+            self._write_reports(prefix, name, profiler, before, after, elapsed,
+                                current_size - start_size, peak_size - start_size)
+
+    def _write_reports(self, prefix: str, name: str, profiler: Optional[cProfile.Profile],
+                       before: tracemalloc.Snapshot, after: tracemalloc.Snapshot,
+                       elapsed: float, growth: int, peak: int) -> None:
+        lines = [
+            f"段階: {name}",
+            f"所要時間: {elapsed:.3f}秒",
+            f"メモリ: 増加 {growth / 1024:,.1f} KiB / ピーク（段階開始時からの増分） {peak / 1024:,.1f} KiB",
+            "",
+            f"確保量の増加が多い箇所（上位{self.top_allocations}件）:",
+        ]
+        for index, stat in enumerate(after.compare_to(before, 'lineno')[:self.top_allocations], start=1):
+            frame = stat.traceback[0]
+            lines.append(f"{index:3d}. {frame.filename}:{frame.lineno}: {stat.size_diff / 1024:+,.1f} KiB "
+                         f"(合計 {stat.size / 1024:,.1f} KiB, {stat.count_diff:+d}個)")
+
+        if profiler is not None:
+            prof_path = self.output_dir / f"{prefix}.prof"
+            profiler.dump_stats(str(prof_path))
+            self.files.append(prof_path)
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(self.top_functions)
+            lines += ["", f"累積時間の長い関数（上位{self.top_functions}件、このスレッドのみ）:", stream.getvalue().strip()]
+        else:
+            lines += ["", "他の段階・ツールがcProfileを使用中のため、CPUプロファイルは省略しました"]
+
+        report_path = self.output_dir / f"{prefix}_allocations.txt"
+        report_path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+        self.files.append(report_path)
+
+
+def profile_stage(profiler: Optional[StageProfiler], name: str):
+    """profilerがあれば段階を計測し、なければ何もしないコンテキストを返す"""
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(name)
+
+
+def is_profiling_enabled() -> bool:
+    """config.iniの[Debug] profileで計測が有効になっているか"""
+    return load_config().getboolean('Debug', 'profile', fallback=False)
+
+
+def profile_dir_for(diary_path: Path) -> Path:
+    """日誌ファイルと同じフォルダに置く計測結果のフォルダ"""
+    return diary_path.with_name(f"{diary_path.stem}_profile")
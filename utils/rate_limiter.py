@@ -0,0 +1,44 @@
+import threading
+import time
+from typing import Optional
+
+from utils.cancellation import CancellationToken
+
+
+class RateLimiter:
+    """1分あたりの呼び出し回数を制限するトークンバケット
+
+    burst回までは続けて許可し、以降は60/rate_per_minute秒ごとに1回ずつ許可する。複数スレッドから共有できる"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minuteは正の値を指定してください")
+        self.interval = 60.0 / rate_per_minute
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """許可を1回分取得できれば0、できなければ次の許可までの秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) / self.interval)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) * self.interval
+
+    def acquire(self, cancel_token: Optional[CancellationToken] = None) -> float:
+        """許可を得るまで待ち、待った秒数を返す。待っている間に中止されるとCancelledErrorを送出する"""
+        waited = 0.0
+        while True:
+            delay = self._reserve()
+            if delay <= 0:
+                return waited
+            if cancel_token is not None:
+                cancel_token.wait(delay)
+            else:
+                time.sleep(delay)
+            waited += delay
@@ -0,0 +1,12 @@
+import math
+import re
+
+WIDE_CHAR_PATTERN = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """テキストのトークン数をローカルで概算する。日本語は1文字1トークン、それ以外は4文字1トークンとして数える"""
+    if not text:
+        return 0
+    wide_chars = len(WIDE_CHAR_PATTERN.findall(text))
+    return wide_chars + math.ceil((len(text) - wide_chars) / 4)
@@ -0,0 +1,215 @@
+"""処理段階ごとの所要時間と属性を記録する軽量なトレース
+
+span()で囲んだ区間を、Chromeのトレースビューアー（chrome://tracing・Perfetto）で開けるJSON配列形式で
+1区間1行ずつ書き出す。同じスレッドで入れ子にした区間はビューアー上でも入れ子で表示される。
+無効の間はspan()が共有の何もしない区間を返すだけのため、計測の負荷はほぼない。
+環境変数CODEDIARY_TRACE_FILEに出力先を指定すると、読み込み時に有効になる。
+record_spans()の間は、そのスレッド（とbindで引き継いだスレッド）で終了した区間をメモリにも集める。
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO
+
+TRACE_FILE_ENV = 'CODEDIARY_TRACE_FILE'
+
+_enabled = False
+_output: Optional[TextIO] = None
+_active_recorders = 0
+_lock = threading.Lock()
+_local = threading.local()
+_named_threads: set = set()
+_origin = time.perf_counter()
+
+
+class Span:
+    """記録中の1区間。setで終了までに分かった属性（件数・トークン数など）を追加できる"""
+
+    __slots__ = ('name', 'category', 'attrs', 'start')
+
+    def __init__(self, name: str, category: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.category = category
+        self.attrs = attrs
+        self.start = 0.0
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        _emit({
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': round((self.start - _origin) * 1_000_000, 1),
+            'dur': round((end - self.start) * 1_000_000, 1),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self.attrs,
+        })
+        return False
+
+
+class SpanRecorder:
+    """record_spansの間に終了した区間のイベントを集める"""
+
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self.events.append(event)
+
+    def spans(self, name: str) -> List[Dict[str, Any]]:
+        """指定した名前の区間を終了順に返す"""
+        with self._lock:
+            return [event for event in self.events if event['name'] == name]
+
+
+class _NoopSpan:
+    """トレースが無効の間に返す何もしない区間"""
+
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, category: str = 'codediary', **attrs: Any):
+    """withで囲んだ区間を記録する。無効の間は何もしない区間を返す"""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, category, attrs)
+
+
+def is_tracing_enabled() -> bool:
+    """区間を記録する状態か（トレースファイルへの出力中またはrecord_spansの実行中）"""
+    return _enabled
+
+
+def _emit(event: Dict[str, Any]) -> None:
+    """イベントを集め、1行書き出す。スレッドの初回はビューアーに表示するスレッド名も書き出す"""
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is not None:
+        recorder.add(event)
+    with _lock:
+        if _output is None:
+            return
+        if event['tid'] not in _named_threads:
+            _named_threads.add(event['tid'])
+            _write_event({'name': 'thread_name', 'ph': 'M', 'pid': event['pid'], 'tid': event['tid'],
+                          'args': {'name': threading.current_thread().name}})
+        _write_event(event)
+
+
+def _write_event(event: Dict[str, Any]) -> None:
+    # Chromeのトレースビューアーは閉じ括弧のないJSON配列も読めるため、1行ずつ追記して途中で落ちても残るようにする
+    _output.write(json.dumps(event, ensure_ascii=False, default=str) + ',\n')
+
+
+def _update_enabled() -> None:
+    """出力先か集計中の処理があるときだけ区間を作るようにする。_lockを取得した状態で呼び出す"""
+    global _enabled
+    _enabled = _output is not None or _active_recorders > 0
+
+
+def enable_tracing(path: Path) -> None:
+    """トレースの出力先を開いて記録を始める。既に記録中であれば前の出力先を閉じる"""
+    global _output
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    disable_tracing()
+    with _lock:
+        _output = open(path, 'w', encoding='utf-8', buffering=1)
+        _output.write('[\n')
+        _named_threads.clear()
+        _update_enabled()
+
+
+def disable_tracing() -> None:
+    """トレースファイルへの記録を止めて出力先を閉じる"""
+    global _output
+    with _lock:
+        if _output is not None:
+            _output.close()
+            _output = None
+        _update_enabled()
+
+
+@contextmanager
+def record_spans() -> Iterator[SpanRecorder]:
+    """withの間にこのスレッドで終了した区間を集める。入れ子にした場合は内側だけに集める"""
+    global _active_recorders
+    recorder = SpanRecorder()
+    previous = getattr(_local, 'recorder', None)
+    _local.recorder = recorder
+    with _lock:
+        _active_recorders += 1
+        _update_enabled()
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+        with _lock:
+            _active_recorders -= 1
+            _update_enabled()
+
+
+def bind(function: Callable) -> Callable:
+    """呼び出し元スレッドのrecord_spansを、別スレッドで実行する関数に引き継ぐ"""
+    recorder = getattr(_local, 'recorder', None)
+    if recorder is None:
+        return function
+
+    def run(*args, **kwargs):
+        previous = getattr(_local, 'recorder', None)
+        _local.recorder = recorder
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _local.recorder = previous
+    return run
+
+
+def configure_tracing_from_env() -> bool:
+    """環境変数CODEDIARY_TRACE_FILEが設定されていれば記録を始める"""
+    path = os.environ.get(TRACE_FILE_ENV)
+    if not path:
+        return False
+    enable_tracing(Path(path))
+    return True
+
+
+def read_trace(path: Path) -> List[Dict[str, Any]]:
+    """書き出したトレースのイベント一覧を読み込む（テスト・集計用）"""
+    events = []
+    for line in Path(path).read_text(encoding='utf-8').splitlines():
+        line = line.strip().rstrip(',')
+        if line and line not in ('[', ']'):
+            events.append(json.loads(line))
+    return events
+
+
+atexit.register(disable_tracing)
+configure_tracing_from_env()
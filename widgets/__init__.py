@@ -1,11 +1,15 @@
-"""UIウィジェットパッケージ。日付選択、ボタン、進捗表示の各ウィジェットを提供"""
+"""UIウィジェットパッケージ。日付選択、ボタン、進捗表示、ジョブ一覧、日誌検索の各ウィジェットを提供"""
 
 from .control_buttons_widget import ControlButtonsWidget
 from .date_selection_widget import DateSelectionWidget
+from .job_list_widget import JobListWidget
 from .progress_widget import ProgressWidget
+from .search_widget import SearchWidget
 
 __all__ = [
     'ControlButtonsWidget',
     'DateSelectionWidget',
-    'ProgressWidget'
+    'JobListWidget',
+    'ProgressWidget',
+    'SearchWidget'
 ]
@@ -10,6 +10,8 @@ class ControlButtonsWidget(ttk.Frame):
         super().__init__(parent, **kwargs)
 
         self.create_github_diary_callback: Optional[Callable] = None
+        self.create_rollup_callback: Optional[Callable] = None
+        self.cancel_callback: Optional[Callable] = None
         self.close_callback: Optional[Callable] = None
 
         self._setup_ui()
@@ -23,19 +25,40 @@ class ControlButtonsWidget(ttk.Frame):
         )
         self.github_button.grid(row=0, column=0, sticky=tk.W, pady=(0, 5))
 
+        self.rollup_button = ttk.Button(
+            self,
+            text="週・月まとめ",
+            command=self._on_create_rollup
+        )
+        self.rollup_button.grid(row=0, column=1, sticky=tk.W, padx=(5, 0), pady=(0, 5))
+
+        self.cancel_button = ttk.Button(
+            self,
+            text="中止",
+            command=self._on_cancel,
+            state=tk.DISABLED
+        )
+        self.cancel_button.grid(row=0, column=2, sticky=tk.W, padx=(5, 0), pady=(0, 5))
+
         self.close_button = ttk.Button(
             self,
             text="閉じる",
             command=self._on_close
         )
-        self.close_button.grid(row=0, column=1, sticky=tk.W, padx=(5, 0))
+        self.close_button.grid(row=0, column=3, sticky=tk.W, padx=(5, 0))
 
     def set_callbacks(self,
                      create_github_diary: Optional[Callable] = None,
+                     create_rollup: Optional[Callable] = None,
+                     cancel: Optional[Callable] = None,
                      close: Optional[Callable] = None):
         """各ボタンのコールバック関数を設定"""
         if create_github_diary:
             self.create_github_diary_callback = create_github_diary
+        if create_rollup:
+            self.create_rollup_callback = create_rollup
+        if cancel:
+            self.cancel_callback = cancel
         if close:
             self.close_callback = close
 
@@ -44,13 +67,29 @@ class ControlButtonsWidget(ttk.Frame):
         if self.create_github_diary_callback:
             self.create_github_diary_callback()
 
+    def _on_create_rollup(self):
+        """週・月まとめボタンのクリック処理"""
+        if self.create_rollup_callback:
+            self.create_rollup_callback()
+
+    def _on_cancel(self):
+        """中止ボタンのクリック処理"""
+        if self.cancel_callback:
+            self.cancel_callback()
+
     def _on_close(self):
         """閉じるボタンのクリック処理"""
         if self.close_callback:
             self.close_callback()
 
     def set_buttons_state(self, enabled: bool):
-        """操作ボタンの有効/無効を切り替え"""
+        """操作ボタンの有効/無効を切り替え。中止ボタンは処理中のみ有効にする"""
         state = tk.NORMAL if enabled else tk.DISABLED
         self.github_button.config(state=state)
+        self.rollup_button.config(state=state)
         self.close_button.config(state=state)
+        self.set_cancel_state(not enabled)
+
+    def set_cancel_state(self, enabled: bool):
+        """中止ボタンの有効/無効を切り替え"""
+        self.cancel_button.config(state=tk.NORMAL if enabled else tk.DISABLED)
@@ -1,17 +1,20 @@
 import tkinter as tk
 from datetime import datetime, timedelta, timezone
 from tkinter import ttk
-
-from tkcalendar import DateEntry
+from typing import Callable, Optional
 
 
 class DateSelectionWidget(ttk.LabelFrame):
     """カレンダーパネルで日付範囲を選択するウィジェット"""
 
+    SELECTION_DEBOUNCE_MS = 600
+
     def __init__(self, parent, config, **kwargs):
         super().__init__(parent, text="対象期間", padding="5", **kwargs)
         self.config = config
         self.jst = timezone(timedelta(hours=9))
+        self.selection_changed_callback: Optional[Callable] = None
+        self._selection_after_id: Optional[str] = None
 
         self.date_entry_config = {
             'width': 12,
@@ -57,8 +60,36 @@ class DateSelectionWidget(ttk.LabelFrame):
         self.end_date_entry.grid(row=1, column=1, sticky=tk.W)
 
     def _create_date_entry(self):
-        """DateEntryウィジェットを作成"""
-        return DateEntry(self, **self.date_entry_config)
+        """DateEntryウィジェットを作成。カレンダーでの選択と直接入力の確定で選択変更を通知する"""
+        # tkcalendarはbabelを読み込み重いため、起動時のモジュール読み込みではなくウィジェットの作成時に読み込む
+        from tkcalendar import DateEntry
+
+        date_entry = DateEntry(self, **self.date_entry_config)
+        date_entry.bind('<<DateEntrySelected>>', self._on_selection_changed, add='+')
+        date_entry.bind('<FocusOut>', self._on_selection_changed, add='+')
+        return date_entry
+
+    def set_callbacks(self, selection_changed: Optional[Callable] = None):
+        """選択期間が変わったときのコールバック関数（開始日, 終了日）を設定"""
+        if selection_changed:
+            self.selection_changed_callback = selection_changed
+
+    def _on_selection_changed(self, event=None):
+        """連続した日付の変更をまとめ、一定時間変更がなければ通知する"""
+        if self._selection_after_id is not None:
+            self.after_cancel(self._selection_after_id)
+        self._selection_after_id = self.after(self.SELECTION_DEBOUNCE_MS, self._notify_selection_changed)
+
+    def _notify_selection_changed(self):
+        """選択中の期間をコールバックに通知。入力途中で日付として解釈できない場合は通知しない"""
+        self._selection_after_id = None
+        if not self.selection_changed_callback:
+            return
+        try:
+            start_date, end_date = self.get_selected_dates()
+        except ValueError:
+            return
+        self.selection_changed_callback(start_date, end_date)
 
     def get_start_date(self):
         """開始日をdateオブジェクトで返す"""
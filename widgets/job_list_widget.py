@@ -0,0 +1,40 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import List, Optional
+
+from service.diary_job_queue import DiaryJob
+
+
+class JobListWidget(ttk.Frame):
+    """日誌生成ジョブごとの状態を表示する一覧ウィジェット"""
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+
+        self.job_ids: List[int] = []
+
+        self._setup_ui()
+
+    def _setup_ui(self):
+        """ジョブ一覧を配置"""
+        self.columnconfigure(0, weight=1)
+
+        self.job_listbox = tk.Listbox(self, height=3, activestyle=tk.NONE, exportselection=False)
+        self.job_listbox.grid(row=0, column=0, sticky="we")
+
+    def show_jobs(self, jobs: List[DiaryJob]):
+        """ジョブの状態を一覧に表示。選択中のジョブは表示を更新しても選択したままにする"""
+        selected_job_id = self.selected_job_id()
+        self.job_ids = [job.job_id for job in jobs]
+        self.job_listbox.delete(0, tk.END)
+        for job in jobs:
+            self.job_listbox.insert(tk.END, job.format())
+        if selected_job_id in self.job_ids:
+            self.job_listbox.selection_set(self.job_ids.index(selected_job_id))
+
+    def selected_job_id(self) -> Optional[int]:
+        """選択中のジョブのID。未選択の場合はNone"""
+        selection = self.job_listbox.curselection()
+        if not selection or selection[0] >= len(self.job_ids):
+            return None
+        return self.job_ids[selection[0]]
@@ -1,5 +1,6 @@
 import time
 import tkinter as tk
+from pathlib import Path
 from tkinter import ttk
 from typing import Optional
 
@@ -17,6 +18,7 @@ class ProgressWidget(ttk.Label):
 
         self.start_time: Optional[float] = None
         self.timer_after_id: Optional[str] = None
+        self.detail = ""
 
     def set_message(self, message: str):
         """メッセージを設定して表示"""
@@ -45,13 +47,25 @@ class ProgressWidget(ttk.Label):
     def _update_elapsed_time(self):
         """経過時間を1秒ごとに更新"""
         if self.start_time:
-            elapsed = int(time.time() - self.start_time)
-            self.set_message(f"日誌生成中... {elapsed}秒経過")
+            self._show_elapsed_time()
 
             self.timer_after_id = self.after(1000, self._update_elapsed_time)
 
-    def set_completion_message(self, input_tokens: int, output_tokens: int, model_name: Optional[str] = None):
-        """完了メッセージに処理時間とトークン数を含めて表示"""
+    def _show_elapsed_time(self):
+        """経過時間と進捗の詳細を表示"""
+        elapsed = int(time.time() - self.start_time)
+        message = f"日誌生成中... {elapsed}秒経過"
+        self.set_message(f"{message}\n{self.detail}" if self.detail else message)
+
+    def set_detail(self, detail: str):
+        """処理中の進捗の詳細（取得済みリポジトリ数など）を経過時間の下に表示"""
+        self.detail = detail
+        if self.start_time and self.timer_after_id:
+            self._show_elapsed_time()
+
+    def set_completion_message(self, input_tokens: int, output_tokens: int, model_name: Optional[str] = None,
+                               saved_path: Optional[Path] = None):
+        """完了メッセージに処理時間とトークン数、保存先を含めて表示"""
         self._stop_timer()
 
         if self.start_time:
@@ -67,9 +81,28 @@ class ProgressWidget(ttk.Label):
         ]
         if model_name:
             lines.append(f"モデル={model_name}")
+        if saved_path:
+            lines.append(f"保存先: {saved_path}")
 
         self.set_message("\n".join(lines))
 
+    def set_jobs_summary(self, done: int, cancelled: int, failed: int, input_tokens: int, output_tokens: int):
+        """全ジョブの終了時に件数・処理時間・トークン数の合計を表示"""
+        self._stop_timer()
+
+        elapsed_str = f"{int(time.time() - self.start_time)}秒" if self.start_time else "不明"
+        counts = f"完了{done}件"
+        if cancelled:
+            counts += f" 中止{cancelled}件"
+        if failed:
+            counts += f" 失敗{failed}件"
+
+        self.set_message("\n".join([
+            f"日誌生成終了: {counts}",
+            f"処理時間: {elapsed_str}",
+            f"トークン数: 入力={input_tokens} 出力={output_tokens}",
+        ]))
+
     def set_error_message(self, error_message: str):
         """エラーメッセージを表示"""
         self._stop_timer()
@@ -78,6 +111,7 @@ class ProgressWidget(ttk.Label):
     def start_progress(self, message: str):
         """プログレスメッセージを表示し経過時間計測を開始"""
         self.set_message(message)
+        self.detail = ""
         self.start_time = time.time()
         self._start_timer()
 
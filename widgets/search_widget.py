@@ -0,0 +1,61 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, List, Optional
+
+
+class SearchWidget(ttk.Frame):
+    """保存済みの日誌を全文検索する入力欄と結果一覧のウィジェット"""
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+
+        self.search_callback: Optional[Callable[[str], None]] = None
+        self.open_callback: Optional[Callable[[int], None]] = None
+        self.query_var = tk.StringVar()
+
+        self._setup_ui()
+
+    def _setup_ui(self):
+        """検索語の入力欄・検索ボタン・結果一覧を配置"""
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.query_entry = ttk.Entry(self, textvariable=self.query_var)
+        self.query_entry.grid(row=0, column=0, sticky="we")
+        self.query_entry.bind('<Return>', lambda event: self._on_search())
+
+        self.search_button = ttk.Button(self, text="検索", command=self._on_search)
+        self.search_button.grid(row=0, column=1, sticky=tk.W, padx=(5, 0))
+
+        self.result_listbox = tk.Listbox(self, height=4)
+        self.result_listbox.grid(row=1, column=0, columnspan=2, sticky="wens", pady=(5, 0))
+        self.result_listbox.bind('<Double-Button-1>', lambda event: self._on_open())
+
+    def set_callbacks(self,
+                      search: Optional[Callable[[str], None]] = None,
+                      open_result: Optional[Callable[[int], None]] = None):
+        """検索実行と結果選択のコールバック関数を設定"""
+        if search:
+            self.search_callback = search
+        if open_result:
+            self.open_callback = open_result
+
+    def _on_search(self):
+        """検索ボタン・Enterキーの処理"""
+        query = self.query_var.get().strip()
+        if query and self.search_callback:
+            self.search_callback(query)
+
+    def _on_open(self):
+        """結果一覧のダブルクリック処理"""
+        selection = self.result_listbox.curselection()
+        if selection and self.open_callback:
+            self.open_callback(selection[0])
+
+    def show_results(self, lines: List[str]):
+        """検索結果を一覧に表示"""
+        self.result_listbox.delete(0, tk.END)
+        for line in lines:
+            self.result_listbox.insert(tk.END, line)
+        if not lines:
+            self.result_listbox.insert(tk.END, "該当する日誌はありません")